@@ -0,0 +1,41 @@
+import argparse
+import pathlib
+import sys
+
+import pyglet
+
+
+def compare_fingerprints(first: pathlib.Path, second: pathlib.Path, brick_limit: int) -> bool:
+    # Окно не нужно, но описания полей (core.service.bitfield) импортируют OpenGL
+    pyglet.options["headless"] = True
+
+    from simulator.fingerprint import FingerprintError, find_divergence
+
+    try:
+        divergence, compared = find_divergence(first, second)
+    except FingerprintError as error:
+        print(f"Журналы нельзя сравнить: {error}")
+        return False
+    if divergence is None:
+        print(f"Расхождений нет, сравнено тиков: {compared}")
+        return True
+
+    print(f"Первое расхождение на тике {divergence.age} (сравнено тиков: {compared}), миры пакета: {divergence.worlds}")
+    if divergence.bricks is None:
+        print("В журналах нет отпечатков кирпичей (FINGERPRINT_BRICKS)")
+    else:
+        print(f"Разошедшихся кирпичей: {len(divergence.bricks)}")
+        for index, position in divergence.bricks[:brick_limit]:
+            print(f"    кирпич {index}, начало в ячейке {tuple(position)}")
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description = "Поиск первого тика и кирпичей, в которых разошлись два журнала отпечатков состояния мира"
+    )
+    parser.add_argument("first", type = pathlib.Path, help = "первый журнал (FINGERPRINT_FOLDER)")
+    parser.add_argument("second", type = pathlib.Path, help = "второй журнал")
+    parser.add_argument("--bricks", type = int, default = 20, help = "сколько разошедшихся кирпичей вывести")
+    arguments = parser.parse_args()
+    sys.exit(0 if compare_fingerprints(arguments.first, arguments.second, max(arguments.bricks, 0)) else 1)
@@ -0,0 +1,348 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+from pyglet import gl
+
+
+class BitfieldError(Exception):
+    pass
+
+
+WORD_BITS = 32
+
+
+@dataclass(frozen = True)
+class BitField:
+    name: str
+    bits: int
+    signed: bool = False
+    # Количество компонент вектора (ivec3 для 3), 1 - скаляр
+    components: int = 1
+    comment: str = ""
+
+    @property
+    def glsl_type(self) -> str:
+        if self.components == 1:
+            return "int" if self.signed or self.bits < WORD_BITS else "uint"
+        return f"{"i" if self.signed or self.bits < WORD_BITS else "u"}vec{self.components}"
+
+    @property
+    def is_unsigned(self) -> bool:
+        return self.glsl_type.startswith("u")
+
+    @property
+    def minimum(self) -> int:
+        return -(1 << (self.bits - 1)) if self.signed else 0
+
+    @property
+    def maximum(self) -> int:
+        return (1 << (self.bits - 1)) - 1 if self.signed else (1 << self.bits) - 1
+
+    # Знаковые значения хранятся со смещением, как zero_offset_* из packing.glsl
+    @property
+    def zero_offset(self) -> int:
+        return 1 << (self.bits - 1) if self.signed else 0
+
+    def component_name(self, component: int) -> str:
+        return self.name if self.components == 1 else f"{self.name}.{"xyzw"[component]}"
+
+    def component_id(self, component: int) -> str:
+        return self.name if self.components == 1 else f"{self.name}_{"xyzw"[component]}"
+
+
+# Часть компоненты поля в слове тексела: биты [source_offset; source_offset + bits) значения
+# лежат в битах [offset; offset + bits) слова word
+@dataclass(frozen = True)
+class BitSlice:
+    field: BitField
+    component: int
+    word: int
+    offset: int
+    bits: int
+    source_offset: int
+
+
+# Описание упакованной записи (Unit, Plan, Cell), из которого генерируются структура и функции упаковки GLSL,
+# а также векторизованные кодировщик и декодировщик NumPy.
+# Поля раскладываются по 32-битным словам без разрывов, если это не увеличивает количество слов,
+# а формат тексела выбирается самым узким из тех, что можно использовать для imageStore
+class BitfieldLayout:
+    # (количество слов, формат, количество каналов). RGB32UI не поддерживается для image load/store
+    TEXEL_FORMATS = (
+        (1, gl.GL_R32UI, 1),
+        (2, gl.GL_RG32UI, 2),
+        (4, gl.GL_RGBA32UI, 4)
+    )
+
+    # Все записи, порядок задает номера полей для проверки переполнения
+    layouts: list["BitfieldLayout"] = []
+
+    def __init__(self, name: str, fields: list[BitField], comment: str = "") -> None:
+        self.name = name
+        self.fields = fields
+        self.comment = comment
+        for field in self.fields:
+            if not 0 < field.bits <= WORD_BITS:
+                raise BitfieldError(f"{self.name}.{field.name} bit count ({field.bits}) must be in [1; {WORD_BITS}]")
+
+        self.slices = self.arrange()
+        self.words = max(bit_slice.word for bit_slice in self.slices) + 1
+        for words, texel_format, channels in self.TEXEL_FORMATS:
+            if self.words <= words:
+                self.texel_format = texel_format
+                self.channels = channels
+                break
+        else:
+            raise BitfieldError(f"{self.name} needs {self.words} words, more than a texel can hold")
+
+        self.overflow_offset = sum(len(layout.overflow_fields) for layout in self.layouts)
+        self.layouts.append(self)
+
+        self.dtype = np.dtype(
+            [
+                (field.name, np.int32 if not field.is_unsigned else np.uint32, (field.components,))
+                if field.components > 1 else
+                (field.name, np.int32 if not field.is_unsigned else np.uint32)
+                for field in self.fields
+            ]
+        )
+
+    @property
+    def lower_name(self) -> str:
+        return self.name.lower()
+
+    @property
+    def bit_count(self) -> int:
+        return sum(field.bits * field.components for field in self.fields)
+
+    # Поля, значения которых могут выйти за диапазон (поля на все слово проверять не нужно)
+    @property
+    def overflow_fields(self) -> list[tuple[BitField, int]]:
+        return [
+            (field, component)
+            for field in self.fields if field.bits < WORD_BITS or field.signed
+            for component in range(field.components)
+        ]
+
+    def overflow_names(self) -> list[str]:
+        return [f"{self.lower_name}_{field.component_id(component)}" for field, component in self.overflow_fields]
+
+    def arrange(self) -> list[BitSlice]:
+        components = [(field, component) for field in self.fields for component in range(field.components)]
+        minimum_words = math.ceil(self.bit_count / WORD_BITS)
+
+        # Сначала - раскладка без разрывов (первый подходящий, по убыванию размера)
+        free = []
+        slices = []
+        for field, component in sorted(components, key = lambda item: -item[0].bits):
+            word = next((index for index, bits in enumerate(free) if bits >= field.bits), None)
+            if word is None:
+                word = len(free)
+                free.append(WORD_BITS)
+            slices.append(BitSlice(field, component, word, WORD_BITS - free[word], field.bits, 0))
+            free[word] -= field.bits
+        if len(free) == minimum_words:
+            return slices
+
+        # Иначе - подряд, с разрывом полей на границах слов
+        slices = []
+        position = 0
+        for field, component in components:
+            source_offset = 0
+            while source_offset < field.bits:
+                word, offset = divmod(position, WORD_BITS)
+                bits = min(field.bits - source_offset, WORD_BITS - offset)
+                slices.append(BitSlice(field, component, word, offset, bits, source_offset))
+                source_offset += bits
+                position += bits
+        return slices
+
+    # --- GLSL ---
+
+    def glsl(self) -> str:
+        name = self.name
+        lower_name = self.lower_name
+        lines = [f"// Сгенерировано core/service/bitfield.py ({name}), изменять нужно схему, а не этот код"]
+
+        for index, (field, component) in enumerate(self.overflow_fields):
+            lines.append(
+                f"const uint overflow_field_{lower_name}_{field.component_id(component)} = {self.overflow_offset + index}u;"
+            )
+        lines.append(f"const int {lower_name}_texel_words = {self.words};")
+
+        lines += ["", ""]
+        if self.comment:
+            lines.append(f"// {self.comment}")
+        lines.append(f"struct {name} {{")
+        for field in self.fields:
+            if field.comment:
+                lines.append(f"// {field.comment}")
+            lines.append(f"    {field.glsl_type} {field.name};")
+        lines += ["};", "", ""]
+
+        zero_values = ", ".join(self.glsl_zero(field) for field in self.fields)
+        lines += [f"{name} new_{lower_name}() {{", f"    return {name}({zero_values});", "}", "", ""]
+
+        # Упаковка
+        lines += [
+            f"uvec4 pack_{lower_name}({name} value, ivec3 position) {{",
+            "    uvec4 packed_value = uvec4(0u);"
+        ]
+        for field, component in self.overflow_fields:
+            lines.append(
+                f"    check_overflow(overflow_field_{lower_name}_{field.component_id(component)}, position,"
+                f" value.{field.component_name(component)}, {field.minimum}, {field.maximum});"
+            )
+        for bit_slice in self.slices:
+            value = self.glsl_stored_value(bit_slice.field, bit_slice.component)
+            if bit_slice.source_offset > 0:
+                value = f"({value} >> {bit_slice.source_offset})"
+            lines.append(
+                f"    packed_value[{bit_slice.word}] = bitfieldInsert(packed_value[{bit_slice.word}], {value},"
+                f" {bit_slice.offset}, {bit_slice.bits});"
+            )
+        lines += ["    return packed_value;", "}", "", ""]
+
+        # Распаковка
+        lines += [f"{name} unpack_{lower_name}(uvec4 packed_value) {{", f"    {name} value;"]
+        for field in self.fields:
+            for component in range(field.components):
+                parts = [
+                    f"bitfieldExtract(packed_value[{bit_slice.word}], {bit_slice.offset}, {bit_slice.bits})"
+                    f"{f" << {bit_slice.source_offset}" if bit_slice.source_offset > 0 else ""}"
+                    for bit_slice in self.slices if bit_slice.field is field and bit_slice.component == component
+                ]
+                stored = parts[0] if len(parts) == 1 else " | ".join(f"({part})" for part in parts)
+                if field.is_unsigned:
+                    value = stored
+                elif field.zero_offset > 0:
+                    value = f"int({stored}) - {field.zero_offset}"
+                else:
+                    value = f"int({stored})"
+                lines.append(f"    value.{field.component_name(component)} = {value};")
+        lines += ["    return value;", "}"]
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def glsl_zero(field: BitField) -> str:
+        zero = "0u" if field.is_unsigned else "0"
+        return zero if field.components == 1 else f"{field.glsl_type}({zero})"
+
+    @staticmethod
+    def glsl_stored_value(field: BitField, component: int) -> str:
+        value = f"value.{field.component_name(component)}"
+        if field.zero_offset > 0:
+            return f"uint({value} + {field.zero_offset})"
+        return value if field.is_unsigned else f"uint({value})"
+
+    # --- NumPy ---
+
+    # Кодирует структурированный массив dtype в массив слов (..., channels)
+    def encode(self, values: npt.NDArray) -> npt.NDArray[np.uint32]:
+        texels = np.zeros((*values.shape, self.channels), dtype = np.uint32)
+        for bit_slice in self.slices:
+            field = bit_slice.field
+            value = values[field.name]
+            if field.components > 1:
+                value = value[..., bit_slice.component]
+            stored = (value.astype(np.int64) + field.zero_offset).astype(np.uint64)
+            part = (stored >> np.uint64(bit_slice.source_offset)) & np.uint64((1 << bit_slice.bits) - 1)
+            texels[..., bit_slice.word] |= (part << np.uint64(bit_slice.offset)).astype(np.uint32)
+        return texels
+
+    # Декодирует массив слов (..., channels), например результат чтения текстуры, в структурированный массив
+    def decode(self, texels: npt.NDArray[np.uint32]) -> npt.NDArray:
+        texels = np.asarray(texels, dtype = np.uint32)
+        values = np.zeros(texels.shape[:-1], dtype = self.dtype)
+        for field in self.fields:
+            for component in range(field.components):
+                stored = np.zeros(texels.shape[:-1], dtype = np.int64)
+                for bit_slice in self.slices:
+                    if bit_slice.field is field and bit_slice.component == component:
+                        part = (texels[..., bit_slice.word] >> np.uint32(bit_slice.offset)) & np.uint32(
+                            (1 << bit_slice.bits) - 1
+                        )
+                        stored |= part.astype(np.int64) << bit_slice.source_offset
+                value = stored - field.zero_offset
+                if field.components > 1:
+                    values[field.name][..., component] = value
+                else:
+                    values[field.name] = value
+        return values
+
+    def random_values(self, count: int, generator: np.random.Generator) -> npt.NDArray:
+        values = np.zeros(count, dtype = self.dtype)
+        for field in self.fields:
+            shape = (count, field.components) if field.components > 1 else count
+            values[field.name] = generator.integers(field.minimum, field.maximum, shape, endpoint = True)
+        return values
+
+    # Проверка, что кодирование и декодирование обратны друг другу и значения не пересекаются в словах
+    def self_test(self, count: int = 10000, seed: int = 0) -> None:
+        used = np.zeros(self.words, dtype = np.uint64)
+        for bit_slice in self.slices:
+            mask = ((1 << bit_slice.bits) - 1) << bit_slice.offset
+            if int(used[bit_slice.word]) & mask:
+                raise BitfieldError(f"{self.name}: slices overlap in word {bit_slice.word}")
+            used[bit_slice.word] |= np.uint64(mask)
+
+        values = self.random_values(count, np.random.default_rng(seed))
+        decoded = self.decode(self.encode(values))
+        for field in self.fields:
+            if not np.array_equal(values[field.name], decoded[field.name]):
+                raise BitfieldError(f"{self.name}.{field.name} does not survive an encode/decode round trip")
+
+    def describe(self) -> str:
+        return (
+            f"{self.name}: {self.bit_count} bits in {self.words} words"
+            f" ({self.channels} channel texel, {self.channels * 4} bytes)"
+        )
+
+
+UNIT_LAYOUT = BitfieldLayout(
+    "Unit",
+    [
+        BitField("substance_id", 14),
+        BitField("quantity", 10),
+        BitField("momentum", 16, True, 3, "Импульс всего юнита")
+    ]
+)
+PLAN_LAYOUT = BitfieldLayout(
+    "Plan",
+    [
+        BitField("presence", 32, False, 2, "Наличие планов в юнитах ([0; 31], [32; 63])"),
+        BitField("direction", 32, False, 2, "Направление планов, 1 - в сторону увеличения координаты")
+    ],
+    "Ось соседа == world_age % 3"
+)
+CELL_LAYOUT = BitfieldLayout(
+    "Cell",
+    [
+        BitField("filled_units", 6),
+        BitField(
+            "backward_plans",
+            6,
+            comment = "Количество заявок в соседей по оси world.age % 3:"
+                      " в сторону уменьшения и увеличения координаты.\n// Сами заявки перечислены битами Plan в порядке юнитов"
+        ),
+        BitField("forward_plans", 6),
+        BitField(
+            "total_quantity",
+            16,
+            comment = "Сумма количеств вещества юнитов ячейки - плотность для давления и поля тяготения"
+        )
+    ]
+)
+
+# Имена полей по номерам, которые шейдеры передают в отчетах о переполнении
+OVERFLOW_FIELDS = tuple(name for layout in BitfieldLayout.layouts for name in layout.overflow_names())
+
+
+# для проверки схем
+if __name__ == "__main__":
+    for test_layout in BitfieldLayout.layouts:
+        test_layout.self_test()
+        print(f"{test_layout.describe()} - round trip ok")
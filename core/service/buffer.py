@@ -0,0 +1,78 @@
+import ctypes
+
+import numpy as np
+import numpy.typing as npt
+from pyglet import gl
+
+from core.service.object import ProjectMixin
+
+
+class StorageBufferError(Exception):
+    pass
+
+
+# Изменяемый буфер OpenGL, привязанный к точке binding.
+# В отличие от буферов, созданных через glNamedBufferStorage(..., 0), позволяет дозаписывать данные частями
+# и увеличивать размер без пересоздания всех зависящих от него объектов
+class StorageBuffer(ProjectMixin):
+    def __init__(
+            self,
+            binding: int,
+            size: int,
+            data: npt.NDArray | None = None,
+            target: int = gl.GL_SHADER_STORAGE_BUFFER,
+            flags: int = gl.GL_DYNAMIC_STORAGE_BIT
+    ) -> None:
+        if size <= 0:
+            raise StorageBufferError(f"Buffer size ({size}) must be greater than 0")
+
+        self.binding = binding
+        self.target = target
+        self.flags = flags
+        self.size = size
+        self.gl_id = gl.GLuint()
+
+        self.create(data)
+        self.bind()
+
+    def create(self, data: npt.NDArray | None = None) -> None:
+        gl.glCreateBuffers(1, self.gl_id)
+        gl.glNamedBufferStorage(self.gl_id, self.size, None, self.flags)
+        self.clear()
+        if data is not None:
+            self.write(0, data)
+
+    def bind(self) -> None:
+        gl.glBindBufferBase(self.target, self.binding, self.gl_id)
+
+    def clear(self) -> None:
+        gl.glClearNamedBufferData(self.gl_id, gl.GL_R32UI, gl.GL_RED_INTEGER, gl.GL_UNSIGNED_INT, None)
+
+    def write(self, offset: int, data: npt.NDArray) -> None:
+        data = np.ascontiguousarray(data)
+        if offset < 0 or offset + data.nbytes > self.size:
+            raise StorageBufferError(
+                f"Write of {data.nbytes} bytes at offset {offset} is out of the buffer bounds ({self.size} bytes)"
+            )
+        if data.nbytes > 0:
+            gl.glNamedBufferSubData(self.gl_id, offset, data.nbytes, data.ctypes.data)
+
+    def write_structure(self, offset: int, structure: ctypes.Structure) -> None:
+        gl.glNamedBufferSubData(self.gl_id, offset, ctypes.sizeof(structure), ctypes.byref(structure))
+
+    # Увеличивает буфер, сохраняя уже записанные данные
+    def resize(self, size: int) -> None:
+        if size <= self.size:
+            return
+
+        old_id = self.gl_id
+        old_size = self.size
+        self.gl_id = gl.GLuint()
+        self.size = size
+        self.create()
+        gl.glCopyNamedBufferSubData(old_id, self.gl_id, 0, 0, old_size)
+        gl.glDeleteBuffers(1, old_id)
+        self.bind()
+
+    def delete(self) -> None:
+        gl.glDeleteBuffers(1, self.gl_id)
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+import numpy.typing as npt
 from arcade.types import Point
 
 from core.service.functions import float_range
@@ -22,9 +24,14 @@ class Figure:
         self.center_y = center_y
         self.resolution = resolution
 
+    # Параметры, однозначно задающие фигуру, для ключей кэшей
+    def get_key(self) -> tuple:
+        parameters = sorted((name, value) for name, value in vars(self).items() if isinstance(value, int | float))
+        return type(self).__name__, *parameters
+
     def calculate(self) -> None:
         self.points = {}
-        for x in float_range(self.x_bounds[0], self.x_bounds[1], self.resolution):
+        for x in np.arange(self.x_bounds[0], self.x_bounds[1], self.resolution).tolist():
             self.points[x] = self.count_y(x)
 
     def get_walk_around_points(self, points_amount: int) -> list[tuple[float, float]]:
@@ -38,13 +45,35 @@ class ClosedFigure(Figure):
     border_points: dict[float, list[float]] = None
     name_rus = "Замкнутая фигура"
 
+    # То же, что belongs_value, но сразу для массивов координат одной формы
+    def belongs_values(self, x: npt.NDArray, y: npt.NDArray) -> npt.NDArray:
+        raise NotImplementedError()
+
     def belongs_value(self, x: float, y: float) -> float:
         # считается, что если value == 1, точка находится на границе, value < 1 - внутри, value > 1 - снаружи
-        raise NotImplementedError()
+        return float(self.belongs_values(np.asarray(x, dtype = float), np.asarray(y, dtype = float)))
 
     def belongs(self, x: float, y: float) -> bool:
         return self.belongs_value(x, y) <= 1
 
+    # Доля пикселя, покрытая фигурой, для каждого пикселя изображения size (width, height), массив (height, width).
+    # Пиксель проверяется в samples * samples точках вокруг (x, y), samples == 1 - только в самой точке (x, y),
+    # то есть без сглаживания
+    def coverage(self, size: tuple[int, int], samples: int = 1) -> npt.NDArray[np.float32]:
+        x, y = np.meshgrid(
+            np.arange(size[0], dtype = np.float32),
+            np.arange(size[1], dtype = np.float32),
+            sparse = True
+        )
+        result = np.zeros((size[1], size[0]), dtype = np.float32)
+        offsets = (np.arange(samples, dtype = np.float32) + 0.5) / samples - 0.5
+        for offset_y in offsets:
+            for offset_x in offsets:
+                x_values, y_values = np.broadcast_arrays(x + offset_x, y + offset_y)
+                result += self.belongs_values(x_values, y_values) <= 1
+        result /= samples * samples
+        return result
+
     def point_belongs(self, point: Point) -> bool:
         return self.belongs(point[0], point[1])
 
@@ -71,11 +100,11 @@ class Ellipse(ClosedFigure):
         value = self.semi_minor_axis * (1 - (x - self.center_x)**2 / self.semi_major_axis**2)**(1 / 2)
         return [value + self.center_y, -value + self.center_y]
 
-    def belongs_value(self, x: float, y: float) -> float:
+    def belongs_values(self, x: npt.NDArray, y: npt.NDArray) -> npt.NDArray:
         if self.semi_major_axis > 0 and self.semi_minor_axis > 0:
             value = (x - self.center_x)**2 / self.semi_major_axis**2 + (y - self.center_y)**2 / self.semi_minor_axis**2
         else:
-            value = 2
+            value = np.full_like(x, 2)
         return value
 
     def get_walk_around_points(self, points_amount: int) -> list[Point]:
@@ -130,16 +159,10 @@ class Rectangle(ClosedFigure):
             values = [self.bottom, self.top]
         return values
 
-    def belongs_value(self, x: float, y: float) -> float:
-        value = self.left <= x <= self.right and self.bottom <= y <= self.top
-        if value:
-            if x == self.left or x == self.right or y == self.bottom or y == self.top:
-                value = 1
-            else:
-                value = 0
-        else:
-            value = 2
-        return value
+    def belongs_values(self, x: npt.NDArray, y: npt.NDArray) -> npt.NDArray:
+        inside = (self.left <= x) & (x <= self.right) & (self.bottom <= y) & (y <= self.top)
+        border = (x == self.left) | (x == self.right) | (y == self.bottom) | (y == self.top)
+        return np.where(inside, np.where(border, 1.0, 0.0), 2.0)
 
 
 # https://math.stackexchange.com/a/1649808
@@ -176,22 +199,22 @@ class RoundedRectangle(Rectangle):
     def count_y(self, x: float) -> list[float]:
         raise NotImplementedError()
 
-    def belongs_value(self, x: float, y: float) -> float:
-        value = super().belongs_value(x, y)
-        if value <= 1:
-
-            left = self.left <= x <= self.inner_left
-            right = self.inner_right <= x <= self.right
-            bottom = self.bottom <= y <= self.inner_bottom
-            top = self.inner_top <= y <= self.top
+    def belongs_values(self, x: npt.NDArray, y: npt.NDArray) -> npt.NDArray:
+        value = super().belongs_values(x, y)
 
-            corner = (left + right) * (bottom + top)
-            if corner:
-                key = (left, bottom)
-                circle = self.corner_circles[key]
-                value = circle.belongs_value(x, y)
+        left = (self.left <= x) & (x <= self.inner_left)
+        right = (self.inner_right <= x) & (x <= self.right)
+        bottom = (self.bottom <= y) & (y <= self.inner_bottom)
+        top = (self.inner_top <= y) & (y <= self.top)
 
-        return value
+        corner = (value <= 1) & (left | right) & (bottom | top)
+        circles = self.corner_circles
+        circle_value = np.where(
+            left,
+            np.where(bottom, circles[(1, 1)].belongs_values(x, y), circles[(1, 0)].belongs_values(x, y)),
+            np.where(bottom, circles[(0, 1)].belongs_values(x, y), circles[(0, 0)].belongs_values(x, y))
+        )
+        return np.where(corner, circle_value, value)
 
 
 class Hexagon(ClosedFigure):
@@ -210,20 +233,14 @@ class Hexagon(ClosedFigure):
         super().__init__(center_x, center_y, resolution)
 
     # https://www.desmos.com/calculator/9884ugkt7g?lang=ru
-    def belongs_value(self, x: float, y: float) -> float:
+    def belongs_values(self, x: npt.NDArray, y: npt.NDArray) -> npt.NDArray:
         sqrt = math.sqrt(3)
 
-        if -self.radius / 2 + self.center_y <= y <= self.radius / 2 + self.center_y:
-            result = abs(x - self.center_x) * 2 / sqrt
-        else:
-            result = abs(y - self.center_y) + abs(x - self.center_x) / sqrt
+        result = np.where(
+            (-self.radius / 2 + self.center_y <= y) & (y <= self.radius / 2 + self.center_y),
+            np.abs(x - self.center_x) * 2 / sqrt,
+            np.abs(y - self.center_y) + np.abs(x - self.center_x) / sqrt
+        )
 
         tolerance = self.radius * 0.01
-        if abs(self.radius - result) < tolerance:
-            value = 1
-        elif result < self.radius:
-            value = 0
-        else:
-            value = 2
-
-        return value
+        return np.where(np.abs(self.radius - result) < tolerance, 1.0, np.where(result < self.radius, 0.0, 2.0))
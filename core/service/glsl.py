@@ -3,6 +3,7 @@ from typing import Any, Iterable
 from pyglet.graphics.shader import ComputeShaderProgram, ShaderException, ShaderProgram
 from pyglet.math import Vec3
 
+from core.service.bitfield import CELL_LAYOUT, PLAN_LAYOUT, UNIT_LAYOUT, BitfieldLayout
 from core.service.logger import Logger
 from core.service.object import ProjectMixin
 from core.service.settings import Settings
@@ -28,10 +29,28 @@ class Replacements(Singleton, ProjectMixin):
         self.WORLD_SHAPE = self.to_ivec3(self.settings.WORLD_SHAPE)
         self.CELL_SHAPE = self.to_ivec3(self.settings.CELL_SHAPE)
         self.CELL_SIZE = self.to_int(self.settings.CELL_SIZE)
+        self.UNIT_CHANNELS = self.to_int(UNIT_LAYOUT.channels)
+        self.PLAN_CHANNELS = self.to_int(PLAN_LAYOUT.channels)
+        self.CELL_CHANNELS = self.to_int(CELL_LAYOUT.channels)
+        self.WORLD_BATCH_SIZE = self.to_int(self.settings.WORLD_BATCH_SIZE)
+        self.OPTICS_LEVEL_COUNT = self.to_int(self.settings.OPTICS_LEVEL_COUNT)
+        self.GRAVITY_FIELD = self.to_int(int(self.settings.GRAVITY_FIELD))
+        self.GRAVITY_LEVEL_COUNT = self.to_int(self.settings.GRAVITY_LEVEL_COUNT)
 
         self.WORLD_GROUP_SHAPE = self.to_ivec3(self.settings.WORLD_GROUP_SHAPE)
         self.CELL_GROUP_SHAPE = self.to_ivec3(self.settings.CELL_GROUP_SHAPE)
 
+        self.CREATURE_CAPACITY = self.to_int(self.settings.CREATURE_CAPACITY)
+        self.CREATURE_GROUP_SIZE = self.to_int(self.settings.CREATURE_GROUP_SIZE)
+        self.CREATURE_SENSOR_COUNT = self.to_int(self.settings.CREATURE_SENSOR_COUNT)
+
+        self.NEURAL_NEURON_COUNT = self.to_int(self.settings.NEURAL_NEURON_COUNT)
+        self.NEURAL_EDGE_CAPACITY = self.to_int(self.settings.NEURAL_EDGE_CAPACITY)
+        self.NEURAL_APPEND_CAPACITY = self.to_int(self.settings.NEURAL_APPEND_CAPACITY)
+
+        self.OVERFLOW_CHECKS = self.to_int(int(self.settings.SHADER_OVERFLOW_CHECKS))
+        self.OVERFLOW_REPORT_CAPACITY = self.to_int(self.settings.OVERFLOW_REPORT_CAPACITY)
+
         self.all = {f"{key.lower()}_placeholder": value for key, value in self.__dict__.items()}
 
     def generate_lut(self, shape: Iterable[int], vector_type: str) -> str:
@@ -76,22 +95,37 @@ class Includes(Singleton, ProjectMixin):
     def __init__(self) -> None:
         super().__init__()
 
-        self.COLOR_FUNCTION = f"{self.settings.PROJECTIONAL_SHADERS}/functions/get_cell_color/{"default" if not self.settings.TEST_COLOR_CUBE else "test_color_cube"}.glsl"
+        self.OPTICS_FUNCTION = f"{self.settings.PROJECTIONAL_SHADERS}/functions/get_cell_optics/{"default" if not self.settings.TEST_COLOR_CUBE else "test_color_cube"}.glsl"
 
         self.PHYSICAL_CONSTANTS = f"{self.settings.SHADERS}/constants/physical.glsl"
         self.PACKING_CONSTANTS = f"{self.settings.SHADERS}/constants/packing.glsl"
         self.COMMON_CONSTANTS = f"{self.settings.SHADERS}/constants/common.glsl"
 
+        self.RANDOM_FUNCTIONS = f"{self.settings.SHADERS}/functions/random.glsl"
+        self.RAY_FUNCTIONS = f"{self.settings.PROJECTIONAL_SHADERS}/functions/ray.glsl"
+        self.WAVEFRONT_FUNCTIONS = f"{self.settings.PROJECTIONAL_SHADERS}/functions/wavefront.glsl"
+
         self.UNIT_COMPONENT = f"{self.settings.SHADERS}/components/unit.glsl"
         self.PLAN_COMPONENT = f"{self.settings.SHADERS}/components/plan.glsl"
         self.CELL_COMPONENT = f"{self.settings.SHADERS}/components/cell.glsl"
         self.SUBSTANCE_COMPONENT = f"{self.settings.SHADERS}/components/substance.glsl"
         self.SUBSTANCE_OPTICS_COMPONENT = f"{self.settings.SHADERS}/components/substance_optics.glsl"
+        self.OPTICS_VOLUME_COMPONENT = f"{self.settings.SHADERS}/components/optics_volume.glsl"
+        self.REACTION_COMPONENT = f"{self.settings.SHADERS}/components/reaction.glsl"
+        self.CREATURE_COMPONENT = f"{self.settings.SHADERS}/components/creature.glsl"
+        self.NEURAL_COMPONENT = f"{self.settings.SHADERS}/components/neural.glsl"
+        self.WORLD_COMPONENT = f"{self.settings.SHADERS}/components/world.glsl"
+        self.GRAVITY_FIELD_COMPONENT = f"{self.settings.SHADERS}/components/gravity_field.glsl"
 
         for key, path in self.__dict__.items():
             with open(path, "r", encoding = settings.SHADER_ENCODING) as include_file:
                 setattr(self, key, include_file.read())
 
+        # Структуры и функции упаковки генерируются по схемам, подключаются из компонентов,
+        # поэтому должны идти после них
+        for layout in BitfieldLayout.layouts:
+            setattr(self, f"{layout.name.upper()}_LAYOUT", layout.glsl())
+
         self.all = {f"#include {key.lower()}": value for key, value in self.__dict__.items()}
 
 
@@ -0,0 +1,28 @@
+from pyglet import gl
+
+
+# Дескрипторы bindless-текстур и изображений, сделанные резидентными в текущем контексте.
+# Резидентность - свойство контекста, а не дескриптора: разделяемый контекст (поток симуляции) видит те же
+# дескрипторы, но должен сделать их резидентными у себя сам (make_resident), иначе обращение к ним не определено
+class ResidentHandles:
+    def __init__(self) -> None:
+        self.texture_handles: list[int] = []
+        # Дескриптор и доступ (GL_READ_ONLY, GL_WRITE_ONLY, GL_READ_WRITE)
+        self.image_handles: list[tuple[int, int]] = []
+
+    def add_texture(self, handle: int) -> int:
+        gl.glMakeTextureHandleResidentARB(handle)
+        self.texture_handles.append(handle)
+        return handle
+
+    def add_image(self, handle: int, access: int) -> int:
+        gl.glMakeImageHandleResidentARB(handle, access)
+        self.image_handles.append((handle, access))
+        return handle
+
+    # Делает все дескрипторы резидентными в текущем контексте
+    def make_resident(self) -> None:
+        for handle in self.texture_handles:
+            gl.glMakeTextureHandleResidentARB(handle)
+        for handle, access in self.image_handles:
+            gl.glMakeImageHandleResidentARB(handle, access)
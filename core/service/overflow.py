@@ -0,0 +1,64 @@
+import numpy as np
+
+from core.service.bitfield import OVERFLOW_FIELDS
+from core.service.buffer import StorageBuffer
+from core.service.object import ProjectMixin
+from core.service.readback import Readback, ReadbackService
+
+
+# OverflowReport из packing.glsl (std430)
+OVERFLOW_REPORT_DTYPE = np.dtype(
+    [
+        ("position", np.int32, 3),
+        ("field", np.uint32),
+        ("value", np.int32),
+        ("padding", np.int32, 3)
+    ]
+)
+
+
+# Собирает нарушения диапазонов упаковываемых величин, найденные шейдерами отладочной сборки (SHADER_OVERFLOW_CHECKS).
+# Буфер нарушений читается асинхронно и обнуляется после каждого копирования,
+# поэтому каждое чтение содержит нарушения, накопленные с прошлого чтения.
+# Копирование и обнуление идут после барьера обновления буферов (ReadbackService.request), поэтому
+# видят все нарушения, записанные атомарными операциями стадий тика, и не гоняются с ними
+class OverflowMonitor(ProjectMixin):
+    REPORT_BINDING = 13
+    HEADER_SIZE = 16
+
+    def __init__(self, readback: ReadbackService) -> None:
+        self.capacity = self.settings.OVERFLOW_REPORT_CAPACITY
+        size = self.HEADER_SIZE + self.capacity * OVERFLOW_REPORT_DTYPE.itemsize
+        self.buffer = StorageBuffer(self.REPORT_BINDING, size)
+
+        self.total_count = 0
+        # Количество нарушений по полям за все время
+        self.field_counts = np.zeros(len(OVERFLOW_FIELDS), dtype = np.int64)
+
+        readback.add_buffer(
+            "overflow_reports",
+            self.buffer.gl_id.value,
+            size,
+            dtype = np.uint8,
+            period = self.settings.OVERFLOW_READBACK_PERIOD,
+            reset = True
+        )
+        readback.subscribe("overflow_reports", self.on_readback)
+
+    def on_readback(self, readback: Readback) -> None:
+        count = int(readback.view[:4].view(np.uint32)[0])
+        if count == 0:
+            return
+
+        reports = readback.view[self.HEADER_SIZE:].view(OVERFLOW_REPORT_DTYPE)[:min(count, self.capacity)]
+        fields = np.minimum(reports["field"], len(OVERFLOW_FIELDS) - 1)
+        self.field_counts += np.bincount(fields, minlength = len(OVERFLOW_FIELDS))
+        self.total_count += count
+
+        for report in reports[:self.settings.OVERFLOW_LOGGED_REPORTS]:
+            self.logger.warning(
+                f"Overflow of {OVERFLOW_FIELDS[min(report["field"], len(OVERFLOW_FIELDS) - 1)]}"
+                f" = {report["value"]} at {tuple(report["position"])}, world age <= {readback.age}"
+            )
+        if count > self.capacity:
+            self.logger.warning(f"{count - self.capacity} more overflows were counted but not stored")
@@ -0,0 +1,260 @@
+import ctypes
+from typing import Callable
+
+import numpy as np
+import numpy.typing as npt
+from pyglet import gl
+
+from core.service.object import ProjectMixin
+
+
+class ReadbackError(Exception):
+    pass
+
+
+# Источник - идентификатор объекта OpenGL или функция, возвращающая его (например, для текстур, которые меняются местами)
+Source = int | Callable[[], int]
+Subscriber = Callable[["Readback"], None]
+
+
+# Готовые данные одного запроса чтения.
+# view - представление NumPy прямо над отображенной памятью буфера, без копирования.
+# Данные действительны, пока слот не освобожден: после вызова всех подписчиков слот освобождается автоматически,
+# если ни один из них не вызвал retain(). Удержанный слот нужно вернуть через release()
+class Readback:
+    def __init__(self, stream: "ReadbackStream", slot: "ReadbackSlot") -> None:
+        self.stream = stream
+        self.slot = slot
+        self.name = stream.name
+        self.age = slot.age
+        self.view = slot.view
+        self.retain_count = 0
+
+    def retain(self) -> None:
+        self.retain_count += 1
+
+    def release(self) -> None:
+        if self.retain_count <= 0:
+            raise ReadbackError(f"Readback {self.name} (age {self.age}) is not retained")
+        self.retain_count -= 1
+        if self.retain_count == 0:
+            self.slot.busy = False
+
+
+# Буфер упаковки пикселей, постоянно отображенный в память процесса
+class ReadbackSlot:
+    def __init__(self, size: int, dtype: np.dtype, shape: tuple[int, ...]) -> None:
+        self.size = size
+        self.gl_id = gl.GLuint()
+        gl.glCreateBuffers(1, self.gl_id)
+        flags = gl.GL_MAP_READ_BIT | gl.GL_MAP_PERSISTENT_BIT | gl.GL_MAP_COHERENT_BIT
+        gl.glNamedBufferStorage(self.gl_id, size, None, flags)
+        address = gl.glMapNamedBufferRange(self.gl_id, 0, size, flags)
+        memory = (ctypes.c_ubyte * size).from_address(ctypes.cast(address, ctypes.c_void_p).value)
+        self.view: npt.NDArray = np.frombuffer(memory, dtype = dtype).reshape(shape)
+        self.view.flags.writeable = False
+
+        self.fence: gl.GLsync | None = None
+        self.age = 0
+        # Занят копированием на видеокарте или данными, которые еще использует подписчик
+        self.busy = False
+
+    def delete(self) -> None:
+        if self.fence is not None:
+            gl.glDeleteSync(self.fence)
+        gl.glUnmapNamedBuffer(self.gl_id)
+        gl.glDeleteBuffers(1, self.gl_id)
+
+
+class ReadbackStream:
+    def __init__(
+            self,
+            name: str,
+            source: Source,
+            size: int,
+            dtype: np.dtype,
+            shape: tuple[int, ...],
+            depth: int,
+            period: int,
+            copy: Callable[[int, int], None]
+    ) -> None:
+        self.name = name
+        self.source = source
+        self.size = size
+        self.period = period
+        self.copy = copy
+        self.slots = [ReadbackSlot(size, dtype, shape) for _ in range(depth)]
+        # Слоты с отправленным копированием в порядке отправки
+        self.in_flight: list[ReadbackSlot] = []
+        self.subscribers: list[Subscriber] = []
+
+        self.requested = 0
+        self.delivered = 0
+        # Запросы, пропущенные из-за того, что все слоты заняты
+        self.dropped = 0
+
+    def source_id(self) -> int:
+        return self.source() if callable(self.source) else self.source
+
+
+# Асинхронное чтение текстур и буферов с видеокарты.
+# Каждый поток чтения имеет кольцо буферов упаковки пикселей: копирование отправляется командой OpenGL
+# и ограждается fence, а poll() без блокировки отдает подписчикам уже завершенные копии.
+# Если подписчики не успевают освобождать слоты, новые запросы пропускаются (dropped), а не останавливают видеокарту
+class ReadbackService(ProjectMixin):
+    def __init__(self) -> None:
+        self.streams: dict[str, ReadbackStream] = {}
+
+    def add_stream(self, stream: ReadbackStream) -> ReadbackStream:
+        if stream.name in self.streams:
+            raise ReadbackError(f"Readback stream {stream.name} already exists")
+        self.streams[stream.name] = stream
+        return stream
+
+    # Чтение области текстуры. offset и shape - в текселях (x, y, z), без них читается весь уровень
+    def add_texture(
+            self,
+            name: str,
+            source: Source,
+            texture_shape: tuple[int, int, int],
+            offset: tuple[int, int, int] = (0, 0, 0),
+            shape: tuple[int, int, int] | None = None,
+            level: int = 0,
+            pixel_format: int = gl.GL_RGBA_INTEGER,
+            pixel_type: int = gl.GL_UNSIGNED_INT,
+            dtype: npt.DTypeLike = np.uint32,
+            channels: int = 4,
+            depth: int | None = None,
+            period: int = 1
+    ) -> ReadbackStream:
+        shape = tuple(texture_shape) if shape is None else tuple(shape)
+        offset = tuple(offset)
+        if any(start < 0 or start + length > limit for start, length, limit in zip(offset, shape, texture_shape)):
+            raise ReadbackError(f"Readback region {offset} + {shape} is out of texture bounds {tuple(texture_shape)}")
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * channels * dtype.itemsize
+
+        def copy(source_id: int, buffer_id: int) -> None:
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buffer_id)
+            gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+            # При привязанном буфере упаковки указатель - смещение в нем
+            gl.glGetTextureSubImage(source_id, level, *offset, *shape, pixel_format, pixel_type, size, None)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+        # Порядок осей NumPy - (z, y, x, канал)
+        view_shape = (shape[2], shape[1], shape[0], channels)
+        return self.add_stream(
+            ReadbackStream(name, source, size, dtype, view_shape, self.get_depth(depth), period, copy)
+        )
+
+    # Чтение части буфера. offset и size - в байтах.
+    # reset - обнулять прочитанную часть после копирования (для счетчиков, накапливаемых между чтениями)
+    def add_buffer(
+            self,
+            name: str,
+            source: Source,
+            size: int,
+            offset: int = 0,
+            dtype: npt.DTypeLike = np.uint32,
+            depth: int | None = None,
+            period: int = 1,
+            reset: bool = False
+    ) -> ReadbackStream:
+        dtype = np.dtype(dtype)
+        if size <= 0 or size % dtype.itemsize != 0:
+            raise ReadbackError(f"Readback size ({size}) must be a positive multiple of {dtype} size")
+        if reset and (offset % 4 != 0 or size % 4 != 0):
+            raise ReadbackError(f"Reset readback range ({offset}, {size}) must be aligned to 4 bytes")
+
+        def copy(source_id: int, buffer_id: int) -> None:
+            gl.glCopyNamedBufferSubData(source_id, buffer_id, offset, 0, size)
+            if reset:
+                gl.glClearNamedBufferSubData(
+                    source_id,
+                    gl.GL_R32UI,
+                    offset,
+                    size,
+                    gl.GL_RED_INTEGER,
+                    gl.GL_UNSIGNED_INT,
+                    None
+                )
+
+        return self.add_stream(
+            ReadbackStream(name, source, size, dtype, (size // dtype.itemsize,), self.get_depth(depth), period, copy)
+        )
+
+    def get_depth(self, depth: int | None) -> int:
+        depth = self.settings.READBACK_RING_DEPTH if depth is None else depth
+        if depth <= 0:
+            raise ReadbackError(f"Readback ring depth ({depth}) must be greater than 0")
+        return depth
+
+    def subscribe(self, name: str, subscriber: Subscriber) -> None:
+        self.streams[name].subscribers.append(subscriber)
+
+    def remove_stream(self, name: str) -> None:
+        stream = self.streams.pop(name)
+        for slot in stream.slots:
+            slot.delete()
+
+    # Отправляет копирование для потоков, у которых наступил период. Вызывается после записи данных на видеокарте
+    def request(self, age: int, names: list[str] | None = None) -> None:
+        streams = self.streams.values() if names is None else (self.streams[name] for name in names)
+        # Запись шейдеров (imageStore, буферы хранения, атомарные операции) видна копированию и обнулению
+        # только после барьера
+        gl.glMemoryBarrier(gl.GL_TEXTURE_UPDATE_BARRIER_BIT | gl.GL_BUFFER_UPDATE_BARRIER_BIT)
+        for stream in streams:
+            if age % stream.period != 0:
+                continue
+            stream.requested += 1
+
+            slot = next((slot for slot in stream.slots if not slot.busy), None)
+            if slot is None:
+                stream.dropped += 1
+                continue
+
+            stream.copy(stream.source_id(), slot.gl_id.value)
+            slot.fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+            slot.age = age
+            slot.busy = True
+            stream.in_flight.append(slot)
+        # Без этого fence может не дойти до видеокарты и никогда не сработать
+        gl.glFlush()
+
+    # Отдает подписчикам завершенные копии, не блокируясь. Возвращает количество отданных копий
+    def poll(self) -> int:
+        delivered = 0
+        for stream in self.streams.values():
+            while stream.in_flight:
+                slot = stream.in_flight[0]
+                status = gl.glClientWaitSync(slot.fence, 0, 0)
+                if status == gl.GL_WAIT_FAILED:
+                    raise ReadbackError(f"Waiting for readback {stream.name} failed")
+                if status == gl.GL_TIMEOUT_EXPIRED:
+                    break
+
+                stream.in_flight.pop(0)
+                gl.glDeleteSync(slot.fence)
+                slot.fence = None
+                self.deliver(stream, slot)
+                delivered += 1
+        return delivered
+
+    @staticmethod
+    def deliver(stream: ReadbackStream, slot: ReadbackSlot) -> None:
+        readback = Readback(stream, slot)
+        stream.delivered += 1
+        # На время вызова подписчиков слот удерживается самим сервисом
+        readback.retain()
+        try:
+            for subscriber in stream.subscribers:
+                subscriber(readback)
+        finally:
+            readback.release()
+
+    def statistics(self) -> dict[str, tuple[int, int, int]]:
+        return {name: (stream.requested, stream.delivered, stream.dropped) for name, stream in self.streams.items()}
+
+    def delete(self) -> None:
+        for name in list(self.streams):
+            self.remove_stream(name)
@@ -0,0 +1,69 @@
+import math
+
+from pyglet import gl
+from pyglet.graphics.shader import ComputeShaderProgram
+
+from core.service.buffer import StorageBuffer
+from core.service.glsl import load_shader, write_uniforms
+from core.service.object import ProjectMixin
+
+
+# Исключающая префиксная сумма массива uint32 на видеокарте, выполняется на месте.
+# Массив лежит в начале собственного буфера, за ним - уровни сумм блоков
+class PrefixSum(ProjectMixin):
+    # Должны совпадать с scan.glsl и scan_add.glsl
+    SCAN_BINDING = 60
+    BLOCK_SIZE = 1024
+
+    programs: tuple[ComputeShaderProgram, ComputeShaderProgram] | None = None
+
+    def __init__(self, count: int, binding: int) -> None:
+        self.count = count
+        # (смещение уровня, длина уровня, количество блоков)
+        self.levels, size = self.get_levels(count)
+
+        self.buffer = StorageBuffer(binding, size * 4)
+
+        if PrefixSum.programs is None:
+            PrefixSum.programs = (
+                ComputeShaderProgram(load_shader(f"{self.settings.SERVICE_SHADERS}/scan.glsl")),
+                ComputeShaderProgram(load_shader(f"{self.settings.SERVICE_SHADERS}/scan_add.glsl"))
+            )
+
+    # Уровни сумм блоков и общее количество элементов буфера
+    @classmethod
+    def get_levels(cls, count: int) -> tuple[list[tuple[int, int, int]], int]:
+        levels = []
+        offset = 0
+        level_count = count
+        while True:
+            block_count = math.ceil(level_count / cls.BLOCK_SIZE)
+            levels.append((offset, level_count, block_count))
+            offset += level_count
+            if block_count == 1:
+                break
+            level_count = block_count
+        # Место под сумму последнего уровня
+        return levels, offset + 1
+
+    def dispatch(self, program: ComputeShaderProgram, level: int) -> None:
+        offset, count, block_count = self.levels[level]
+        sums_offset = offset + count
+        uniforms = {
+            "u_scan_offset": (offset, True, True),
+            "u_scan_count": (count, True, True),
+            "u_sums_offset": (sums_offset, True, True)
+        }
+        write_uniforms(program, uniforms)
+        program.use()
+        gl.glDispatchCompute(block_count, 1, 1)
+        gl.glMemoryBarrier(gl.GL_SHADER_STORAGE_BARRIER_BIT)
+
+    def run(self) -> None:
+        scan_program, add_program = self.programs
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.SCAN_BINDING, self.buffer.gl_id)
+
+        for level in range(len(self.levels)):
+            self.dispatch(scan_program, level)
+        for level in range(len(self.levels) - 2, -1, -1):
+            self.dispatch(add_program, level)
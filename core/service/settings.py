@@ -30,8 +30,51 @@ class Settings(Singleton):
             self.SHADERS = f"shaders"
             self.PHYSICAL_SHADERS = f"{self.SHADERS}/physical"
             self.PROJECTIONAL_SHADERS = f"{self.SHADERS}/projectional"
+            self.CREATURE_SHADERS = f"{self.SHADERS}/creatures"
+            self.NEURAL_SHADERS = f"{self.SHADERS}/neural"
+            self.SERVICE_SHADERS = f"{self.SHADERS}/service"
+            # Сгенерированные текстуры сохраняются на диск, чтобы не генерировать их при следующих запусках
+            self.TEXTURE_CACHE = "cache/textures"
+            # Объем сгенерированных текстур в байтах, хранимых в памяти, самые давно использованные вытесняются
+            self.TEXTURE_CACHE_SIZE = 64 * 1024 * 1024
+            # Начальный размер атласа сгенерированных текстур в пикселях
+            self.TEXTURE_ATLAS_SIZE = 1024
             self.CPU_COUNT = os.cpu_count()
+            # Длина части массива в задачах над массивами
+            self.JOB_CHUNK_SIZE = 1 << 16
+            # При включенном GIL выполнять задачи над массивами в пуле процессов
+            self.JOB_PROCESS_FALLBACK = True
+            # Период вывода времени выполнения задач в тиках, 0 - не выводить
+            self.JOB_TIMING_LOG_PERIOD = 1000
+            # Процессы физики мира на процессоре (simulator/cpu_physics.py), каждый считает свой слой мира по оси x
+            self.CPU_PHYSICS_WORKER_COUNT = self.CPU_COUNT
+            # Реализация стадий физики на процессоре: "numpy" или "numba" (без установленной numba - "numpy").
+            # Numba - необязательная зависимость и не входит в requirements.txt
+            self.CPU_PHYSICS_BACKEND = "numpy"
+            # Время ожидания работников физики на процессоре в секундах на тик команды,
+            # после него зависший работник считается сбоем, а не ожидается вечно
+            self.CPU_PHYSICS_TIMEOUT = 60.0
+            # Количество буферов в кольце каждого потока чтения с видеокарты
+            self.READBACK_RING_DEPTH = 3
+            # Доступная миру видеопамять в байтах, None - узнать у драйвера
+            self.VRAM_BUDGET = None
+            # Доля свободной видеопамяти, оставляемая драйверу и окну
+            self.VRAM_RESERVE = 0.1
             self.SHADER_ENCODING = "utf-8"
+            # Отладочная сборка шейдеров: проверка переполнения упаковываемых величин
+            self.SHADER_OVERFLOW_CHECKS = False
+            # Сколько нарушений сохраняется между чтениями, остальные только подсчитываются
+            self.OVERFLOW_REPORT_CAPACITY = 1024
+            # Период чтения нарушений в тиках
+            self.OVERFLOW_READBACK_PERIOD = 60
+            # Сколько нарушений из каждого чтения выводить в лог
+            self.OVERFLOW_LOGGED_REPORTS = 10
+            # Период отпечатков состояния мира в тиках (simulator/fingerprint.py), 0 - не считать
+            self.FINGERPRINT_PERIOD = 0
+            # Журнал отпечатков каждого запуска - отдельный файл в этой папке
+            self.FINGERPRINT_FOLDER = "fingerprints"
+            # Писать в журнал отпечатки кирпичей, без них расхождение находится с точностью до мира пакета
+            self.FINGERPRINT_BRICKS = True
 
             self.WORLD_UPDATE_PERIOD = 1
             self.WORLD_SEED = int(datetime.datetime.now().timestamp())
@@ -40,14 +83,104 @@ class Settings(Singleton):
             self.CELL_SIZE = 32
             self.CELL_SHAPE = self.decompose(self.CELL_SIZE, 3)
             self.CHUNK_COUNT = 1
+            # Количество независимых миров формы WORLD_SHAPE, симулируемых одними вызовами шейдеров (для перебора параметров).
+            # Существа и отображение используют только первый мир
+            self.WORLD_BATCH_SIZE = 1
 
             # Размер рабочей группы вычислительного шейдера
             self.CELL_GROUP_SHAPE = Vec3(8, 8, 8)
             self.WORLD_GROUP_SHAPE = self.WORLD_SHAPE // self.CELL_GROUP_SHAPE
 
             self.GRAVITY_VECTOR = Vec3(1, 0, 0)
+            # True - тяготение считается из распределения вещества (simulator/gravity.py), False - постоянный GRAVITY_VECTOR
+            # (вектор мира пакета, World.set_world_parameters). Поле заменяет вектор и не считается физикой
+            # на процессоре (simulator/cpu_physics.py)
+            self.GRAVITY_FIELD = False
+            # Гравитационная постоянная поля. При 5e-5 ускорение на поверхности начальной планеты
+            # мира 128 x 128 x 64 порядка 1, как у GRAVITY_VECTOR
+            self.GRAVITY_CONSTANT = 5e-5
+            # Уровни многосеточного решателя, включая уровень ячеек. Стороны мира должны делиться на 2^(уровней - 1)
+            self.GRAVITY_LEVEL_COUNT = 5
+            # Проходы красно-черного сглаживания на каждом уровне до перехода на грубый уровень и после возврата
+            self.GRAVITY_SMOOTHING_SWEEPS = 2
+            # Проходы сглаживания самого грубого уровня
+            self.GRAVITY_COARSE_SWEEPS = 16
+            # Коэффициент уравнения состояния вещества (stage_0.glsl): давление на единицу плотности в почти пустой ячейке,
+            # 0 - давление не действует (по умолчанию, запуск включает его сам).
+            # Равновесие с тяготением g - слой толщиной порядка PRESSURE_STIFFNESS / g ячеек, например 4.0
+            self.PRESSURE_STIFFNESS = 0.0
+
+            # Реестр веществ
+            # Под substance_id в юните отведено 14 бит
+            self.SUBSTANCE_ID_BITS = 14
+            self.MAX_SUBSTANCE_COUNT = 1 << self.SUBSTANCE_ID_BITS
+            # Начальная емкость реестра, при необходимости увеличивается
+            self.SUBSTANCE_CAPACITY = 256
+            # Количество процедурно генерируемых веществ (в дополнение к заданным классами)
+            self.SUBSTANCE_GENERATED_COUNT = 0
+            # Путь к таблице веществ (.npy, формат simulator.substance.SUBSTANCE_TABLE_DTYPE) или None
+            self.SUBSTANCE_TABLE = None
+            # Количество процедурно генерируемых реакций между веществами
+            self.REACTION_GENERATED_COUNT = 4
+
+            # Существа
+            # Максимальное количество одновременно живущих существ (количество слотов)
+            self.CREATURE_CAPACITY = 1 << 20
+            self.CREATURE_GROUP_SIZE = 256
+            # Существа в начальном мире, 0 - мир создается без существ
+            self.CREATURE_INITIAL_COUNT = 0
+            # Максимальное количество существ, создаваемых за тик, остальные ждут в очереди
+            self.CREATURE_SPAWN_BATCH = 1 << 14
+            self.CREATURE_SENSOR_COUNT = 4
+            self.CREATURE_INITIAL_ENERGY = 100.0
+            self.CREATURE_MAX_ENERGY = 1000.0
+            # Расход энергии за тик
+            self.CREATURE_METABOLISM = 0.1
+            # Максимальное количество вещества, поглощаемого за тик
+            self.CREATURE_CONSUMPTION = 4
+            # Энергия от единицы массы поглощенного вещества
+            self.CREATURE_FOOD_ENERGY = 0.5
+            self.CREATURE_INITIAL_SPEED = 0.05
+            self.CREATURE_MAX_SPEED = 0.2
+
+            # Нейронные сети существ
+            # Нейронов в сети одного существа, первые NeuralNetworks.OUTPUT_COUNT из них - выходы
+            self.NEURAL_NEURON_COUNT = 8
+            # Входов на нейрон у нового существа
+            self.NEURAL_INITIAL_EDGES = 3
+            # Общее количество связей всех сетей
+            self.NEURAL_EDGE_CAPACITY = self.CREATURE_CAPACITY * 12
+            # Количество связей, которые можно добавить между уплотнениями
+            self.NEURAL_APPEND_CAPACITY = 1 << 20
+            # Период мутаций в тиках
+            self.NEURAL_MUTATION_PERIOD = 100
+            # Вероятности изменения веса (и смещения), удаления и добавления связи при мутации
+            self.NEURAL_WEIGHT_MUTATION = 0.05
+            self.NEURAL_EDGE_REMOVAL = 0.01
+            self.NEURAL_EDGE_ADDITION = 0.01
+            self.NEURAL_MUTATION_STRENGTH = 0.1
 
             self.OPTICAL_DENSITY_SCALE = 0.0003
+            # Уровни детализации объема оптики для отрисовки, включая уровень 0 с полным разрешением.
+            # Луч переходит на уровень level, когда пиксель на его расстоянии покрывает 2^level ячеек, 1 - без перехода
+            self.OPTICS_LEVEL_COUNT = 5
+            # Больше 1 - переход на грубые уровни ближе к камере
+            self.OPTICS_LOD_BIAS = 1.0
+            # Отрисовка мира: "fragment" - полноэкранный проход, "tile" - вычислительный шейдер по плиткам экрана,
+            # "wavefront" - волновой конвейер лучей с отражением и преломлением на границах сред.
+            # Переключается клавишей R, клавиша B сравнивает их время на PROJECTION_BENCHMARK_FRAMES кадрах
+            self.PROJECTION_RENDERER = "fragment"
+            self.PROJECTION_BENCHMARK_FRAMES = 60
+            # Сколько раз луч "wavefront" может разветвиться на отраженный и преломленный, 0 - без ветвлений
+            self.WAVEFRONT_MAX_BOUNCES = 2
+            # Прирост показателя преломления на единицу оптической толщины тексела
+            self.WAVEFRONT_REFRACTIVITY = 2.0
+            # Относительная разница показателей преломления соседних текселей, с которой начинается граница сред
+            self.WAVEFRONT_INTERFACE_THRESHOLD = 0.01
+            # Лучи с меньшей долей в цвете пикселя не порождаются
+            self.WAVEFRONT_MIN_WEIGHT = 0.02
+            # Вместимость очереди лучей на пиксель, лучи сверх нее идут дальше без ветвления
+            self.WAVEFRONT_QUEUE_RAYS_PER_PIXEL = 1.0
 
             self.CAMERA_ZOOM_SENSITIVITY = 0.1
             # При значениях меньше 0.4 изображение начинает скакать и переворачиваться
@@ -74,6 +207,23 @@ class Settings(Singleton):
 
             self.MAX_FPS = 60
             self.MAX_TPS = 1000
+            # Симуляция в отдельном потоке с разделяемым контекстом OpenGL, отрисовка читает последний завершенный тик.
+            # Внеэкранная отрисовка (render.py) всегда считает мир в основном потоке
+            self.SIMULATION_THREAD = True
+            # Тики, отправленные видеокарте, но еще не выполненные ею. Поток симуляции ждет, чтобы не уходить вперед
+            self.SIMULATION_TICKS_IN_FLIGHT = 2
+
+            # Внеэкранная отрисовка пролета камеры в кадры PNG (render.py)
+            self.RENDER_FOLDER = "renders"
+            # Размер кадра в пикселях, не зависит от размера окна
+            self.RENDER_SIZE = (1920, 1080)
+            # Период кадров в тиках мира
+            self.RENDER_FRAME_PERIOD = 10
+            # Буферы упаковки пикселей для чтения кадров, кадр удерживает свой буфер до конца сжатия в PNG
+            self.RENDER_READBACK_DEPTH = 4
+            self.RENDER_ENCODER_COUNT = max(1, self.CPU_COUNT // 2)
+            # 0 - без сжатия, 9 - максимальное
+            self.RENDER_PNG_COMPRESSION = 1
 
             self.TEST_COLOR_CUBE = False
             self.TEST_COLOR_CUBE_START = (1.0, 1.0, 1.0, max(1 / max(self.WORLD_SHAPE), 0.03))
@@ -111,10 +261,154 @@ class Settings(Singleton):
         if self.CPU_COUNT <= 0:
             raise SettingError(f"CPU_COUNT ({self.CPU_COUNT}) must be greater than 0")
 
+        if self.CPU_PHYSICS_WORKER_COUNT <= 0:
+            raise SettingError(f"CPU_PHYSICS_WORKER_COUNT ({self.CPU_PHYSICS_WORKER_COUNT}) must be greater than 0")
+
+        if self.CPU_PHYSICS_BACKEND not in ("numpy", "numba"):
+            raise SettingError(f"CPU_PHYSICS_BACKEND ({self.CPU_PHYSICS_BACKEND}) must be \"numpy\" or \"numba\"")
+
+        if self.CPU_PHYSICS_TIMEOUT <= 0:
+            raise SettingError(f"CPU_PHYSICS_TIMEOUT ({self.CPU_PHYSICS_TIMEOUT}) must be greater than 0")
+
+        if self.JOB_CHUNK_SIZE <= 0:
+            raise SettingError(f"JOB_CHUNK_SIZE ({self.JOB_CHUNK_SIZE}) must be greater than 0")
+
+        if self.VRAM_BUDGET is not None and self.VRAM_BUDGET <= 0:
+            raise SettingError(f"self.VRAM_BUDGET ({self.VRAM_BUDGET}) must be greater than 0 or None")
+
+        if not 0 <= self.VRAM_RESERVE < 1:
+            raise SettingError(f"self.VRAM_RESERVE ({self.VRAM_RESERVE}) must be in [0; 1)")
+
+        if min(self.RENDER_SIZE) <= 0:
+            raise SettingError(f"All render dimensions, RENDER_SIZE {self.RENDER_SIZE}, must be greater than 0")
+
+        if self.SIMULATION_TICKS_IN_FLIGHT <= 0:
+            raise SettingError(
+                f"self.SIMULATION_TICKS_IN_FLIGHT ({self.SIMULATION_TICKS_IN_FLIGHT}) must be greater than 0"
+            )
+
+        if self.RENDER_FRAME_PERIOD <= 0:
+            raise SettingError(f"self.RENDER_FRAME_PERIOD ({self.RENDER_FRAME_PERIOD}) must be greater than 0")
+
+        if self.RENDER_READBACK_DEPTH <= 0:
+            raise SettingError(f"self.RENDER_READBACK_DEPTH ({self.RENDER_READBACK_DEPTH}) must be greater than 0")
+
+        if self.FINGERPRINT_PERIOD < 0:
+            raise SettingError(f"self.FINGERPRINT_PERIOD ({self.FINGERPRINT_PERIOD}) must not be negative")
+
+        if self.RENDER_ENCODER_COUNT <= 0:
+            raise SettingError(f"self.RENDER_ENCODER_COUNT ({self.RENDER_ENCODER_COUNT}) must be greater than 0")
+
+        if not 0 <= self.RENDER_PNG_COMPRESSION <= 9:
+            raise SettingError(f"self.RENDER_PNG_COMPRESSION ({self.RENDER_PNG_COMPRESSION}) must be in [0; 9]")
+
+        max_optics_level_count = int(max(self.WORLD_SHAPE)).bit_length()
+        if not 1 <= self.OPTICS_LEVEL_COUNT <= max_optics_level_count:
+            raise SettingError(
+                f"self.OPTICS_LEVEL_COUNT ({self.OPTICS_LEVEL_COUNT}) must be in [1; {max_optics_level_count}]"
+                f" for WORLD_SHAPE {self.WORLD_SHAPE}"
+            )
+
+        if self.PROJECTION_RENDERER not in ("fragment", "tile", "wavefront"):
+            raise SettingError(
+                f"self.PROJECTION_RENDERER ({self.PROJECTION_RENDERER}) must be \"fragment\", \"tile\" or \"wavefront\""
+            )
+
+        if self.WAVEFRONT_MAX_BOUNCES < 0:
+            raise SettingError(f"self.WAVEFRONT_MAX_BOUNCES ({self.WAVEFRONT_MAX_BOUNCES}) must not be negative")
+
+        if self.WAVEFRONT_REFRACTIVITY < 0:
+            raise SettingError(f"self.WAVEFRONT_REFRACTIVITY ({self.WAVEFRONT_REFRACTIVITY}) must not be negative")
+
+        if self.WAVEFRONT_INTERFACE_THRESHOLD <= 0:
+            raise SettingError(
+                f"self.WAVEFRONT_INTERFACE_THRESHOLD ({self.WAVEFRONT_INTERFACE_THRESHOLD}) must be greater than 0"
+            )
+
+        if not 0 < self.WAVEFRONT_MIN_WEIGHT < 1:
+            raise SettingError(f"self.WAVEFRONT_MIN_WEIGHT ({self.WAVEFRONT_MIN_WEIGHT}) must be in (0; 1)")
+
+        if self.WAVEFRONT_QUEUE_RAYS_PER_PIXEL <= 0:
+            raise SettingError(
+                f"self.WAVEFRONT_QUEUE_RAYS_PER_PIXEL ({self.WAVEFRONT_QUEUE_RAYS_PER_PIXEL}) must be greater than 0"
+            )
+
+        if self.PROJECTION_BENCHMARK_FRAMES <= 0:
+            raise SettingError(
+                f"self.PROJECTION_BENCHMARK_FRAMES ({self.PROJECTION_BENCHMARK_FRAMES}) must be greater than 0"
+            )
+
+        if self.OPTICS_LOD_BIAS <= 0:
+            raise SettingError(f"self.OPTICS_LOD_BIAS ({self.OPTICS_LOD_BIAS}) must be greater than 0")
+
+        if self.TEXTURE_CACHE_SIZE <= 0:
+            raise SettingError(f"self.TEXTURE_CACHE_SIZE ({self.TEXTURE_CACHE_SIZE}) must be greater than 0")
+
+        if self.TEXTURE_ATLAS_SIZE <= 0:
+            raise SettingError(f"self.TEXTURE_ATLAS_SIZE ({self.TEXTURE_ATLAS_SIZE}) must be greater than 0")
+
+        if self.WORLD_BATCH_SIZE <= 0:
+            raise SettingError(f"self.WORLD_BATCH_SIZE ({self.WORLD_BATCH_SIZE}) must be greater than 0")
+
+        # Ограничение на количество рабочих групп по одной оси
+        if self.WORLD_SHAPE.z // self.CELL_GROUP_SHAPE.z * self.WORLD_BATCH_SIZE > 65535:
+            raise SettingError(
+                f"self.WORLD_BATCH_SIZE ({self.WORLD_BATCH_SIZE}) is too large for {self.WORLD_SHAPE.z} cells deep worlds"
+            )
+
         if self.WORLD_SHAPE % self.CELL_GROUP_SHAPE != Vec3(0, 0, 0):
             raise SettingError(
                 f"self.WORLD_SHAPE % self.CELL_GROUP_SHAPE ({self.WORLD_SHAPE} % {self.CELL_GROUP_SHAPE} == {Vec3(0, 0, 0)}) division remainder must be zero vector"
             )
 
+        gravity_level_divisor = 1 << (self.GRAVITY_LEVEL_COUNT - 1) if self.GRAVITY_LEVEL_COUNT > 0 else 1
+        if self.GRAVITY_LEVEL_COUNT <= 0 or any(component % gravity_level_divisor for component in self.WORLD_SHAPE):
+            raise SettingError(
+                f"self.GRAVITY_LEVEL_COUNT ({self.GRAVITY_LEVEL_COUNT}) must be greater than 0"
+                f" and all WORLD_SHAPE {self.WORLD_SHAPE} dimensions must be divisible by {gravity_level_divisor}"
+            )
+
+        if self.GRAVITY_SMOOTHING_SWEEPS <= 0 or self.GRAVITY_COARSE_SWEEPS <= 0:
+            raise SettingError(
+                f"self.GRAVITY_SMOOTHING_SWEEPS ({self.GRAVITY_SMOOTHING_SWEEPS}) and"
+                f" self.GRAVITY_COARSE_SWEEPS ({self.GRAVITY_COARSE_SWEEPS}) must be greater than 0"
+            )
+
+        if self.PRESSURE_STIFFNESS < 0:
+            raise SettingError(f"self.PRESSURE_STIFFNESS ({self.PRESSURE_STIFFNESS}) must be non-negative")
+
         if 0 > self.CELL_SIZE or 63 < self.CELL_SIZE:
             raise SettingError(f"self.CELL_SIZE ({self.CELL_SIZE}) must be in [1; 63]")
+
+        if not 0 < self.SUBSTANCE_CAPACITY <= self.MAX_SUBSTANCE_COUNT:
+            raise SettingError(
+                f"self.SUBSTANCE_CAPACITY ({self.SUBSTANCE_CAPACITY}) must be in [1; {self.MAX_SUBSTANCE_COUNT}]"
+            )
+
+        if self.CREATURE_CAPACITY % self.CREATURE_GROUP_SIZE != 0:
+            raise SettingError(
+                f"self.CREATURE_CAPACITY ({self.CREATURE_CAPACITY}) must be divisible by self.CREATURE_GROUP_SIZE ({self.CREATURE_GROUP_SIZE})"
+            )
+
+        # Ограничение на количество рабочих групп по одной оси
+        if self.CREATURE_CAPACITY // self.CREATURE_GROUP_SIZE > 65535:
+            raise SettingError(
+                f"self.CREATURE_CAPACITY ({self.CREATURE_CAPACITY}) must not exceed {65535 * self.CREATURE_GROUP_SIZE}"
+            )
+
+        if self.CREATURE_INITIAL_COUNT * self.NEURAL_NEURON_COUNT * self.NEURAL_INITIAL_EDGES > self.NEURAL_APPEND_CAPACITY:
+            raise SettingError(
+                "Initial creature networks (CREATURE_INITIAL_COUNT * NEURAL_NEURON_COUNT * NEURAL_INITIAL_EDGES)"
+                f" must fit self.NEURAL_APPEND_CAPACITY ({self.NEURAL_APPEND_CAPACITY})"
+            )
+
+        if not 0 <= self.CREATURE_INITIAL_COUNT <= self.CREATURE_CAPACITY:
+            raise SettingError(
+                f"self.CREATURE_INITIAL_COUNT ({self.CREATURE_INITIAL_COUNT}) must be in [0; {self.CREATURE_CAPACITY}]"
+            )
+
+        if self.REACTION_GENERATED_COUNT < 0:
+            raise SettingError(f"self.REACTION_GENERATED_COUNT ({self.REACTION_GENERATED_COUNT}) must not be negative")
+
+        if self.SUBSTANCE_GENERATED_COUNT < 0:
+            raise SettingError(f"self.SUBSTANCE_GENERATED_COUNT ({self.SUBSTANCE_GENERATED_COUNT}) must not be negative")
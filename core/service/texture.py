@@ -1,18 +1,27 @@
 import functools
+import hashlib
 import math
-from typing import Self
+import pathlib
+from collections import OrderedDict
+from typing import Callable, Self
 
 import PIL.Image
 import arcade
+import numpy as np
 from PIL import Image
 from arcade import Texture as ArcadeTexture, color
+from arcade.hitbox import HitBoxAlgorithm
+from arcade.texture_atlas import DefaultTextureAtlas
 from arcade.types import Color
 
 from core.service.figure import Circle, ClosedFigure, Hexagon, RoundedRectangle
+from core.service.object import ProjectMixin
 
 
 class Texture(ArcadeTexture):
     from_texture_counter = 0
+    # Сглаживание краев фигур: каждый пиксель проверяется в FIGURE_SAMPLES * FIGURE_SAMPLES точках
+    FIGURE_SAMPLES = 4
 
     @classmethod
     def from_texture(cls, texture: arcade.Texture, cache_name: str = None) -> Self:
@@ -28,12 +37,11 @@ class Texture(ArcadeTexture):
         )
 
     @staticmethod
-    @functools.cache
+    @functools.lru_cache(maxsize = 256)
     def get_figure(figure_class: type[ClosedFigure], *args, **kwargs) -> ClosedFigure:
         return figure_class(*args, **kwargs)
 
     @classmethod
-    @functools.cache
     def create_rounded_rectangle(
             cls,
             size: tuple[int | float, int | float] = (100, 50),
@@ -73,7 +81,6 @@ class Texture(ArcadeTexture):
         return texture
 
     @classmethod
-    @functools.cache
     def create_circle(
             cls,
             radius: int | float = 25,
@@ -101,7 +108,6 @@ class Texture(ArcadeTexture):
         return texture
 
     @classmethod
-    @functools.cache
     def create_hexagon(
             cls,
             radius: int | float = 25,
@@ -130,8 +136,13 @@ class Texture(ArcadeTexture):
         )
         return texture
 
+    # Маска фигуры со сглаженными краями: value внутри фигуры, 0 снаружи
+    @classmethod
+    def get_figure_mask(cls, figure: ClosedFigure, size: tuple[int, int], value: int = 255) -> np.ndarray:
+        return np.rint(figure.coverage(size, cls.FIGURE_SAMPLES) * value).astype(np.uint8)
+
+    # Сгенерированные текстуры берутся из TEXTURES: из памяти, с диска или генерируются и сохраняются в него
     @classmethod
-    @functools.cache
     def create_with_figure(
             cls,
             figure: ClosedFigure,
@@ -147,25 +158,53 @@ class Texture(ArcadeTexture):
             if isinstance(size[dimension], float):
                 # noinspection PyUnresolvedReferences
                 size[dimension] = int(size[dimension]) + (size[dimension] % 1 > 0)
+
+        key = TEXTURES.get_key(
+            "figure",
+            cls.FIGURE_SAMPLES,
+            figure.get_key(),
+            inner_figure.get_key(),
+            tuple(size),
+            tuple(main_color),
+            tuple(border_color),
+            tuple(background_color),
+            transparent_background
+        )
+        return TEXTURES.get_or_create(
+            key,
+            lambda: cls.render_figure(
+                figure,
+                inner_figure,
+                size,
+                main_color,
+                border_color,
+                background_color,
+                transparent_background
+            ),
+            arcade.hitbox.algo_detailed
+        )
+
+    @classmethod
+    def render_figure(
+            cls,
+            figure: ClosedFigure,
+            inner_figure: ClosedFigure,
+            size: list[int],
+            main_color: Color,
+            border_color: Color,
+            background_color: Color,
+            transparent_background: bool
+    ) -> PIL.Image.Image:
         image = Image.new("RGBA", size, main_color)
 
         # обрезание прямоугольника до необходимой фигуры
-        alpha = Image.new("L", size, 0)
-        for x in range(size[0]):
-            for y in range(size[1]):
-                if figure.belongs(x, y):
-                    alpha.putpixel((x, y), image.getpixel((x, y))[3])
+        alpha = Image.fromarray(cls.get_figure_mask(figure, size, main_color[3]))
         image.putalpha(alpha)
 
         # наложение границы
         if main_color != border_color:
             colored = Image.new("RGBA", size, border_color)
-            border_mask = Image.new("L", size, 0)
-
-            for x in range(size[0]):
-                for y in range(size[1]):
-                    if inner_figure.belongs(x, y):
-                        border_mask.putpixel((x, y), 255)
+            border_mask = Image.fromarray(cls.get_figure_mask(inner_figure, size))
             colored.putalpha(alpha)
             image = Image.composite(image, colored, border_mask)
 
@@ -173,7 +212,7 @@ class Texture(ArcadeTexture):
             background = Image.new("RGBA", size, background_color)
             image = Image.composite(image, background, image.getchannel(3))
 
-        return Texture(image, hit_box_algorithm = arcade.hitbox.algo_detailed)
+        return image
 
     def with_image(self, image: PIL.Image.Image, maintain_ratio: bool = True, center: bool = True) -> Self:
         if maintain_ratio:
@@ -188,3 +227,123 @@ class Texture(ArcadeTexture):
             self.image.alpha_composite(image)
 
         return self
+
+
+# Ограниченный кэш сгенерированных текстур.
+# В памяти хранится не больше TEXTURE_CACHE_SIZE байт изображений, самые давно использованные текстуры вытесняются.
+# Все текстуры кэша упаковываются в общий атлас, чтобы интерфейс рисовался без переключения текстур
+# (SpriteList(atlas = TEXTURES.get_atlas())). Изображения сохраняются на диск по ключу параметров,
+# при следующих запусках они читаются вместо генерации
+class TextureCache(ProjectMixin):
+    # Меняется вместе со способом генерации текстур, чтобы не читать устаревшие файлы
+    VERSION = 1
+
+    def __init__(self) -> None:
+        self.textures: OrderedDict[str, Texture] = OrderedDict()
+        # Байт изображений в памяти
+        self.size = 0
+        self.atlas: DefaultTextureAtlas | None = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def get_key(cls, *parameters) -> str:
+        return hashlib.sha1(repr((cls.VERSION, *parameters)).encode()).hexdigest()
+
+    @staticmethod
+    def get_texture_size(texture: Texture) -> int:
+        return texture.image.width * texture.image.height * len(texture.image.getbands())
+
+    def get_path(self, key: str) -> pathlib.Path:
+        return pathlib.Path(self.settings.TEXTURE_CACHE) / f"{key}.png"
+
+    def get_or_create(
+            self,
+            key: str,
+            render: Callable[[], PIL.Image.Image],
+            hit_box_algorithm: HitBoxAlgorithm | None = None
+    ) -> Texture:
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.textures.move_to_end(key)
+            self.hits += 1
+            return texture
+
+        image = self.load(key)
+        if image is None:
+            self.misses += 1
+            image = render()
+            self.save(key, image)
+        else:
+            self.disk_hits += 1
+
+        # Ключ вместо хэша содержимого: arcade не считает хэш изображения, а атлас не дублирует одинаковые текстуры
+        texture = Texture(image, hit_box_algorithm = hit_box_algorithm, hash = key)
+        self.put(key, texture)
+        return texture
+
+    def load(self, key: str) -> PIL.Image.Image | None:
+        path = self.get_path(key)
+        if not path.exists():
+            return None
+        try:
+            with Image.open(path) as file:
+                return file.convert("RGBA")
+        except OSError as error:
+            self.logger.warning(f"Cached texture {path} is not readable, it will be generated again: {error}")
+            return None
+
+    def save(self, key: str, image: PIL.Image.Image) -> None:
+        path = self.get_path(key)
+        try:
+            path.parent.mkdir(parents = True, exist_ok = True)
+            image.save(path)
+        except OSError as error:
+            self.logger.warning(f"Texture is not saved to {path}: {error}")
+
+    def put(self, key: str, texture: Texture) -> None:
+        self.textures[key] = texture
+        self.size += self.get_texture_size(texture)
+        if self.atlas is not None:
+            self.atlas.add(texture)
+        self.evict()
+
+    # Вытесняет самые давно использованные текстуры, пока кэш не поместится в TEXTURE_CACHE_SIZE.
+    # Последняя добавленная текстура остается, даже если она одна больше ограничения
+    def evict(self) -> None:
+        while self.size > self.settings.TEXTURE_CACHE_SIZE and len(self.textures) > 1:
+            _, texture = self.textures.popitem(last = False)
+            self.size -= self.get_texture_size(texture)
+            self.evictions += 1
+            # Атлас считает ссылки на текстуру: если она еще используется в SpriteList, место в атласе останется за ней
+            if self.atlas is not None and self.atlas.has_texture(texture):
+                self.atlas.remove(texture)
+
+    # Атлас создается при первом обращении, когда уже есть контекст OpenGL окна
+    def get_atlas(self) -> DefaultTextureAtlas:
+        if self.atlas is None:
+            size = self.settings.TEXTURE_ATLAS_SIZE
+            self.atlas = DefaultTextureAtlas((size, size))
+            for texture in self.textures.values():
+                self.atlas.add(texture)
+        return self.atlas
+
+    def clear(self) -> None:
+        if self.atlas is not None:
+            for texture in self.textures.values():
+                if self.atlas.has_texture(texture):
+                    self.atlas.remove(texture)
+        self.textures.clear()
+        self.size = 0
+
+    def describe(self) -> str:
+        return (
+            f"{len(self.textures)} textures, {self.size} bytes, hits {self.hits}, disk hits {self.disk_hits},"
+            f" misses {self.misses}, evictions {self.evictions}"
+        )
+
+
+TEXTURES = TextureCache()
@@ -0,0 +1,337 @@
+import math
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from threading import Lock as StandardLock
+from typing import Any, Callable, Iterable
+
+import numpy as np
+import numpy.typing as npt
+
+from core.service.object import ProjectMixin
+from core.service.threads.lock import Lock, collect_lock_stats
+
+
+class JobError(Exception):
+    pass
+
+
+class DependencyFailedError(JobError):
+    pass
+
+
+# Описание массива в разделяемой памяти, которое можно передать в другой процесс
+ArrayDescriptor = tuple[str, tuple[int, ...], str]
+
+
+# Массив NumPy в разделяемой памяти. Процессы-исполнители открывают его по имени, без копирования данных
+class SharedArray:
+    def __init__(self, shape: int | tuple[int, ...], dtype: npt.DTypeLike) -> None:
+        self.shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, math.prod(self.shape) * self.dtype.itemsize)
+        self.memory = shared_memory.SharedMemory(create = True, size = size)
+        self.array: npt.NDArray = np.ndarray(self.shape, self.dtype, self.memory.buf)
+
+    @property
+    def descriptor(self) -> ArrayDescriptor:
+        return self.memory.name, self.shape, self.dtype.str
+
+    def delete(self) -> None:
+        # Представление должно быть удалено до закрытия памяти
+        del self.array
+        self.memory.close()
+        self.memory.unlink()
+
+
+# Выполняется в процессе-исполнителе
+def run_shared_chunk(
+        function: Callable[..., Any],
+        descriptors: list[ArrayDescriptor],
+        start: int,
+        stop: int,
+        kwargs: dict[str, Any]
+) -> tuple[Any, float]:
+    memories = [shared_memory.SharedMemory(name, track = False) for name, _, _ in descriptors]
+    try:
+        arrays = [
+            np.ndarray(shape, np.dtype(dtype), memory.buf)[start:stop]
+            for memory, (_, shape, dtype) in zip(memories, descriptors)
+        ]
+        started = time.perf_counter()
+        result = function(*arrays, **kwargs)
+        duration = time.perf_counter() - started
+        del arrays
+        return result, duration
+    finally:
+        for memory in memories:
+            memory.close()
+
+
+def run_chunk(
+        function: Callable[..., Any],
+        arrays: list[npt.NDArray],
+        start: int,
+        stop: int,
+        kwargs: dict[str, Any]
+) -> tuple[Any, float]:
+    return run_timed(function, [array[start:stop] for array in arrays], kwargs)
+
+
+def run_timed(function: Callable[..., Any], args: Iterable[Any], kwargs: dict[str, Any]) -> tuple[Any, float]:
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class Job:
+    def __init__(self, name: str, dependencies: Iterable["Job"]) -> None:
+        self.name = name
+        self.dependencies = tuple(dependencies)
+        # Результат самой задачи, для задач над массивами - список результатов частей
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+        # Момент, когда выполнились все зависимости
+        self.ready: float | None = None
+        self.finished: float | None = None
+        # Суммарное время выполнения частей в исполнителях
+        self.work_time = 0.0
+        self.chunk_count = 1
+
+    def __repr__(self) -> str:
+        return f"Job({self.name})"
+
+    @property
+    def wait_time(self) -> float:
+        return 0.0 if self.ready is None else self.ready - self.submitted
+
+    @property
+    def wall_time(self) -> float:
+        return 0.0 if self.finished is None or self.ready is None else self.finished - self.ready
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: float | None = None) -> Any:
+        return self.future.result(timeout)
+
+
+# Система задач для работы мира на процессоре.
+# Задача запускается после выполнения всех своих зависимостей, исключение задачи пробрасывается в wait()
+# и передается зависимым задачам как DependencyFailedError.
+# Задачи над массивами делятся на части по первой оси. При включенном GIL части выполняются в пуле процессов,
+# а массивы передаются через разделяемую память (функция должна быть доступна по импорту),
+# на сборке без GIL (python3.14t) - в пуле потоков над теми же массивами
+class JobSystem(ProjectMixin):
+    def __init__(self, worker_count: int | None = None, chunk_size: int | None = None) -> None:
+        self.worker_count = self.settings.CPU_COUNT if worker_count is None else worker_count
+        self.chunk_size = self.settings.JOB_CHUNK_SIZE if chunk_size is None else chunk_size
+
+        gil_check = getattr(sys, "_is_gil_enabled", None)
+        self.gil_enabled = True if gil_check is None else gil_check()
+        self.use_processes = self.gil_enabled and self.settings.JOB_PROCESS_FALLBACK
+
+        self.thread_executor = ThreadPoolExecutor(self.worker_count, thread_name_prefix = "job")
+        self.process_executor: ProcessPoolExecutor | None = None
+        if self.use_processes:
+            self.process_executor = ProcessPoolExecutor(self.worker_count)
+
+        self.lock = Lock("jobs")
+        self.pending: list[Job] = []
+        # Время выполнения задач, завершенных после последнего вызова collect_timings
+        self.timings: dict[str, tuple[float, float, float, int]] = {}
+
+        self.logger.info(
+            f"Job system: {self.worker_count} workers, GIL enabled: {self.gil_enabled},"
+            f" chunked jobs run in {"processes" if self.use_processes else "threads"}"
+        )
+
+    # Выделяет массив, который задачи над массивами используют без копирования
+    def allocate(self, shape: int | tuple[int, ...], dtype: npt.DTypeLike) -> SharedArray | npt.NDArray:
+        if self.use_processes:
+            return SharedArray(shape, dtype)
+        return np.zeros(shape, dtype)
+
+    def register(self, job: Job, start: Callable[[], None]) -> Job:
+        with self.lock:
+            self.pending.append(job)
+
+        remaining = [len(job.dependencies)]
+        remaining_lock = StandardLock()
+
+        def on_dependency_done(_: Future) -> None:
+            with remaining_lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            self.start(job, start)
+
+        if not job.dependencies:
+            self.start(job, start)
+        for dependency in job.dependencies:
+            dependency.future.add_done_callback(on_dependency_done)
+        return job
+
+    def start(self, job: Job, start: Callable[[], None]) -> None:
+        job.ready = time.perf_counter()
+        failed = [dependency for dependency in job.dependencies if dependency.future.exception() is not None]
+        if failed:
+            error = DependencyFailedError(f"{job} depends on failed {failed[0]}")
+            error.__cause__ = failed[0].future.exception()
+            self.finish(job, error = error)
+            return
+        try:
+            start()
+        except Exception as error:
+            self.finish(job, error = error)
+
+    def finish(self, job: Job, result: Any = None, error: BaseException | None = None) -> None:
+        job.finished = time.perf_counter()
+        with self.lock:
+            total_time, wall_time, wait_time, count = self.timings.get(job.name, (0.0, 0.0, 0.0, 0))
+            self.timings[job.name] = (
+                total_time + job.work_time,
+                wall_time + job.wall_time,
+                wait_time + job.wait_time,
+                count + 1
+            )
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    # Задача над произвольными объектами, всегда выполняется в потоке
+    def submit(
+            self,
+            name: str,
+            function: Callable[..., Any],
+            *args: Any,
+            dependencies: Iterable[Job] = (),
+            **kwargs: Any
+    ) -> Job:
+        job = Job(name, dependencies)
+
+        def on_done(future: Future) -> None:
+            result, job.work_time = future.result() if future.exception() is None else (None, 0.0)
+            self.finish(job, result, future.exception())
+
+        def start() -> None:
+            self.thread_executor.submit(run_timed, function, args, kwargs).add_done_callback(on_done)
+
+        return self.register(job, start)
+
+    # Задача над массивами: function(*части_массивов, **kwargs) вызывается для каждой части длиной chunk_size.
+    # Функция меняет части на месте или возвращает результат части, результат задачи - список результатов частей.
+    # Массивы не из allocate() при выполнении в процессах копируются в разделяемую память и обратно
+    def submit_chunked(
+            self,
+            name: str,
+            function: Callable[..., Any],
+            arrays: Iterable[SharedArray | npt.NDArray],
+            dependencies: Iterable[Job] = (),
+            chunk_size: int | None = None,
+            **kwargs: Any
+    ) -> Job:
+        arrays = list(arrays)
+        if not arrays:
+            raise JobError(f"Chunked job {name} needs at least one array")
+        length = len(arrays[0].array if isinstance(arrays[0], SharedArray) else arrays[0])
+        for array in arrays:
+            if len(array.array if isinstance(array, SharedArray) else array) != length:
+                raise JobError(f"All arrays of chunked job {name} must have the same length ({length})")
+
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        bounds = [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+        job = Job(name, dependencies)
+        job.chunk_count = len(bounds)
+
+        def start() -> None:
+            temporary: list[tuple[SharedArray, npt.NDArray]] = []
+            if self.use_processes:
+                descriptors = []
+                for array in arrays:
+                    if not isinstance(array, SharedArray):
+                        shared = SharedArray(array.shape, array.dtype)
+                        shared.array[...] = array
+                        temporary.append((shared, array))
+                        array = shared
+                    descriptors.append(array.descriptor)
+                futures = [
+                    self.process_executor.submit(run_shared_chunk, function, descriptors, start, stop, kwargs)
+                    for start, stop in bounds
+                ]
+            else:
+                local_arrays = [array.array if isinstance(array, SharedArray) else array for array in arrays]
+                futures = [
+                    self.thread_executor.submit(run_chunk, function, local_arrays, start, stop, kwargs)
+                    for start, stop in bounds
+                ]
+            if not futures:
+                self.finish(job, [])
+                return
+
+            remaining = [len(futures)]
+            remaining_lock = StandardLock()
+
+            # Задача завершается вместе с последней частью
+            def on_done(_: Future) -> None:
+                with remaining_lock:
+                    remaining[0] -= 1
+                    if remaining[0] > 0:
+                        return
+                error = next((future.exception() for future in futures if future.exception() is not None), None)
+                results = []
+                if error is None:
+                    for future in futures:
+                        result, duration = future.result()
+                        results.append(result)
+                        job.work_time += duration
+                try:
+                    for shared, array in temporary:
+                        if error is None:
+                            array[...] = shared.array
+                        shared.delete()
+                except Exception as copy_error:
+                    error = error or copy_error
+                self.finish(job, results, error)
+
+            for future in futures:
+                future.add_done_callback(on_done)
+
+        return self.register(job, start)
+
+    # Ждет все отправленные задачи и пробрасывает первое исключение
+    def wait(self, jobs: Iterable[Job] | None = None) -> None:
+        if jobs is None:
+            with self.lock:
+                jobs, self.pending = self.pending, []
+        for future in as_completed([job.future for job in jobs]):
+            future.result()
+
+    # Возвращает и сбрасывает накопленное время задач:
+    # имя -> (время в исполнителях, время от готовности до завершения, время ожидания зависимостей, количество)
+    def collect_timings(self) -> dict[str, tuple[float, float, float, int]]:
+        with self.lock:
+            timings, self.timings = self.timings, {}
+        return timings
+
+    def log_timings(self) -> None:
+        for name, (work_time, wall_time, wait_time, count) in sorted(self.collect_timings().items()):
+            self.logger.debug(
+                f"job {name}: {count} runs, work {work_time * 1000:.3f} ms, wall {wall_time * 1000:.3f} ms,"
+                f" waited for dependencies {wait_time * 1000:.3f} ms"
+            )
+        # Статистика всех блокировок Lock, не только системы задач
+        for name, (acquire_count, contended_count, failed_count, wait_time, max_wait_time, hold_time) in sorted(
+                collect_lock_stats().items()
+        ):
+            self.logger.debug(
+                f"lock {name}: {acquire_count} acquires, {contended_count} contended, {failed_count} failed,"
+                f" waited {wait_time * 1000:.3f} ms (max {max_wait_time * 1000:.3f} ms), held {hold_time * 1000:.3f} ms"
+            )
+
+    def shutdown(self) -> None:
+        self.thread_executor.shutdown()
+        if self.process_executor is not None:
+            self.process_executor.shutdown()
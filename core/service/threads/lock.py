@@ -1,3 +1,5 @@
+import time
+import weakref
 from threading import Lock as StandardLock, Thread, ThreadError, current_thread
 from types import TracebackType
 
@@ -10,11 +12,38 @@ class CallFromAnotherThreadException(ThreadError):
     pass
 
 
+# Статистика блокировки: (получений, получений с ожиданием, неудачных попыток, время ожидания, наибольшее ожидание,
+# время удержания), время в секундах
+LockStats = tuple[int, int, int, float, float, float]
+
+# Все созданные блокировки, для сбора статистики (collect_lock_stats)
+LOCKS: "weakref.WeakSet[Lock]" = weakref.WeakSet()
+
+
+# Нереентерабельная блокировка с владельцем и статистикой ожидания.
+# Владелец записывается только после получения блокировки и стирается до ее освобождения,
+# а повторное получение проверяется по владельцу: записать себя владельцем может только сам поток,
+# поэтому проверка не гоняется с другими потоками. Статистика меняется под отдельной короткой блокировкой,
+# поэтому ее сбор (collect_stats) не ждет, пока владелец освободит саму блокировку
 class Lock:
-    def __init__(self) -> None:
+    def __init__(self, name: str = "lock") -> None:
+        self.name = name
         self.lock = StandardLock()
-        self.locked = False
         self.thread: Thread | None = None
+        # Момент получения блокировки текущим владельцем
+        self.acquired = 0.0
+
+        self.stats_lock = StandardLock()
+        self.acquire_count = 0
+        self.contended_count = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.hold_time = 0.0
+        self.failed_count = 0
+        LOCKS.add(self)
+
+    def __repr__(self) -> str:
+        return f"Lock({self.name})"
 
     def __enter__(self) -> bool:
         return self.acquire()
@@ -24,23 +53,92 @@ class Lock:
             exc_type: type[Exception] | None,
             exc_value: Exception | None,
             exc_traceback: TracebackType | None
-    ) -> bool | None:
-        return self.release()
-
-    def acquire(self) -> bool:
-        if self.locked:
-            raise MultipleAcquireAttemptException()
-        else:
-            self.locked = True
-            self.thread = current_thread()
-            return self.lock.acquire()
-
-    def release(self) -> bool | None:
-        self.locked = False
+    ) -> None:
+        self.release()
+
+    @property
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+    # Аргументы как у threading.Lock.acquire
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        thread = current_thread()
+        if self.thread is thread:
+            raise MultipleAcquireAttemptException(f"{self} is already acquired by {thread.name}")
+
+        # Сначала попытка без ожидания, чтобы отличить получение с ожиданием от свободной блокировки
+        waited = 0.0
+        contended = not self.lock.acquire(False)
+        if contended:
+            started = time.perf_counter()
+            if not blocking or not self.lock.acquire(True, timeout):
+                with self.stats_lock:
+                    self.failed_count += 1
+                return False
+            waited = time.perf_counter() - started
+
+        self.thread = thread
+        self.acquired = time.perf_counter()
+        with self.stats_lock:
+            self.acquire_count += 1
+            if contended:
+                self.contended_count += 1
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+        return True
+
+    def release(self) -> None:
+        # Освобождение без получения тоже попадает сюда: у свободной блокировки нет владельца
+        if self.thread is not current_thread():
+            raise CallFromAnotherThreadException(f"{self} is released by {current_thread().name}, not by its owner")
+        held = time.perf_counter() - self.acquired
+        with self.stats_lock:
+            self.hold_time += held
         self.thread = None
-        # Проверка на освобождения без получения (acquire) уже реализована в самом self.lock.release()
-        return self.lock.release()
+        self.lock.release()
 
     def check_thread(self, message: str = "") -> None:
-        if self.locked and self.thread != current_thread():
+        thread = self.thread
+        if thread is not None and thread is not current_thread():
             raise CallFromAnotherThreadException(message)
+
+    # Возвращает и сбрасывает статистику, накопленную с прошлого вызова
+    def collect_stats(self) -> LockStats:
+        with self.stats_lock:
+            stats = (
+                self.acquire_count,
+                self.contended_count,
+                self.failed_count,
+                self.wait_time,
+                self.max_wait_time,
+                self.hold_time
+            )
+            self.acquire_count = 0
+            self.contended_count = 0
+            self.failed_count = 0
+            self.wait_time = 0.0
+            self.max_wait_time = 0.0
+            self.hold_time = 0.0
+        return stats
+
+
+# Статистика всех блокировок, которые использовались с прошлого вызова: имя -> статистика.
+# Статистика блокировок с одинаковыми именами складывается
+def collect_lock_stats() -> dict[str, LockStats]:
+    result: dict[str, LockStats] = {}
+    for lock in list(LOCKS):
+        stats = lock.collect_stats()
+        if stats[0] == 0 and stats[2] == 0:
+            continue
+        if lock.name in result:
+            previous = result[lock.name]
+            stats = (
+                previous[0] + stats[0],
+                previous[1] + stats[1],
+                previous[2] + stats[2],
+                previous[3] + stats[3],
+                max(previous[4], stats[4]),
+                previous[5] + stats[5]
+            )
+        result[lock.name] = stats
+    return result
@@ -0,0 +1,96 @@
+from threading import Thread, current_thread
+from typing import Any, Iterator
+
+from core.service.threads.lock import CallFromAnotherThreadException
+
+
+class RingError(Exception):
+    pass
+
+
+# Ограниченная очередь без блокировок для одного потока-производителя и одного потока-потребителя,
+# например, для передачи снимков мира и событий между потоком симуляции и потоками отрисовки и анализа.
+# Индекс записи меняет только производитель, индекс чтения - только потребитель, поэтому потоки никогда не ждут
+# друг друга: производитель сначала записывает элемент в ячейку и только потом публикует новый индекс записи,
+# а потребитель освобождает ячейку до публикации нового индекса чтения.
+# Запись и чтение целого атрибута и элемента списка атомарны и с GIL, и в сборке без GIL.
+# Индексы растут неограниченно, ячейка - индекс по маске емкости, емкость округляется вверх до степени двойки.
+# Потоки производителя и потребителя запоминаются при первом обращении, вызов из другого потока - ошибка
+class SPSCRing:
+    def __init__(self, capacity: int, name: str = "ring") -> None:
+        if capacity <= 0:
+            raise RingError(f"Ring {name} capacity ({capacity}) must be greater than 0")
+        self.name = name
+        self.capacity = 1 << (capacity - 1).bit_length()
+        self.mask = self.capacity - 1
+        self.slots: list[Any] = [None] * self.capacity
+        # Следующая ячейка для записи, меняется только производителем
+        self.write_index = 0
+        # Следующая ячейка для чтения, меняется только потребителем
+        self.read_index = 0
+
+        self.producer: Thread | None = None
+        self.consumer: Thread | None = None
+        # Меняются только производителем
+        self.pushed_count = 0
+        self.rejected_count = 0
+
+    def __repr__(self) -> str:
+        return f"SPSCRing({self.name}, {len(self)}/{self.capacity})"
+
+    # Приблизительна, если вызывается не производителем и не потребителем
+    def __len__(self) -> int:
+        return self.write_index - self.read_index
+
+    def check_producer(self) -> None:
+        thread = current_thread()
+        if self.producer is None:
+            self.producer = thread
+        elif self.producer is not thread:
+            raise CallFromAnotherThreadException(f"{self} has producer {self.producer.name}, not {thread.name}")
+
+    def check_consumer(self) -> None:
+        thread = current_thread()
+        if self.consumer is None:
+            self.consumer = thread
+        elif self.consumer is not thread:
+            raise CallFromAnotherThreadException(f"{self} has consumer {self.consumer.name}, not {thread.name}")
+
+    # Возвращает False, если очередь заполнена: производитель не ждет потребителя, а решает сам,
+    # отбросить элемент или повторить позже
+    def push(self, item: Any) -> bool:
+        self.check_producer()
+        write_index = self.write_index
+        if write_index - self.read_index >= self.capacity:
+            self.rejected_count += 1
+            return False
+        self.slots[write_index & self.mask] = item
+        self.write_index = write_index + 1
+        self.pushed_count += 1
+        return True
+
+    # Возвращает default, если очередь пуста
+    def pop(self, default: Any = None) -> Any:
+        self.check_consumer()
+        read_index = self.read_index
+        if read_index == self.write_index:
+            return default
+        slot = read_index & self.mask
+        item = self.slots[slot]
+        # Ячейка не удерживает элемент, пока производитель ее не перезапишет
+        self.slots[slot] = None
+        self.read_index = read_index + 1
+        return item
+
+    # Забирает все элементы, опубликованные к моменту вызова
+    def drain(self) -> Iterator[Any]:
+        self.check_consumer()
+        for _ in range(self.write_index - self.read_index):
+            yield self.pop()
+
+    # Для снимков, из которых нужен только последний: забирает все элементы и возвращает последний
+    def pop_latest(self, default: Any = None) -> Any:
+        item = default
+        for item in self.drain():
+            pass
+        return item
@@ -0,0 +1,53 @@
+import argparse
+import datetime
+import pathlib
+
+import pyglet
+
+
+def render(camera_path: pathlib.Path, folder: pathlib.Path | None, headless: bool) -> None:
+    if headless:
+        # Должно быть задано до создания окна и контекста OpenGL, то есть до импорта arcade
+        pyglet.options["headless"] = True
+
+    from simulator.render import CameraPath, OfflineRenderer
+    from simulator.window import ProjectWindow
+
+    window = ProjectWindow(visible = False)
+    renderer = None
+    try:
+        # Кадры должны соответствовать тикам пути, поэтому мир считается в этом же потоке
+        window.start(simulation_thread = False)
+        world = window.world
+        path = CameraPath.load(camera_path)
+        if folder is None:
+            folder = pathlib.Path(window.settings.RENDER_FOLDER) / datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        renderer = OfflineRenderer(world.projection, path, folder)
+
+        # Кадры рисуются каждые RENDER_FRAME_PERIOD тиков от начала пути до его конца,
+        # симуляция между кадрами идет, пока видеокарта копирует, а потоки сжимают предыдущие кадры
+        frame_age = path.start_age
+        while frame_age <= path.end_age:
+            if world.age >= frame_age:
+                renderer.render(world.age)
+                frame_age += window.settings.RENDER_FRAME_PERIOD
+            world.on_update()
+            renderer.poll()
+        renderer.finish()
+    finally:
+        if renderer is not None:
+            renderer.delete()
+        window.stop()
+        if window.world is not None:
+            print(f"Отрисовка окончена. Возраст мира: {window.world.age}")
+            if renderer is not None:
+                print(f"Кадров: {renderer.encoded} из {renderer.frame}, папка: {renderer.folder}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Внеэкранная отрисовка пролета камеры в кадры PNG")
+    parser.add_argument("camera_path", type = pathlib.Path, help = "JSON с ключевыми кадрами камеры (CameraPath)")
+    parser.add_argument("--output", type = pathlib.Path, default = None, help = "папка для кадров")
+    parser.add_argument("--headless", action = "store_true", help = "без оконной системы (EGL)")
+    arguments = parser.parse_args()
+    render(arguments.camera_path, arguments.output, arguments.headless)
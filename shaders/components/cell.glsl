@@ -16,14 +16,7 @@ ivec3(0, 0, 1)
 );
 
 
-struct Cell {
-    int filled_units;
-};
-
-
-Cell new_cell() {
-    return Cell(0);
-}
+#include cell_layout
 
 
 int cell_position_to_index(ivec3 position) {
@@ -31,26 +24,13 @@ int cell_position_to_index(ivec3 position) {
 }
 
 
-// r - [0; 29]
-// g - []
-// b - [0; 31]
-// a - [0; 31]
 Cell read_cell(ivec3 position) {
     int chunk_index = 0;
-    uvec4 packed_cell = texelFetch(u_read_cell.handles[chunk_index], position, 0);
-    Cell cell;
-
-    cell.filled_units = int(bitfieldExtract(packed_cell.r, 0, 6));
-
-    return cell;
+    return unpack_cell(texelFetch(u_read_cell.handles[chunk_index], position, 0));
 }
 
 
 void write_cell(ivec3 position, Cell cell) {
     int chunk_index = 0;
-    uvec4 packed_cell = uvec4(0u);
-
-    packed_cell.r = uint(cell.filled_units);
-
-    imageStore(u_write_cell.handles[chunk_index], position, packed_cell);
+    imageStore(u_write_cell.handles[chunk_index], position, pack_cell(cell, position));
 }
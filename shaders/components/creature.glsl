@@ -0,0 +1,113 @@
+const int creature_capacity = creature_capacity_placeholder;
+const int creature_group_size = creature_group_size_placeholder;
+const int creature_sensor_count = creature_sensor_count_placeholder;
+
+// Биты состояния существа
+const uint creature_alive = 1u;
+// Существо создано в текущем тике, его слот еще может содержать нейронную сеть прошлого владельца
+const uint creature_newborn = 2u;
+// Значение u_creature_spawned_slots для неудавшегося создания
+const uint creature_no_slot = 0xFFFFFFFFu;
+
+
+// Существа хранятся как структура массивов: каждое ядро читает только нужные ему поля.
+// Индекс в массивах - слот существа, свободные слоты переиспользуются через стек u_creature_free_slots.
+// Количество буферов в одной программе ограничено (GL_MAX_COMPUTE_SHADER_STORAGE_BLOCKS, часто 16),
+// поэтому ядро может объявить creature_buffer_subset и подключить только буферы creature_use_<поле>
+#if !defined(creature_buffer_subset) || defined(creature_use_positions)
+// xyz - позиция в координатах ячеек, w - не используется
+layout(std430, binding = 30) restrict buffer CreaturePositions {
+    vec4 data[];
+} u_creature_positions;
+#endif
+#if !defined(creature_buffer_subset) || defined(creature_use_velocities)
+// xyz - скорость в ячейках за тик, w - не используется
+layout(std430, binding = 31) restrict buffer CreatureVelocities {
+    vec4 data[];
+} u_creature_velocities;
+#endif
+#if !defined(creature_buffer_subset) || defined(creature_use_energies)
+layout(std430, binding = 32) restrict buffer CreatureEnergies {
+    float data[];
+} u_creature_energies;
+#endif
+#if !defined(creature_buffer_subset) || defined(creature_use_states)
+layout(std430, binding = 33) restrict buffer CreatureStates {
+    uint data[];
+} u_creature_states;
+#endif
+#if !defined(creature_buffer_subset) || defined(creature_use_cells)
+// Индекс ячейки, в которой находится существо, и его порядковый номер в ней
+layout(std430, binding = 34) restrict buffer CreatureCells {
+    uint data[];
+} u_creature_cells;
+#endif
+#if !defined(creature_buffer_subset) || defined(creature_use_ranks)
+layout(std430, binding = 35) restrict buffer CreatureRanks {
+    uint data[];
+} u_creature_ranks;
+#endif
+
+#if !defined(creature_buffer_subset) || defined(creature_use_free_slots)
+layout(std430, binding = 36) restrict buffer CreatureFreeSlots {
+    uint data[];
+} u_creature_free_slots;
+#endif
+#if !defined(creature_buffer_subset) || defined(creature_use_counters)
+layout(std430, binding = 37) restrict buffer CreatureCounters {
+// Количество свободных слотов - вершина стека u_creature_free_slots
+    int free_count;
+    int padding_0;
+    int padding_1;
+    int padding_2;
+} u_creature_counters;
+#endif
+
+#if !defined(creature_buffer_subset) || defined(creature_use_appetites)
+// Желание поглощать вещество - [0; 1]
+layout(std430, binding = 42) restrict buffer CreatureAppetites {
+    float data[];
+} u_creature_appetites;
+#endif
+#if !defined(creature_buffer_subset) || defined(creature_use_spawned_slots)
+// Слоты, выделенные заявкам на создание в текущем тике
+layout(std430, binding = 43) restrict buffer CreatureSpawnedSlots {
+    uint data[];
+} u_creature_spawned_slots;
+#endif
+
+#if !defined(creature_buffer_subset) || defined(creature_use_sensors)
+// Значения сенсоров, creature_sensor_count на существо
+layout(std430, binding = 39) restrict buffer CreatureSensors {
+    float data[];
+} u_creature_sensors;
+#endif
+
+#if !defined(creature_buffer_subset) || defined(creature_use_grid_offsets)
+// Сетка существ по ячейкам мира.
+// Сначала - количество существ в каждой ячейке, после префиксной суммы - смещение первого существа ячейки в u_creature_grid.
+// Дополнительный последний элемент после префиксной суммы равен общему количеству существ
+layout(std430, binding = 40) restrict buffer CreatureGridOffsets {
+    uint data[];
+} u_creature_grid_offsets;
+#endif
+#if !defined(creature_buffer_subset) || defined(creature_use_grid)
+// Слоты существ, отсортированные по ячейкам
+layout(std430, binding = 41) restrict buffer CreatureGrid {
+    uint data[];
+} u_creature_grid;
+#endif
+
+
+#if !defined(creature_buffer_subset) || defined(creature_use_states)
+bool is_creature_alive(uint slot) {
+    return (u_creature_states.data[slot] & creature_alive) != 0u;
+}
+#endif
+
+
+// Сенсоры
+const int creature_sensor_fill = 0;
+const int creature_sensor_food = 1;
+const int creature_sensor_crowding = 2;
+const int creature_sensor_energy = 3;
@@ -0,0 +1,77 @@
+// Поле тяготения пакета миров: потенциал из уравнения Пуассона (лапласиан потенциала - 4 pi G на плотность),
+// решаемого геометрическим многосеточным методом (simulator/gravity.py).
+// Уровень 0 - ячейки мира, каждый следующий уровень вдвое грубее по каждой оси, шаг уровня level - 2^level ячеек.
+// На каждом уровне две копии потенциала (сглаживание читает одну и пишет другую) и правая часть уравнения.
+// За границей мира потенциал равен 0, поэтому миры пакета, лежащие друг за другом по оси z, не притягивают друг друга
+const int gravity_level_count = gravity_level_count_placeholder;
+// false - тяготение задается постоянным вектором мира (WorldParameters.gravity_vector)
+const bool gravity_field = bool(gravity_field_placeholder);
+
+
+// Должен совпадать с GravityField из simulator/gravity.py
+layout(std430, binding = 23) readonly restrict buffer GravityField {
+    sampler3D potentials[gravity_level_count * 2];
+    sampler3D sources[gravity_level_count];
+    writeonly image3D potential_images[gravity_level_count * 2];
+    writeonly image3D source_images[gravity_level_count];
+} u_gravity_field;
+
+
+ivec3 get_gravity_world_shape(int level) {
+    return world_shape >> level;
+}
+
+
+int get_gravity_world_index(ivec3 position, int level) {
+    return position.z / get_gravity_world_shape(level).z;
+}
+
+
+// Тексел уровня принадлежит миру пакета world_index
+bool is_in_gravity_world(ivec3 position, int level, int world_index) {
+    ivec3 shape = get_gravity_world_shape(level);
+    return all(greaterThanEqual(position, ivec3(0)))
+        && position.x < shape.x
+        && position.y < shape.y
+        && position.z < shape.z * world_batch_size
+        && position.z / shape.z == world_index;
+}
+
+
+// Потенциал копии copy уровня level, 0 за границей мира world_index
+float read_potential(ivec3 position, int level, int copy, int world_index) {
+    if (!is_in_gravity_world(position, level, world_index)) {
+        return 0.0;
+    }
+    return texelFetch(u_gravity_field.potentials[level * 2 + copy], position, 0).x;
+}
+
+
+void write_potential(ivec3 position, int level, int copy, float potential) {
+    imageStore(u_gravity_field.potential_images[level * 2 + copy], position, vec4(potential));
+}
+
+
+float read_gravity_source(ivec3 position, int level) {
+    return texelFetch(u_gravity_field.sources[level], position, 0).x;
+}
+
+
+void write_gravity_source(ivec3 position, int level, float source) {
+    imageStore(u_gravity_field.source_images[level], position, vec4(source));
+}
+
+
+// Ускорение в ячейке - минус градиент решения (копия 0 уровня 0), центральная разность
+vec3 get_gravity_acceleration(ivec3 cell_position) {
+    int world_index = get_gravity_world_index(cell_position, 0);
+    vec3 gradient = vec3(
+        read_potential(cell_position + ivec3(1, 0, 0), 0, 0, world_index)
+            - read_potential(cell_position - ivec3(1, 0, 0), 0, 0, world_index),
+        read_potential(cell_position + ivec3(0, 1, 0), 0, 0, world_index)
+            - read_potential(cell_position - ivec3(0, 1, 0), 0, 0, world_index),
+        read_potential(cell_position + ivec3(0, 0, 1), 0, 0, world_index)
+            - read_potential(cell_position - ivec3(0, 0, 1), 0, 0, world_index)
+    ) / 2.0;
+    return -gradient;
+}
@@ -0,0 +1,117 @@
+// Нейронные сети существ.
+// У каждого слота существа есть блок из neural_neuron_count нейронов, первые neural_output_count из них - выходы.
+// Входы нейронов хранятся как CSR: для нейрона n его входы - u_edges.data[u_edge_offsets.data[n]; u_edge_offsets.data[n + 1])
+const int neural_neuron_count = neural_neuron_count_placeholder;
+const int neural_edge_capacity = neural_edge_capacity_placeholder;
+const int neural_append_capacity = neural_append_capacity_placeholder;
+const int neural_total_neurons = creature_capacity * neural_neuron_count;
+
+// Выходы сети, количество должно совпадать с NeuralNetworks.OUTPUT_COUNT
+// 0-2 - скорость по x, y, z
+const int neural_output_velocity = 0;
+const int neural_output_appetite = 3;
+const int neural_output_count = 4;
+
+// Источник входа удаленной связи, такие связи выбрасываются при уплотнении
+const int neural_edge_dead = -2147483647 - 1;
+
+
+// source >= 0 - номер нейрона внутри сети существа, source < 0 - сенсор (-source - 1)
+struct Edge {
+    int source;
+    float weight;
+};
+
+
+// Связь, добавленная после последнего уплотнения
+struct AppendedEdge {
+    uint neuron;
+    int source;
+    float weight;
+// Место среди входов нейрона, вычисляется при уплотнении
+    uint rank;
+};
+
+
+// Как и в creature.glsl, ядро может объявить neural_buffer_subset и подключить только буферы neural_use_<имя>
+#if !defined(neural_buffer_subset) || defined(neural_use_network_sizes)
+// Количество нейронов в сети существа
+layout(std430, binding = 44) restrict buffer NetworkSizes {
+    uint data[];
+} u_network_sizes;
+#endif
+#if !defined(neural_buffer_subset) || defined(neural_use_neuron_biases)
+layout(std430, binding = 45) restrict buffer NeuronBiases {
+    float data[];
+} u_neuron_biases;
+#endif
+#if !defined(neural_buffer_subset) || defined(neural_use_neuron_states)
+// Двойной буфер: neural_total_neurons значений для четного тика, затем столько же для нечетного
+layout(std430, binding = 46) restrict buffer NeuronStates {
+    float data[];
+} u_neuron_states;
+#endif
+#if !defined(neural_buffer_subset) || defined(neural_use_edge_offsets)
+// neural_total_neurons + 1 значений
+layout(std430, binding = 47) restrict buffer EdgeOffsets {
+    uint data[];
+} u_edge_offsets;
+#endif
+#if !defined(neural_buffer_subset) || defined(neural_use_edges)
+layout(std430, binding = 48) restrict buffer Edges {
+    Edge data[];
+} u_edges;
+#endif
+#if !defined(neural_buffer_subset) || defined(neural_use_compacted_edges)
+layout(std430, binding = 49) restrict buffer CompactedEdges {
+    Edge data[];
+} u_compacted_edges;
+#endif
+#if !defined(neural_buffer_subset) || defined(neural_use_appended_edges)
+layout(std430, binding = 50) restrict buffer AppendedEdges {
+    AppendedEdge data[];
+} u_appended_edges;
+#endif
+#if !defined(neural_buffer_subset) || defined(neural_use_counters)
+layout(std430, binding = 51) restrict buffer NeuralCounters {
+// Может превышать neural_append_capacity, лишние связи отбрасываются
+    int append_count;
+    int padding_0;
+    int padding_1;
+    int padding_2;
+} u_neural_counters;
+#endif
+#if !defined(neural_buffer_subset) || defined(neural_use_compacted_edge_offsets)
+// Количество входов каждого нейрона после уплотнения, а после префиксной суммы - новые u_edge_offsets
+layout(std430, binding = 52) restrict buffer CompactedEdgeOffsets {
+    uint data[];
+} u_compacted_edge_offsets;
+#endif
+
+
+#if (!defined(creature_buffer_subset) || defined(creature_use_states)) && (!defined(neural_buffer_subset) || defined(neural_use_network_sizes))
+// Нейрон участвует в уплотнении, если существо живо, а его сеть не осталась от прошлого владельца слота
+bool is_neuron_kept(int neuron) {
+    uint slot = uint(neuron / neural_neuron_count);
+    uint state = u_creature_states.data[slot];
+    bool alive = (state & creature_alive) != 0u && (state & creature_newborn) == 0u;
+    return alive && uint(neuron % neural_neuron_count) < u_network_sizes.data[slot];
+}
+#endif
+
+
+#if !defined(neural_buffer_subset) || defined(neural_use_appended_edges) && defined(neural_use_counters)
+// Добавляет связь, если есть место
+void append_edge(int neuron, int source, float weight) {
+    int index = atomicAdd(u_neural_counters.append_count, 1);
+    if (index < neural_append_capacity) {
+        u_appended_edges.data[index] = AppendedEdge(uint(neuron), source, weight, 0u);
+    }
+}
+#endif
+
+
+// Случайный источник входа: нейрон той же сети или сенсор
+int random_edge_source(uint random) {
+    return int(random % uint(neural_neuron_count + creature_sensor_count)) - creature_sensor_count;
+}
@@ -0,0 +1,55 @@
+// Объем оптики первого мира пакета с цепочкой уровней детализации.
+// Тексел уровня 0 - оптика ячейки (get_cell_optics), тексел уровня level - среднее 2 x 2 x 2 текселей уровня level - 1,
+// то есть оптика куба из 2^level ячеек. Цвет и непрозрачность считаются из оптики по закону Бугера-Ламберта,
+// поэтому луч, прошедший куб насквозь, теряет почти столько же света, сколько потерял бы в его ячейках
+const int optics_level_count = optics_level_count_placeholder;
+
+
+// Должен совпадать с OpticsVolume из simulator/optics.py
+layout(std430, binding = 21) readonly restrict buffer OpticsVolume {
+    sampler3D levels;
+    writeonly image3D level_images[optics_level_count];
+} u_optics_volume;
+
+
+vec4 read_optics(ivec3 position, int level) {
+    return texelFetch(u_optics_volume.levels, position, level);
+}
+
+
+void write_optics(ivec3 position, int level, vec4 optics) {
+    imageStore(u_optics_volume.level_images[level], position, optics);
+}
+
+
+// Форма уровня level в текселях
+ivec3 get_optics_level_shape(int level) {
+    return textureSize(u_optics_volume.levels, level);
+}
+
+
+// Самый грубый уровень, ячейка которого не больше footprint ячеек мира
+int get_optics_level(float footprint) {
+    return clamp(int(floor(log2(max(footprint, 1.0)))), 0, optics_level_count - 1);
+}
+
+
+// Цвет и непрозрачность участка луча длиной distance внутри тексела с оптикой optics
+vec4 get_optics_color(vec4 optics, float distance) {
+    if (optics.w <= 0.0) {
+        return vec4(0.0);
+    }
+    vec3 rgb = sqrt(optics.rgb / optics.w);
+    float opacity = 1.0 - exp(-optics.w * distance);
+    return vec4(rgb, opacity);
+}
+
+
+// Смешивает цвет участка луча с уже накопленным (спереди назад). Возвращает true, когда луч стал непрозрачным
+bool blend_optics_color(inout vec4 ray_color, vec4 cell_color) {
+    if (cell_color.a > 0.01) {
+        float alpha = cell_color.a * (1.0 - ray_color.a);
+        ray_color += vec4(cell_color.rgb * alpha, alpha);
+    }
+    return ray_color.a >= 0.99;
+}
@@ -0,0 +1,49 @@
+struct Reaction {
+// Продукт меньшего реагента - [0; 15], продукт большего реагента - [16; 31]
+    uint products;
+// Порог для 16-битного случайного числа - [0; 65536], 0 у пустой реакции
+    uint threshold;
+};
+
+
+// Должен совпадать с ReactionTable из simulator/reaction.py.
+// Хэш-таблица с открытой адресацией: запись - ключ пары (0 - свободная запись), продукты, порог и пустое слово
+layout(std430, binding = 12) readonly restrict buffer ReactionBuffer {
+    // 32 - log2(количество записей)
+    uint shift;
+    uint padding[3];
+    uvec4 entries[];
+} u_reaction_buffer;
+
+
+// Должна совпадать с ReactionTable.get_key и ReactionTable.get_slot.
+// Таблица заполнена не больше чем на четверть, поэтому цикл почти всегда завершается первой выборкой.
+// Пара без реакции (в том числе Vacuum с ключом 0) находит свободную запись с нулевым порогом
+Reaction read_reaction(int substance_0, int substance_1) {
+    uint key = uint(min(substance_0, substance_1)) | uint(max(substance_0, substance_1)) << 16;
+    uint mask = (1u << (32u - u_reaction_buffer.shift)) - 1u;
+    uint slot = (key * 2654435769u) >> u_reaction_buffer.shift;
+    uvec4 entry = u_reaction_buffer.entries[slot];
+    while (entry.x != key && entry.x != 0u) {
+        slot = (slot + 1u) & mask;
+        entry = u_reaction_buffer.entries[slot];
+    }
+    return entry.x == key ? Reaction(entry.y, entry.z) : Reaction(0u, 0u);
+}
+
+
+// Реакция пары юнитов одной ячейки. Без ветвлений: у пустой реакции нулевой порог и она никогда не происходит
+void react(inout Unit unit_0, inout Unit unit_1, uint random) {
+    Reaction reaction = read_reaction(unit_0.substance_id, unit_1.substance_id);
+
+    // Продукты хранятся в порядке (меньший реагент, больший реагент)
+    bool swapped = unit_0.substance_id > unit_1.substance_id;
+    int product_low = int(bitfieldExtract(reaction.products, 0, 16));
+    int product_high = int(bitfieldExtract(reaction.products, 16, 16));
+    bool happened = (random & mask_16) < reaction.threshold;
+
+    int product_0 = swapped ? product_high : product_low;
+    int product_1 = swapped ? product_low : product_high;
+    unit_0.substance_id = happened ? product_0 : unit_0.substance_id;
+    unit_1.substance_id = happened ? product_1 : unit_1.substance_id;
+}
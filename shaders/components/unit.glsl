@@ -6,19 +6,7 @@ layout(std430, binding = 5) writeonly restrict buffer WriteUnit {
 } u_write_unit;
 
 
-struct Unit {
-    int substance_id;// 14 - [-8192; 8191]
-    int quantity;// 10 - [0; 1023]
-// Импульс всего юнита
-    ivec3 momentum;// 16 - [-32768; 32767]
-// Заявка всегда 1/6 от импульса и количество, поэтому ее можно не хранить, можно хранить только признак ее наличия
-    bool plan;
-};
-
-
-Unit new_unit() {
-    return Unit(0, 0, ivec3(0u), false);
-}
+#include unit_layout
 
 
 ivec3 unit_index_to_position(ivec3 cell_position, int local_index) {
@@ -31,24 +19,9 @@ ivec3 unit_index_to_position(ivec3 cell_position, int local_index) {
 }
 
 
-// r - [0; 23]
-// g - [0; 29]
-// b - [0; 17]
-// a - []
 Unit read_unit_base(ivec3 position) {
     int chunk_index = 0;
-    uvec4 packed_unit = texelFetch(u_read_unit.handles[chunk_index], position, 0);
-    Unit unit;
-
-    unit.substance_id = int(bitfieldExtract(packed_unit.r, 0, 14));
-    unit.quantity = int(bitfieldExtract(packed_unit.r, 14, 10));
-
-    unit.momentum.x = int(bitfieldExtract(packed_unit.g, 0, 10) | (bitfieldExtract(packed_unit.b, 0, 6) << 10));
-    unit.momentum.y = int(bitfieldExtract(packed_unit.g, 10, 10) | (bitfieldExtract(packed_unit.b, 6, 6) << 10));
-    unit.momentum.z = int(bitfieldExtract(packed_unit.g, 20, 10) | (bitfieldExtract(packed_unit.b, 12, 6) << 10));
-    unit.momentum -= zero_offset_16;
-
-    return unit;
+    return unpack_unit(texelFetch(u_read_unit.handles[chunk_index], position, 0));
 }
 
 Unit read_unit(ivec3 global_position) {
@@ -60,23 +33,9 @@ Unit read_unit(ivec3 cell_position, int local_index) {
 }
 
 
-// todo: Внедрить проверку на переполнение упаковываемых величин, которую можно будет убирать до компиляции, в случае необходимости (макрос для проверки переполнения, который можно отключать #define) 
 void write_unit_base(ivec3 position, Unit unit) {
     int chunk_index = 0;
-    uvec4 packed_unit = uvec4(0u);
-
-    packed_unit.r = uint(unit.substance_id);
-    packed_unit.r = bitfieldInsert(packed_unit.r, uint(unit.quantity), 14, 10);
-
-    uvec3 momentum = uvec3(unit.momentum + zero_offset_16);
-    packed_unit.g = momentum.x;
-    packed_unit.g = bitfieldInsert(packed_unit.g, momentum.y, 10, 10);
-    packed_unit.g = bitfieldInsert(packed_unit.g, momentum.z, 20, 10);
-    packed_unit.b = momentum.x >> 10;
-    packed_unit.b = bitfieldInsert(packed_unit.b, momentum.y >> 10, 6, 6);
-    packed_unit.b = bitfieldInsert(packed_unit.b, momentum.z >> 10, 12, 6);
-
-    imageStore(u_write_unit.handles[chunk_index], position, packed_unit);
+    imageStore(u_write_unit.handles[chunk_index], position, pack_unit(unit, position));
 }
 
 void write_unit(ivec3 global_position, Unit unit) {
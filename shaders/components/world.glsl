@@ -0,0 +1,41 @@
+// Пакет миров: world_batch_size миров одной формы лежат друг за другом по оси z общих текстур
+// и продвигаются одним вызовом каждой стадии. Миры независимы: границы каждого замкнуты на него самого.
+// Номер мира определяется по рабочей группе, параметры мира - по номеру
+const int world_batch_size = world_batch_size_placeholder;
+
+
+// Должна совпадать с WORLD_PARAMETERS_DTYPE из world.py
+struct WorldParameters {
+    ivec3 gravity_vector;
+    int seed;
+    int age;
+    int padding_0;
+    int padding_1;
+    int padding_2;
+};
+
+layout(std430, binding = 15) readonly restrict buffer WorldParametersBuffer {
+    WorldParameters data[];
+} u_world_parameters;
+
+
+int get_world_index(ivec3 group_position) {
+    return group_position.z / world_group_shape.z;
+}
+
+
+WorldParameters read_world_parameters(int world_index) {
+    return u_world_parameters.data[world_index];
+}
+
+
+// Смещение мира в общих текстурах (в ячейках)
+ivec3 get_world_offset(int world_index) {
+    return ivec3(0, 0, world_index * world_shape.z);
+}
+
+
+// Позиция ячейки в общих текстурах по позиции в мире, с переходом через границы мира
+ivec3 wrap_world_position(ivec3 world_cell_position, int world_index) {
+    return (world_cell_position + world_shape) % world_shape + get_world_offset(world_index);
+}
@@ -16,3 +16,44 @@ const uint mask_16 = (1u << 16) - 1u;
 const uint mask_21 = (1u << 21) - 1u;
 
 const float normal_8 = float(mask_8);
+
+
+// Проверка переполнения упаковываемых величин. Включается настройкой SHADER_OVERFLOW_CHECKS,
+// в выключенном состоянии check_overflow раскрывается в пустоту и ничего не стоит.
+// Нарушения дописываются в u_overflow_reports и читаются на процессоре асинхронно (core/service/overflow.py)
+#define overflow_checks overflow_checks_placeholder
+
+// Идентификаторы полей генерируются вместе с функциями упаковки (overflow_field_<запись>_<поле>)
+
+#if overflow_checks
+const int overflow_report_capacity = overflow_report_capacity_placeholder;
+
+struct OverflowReport {
+    ivec3 position;
+    uint field;
+    int value;
+    int padding_0;
+    int padding_1;
+    int padding_2;
+};
+
+layout(std430, binding = 13) restrict buffer OverflowReports {
+// Может превышать overflow_report_capacity, лишние нарушения только подсчитываются
+    uint count;
+    uint padding_0;
+    uint padding_1;
+    uint padding_2;
+    OverflowReport data[];
+} u_overflow_reports;
+
+void report_overflow(uint field, ivec3 position, int value) {
+    uint index = atomicAdd(u_overflow_reports.count, 1u);
+    if (index < uint(overflow_report_capacity)) {
+        u_overflow_reports.data[index] = OverflowReport(position, field, value, 0, 0, 0);
+    }
+}
+
+#define check_overflow(field, position, value, minimum, maximum) if ((value) < (minimum) || (value) > (maximum)) { report_overflow(field, position, value); }
+#else
+#define check_overflow(field, position, value, minimum, maximum)
+#endif
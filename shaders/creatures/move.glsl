@@ -0,0 +1,45 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include packing_constants
+
+#include cell_component
+#include creature_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+uniform int u_world_update_period;
+uniform float u_creature_metabolism;
+
+
+// Перемещает существ, возвращает слоты умерших в стек свободных и считает существ в каждой ячейке
+void main() {
+    uint slot = gl_GlobalInvocationID.x;
+    if (slot >= creature_capacity || !is_creature_alive(slot)) {
+        return;
+    }
+
+    float energy = u_creature_energies.data[slot] - u_creature_metabolism * float(u_world_update_period);
+    if (energy <= 0.0) {
+        u_creature_states.data[slot] = 0u;
+        int top = atomicAdd(u_creature_counters.free_count, 1);
+        u_creature_free_slots.data[top] = slot;
+        return;
+    }
+
+    // Мир замкнут, как и в физических стадиях
+    vec3 position = u_creature_positions.data[slot].xyz + u_creature_velocities.data[slot].xyz * float(u_world_update_period);
+    position = mod(position, vec3(world_shape));
+    // mod для чисел с плавающей точкой может вернуть ровно world_shape
+    ivec3 cell_position = clamp(ivec3(floor(position)), world_min, world_max);
+    uint cell_index = uint(cell_position_to_index(cell_position));
+
+    u_creature_positions.data[slot].xyz = position;
+    u_creature_energies.data[slot] = energy;
+    u_creature_cells.data[slot] = cell_index;
+    u_creature_ranks.data[slot] = atomicAdd(u_creature_grid_offsets.data[cell_index], 1u);
+}
@@ -0,0 +1,19 @@
+#version 460
+
+
+#include creature_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+// Раскладывает существ по ячейкам сетки. Место в ячейке получено в move.glsl, поэтому атомарные операции не нужны
+void main() {
+    uint slot = gl_GlobalInvocationID.x;
+    if (slot >= creature_capacity || !is_creature_alive(slot)) {
+        return;
+    }
+
+    uint cell_index = u_creature_cells.data[slot];
+    u_creature_grid.data[u_creature_grid_offsets.data[cell_index] + u_creature_ranks.data[slot]] = slot;
+}
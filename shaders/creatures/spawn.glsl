@@ -0,0 +1,48 @@
+#version 460
+
+
+#include creature_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+struct CreatureSpawn {
+// w - начальная энергия
+    vec4 position;
+    vec4 velocity;
+};
+
+
+layout(std430, binding = 38) readonly restrict buffer CreatureSpawns {
+    CreatureSpawn data[];
+} u_creature_spawns;
+
+
+uniform int u_spawn_count;
+
+
+void main() {
+    int request = int(gl_GlobalInvocationID.x);
+    if (request >= u_spawn_count) {
+        return;
+    }
+
+    // Снятие слота с вершины стека свободных слотов.
+    // Если стек пуст, счетчик возвращается обратно, а существо не создается
+    int top = atomicAdd(u_creature_counters.free_count, -1);
+    if (top <= 0) {
+        atomicAdd(u_creature_counters.free_count, 1);
+        u_creature_spawned_slots.data[request] = creature_no_slot;
+        return;
+    }
+    uint slot = u_creature_free_slots.data[top - 1];
+    u_creature_spawned_slots.data[request] = slot;
+
+    CreatureSpawn spawn = u_creature_spawns.data[request];
+    u_creature_positions.data[slot] = vec4(spawn.position.xyz, 0.0);
+    u_creature_velocities.data[slot] = vec4(spawn.velocity.xyz, 0.0);
+    u_creature_energies.data[slot] = spawn.position.w;
+    u_creature_appetites.data[slot] = 1.0;
+    u_creature_states.data[slot] = creature_alive | creature_newborn;
+}
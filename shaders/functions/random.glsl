@@ -0,0 +1,24 @@
+// PCG-хэш, https://www.jcgt.org/published/0009/03/02/
+uint hash(uint value) {
+    uint state = value * 747796405u + 2891336453u;
+    uint word = ((state >> ((state >> 28u) + 4u)) ^ state) * 277803737u;
+    return (word >> 22u) ^ word;
+}
+
+uint hash(uvec2 value) {
+    return hash(value.x ^ hash(value.y));
+}
+
+uint hash(uvec3 value) {
+    return hash(value.x ^ hash(value.y ^ hash(value.z)));
+}
+
+uint hash(uvec4 value) {
+    return hash(value.x ^ hash(value.y ^ hash(value.z ^ hash(value.w))));
+}
+
+
+// Равномерно распределенное число в [0; 1)
+float hash_to_unit(uint value) {
+    return float(value >> 8) / float(1u << 24);
+}
@@ -0,0 +1,34 @@
+#version 460
+
+
+#define creature_buffer_subset
+#define creature_use_states
+#define neural_buffer_subset
+#define neural_use_compacted_edge_offsets
+#define neural_use_edge_offsets
+#define neural_use_edges
+#define neural_use_network_sizes
+#include creature_component
+#include neural_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+// Уплотнение, шаг 1: количество сохраняемых входов каждого нейрона
+void main() {
+    int neuron = int(gl_GlobalInvocationID.x);
+    if (neuron >= neural_total_neurons) {
+        return;
+    }
+
+    uint count = 0u;
+    if (is_neuron_kept(neuron)) {
+        uint edge_start = u_edge_offsets.data[neuron];
+        uint edge_end = min(u_edge_offsets.data[neuron + 1], uint(neural_edge_capacity));
+        for (uint edge_index = edge_start; edge_index < edge_end; edge_index++) {
+            count += uint(u_edges.data[edge_index].source != neural_edge_dead);
+        }
+    }
+    u_compacted_edge_offsets.data[neuron] = count;
+}
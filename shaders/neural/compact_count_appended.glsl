@@ -0,0 +1,31 @@
+#version 460
+
+
+#define creature_buffer_subset
+#define creature_use_states
+#define neural_buffer_subset
+#define neural_use_appended_edges
+#define neural_use_compacted_edge_offsets
+#define neural_use_counters
+#include creature_component
+#include neural_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+// Значение rank для связей, которые не попадут в сеть
+const uint neural_no_rank = 0xFFFFFFFFu;
+
+
+// Уплотнение, шаг 2: добавленные связи встают после сохраненных входов своего нейрона
+void main() {
+    int index = int(gl_GlobalInvocationID.x);
+    if (index >= min(u_neural_counters.append_count, neural_append_capacity)) {
+        return;
+    }
+
+    AppendedEdge edge = u_appended_edges.data[index];
+    bool alive = is_creature_alive(edge.neuron / uint(neural_neuron_count));
+    u_appended_edges.data[index].rank = alive ? atomicAdd(u_compacted_edge_offsets.data[edge.neuron], 1u) : neural_no_rank;
+}
@@ -0,0 +1,36 @@
+#version 460
+
+
+#define creature_buffer_subset
+#define creature_use_states
+#define neural_buffer_subset
+#define neural_use_compacted_edge_offsets
+#define neural_use_compacted_edges
+#define neural_use_edge_offsets
+#define neural_use_edges
+#define neural_use_network_sizes
+#include creature_component
+#include neural_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+// Уплотнение, шаг 3 (после префиксной суммы): перенос сохраняемых входов в новый массив связей
+void main() {
+    int neuron = int(gl_GlobalInvocationID.x);
+    if (neuron >= neural_total_neurons || !is_neuron_kept(neuron)) {
+        return;
+    }
+
+    uint target = u_compacted_edge_offsets.data[neuron];
+    uint edge_start = u_edge_offsets.data[neuron];
+    uint edge_end = min(u_edge_offsets.data[neuron + 1], uint(neural_edge_capacity));
+    for (uint edge_index = edge_start; edge_index < edge_end && target < uint(neural_edge_capacity); edge_index++) {
+        Edge edge = u_edges.data[edge_index];
+        if (edge.source != neural_edge_dead) {
+            u_compacted_edges.data[target] = edge;
+            target++;
+        }
+    }
+}
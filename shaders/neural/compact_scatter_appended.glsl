@@ -0,0 +1,35 @@
+#version 460
+
+
+#define creature_buffer_subset
+#define neural_buffer_subset
+#define neural_use_appended_edges
+#define neural_use_compacted_edge_offsets
+#define neural_use_compacted_edges
+#define neural_use_counters
+#include creature_component
+#include neural_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+const uint neural_no_rank = 0xFFFFFFFFu;
+
+
+// Уплотнение, шаг 4: перенос добавленных связей на места, полученные на шаге 2
+void main() {
+    int index = int(gl_GlobalInvocationID.x);
+    if (index >= min(u_neural_counters.append_count, neural_append_capacity)) {
+        return;
+    }
+
+    AppendedEdge edge = u_appended_edges.data[index];
+    if (edge.rank == neural_no_rank) {
+        return;
+    }
+    uint target = u_compacted_edge_offsets.data[edge.neuron] + edge.rank;
+    if (target < uint(neural_edge_capacity)) {
+        u_compacted_edges.data[target] = Edge(edge.source, edge.weight);
+    }
+}
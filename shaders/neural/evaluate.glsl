@@ -0,0 +1,71 @@
+#version 460
+
+
+#define creature_buffer_subset
+#define creature_use_appetites
+#define creature_use_sensors
+#define creature_use_states
+#define creature_use_velocities
+#define neural_buffer_subset
+#define neural_use_edge_offsets
+#define neural_use_edges
+#define neural_use_network_sizes
+#define neural_use_neuron_biases
+#define neural_use_neuron_states
+#include creature_component
+#include neural_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+// Четность тика: из какой половины u_neuron_states читать
+uniform int u_state_parity;
+uniform float u_creature_max_speed;
+
+
+// Продвигает все сети на один шаг. Состояния читаются из одной половины двойного буфера, а пишутся в другую,
+// поэтому сигнал проходит ровно одну связь за тик - как при обработке сети, начиная с выходов
+void main() {
+    int neuron = int(gl_GlobalInvocationID.x);
+    if (neuron >= neural_total_neurons) {
+        return;
+    }
+    uint slot = uint(neuron / neural_neuron_count);
+    int local_neuron = neuron % neural_neuron_count;
+    if (!is_creature_alive(slot) || uint(local_neuron) >= u_network_sizes.data[slot]) {
+        return;
+    }
+
+    int read_offset = u_state_parity * neural_total_neurons;
+    int write_offset = (1 - u_state_parity) * neural_total_neurons;
+    int network_start = int(slot) * neural_neuron_count;
+    uint sensor_start = slot * uint(creature_sensor_count);
+
+    uint edge_start = u_edge_offsets.data[neuron];
+    uint edge_end = min(u_edge_offsets.data[neuron + 1], uint(neural_edge_capacity));
+    float sum = u_neuron_biases.data[neuron];
+    for (uint edge_index = edge_start; edge_index < edge_end; edge_index++) {
+        Edge edge = u_edges.data[edge_index];
+        // Вместо ветвления читаются оба источника
+        int neuron_source = clamp(edge.source, 0, neural_neuron_count - 1);
+        int sensor_source = clamp(-edge.source - 1, 0, creature_sensor_count - 1);
+        float neuron_value = u_neuron_states.data[read_offset + network_start + neuron_source];
+        float sensor_value = u_creature_sensors.data[sensor_start + uint(sensor_source)];
+        sum += edge.weight * (edge.source >= 0 ? neuron_value : sensor_value);
+    }
+
+    float activation = tanh(sum);
+    u_neuron_states.data[write_offset + neuron] = activation;
+
+    if (local_neuron < neural_output_velocity + 3) {
+        u_creature_velocities.data[slot][local_neuron - neural_output_velocity] = activation * u_creature_max_speed;
+    } else if (local_neuron == neural_output_appetite) {
+        u_creature_appetites.data[slot] = activation * 0.5 + 0.5;
+    }
+
+    // Уплотнение для новой сети уже выполнено
+    if (local_neuron == 0) {
+        u_creature_states.data[slot] &= ~creature_newborn;
+    }
+}
@@ -0,0 +1,66 @@
+#version 460
+
+
+#include random_functions
+
+#define creature_buffer_subset
+#define creature_use_states
+#define neural_buffer_subset
+#define neural_use_appended_edges
+#define neural_use_counters
+#define neural_use_edge_offsets
+#define neural_use_edges
+#define neural_use_network_sizes
+#define neural_use_neuron_biases
+#include creature_component
+#include neural_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+uniform int u_seed;
+// Вероятности изменения веса, удаления связи и добавления связи
+uniform float u_weight_mutation;
+uniform float u_edge_removal;
+uniform float u_edge_addition;
+// Максимальное изменение веса или смещения
+uniform float u_mutation_strength;
+
+
+// Меняет веса и смещения, помечает связи удаленными и добавляет новые.
+// Изменение топологии применяется последующим уплотнением
+void main() {
+    int neuron = int(gl_GlobalInvocationID.x);
+    if (neuron >= neural_total_neurons || !is_neuron_kept(neuron)) {
+        return;
+    }
+
+    uint random = hash(uvec3(uint(neuron), uint(u_seed), 1u));
+    uint edge_start = u_edge_offsets.data[neuron];
+    uint edge_end = min(u_edge_offsets.data[neuron + 1], uint(neural_edge_capacity));
+    for (uint edge_index = edge_start; edge_index < edge_end; edge_index++) {
+        Edge edge = u_edges.data[edge_index];
+
+        random = hash(random);
+        float change = (hash_to_unit(hash(random)) * 2.0 - 1.0) * u_mutation_strength;
+        edge.weight += hash_to_unit(random) < u_weight_mutation ? change : 0.0;
+
+        random = hash(random);
+        edge.source = hash_to_unit(random) < u_edge_removal ? neural_edge_dead : edge.source;
+
+        u_edges.data[edge_index] = edge;
+    }
+
+    random = hash(random);
+    float change = (hash_to_unit(hash(random)) * 2.0 - 1.0) * u_mutation_strength;
+    u_neuron_biases.data[neuron] += hash_to_unit(random) < u_weight_mutation ? change : 0.0;
+
+    random = hash(random);
+    if (hash_to_unit(random) < u_edge_addition) {
+        random = hash(random);
+        int source = random_edge_source(random);
+        random = hash(random);
+        append_edge(neuron, source, hash_to_unit(random) * 2.0 - 1.0);
+    }
+}
@@ -0,0 +1,59 @@
+#version 460
+
+
+#include random_functions
+
+#define creature_buffer_subset
+#define creature_use_sensors
+#define creature_use_spawned_slots
+#define neural_buffer_subset
+#define neural_use_appended_edges
+#define neural_use_counters
+#define neural_use_network_sizes
+#define neural_use_neuron_biases
+#define neural_use_neuron_states
+#include creature_component
+#include neural_component
+
+
+layout(local_size_x = creature_group_size) in;
+
+
+uniform int u_spawn_count;
+uniform int u_seed;
+uniform int u_initial_edges;
+
+
+// Создает случайные сети новым существам. Один вызов - один нейрон новой сети
+void main() {
+    int request = int(gl_GlobalInvocationID.x) / neural_neuron_count;
+    int local_neuron = int(gl_GlobalInvocationID.x) % neural_neuron_count;
+    if (request >= u_spawn_count) {
+        return;
+    }
+    uint slot = u_creature_spawned_slots.data[request];
+    if (slot == creature_no_slot) {
+        return;
+    }
+
+    int neuron = int(slot) * neural_neuron_count + local_neuron;
+    uint random = hash(uvec3(uint(neuron), uint(u_seed), 0u));
+
+    u_neuron_states.data[neuron] = 0.0;
+    u_neuron_states.data[neural_total_neurons + neuron] = 0.0;
+    u_neuron_biases.data[neuron] = hash_to_unit(random) * 2.0 - 1.0;
+    if (local_neuron == 0) {
+        u_network_sizes.data[slot] = uint(neural_neuron_count);
+    }
+    if (local_neuron < creature_sensor_count) {
+        u_creature_sensors.data[slot * uint(creature_sensor_count) + uint(local_neuron)] = 0.0;
+    }
+
+    // Входы попадут в сеть при ближайшем уплотнении
+    for (int edge = 0; edge < u_initial_edges; edge++) {
+        random = hash(random);
+        int source = random_edge_source(random);
+        random = hash(random);
+        append_edge(neuron, source, hash_to_unit(random) * 2.0 - 1.0);
+    }
+}
@@ -9,19 +9,27 @@
 #include cell_component
 #include unit_component
 #include substance_component
+#include world_component
 
 
 layout(local_size_x = cell_group_shape.x, local_size_y = cell_group_shape.y, local_size_z = cell_group_shape.z) in;
 
 
+// Буфер веществ выделяется с запасом, поэтому его длина не равна количеству веществ
+uniform int u_substance_count;
+
+
 void main() {
     ivec3 cell_position = ivec3(gl_GlobalInvocationID);
-    int substance_count = u_substance_buffer.data.length();
+    // Все миры пакета создаются одинаковыми
+    ivec3 world_cell_position = cell_position - get_world_offset(get_world_index(ivec3(gl_WorkGroupID)));
+    // Vacuum (индекс 0) в слои планеты не входит
+    int layer_count = u_substance_count - 1;
 
     float sphere_radius = float(min(world_shape.x, min(world_shape.y, world_shape.z))) / 2.0;
-    float radius = distance(vec3(cell_position), vec3(world_shape) / 2.0);
+    float radius = distance(vec3(world_cell_position), vec3(world_shape) / 2.0);
     float normalized_radius = radius / sphere_radius;
-    int layer = clamp(int(float(substance_count - 1) * normalized_radius), 0, substance_count - 1) + 1;
+    int layer = clamp(int(float(layer_count) * normalized_radius), 0, layer_count - 1) + 1;
 
     Cell cell = new_cell();
     Unit unit = new_unit();
@@ -29,6 +37,8 @@ void main() {
     unit.quantity = int(300.0 * (sphere_radius - radius) / radius);
     unit.substance_id = unit.quantity > 0 ? layer : 0;
     cell.filled_units = unit.quantity > 0 ? 1 : 0;
+    // Количество в юните хранится в 10 битах
+    cell.total_quantity = cell.filled_units > 0 ? unit.quantity & int(mask_10) : 0;
 
     Substance substance = read_substance(unit.substance_id);
 
@@ -0,0 +1,24 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include packing_constants
+
+#include cell_component
+#include world_component
+#include gravity_field_component
+
+
+layout(local_size_x = cell_group_shape.x, local_size_y = cell_group_shape.y, local_size_z = cell_group_shape.z) in;
+
+
+// 4 pi G: количество вещества ячейки переводится в правую часть уравнения Пуассона
+uniform float u_source_scale;
+
+
+// Правая часть уровня 0: масса ячейки - сумма количеств вещества ее юнитов, хранимая в самой ячейке
+void main() {
+    ivec3 cell_position = ivec3(gl_GlobalInvocationID);
+    write_gravity_source(cell_position, 0, u_source_scale * float(read_cell(cell_position).total_quantity));
+}
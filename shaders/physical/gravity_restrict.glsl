@@ -0,0 +1,56 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+
+#include world_component
+#include gravity_field_component
+
+
+layout(local_size_x = 4, local_size_y = 4, local_size_z = 4) in;
+
+
+// Записываемый уровень, невязка считается на уровне u_level - 1 по копии потенциала u_source
+uniform int u_level;
+uniform int u_source;
+
+
+const ivec3 neighbour_offsets[6] = ivec3[6](
+ivec3(-1, 0, 0),
+ivec3(1, 0, 0),
+ivec3(0, -1, 0),
+ivec3(0, 1, 0),
+ivec3(0, 0, -1),
+ivec3(0, 0, 1)
+);
+
+
+// Невязка уравнения в текселе уровня level: правая часть минус лапласиан потенциала
+float get_residual(ivec3 position, int level, int world_index) {
+    float potential = read_potential(position, level, u_source, world_index);
+    float sum = 0.0;
+    for (int neighbour = 0; neighbour < 6; neighbour++) {
+        sum += read_potential(position + neighbour_offsets[neighbour], level, u_source, world_index);
+    }
+    float step_square = float(1 << (2 * level));
+    return read_gravity_source(position, level) - (sum - 6.0 * potential) / step_square;
+}
+
+
+// Правая часть уровня u_level - средняя невязка 8 дочерних текселей.
+// Стороны мира делятся на 2^(gravity_level_count - 1), поэтому дочерние тексели всегда есть
+void main() {
+    ivec3 position = ivec3(gl_GlobalInvocationID);
+    int world_index = get_gravity_world_index(position, u_level);
+    if (!is_in_gravity_world(position, u_level, world_index)) {
+        return;
+    }
+
+    float residual = 0.0;
+    for (int child = 0; child < 8; child++) {
+        ivec3 child_position = position * 2 + ivec3(child & 1, (child >> 1) & 1, child >> 2);
+        residual += get_residual(child_position, u_level - 1, world_index);
+    }
+    write_gravity_source(position, u_level, residual / 8.0);
+}
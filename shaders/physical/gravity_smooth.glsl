@@ -0,0 +1,125 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+
+#include world_component
+#include gravity_field_component
+
+
+layout(local_size_x = cell_group_shape.x, local_size_y = cell_group_shape.y, local_size_z = cell_group_shape.z) in;
+
+
+// Потенциал группы вместе со слоем соседних текселей
+shared float potential_cache[cell_cache_shape.x][cell_cache_shape.y][cell_cache_shape.z];
+
+
+uniform int u_level;
+// Копия потенциала с начальным приближением, результат пишется в другую
+uniform int u_source;
+// Начальное приближение 0: поправка грубого уровня решается заново каждый цикл
+uniform bool u_zero_guess;
+// Прибавить к начальному приближению поправку уровня u_level + 1 (копия 0), интерполированную трилинейно
+uniform bool u_prolongate;
+uniform int u_sweeps;
+
+
+const ivec3 neighbour_offsets[6] = ivec3[6](
+ivec3(-1, 0, 0),
+ivec3(1, 0, 0),
+ivec3(0, -1, 0),
+ivec3(0, 1, 0),
+ivec3(0, 0, -1),
+ivec3(0, 0, 1)
+);
+
+
+// Центр тексела уровня u_level лежит между центрами текселей грубого уровня с весами 3/4 и 1/4 по каждой оси
+float prolongate(ivec3 position, int world_index) {
+    ivec3 coarse_position = position >> 1;
+    ivec3 direction = (position & 1) * 2 - 1;
+    float correction = 0.0;
+    for (int corner = 0; corner < 8; corner++) {
+        ivec3 corner_offset = ivec3(corner & 1, (corner >> 1) & 1, corner >> 2);
+        vec3 weights = mix(vec3(0.75), vec3(0.25), vec3(corner_offset));
+        correction += weights.x * weights.y * weights.z
+            * read_potential(coarse_position + corner_offset * direction, u_level + 1, 0, world_index);
+    }
+    return correction;
+}
+
+
+float get_initial_potential(ivec3 position) {
+    int world_index = get_gravity_world_index(position, u_level);
+    if (!is_in_gravity_world(position, u_level, world_index)) {
+        return 0.0;
+    }
+    float potential = u_zero_guess ? 0.0 : read_potential(position, u_level, u_source, world_index);
+    if (u_prolongate) {
+        potential += prolongate(position, world_index);
+    }
+    return potential;
+}
+
+
+// Красно-черный Гаусс-Зейдель в общей памяти: группа загружает свой блок с соседним слоем
+// и выполняет u_sweeps проходов по текселям одного цвета, затем другого.
+// Соседний слой в течение вызова не обновляется, поэтому на границах блоков сглаживание - как у метода Якоби,
+// а результат не зависит от порядка выполнения групп
+void main() {
+    ivec3 group_origin = ivec3(gl_WorkGroupID) * cell_group_shape - 1;
+    int cache_index = int(gl_LocalInvocationIndex);
+    for (; cache_index < cell_cache_size; cache_index += cell_group_size) {
+        ivec3 cache_position = ivec3(
+            cache_index % cell_cache_shape.x,
+            (cache_index / cell_cache_shape.x) % cell_cache_shape.y,
+            cache_index / (cell_cache_shape.x * cell_cache_shape.y)
+        );
+        potential_cache[cache_position.x][cache_position.y][cache_position.z] = get_initial_potential(
+            group_origin + cache_position
+        );
+    }
+    memoryBarrierShared();
+    barrier();
+
+    ivec3 position = ivec3(gl_GlobalInvocationID);
+    ivec3 cache_position = ivec3(gl_LocalInvocationID) + 1;
+    int world_index = get_gravity_world_index(position, u_level);
+    bool in_world = is_in_gravity_world(position, u_level, world_index);
+    // Соседи за границей мира, в том числе из соседнего мира пакета, не входят в сумму: потенциал там 0
+    bool neighbours[6];
+    for (int neighbour = 0; neighbour < 6; neighbour++) {
+        neighbours[neighbour] = is_in_gravity_world(position + neighbour_offsets[neighbour], u_level, world_index);
+    }
+    float step_square = float(1 << (2 * u_level));
+    float source = in_world ? read_gravity_source(position, u_level) : 0.0;
+    int color = (position.x + position.y + position.z) & 1;
+
+    for (int sweep = 0; sweep < u_sweeps; sweep++) {
+        for (int sweep_color = 0; sweep_color < 2; sweep_color++) {
+            if (in_world && color == sweep_color) {
+                float sum = 0.0;
+                for (int neighbour = 0; neighbour < 6; neighbour++) {
+                    if (neighbours[neighbour]) {
+                        ivec3 neighbour_position = cache_position + neighbour_offsets[neighbour];
+                        sum += potential_cache[neighbour_position.x][neighbour_position.y][neighbour_position.z];
+                    }
+                }
+                float potential = (sum - step_square * source) / 6.0;
+                potential_cache[cache_position.x][cache_position.y][cache_position.z] = potential;
+            }
+            memoryBarrierShared();
+            barrier();
+        }
+    }
+
+    if (in_world) {
+        write_potential(
+            position,
+            u_level,
+            1 - u_source,
+            potential_cache[cache_position.x][cache_position.y][cache_position.z]
+        );
+    }
+}
@@ -5,28 +5,156 @@
 #include physical_constants
 #include packing_constants
 
+#include random_functions
+
 #include unit_component
 #include plan_component
 #include cell_component
 #include substance_component
+#include reaction_component
+#include world_component
+#include gravity_field_component
+
+#define creature_buffer_subset
+#define creature_use_energies
+#define creature_use_appetites
+#define creature_use_sensors
+#define creature_use_grid_offsets
+#define creature_use_grid
+#include creature_component
 
 
 
 layout(local_size_x = cell_group_shape.x, local_size_y = cell_group_shape.y, local_size_z = cell_group_shape.z) in;
 shared Cell cell_cache[cell_cache_shape.x][cell_cache_shape.y][cell_cache_shape.z];
+// Давление ячеек того же блока, считается один раз на ячейку при загрузке кэша
+shared float pressure_cache[cell_cache_shape.x][cell_cache_shape.y][cell_cache_shape.z];
 
 
 // Переменные, которые почти не меняются или меняются редко
 uniform int u_world_update_period;
-uniform ivec3 u_gravity_vector;
+// Коэффициент уравнения состояния, 0 - давление не действует
+uniform float u_pressure_stiffness;
+// Максимальное количество вещества, которое существо может поглотить за тик
+uniform int u_creature_consumption;
+// Энергия, получаемая от единицы массы поглощенного вещества
+uniform float u_creature_food_energy;
+uniform float u_creature_max_energy;
+
+
+// Уравнение состояния: давление пропорционально плотности (сумме количеств вещества ячейки),
+// как у газа Ван-дер-Ваальса без притяжения - юниты занимают места ячейки, и с заполнением давление растет быстрее.
+// Знаменатель не обращается в 0: мест на одно больше, чем юнитов может быть в ячейке
+float get_pressure(Cell cell) {
+    float free_volume = 1.0 - float(cell.filled_units) / float(cell_size + 1);
+    return u_pressure_stiffness * float(cell.total_quantity) / free_volume;
+}
+
+
+// Ускорение от давления - минус градиент давления (центральная разность по соседям из кэша), деленный на плотность
+vec3 get_pressure_acceleration(ivec3 cache_cell_position, Cell cell) {
+    if (cell.total_quantity == 0) {
+        return vec3(0.0);
+    }
+    vec3 gradient;
+    for (int axis = 0; axis < 3; axis++) {
+        ivec3 forward = cache_cell_position;
+        ivec3 backward = cache_cell_position;
+        forward[axis] += 1;
+        backward[axis] -= 1;
+        float forward_pressure = pressure_cache[forward.x][forward.y][forward.z];
+        float backward_pressure = pressure_cache[backward.x][backward.y][backward.z];
+        gradient[axis] = (forward_pressure - backward_pressure) / 2.0;
+    }
+    return -gradient / float(cell.total_quantity);
+}
+
+
+// Взаимодействие существ с миром: ячейка последовательно обслуживает своих существ из сетки,
+// поэтому гонок за юниты нет.
+// Существа поглощают вещество с последнего юнита ячейки, опустошенный юнит удаляется из ячейки.
+// Возвращает последний юнит после поглощения - он записывается вместе с остальными юнитами ячейки.
+// Существа живут только в первом мире пакета
+Unit feed_creatures(ivec3 global_cell_position, int world_index, inout Cell cell) {
+    Unit food = cell.filled_units > 0 ? read_unit(global_cell_position, cell.filled_units - 1) : new_unit();
+    if (world_index != 0) {
+        return food;
+    }
+
+    uint cell_index = uint(cell_position_to_index(global_cell_position));
+    uint first_creature = u_creature_grid_offsets.data[cell_index];
+    uint last_creature = u_creature_grid_offsets.data[cell_index + 1u];
+    int creature_count = int(last_creature - first_creature);
+
+    float fill = float(cell.filled_units) / float(cell_size);
+    float food_available = float(cell.total_quantity) / float(cell_size * int(mask_10));
+    float crowding = min(float(creature_count) / 32.0, 1.0);
+
+    for (uint grid_index = first_creature; grid_index < last_creature; grid_index++) {
+        uint slot = u_creature_grid.data[grid_index];
+        float energy = u_creature_energies.data[slot];
+
+        uint sensors = slot * uint(creature_sensor_count);
+        u_creature_sensors.data[sensors + creature_sensor_fill] = fill;
+        u_creature_sensors.data[sensors + creature_sensor_food] = food_available;
+        u_creature_sensors.data[sensors + creature_sensor_crowding] = crowding;
+        u_creature_sensors.data[sensors + creature_sensor_energy] = energy / u_creature_max_energy;
+
+        int consumed = min(int(round(float(u_creature_consumption) * u_creature_appetites.data[slot])), food.quantity);
+        if (consumed > 0) {
+            Substance substance = read_substance(food.substance_id);
+            int quantity = food.quantity - consumed;
+            // Импульс юнита уменьшается пропорционально поглощенному количеству
+            food.momentum = food.momentum * quantity / food.quantity;
+            food.quantity = quantity;
+            cell.total_quantity -= consumed;
+            energy += float(consumed * substance.mass) * u_creature_food_energy;
+            u_creature_energies.data[slot] = min(energy, u_creature_max_energy);
+
+            if (food.quantity == 0) {
+                cell.filled_units -= 1;
+                food = cell.filled_units > 0 ? read_unit(global_cell_position, cell.filled_units - 1) : new_unit();
+            }
+        }
+    }
+
+    return food;
+}
 
-// Переменные, которые могу меняться каждый кадр
-// Порядок и дополнения до 16 байт должны совпадать с тем, что обхявлено в python-коде
-layout(std140, binding = 2) uniform PhysicsBuffer {
-// При tps == 1000 uint32 хватит примерно на 49.7 суток непрерывной симуляции
-    int u_world_age;
-    ivec3 u_padding_0;
-};
+
+// Последний юнит ячейки уже прочитан и, возможно, частично поглощен существами
+Unit read_cell_unit(ivec3 global_cell_position, int local_unit_index, Cell cell, Unit food) {
+    return local_unit_index == cell.filled_units - 1 ? food : read_unit(global_cell_position, local_unit_index);
+}
+
+
+// Импульс и заявка юнита в соседа по оси axis
+void update_unit(
+    ivec3 global_cell_position,
+    int local_unit_index,
+    Unit unit,
+    vec3 acceleration,
+    ivec3 gravity,
+    int axis,
+    inout Plan plan,
+    inout Cell cell
+) {
+    int plan_section = local_unit_index / 32;
+    int plan_section_index = local_unit_index % 32;
+    Substance substance = read_substance(unit.substance_id);
+
+    unit.momentum += ivec3(round(acceleration * float(unit.quantity * u_world_update_period)));
+    unit.momentum += gravity * unit.quantity * u_world_update_period;
+    int momentum_d = unit.momentum[axis];
+    if (momentum_d != 0 && abs(momentum_d) >= substance.mass) {
+        plan.presence[plan_section] = bitfieldInsert(plan.presence[plan_section], 1, plan_section_index, 1);
+        plan.direction[plan_section] = bitfieldInsert(plan.direction[plan_section], uint(momentum_d > 0), plan_section_index, 1);
+        cell.backward_plans += int(momentum_d < 0);
+        cell.forward_plans += int(momentum_d > 0);
+    }
+
+    write_unit(global_cell_position, local_unit_index, unit);
+}
 
 
 void main() {
@@ -34,6 +162,11 @@ void main() {
     ivec3 global_cell_position = ivec3(gl_GlobalInvocationID);
     int gloup_cell_index = int(gl_LocalInvocationIndex);
     int chunk_index = 0;
+    // Гравитация и возраст - свои у каждого мира пакета
+    int world_index = get_world_index(group_position);
+    WorldParameters world = read_world_parameters(world_index);
+    ivec3 world_offset = get_world_offset(world_index);
+    ivec3 world_cell_position = global_cell_position - world_offset;
 
     for (int cell_index = gloup_cell_index; cell_index < cell_cache_size; cell_index += cell_group_size) {
         ivec3 cache_cell_position = ivec3(
@@ -41,9 +174,14 @@ void main() {
         (cell_index % (cell_cache_shape.x * cell_cache_shape.y)) / cell_cache_shape.x,
         cell_index / (cell_cache_shape.x * cell_cache_shape.y)
         );
-        ivec3 read_position = (cache_cell_position + ivec3(group_position * cell_group_shape) - 1 + world_shape) % world_shape;
+        ivec3 read_position = wrap_world_position(
+        cache_cell_position + group_position * cell_group_shape - world_offset - 1,
+        world_index
+        );
 
-        cell_cache[cache_cell_position.x][cache_cell_position.y][cache_cell_position.z] = read_cell(read_position);
+        Cell cache_cell = read_cell(read_position);
+        cell_cache[cache_cell_position.x][cache_cell_position.y][cache_cell_position.z] = cache_cell;
+        pressure_cache[cache_cell_position.x][cache_cell_position.y][cache_cell_position.z] = get_pressure(cache_cell);
     }
 
     memoryBarrierShared();
@@ -52,24 +190,42 @@ void main() {
     // Сдвиг на + 1 так как в кэш записывается еще слой поверх группы
     ivec3 cache_cell_position = ivec3(gl_LocalInvocationID) + 1;
     Cell cell = cell_cache[cache_cell_position.x][cache_cell_position.y][cache_cell_position.z];
-    Plan plan = read_plan(global_cell_position);
-
-    for (int local_unit_index = 0; local_unit_index < cell.filled_units; local_unit_index++) {
-        int plan_section = local_unit_index / 32;
-        int plan_section_index = local_unit_index % 32;
-
-        ivec3 global_unit_position = unit_index_to_position(global_cell_position, local_unit_index);
-        Unit unit = read_unit(global_unit_position);
-        Substance substance = read_substance(unit.substance_id);
-
-        unit.momentum += global_cell_position.x > 0 ? u_gravity_vector * unit.quantity * u_world_update_period : ivec3(0.0);
-        int momentum_d = unit.momentum[u_world_age % 3];
-        if (abs(momentum_d) >= substance.mass) {
-            plan.presence[plan_section] = bitfieldInsert(plan.presence[plan_section], 1, plan_section_index, 1);
-            plan.direction[plan_section] = bitfieldInsert(plan.direction[plan_section], sign(momentum_d), plan_section_index, 1);
-        }
-
-        write_unit(global_unit_position, unit);
+    // Заявки прошлого тика уже выполнены стадией перемещения
+    Plan plan = new_plan();
+    cell.backward_plans = 0;
+    cell.forward_plans = 0;
+    // Ускорения от давления и поля тяготения одни на ячейку
+    vec3 acceleration = get_pressure_acceleration(cache_cell_position, cell);
+    if (gravity_field) {
+        acceleration += get_gravity_acceleration(global_cell_position);
+    }
+    // Давление считается по ячейкам до поглощения, как и у соседей в pressure_cache
+    Unit food = feed_creatures(global_cell_position, world_index, cell);
+
+    // Без поля тяготение - постоянный вектор мира
+    ivec3 gravity = !gravity_field && world_cell_position.x > 0 ? world.gravity_vector : ivec3(0);
+    int axis = world.age % 3;
+
+    // Реакции юнитов ячейки, уже загруженных для расчета импульса: реагируют соседние юниты (0, 1), (2, 3)...
+    // на четных тиках и (1, 2), (3, 4)... на нечетных, поэтому за тик каждый юнит участвует не более чем
+    // в одной реакции. Продукт реакции получает импульс и заявку уже как новое вещество
+    int unit_index = world.age % 2;
+    if (unit_index == 1 && cell.filled_units > 0) {
+        Unit unit = read_cell_unit(global_cell_position, 0, cell, food);
+        update_unit(global_cell_position, 0, unit, acceleration, gravity, axis, plan, cell);
+    }
+    for (; unit_index + 1 < cell.filled_units; unit_index += 2) {
+        Unit unit_0 = read_cell_unit(global_cell_position, unit_index, cell, food);
+        Unit unit_1 = read_cell_unit(global_cell_position, unit_index + 1, cell, food);
+        uint random = hash(uvec4(uvec3(world_cell_position), uint(world.age) * 64u + uint(unit_index)) ^ uint(world.seed));
+        react(unit_0, unit_1, random);
+
+        update_unit(global_cell_position, unit_index, unit_0, acceleration, gravity, axis, plan, cell);
+        update_unit(global_cell_position, unit_index + 1, unit_1, acceleration, gravity, axis, plan, cell);
+    }
+    if (unit_index < cell.filled_units) {
+        Unit unit = read_cell_unit(global_cell_position, unit_index, cell, food);
+        update_unit(global_cell_position, unit_index, unit, acceleration, gravity, axis, plan, cell);
     }
 
     write_plan(global_cell_position, plan);
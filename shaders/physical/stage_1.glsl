@@ -9,6 +9,7 @@
 #include plan_component
 #include cell_component
 #include substance_component
+#include world_component
 
 
 
@@ -16,24 +17,19 @@ layout(local_size_x = cell_group_shape.x, local_size_y = cell_group_shape.y, loc
 shared Cell cell_cache[cell_cache_shape.x][cell_cache_shape.y][cell_cache_shape.z];
 
 
-// Переменные, которые почти не меняются или меняются редко
-uniform int u_world_update_period;
-uniform ivec3 u_gravity_vector;
-
-// Переменные, которые могу меняться каждый кадр
-// Порядок и дополнения до 16 байт должны совпадать с тем, что обхявлено в python-коде
-layout(std140, binding = 2) uniform PhysicsBuffer {
-// При tps == 1000 uint32 хватит примерно на 49.7 суток непрерывной симуляции
-    int u_world_age;
-    ivec3 u_padding_0;
-};
-
-
+// Стадия перемещения: юниты с заявками переходят в соседнюю ячейку по оси (возраст мира) % 3.
+// Ячейки вдоль оси разбиваются на пары, смещение разбиения чередуется каждые три тика, поэтому у ячейки ровно один сосед,
+// с которым она обменивается юнитами. Обе ячейки пары по одинаковым данным (заполненность и счетчики заявок из cell_cache)
+// вычисляют, сколько юнитов переходит в каждую сторону, и каждая записывает только себя - гонок и атомарных операций нет.
+// Заявки в соседа не из пары ждут следующей смены разбиения
 void main() {
     ivec3 group_position = ivec3(gl_WorkGroupID);
     ivec3 global_cell_position = ivec3(gl_GlobalInvocationID);
     int gloup_cell_index = int(gl_LocalInvocationIndex);
-    int chunk_index = 0;
+    int world_index = get_world_index(group_position);
+    WorldParameters world = read_world_parameters(world_index);
+    ivec3 world_offset = get_world_offset(world_index);
+    ivec3 world_cell_position = global_cell_position - world_offset;
 
     for (int cell_index = gloup_cell_index; cell_index < cell_cache_size; cell_index += cell_group_size) {
         ivec3 cache_cell_position = ivec3(
@@ -41,7 +37,10 @@ void main() {
         (cell_index % (cell_cache_shape.x * cell_cache_shape.y)) / cell_cache_shape.x,
         cell_index / (cell_cache_shape.x * cell_cache_shape.y)
         );
-        ivec3 read_position = (cache_cell_position + ivec3(group_position * cell_group_shape) - 1 + world_shape) % world_shape;
+        ivec3 read_position = wrap_world_position(
+        cache_cell_position + group_position * cell_group_shape - world_offset - 1,
+        world_index
+        );
 
         cell_cache[cache_cell_position.x][cache_cell_position.y][cache_cell_position.z] = read_cell(read_position);
     }
@@ -49,29 +48,65 @@ void main() {
     memoryBarrierShared();
     barrier();
 
+    int axis = world.age % 3;
+    ivec3 axis_offset = ivec3(0);
+    axis_offset[axis] = 1;
+    // 1 - пара в сторону увеличения координаты, -1 - в сторону уменьшения
+    int pair_side = (world_cell_position[axis] + (world.age / 3) % 2) % 2 == 0 ? 1 : -1;
+    ivec3 partner_position = wrap_world_position(world_cell_position + axis_offset * pair_side, world_index);
+
     // Сдвиг на + 1 так как в кэш записывается еще слой поверх группы
     ivec3 cache_cell_position = ivec3(gl_LocalInvocationID) + 1;
+    ivec3 cache_partner_position = cache_cell_position + axis_offset * pair_side;
     Cell cell = cell_cache[cache_cell_position.x][cache_cell_position.y][cache_cell_position.z];
-    Plan plan = read_plan(global_cell_position);
+    Cell partner = cell_cache[cache_partner_position.x][cache_partner_position.y][cache_partner_position.z];
+
+    // Сначала юниты обмениваются попарно, остальные заявки выполняются, пока есть место
+    int outgoing = pair_side > 0 ? cell.forward_plans : cell.backward_plans;
+    int incoming = pair_side > 0 ? partner.backward_plans : partner.forward_plans;
+    int swapped = min(outgoing, incoming);
+    int sent = swapped + min(outgoing - swapped, cell_size - partner.filled_units);
+    int received = swapped + min(incoming - swapped, cell_size - cell.filled_units);
 
+    Plan plan = read_plan(global_cell_position);
+    uint outgoing_direction = uint(pair_side > 0);
+    int write_index = 0;
+    int total_quantity = 0;
     for (int local_unit_index = 0; local_unit_index < cell.filled_units; local_unit_index++) {
         int plan_section = local_unit_index / 32;
         int plan_section_index = local_unit_index % 32;
-
-        ivec3 global_unit_position = unit_index_to_position(global_cell_position, local_unit_index);
-        Unit unit = read_unit(global_unit_position);
-        Substance substance = read_substance(unit.substance_id);
-
-        unit.momentum += global_cell_position.x > 0 ? u_gravity_vector * unit.quantity * u_world_update_period : ivec3(0.0);
-        int momentum_d = unit.momentum[u_world_age % 3];
-        if (abs(momentum_d) >= substance.mass) {
-            plan.presence[plan_section] = bitfieldInsert(plan.presence[plan_section], 1, plan_section_index, 1);
-            plan.direction[plan_section] = bitfieldInsert(plan.direction[plan_section], sign(momentum_d), plan_section_index, 1);
+        bool leaves = bitfieldExtract(plan.presence[plan_section], plan_section_index, 1) == 1u
+        && bitfieldExtract(plan.direction[plan_section], plan_section_index, 1) == outgoing_direction
+        && sent > 0;
+        sent -= int(leaves);
+
+        if (!leaves) {
+            Unit unit = read_unit(global_cell_position, local_unit_index);
+            write_unit(global_cell_position, write_index, unit);
+            total_quantity += unit.quantity;
+            write_index++;
         }
+    }
 
-        write_unit(global_unit_position, unit);
+    Plan partner_plan = read_plan(partner_position);
+    uint incoming_direction = 1u - outgoing_direction;
+    for (int local_unit_index = 0; local_unit_index < partner.filled_units && received > 0; local_unit_index++) {
+        int plan_section = local_unit_index / 32;
+        int plan_section_index = local_unit_index % 32;
+        bool arrives = bitfieldExtract(partner_plan.presence[plan_section], plan_section_index, 1) == 1u
+        && bitfieldExtract(partner_plan.direction[plan_section], plan_section_index, 1) == incoming_direction;
+
+        if (arrives) {
+            Unit unit = read_unit(partner_position, local_unit_index);
+            // Переход в соседнюю ячейку расходует импульс, равный массе вещества
+            unit.momentum[axis] += pair_side * read_substance(unit.substance_id).mass;
+            write_unit(global_cell_position, write_index, unit);
+            total_quantity += unit.quantity;
+            write_index++;
+            received--;
+        }
     }
 
-    write_plan(global_cell_position, plan);
-    write_cell(global_cell_position, cell);
+    write_plan(global_cell_position, new_plan());
+    write_cell(global_cell_position, Cell(write_index, 0, 0, total_quantity));
 }
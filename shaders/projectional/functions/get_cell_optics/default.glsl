@@ -1,12 +1,12 @@
 uniform float u_optical_density_scale;
 
 
-vec4 get_cell_color(ivec3 cell_position, float distance) {
+// Оптика ячейки для объема оптики (optics_volume.glsl): xyz - сумма квадратов цветов веществ, взвешенных
+// их оптической толщиной, w - оптическая толщина на единицу длины пути луча
+vec4 get_cell_optics(ivec3 cell_position) {
     Cell cell = read_cell(cell_position);
     vec3 rgb_squared = vec3(0.0);
-    vec3 rgb = vec3(0.0);
     float optical_depth = 0.0;
-    float opacity = 0.0;
 
     for (int unit_index = 0; unit_index < cell.filled_units; unit_index++) {
         Unit unit = read_unit(cell_position, unit_index);
@@ -17,14 +17,5 @@ vec4 get_cell_color(ivec3 cell_position, float distance) {
         optical_depth += substance_optical_depth;
     }
 
-    if (optical_depth > 0.0) {
-        rgb = sqrt(rgb_squared / optical_depth);
-
-        float absorption = optical_depth * u_optical_density_scale * distance;
-        opacity = 1.0 - exp(-absorption);
-        // Вариант ниже должен быть быстрее, чем с exp(), но пока что этого не видно
-        // opacity = absorption / (1.0 + absorption);
-    }
-
-    return vec4(rgb, opacity);
+    return vec4(rgb_squared, optical_depth) * u_optical_density_scale;
 }
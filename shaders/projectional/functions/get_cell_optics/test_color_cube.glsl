@@ -0,0 +1,16 @@
+uniform vec4 u_test_color_cube_start;
+uniform vec4 u_test_color_cube_end;
+
+
+vec4 get_cell_optics(ivec3 position) {
+    vec4 start = u_test_color_cube_start;
+    vec4 end = u_test_color_cube_end;
+    vec3 rate = vec3(position) / vec3(world_shape);
+
+    vec3 rgb = start.rgb * rate + end.rgb * (1 - rate);
+    float alpha = (start.a + end.a) / 2;
+    // Толщина, при которой ячейка, пройденная насквозь, непрозрачна на alpha
+    float optical_depth = -log(1.0 - alpha);
+
+    return vec4(rgb * rgb * optical_depth, optical_depth);
+}
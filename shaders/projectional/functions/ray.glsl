@@ -0,0 +1,152 @@
+// Переменные, которые почти не меняются или меняются редко
+uniform vec2 u_window_size;
+uniform float u_fov_scale;
+uniform float u_near;
+uniform float u_far;
+
+// Переменные, которые могу меняться каждый кадр
+// Порядок и дополнения до 16 байт должны совпадать с тем, что обхявлено в python-коде
+layout(std140, binding = 3) uniform CameraBuffer {
+    vec3 u_view_position;
+    int u_padding_0;
+    vec3 u_view_forward;
+    int u_padding_1;
+    vec3 u_view_right;
+    int u_padding_2;
+    vec3 u_view_up;
+    float u_zoom;
+};
+
+
+// Состояние прохода луча по ячейкам мира (DDA).
+// Общее для отрисовки (fragment.glsl) и выбора ячейки под курсором (pick.glsl), чтобы они видели одно и то же
+struct RayMarch {
+    // Начало луча, смещенное так же, как позиция камеры (центр ячейки (0, 0, 0) в (0, 0, 0))
+    vec3 origin;
+    // Позиция ячейки, внутри которой находится луч
+    vec3 cell_position;
+    vec3 step_forward;
+    vec3 step_size;
+    vec3 next_boundary;
+    float ray_length;
+    // 0, если луч не пересекает мир
+    int max_iterations;
+    // Уровень детализации: ячейка прохода - куб из 2^level ячеек мира, cell_position - в таких ячейках
+    int level;
+    // Последний переход между ячейками: единичный шаг по оси пересеченной грани, 0 до первого перехода
+    vec3 last_step;
+};
+
+
+// pixel_position - координаты пикселя в окне, как gl_FragCoord.xy
+vec3 get_ray_forward(vec2 pixel_position) {
+    // Координаты пикселя на мониторе, со смещением цетнра координат в центр экрана
+    vec2 pixel_position_normalized = (pixel_position - 0.5 * u_window_size) / (u_window_size.y * 0.5);
+
+    // Направление луча в локальных координатах камеры
+    vec3 ray_forward_local = normalize(vec3(
+    pixel_position_normalized.x * u_fov_scale / u_zoom,
+    pixel_position_normalized.y * u_fov_scale / u_zoom,
+    1.0
+    ));
+
+    // Перевод в мировые координаты
+    return normalize(
+    u_view_right * ray_forward_local.x +
+    u_view_up * ray_forward_local.y +
+    u_view_forward * ray_forward_local.z
+    );
+}
+
+
+// Размер пикселя в ячейках мира на единичном расстоянии от камеры
+float get_pixel_footprint() {
+    return 2.0 * u_fov_scale / (u_window_size.y * u_zoom);
+}
+
+
+// Луч из точки origin (в координатах позиции камеры), проходящий участок [near; far] от нее
+RayMarch start_ray_march_at(vec3 origin, vec3 ray_forward, float near, float far) {
+    RayMarch march;
+    march.max_iterations = 0;
+    march.level = 0;
+    march.last_step = vec3(0.0);
+
+    // Смещение отображения мира так, чтобы центр ячейки (0, 0, 0) был в позиции (0, 0, 0)
+    vec3 biased_view_position = origin + vec3(0.5);
+    march.origin = biased_view_position;
+
+    // Нужно для ускорения вычислений, заменяет деление на умножение
+    vec3 ray_backward = 1.0 / (ray_forward + vec3(1e-10));
+    vec3 distance_to_mins = (world_min - biased_view_position) * ray_backward;
+    vec3 distance_to_maxes = (world_max - biased_view_position + 1) * ray_backward;
+    vec3 near_bounds = min(distance_to_mins, distance_to_maxes);
+    vec3 far_bounds = max(distance_to_mins, distance_to_maxes);
+
+    float entry_distance = max(max(max(near_bounds.x, near_bounds.y), near_bounds.z), near);
+    float exit_distance = min(min(min(far_bounds.x, far_bounds.y), far_bounds.z), far);
+
+    if (exit_distance > max(entry_distance, 0.0)) {
+        // Расстояние до границы мира, или 0, если камера внутри мира
+        float ray_start_offset = max(entry_distance, 0.0) + 1e-4;
+        vec3 ray_start = biased_view_position + ray_forward * ray_start_offset;
+
+        march.cell_position = floor(ray_start);
+        march.step_forward = sign(ray_forward);
+        march.step_size = abs(ray_backward);
+        march.ray_length = ray_start_offset;
+        // Расстояния считаются от камеры, как и ray_length
+        march.next_boundary = ray_start_offset
+        + (march.cell_position - ray_start + max(march.step_forward, 0.0)) * ray_backward;
+        march.max_iterations = world_shape.x + world_shape.y + world_shape.z;
+    }
+
+    return march;
+}
+
+
+RayMarch start_ray_march(vec3 ray_forward) {
+    return start_ray_march_at(u_view_position, ray_forward, u_near, u_far);
+}
+
+
+bool is_ray_in_world(RayMarch march) {
+    ivec3 level_max = world_max >> march.level;
+    return !(any(lessThan(march.cell_position, world_min)) || any(greaterThan(march.cell_position, level_max)));
+}
+
+
+// Продолжает проход с текущей точки луча на уровне детализации level.
+// Часть ячейки уровня, которую луч уже прошел на прежнем уровне, не учитывается повторно,
+// так как get_ray_cell_distance() считается от текущей длины луча
+void set_ray_march_level(inout RayMarch march, vec3 ray_forward, int level) {
+    float cell_scale = float(1 << level);
+    vec3 ray_backward = 1.0 / (ray_forward + vec3(1e-10));
+    float ray_length = march.ray_length + 1e-4;
+    vec3 ray_point = march.origin + ray_forward * ray_length;
+
+    march.cell_position = floor(ray_point / cell_scale);
+    march.step_size = abs(ray_backward) * cell_scale;
+    march.next_boundary = ray_length
+    + ((march.cell_position + max(march.step_forward, 0.0)) * cell_scale - ray_point) * ray_backward;
+    march.level = level;
+}
+
+
+// Длина пути луча внутри текущей ячейки
+float get_ray_cell_distance(RayMarch march) {
+    return min(min(march.next_boundary.x, march.next_boundary.y), march.next_boundary.z) - march.ray_length;
+}
+
+
+void advance_ray_march(inout RayMarch march) {
+    vec3 next_boundary = march.next_boundary;
+    float future_ray_length = min(min(next_boundary.x, next_boundary.y), next_boundary.z);
+    vec3 mask = step(next_boundary.xyz, next_boundary.yzx) * step(next_boundary.xyz, next_boundary.zxy);
+    if (mask.x > 0.0) mask.yz = vec2(0.0);
+    else if (mask.y > 0.0) mask.z = 0.0;
+    march.last_step = mask * march.step_forward;
+    march.cell_position += march.last_step;
+    march.next_boundary += mask * march.step_size;
+    march.ray_length = future_ray_length;
+}
@@ -0,0 +1,190 @@
+// Волновой конвейер лучей (WavefrontRaymarcher из simulator/raymarch.py). Луч, дошедший до границы сред,
+// не ветвится внутри вызова, а кладет отраженный и преломленный лучи в очередь, которую обрабатывает следующий проход.
+// Показатель преломления тексела растет с его оптической плотностью (соотношение Гладстона-Дейла), граница сред -
+// переход между текселями, показатели которых относительно отличаются больше чем на u_interface_threshold.
+// Требует ray_functions и optics_volume_component
+
+
+uniform vec4 u_background;
+// Больше 1 - более грубые уровни детализации ближе к камере
+uniform float u_optics_lod_bias;
+// Прирост показателя преломления на единицу оптической толщины
+uniform float u_refractivity;
+uniform float u_interface_threshold;
+// Лучи с меньшей долей в цвете пикселя не порождаются
+uniform float u_min_weight;
+// Сколько раз луч может разветвиться, 0 - без отражения и преломления
+uniform int u_max_bounces;
+// Вместимость каждой очереди в лучах
+uniform uint u_queue_capacity;
+
+
+// Должна совпадать с WAVEFRONT_RAY_DTYPE из simulator/raymarch.py
+struct WavefrontRay {
+    // Начало луча в координатах позиции камеры и путь от камеры до него (для уровня детализации)
+    vec3 origin;
+    float path_length;
+    vec3 direction;
+    // Доля луча в цвете пикселя
+    float weight;
+    // -1 - недействительный луч, место которого в очереди зарезервировано, но не занято
+    int pixel;
+    // Показатель преломления среды, в которой начинается луч
+    float refractive_index;
+    // Номер ветвления, породившего луч
+    int bounce;
+    int padding;
+};
+
+
+// Должны совпадать с WavefrontRaymarcher из simulator/raymarch.py
+layout(std430, binding = 24) restrict buffer WavefrontState {
+    // Аргументы glDispatchComputeIndirect для входной очереди
+    uint dispatch_x;
+    uint dispatch_y;
+    uint dispatch_z;
+    uint input_count;
+    // Может превышать вместимость: лучи сверх нее не записываются
+    uint output_count;
+} u_wavefront_state;
+
+layout(std430, binding = 25) readonly restrict buffer WavefrontInput {
+    WavefrontRay rays[];
+} u_wavefront_input;
+
+layout(std430, binding = 26) writeonly restrict buffer WavefrontOutput {
+    WavefrontRay rays[];
+} u_wavefront_output;
+
+// Цвет пикселя с фиксированной точкой: вклады лучей складываются атомарно, и результат не зависит от их порядка
+layout(std430, binding = 27) restrict buffer WavefrontPixels {
+    uvec4 colors[];
+} u_wavefront_pixels;
+
+
+// Сумма вкладов лучей пикселя не больше 1
+const float wavefront_color_scale = float(1 << 24);
+
+
+uvec4 encode_wavefront_color(vec3 color) {
+    return uvec4(round(clamp(color, 0.0, 1.0) * wavefront_color_scale), 0u);
+}
+
+
+vec3 decode_wavefront_color(uvec4 color) {
+    return vec3(color.rgb) / wavefront_color_scale;
+}
+
+
+float get_refractive_index(vec4 optics) {
+    return 1.0 + u_refractivity * optics.w;
+}
+
+
+// Делит оставшийся свет луча на границе сред между отраженным и преломленным лучами (Френель в приближении Шлика)
+// и кладет их в выходную очередь. Возвращает false, если ветвить луч не нужно или в очереди нет места:
+// тогда луч идет дальше, не преломляясь
+bool branch_wavefront_ray(WavefrontRay ray, RayMarch march, vec4 ray_color, float index_from, float index_to) {
+    float weight = ray.weight * (1.0 - ray_color.a);
+    if (weight < u_min_weight) {
+        return false;
+    }
+
+    vec3 normal = -march.last_step;
+    vec3 reflected = reflect(ray.direction, normal);
+    vec3 refracted = refract(ray.direction, normal, index_from / index_to);
+    // Полное внутреннее отражение
+    float reflectance = 1.0;
+    if (any(notEqual(refracted, vec3(0.0)))) {
+        // Из более плотной среды - по углу преломления
+        float cosine = dot(index_from > index_to ? refracted : ray.direction, march.last_step);
+        float normal_reflectance = pow((index_from - index_to) / (index_from + index_to), 2.0);
+        reflectance = normal_reflectance + (1.0 - normal_reflectance) * pow(1.0 - cosine, 5.0);
+    }
+
+    // Слабый луч не порождается, его доля переходит к другому
+    float reflected_weight = weight * reflectance;
+    float refracted_weight = weight - reflected_weight;
+    if (reflected_weight < u_min_weight) {
+        reflected_weight = 0.0;
+        refracted_weight = weight;
+    } else if (refracted_weight < u_min_weight) {
+        reflected_weight = weight;
+        refracted_weight = 0.0;
+    }
+
+    uint count = uint(reflected_weight > 0.0) + uint(refracted_weight > 0.0);
+    uint first = atomicAdd(u_wavefront_state.output_count, count);
+    if (first + count > u_queue_capacity) {
+        // Следующий проход читает min(output_count, u_queue_capacity) лучей, поэтому поместившийся слот
+        // зарезервированной пары все равно нужно записать - недействительным лучом
+        if (first < u_queue_capacity) {
+            u_wavefront_output.rays[first].pixel = -1;
+        }
+        return false;
+    }
+
+    WavefrontRay child;
+    child.origin = march.origin - vec3(0.5) + ray.direction * march.ray_length;
+    child.path_length = ray.path_length + march.ray_length;
+    child.pixel = ray.pixel;
+    child.bounce = ray.bounce + 1;
+    child.padding = 0;
+    if (reflected_weight > 0.0) {
+        child.direction = reflected;
+        child.weight = reflected_weight;
+        child.refractive_index = index_from;
+        u_wavefront_output.rays[first] = child;
+        first++;
+    }
+    if (refracted_weight > 0.0) {
+        child.direction = refracted;
+        child.weight = refracted_weight;
+        child.refractive_index = index_to;
+        u_wavefront_output.rays[first] = child;
+    }
+    return true;
+}
+
+
+// Проходит луч, как fragment.glsl, до выхода из мира, непрозрачности или разветвления на границе сред.
+// near - начало прохода от ray.origin, medium_known - false, если среда начала луча неизвестна (луч из камеры).
+// Возвращает вклад луча в цвет пикселя
+vec3 trace_wavefront_ray(WavefrontRay ray, float near, bool medium_known) {
+    RayMarch march = start_ray_march_at(ray.origin, ray.direction, near, u_far);
+    vec4 ray_color = vec4(0.0, 0.0, 0.0, 0.0);
+    float pixel_footprint = get_pixel_footprint() * u_optics_lod_bias;
+    float refractive_index = ray.refractive_index;
+    bool can_branch = ray.bounce < u_max_bounces;
+
+    // Каждая смена уровня детализации тратит одну итерацию
+    int max_iterations = march.max_iterations > 0 ? march.max_iterations + optics_level_count : 0;
+    for (int iteration = 0; iteration < max_iterations; iteration++) {
+        if (!is_ray_in_world(march)) break;
+
+        int level = get_optics_level((ray.path_length + march.ray_length) * pixel_footprint);
+        if (level > march.level) {
+            set_ray_march_level(march, ray.direction, level);
+            // Усредненные тексели грубого уровня сравниваются только между собой
+            medium_known = false;
+            continue;
+        }
+
+        vec4 cell_optics = read_optics(ivec3(march.cell_position), march.level);
+        float cell_index = get_refractive_index(cell_optics);
+        bool at_interface = can_branch && medium_known
+            && abs(cell_index - refractive_index) > u_interface_threshold * refractive_index;
+        if (at_interface && branch_wavefront_ray(ray, march, ray_color, refractive_index, cell_index)) {
+            return ray.weight * ray_color.rgb;
+        }
+        // Плавное изменение плотности границей не считается
+        refractive_index = cell_index;
+        medium_known = true;
+
+        if (blend_optics_color(ray_color, get_optics_color(cell_optics, get_ray_cell_distance(march)))) break;
+
+        advance_ray_march(march);
+    }
+
+    return ray.weight * (ray_color.rgb + (1.0 - ray_color.a) * u_background.rgb);
+}
@@ -0,0 +1,24 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include packing_constants
+
+#include cell_component
+#include unit_component
+#include substance_optics_component
+#include optics_volume_component
+
+
+layout(local_size_x = cell_group_shape.x, local_size_y = cell_group_shape.y, local_size_z = cell_group_shape.z) in;
+
+
+#include optics_function
+
+
+// Уровень 0 объема оптики: одна ячейка первого мира пакета - один тексел
+void main() {
+    ivec3 cell_position = ivec3(gl_GlobalInvocationID);
+    write_optics(cell_position, 0, get_cell_optics(cell_position));
+}
@@ -0,0 +1,36 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include optics_volume_component
+
+
+layout(local_size_x = 4, local_size_y = 4, local_size_z = 4) in;
+
+
+// Записываемый уровень, читается уровень u_level - 1
+uniform int u_level;
+
+
+// Тексел уровня u_level - среднее существующих дочерних текселей.
+// У мира, стороны которого не делятся на 2^u_level, крайние текселы покрывают только его часть
+void main() {
+    ivec3 position = ivec3(gl_GlobalInvocationID);
+    if (any(greaterThanEqual(position, get_optics_level_shape(u_level)))) {
+        return;
+    }
+
+    ivec3 child_shape = get_optics_level_shape(u_level - 1);
+    vec4 optics = vec4(0.0);
+    int child_count = 0;
+    for (int child = 0; child < 8; child++) {
+        ivec3 child_position = position * 2 + ivec3(child & 1, (child >> 1) & 1, child >> 2);
+        if (all(lessThan(child_position, child_shape))) {
+            optics += read_optics(child_position, u_level - 1);
+            child_count++;
+        }
+    }
+
+    write_optics(position, u_level, optics / float(child_count));
+}
@@ -0,0 +1,59 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include packing_constants
+
+#include cell_component
+#include unit_component
+
+
+#include ray_functions
+
+
+layout(local_size_x = 1, local_size_y = 1, local_size_z = 1) in;
+
+
+// Координаты пикселя в окне, как gl_FragCoord.xy
+uniform vec2 u_pick_pixel;
+
+// Должен совпадать с PICK_RESULT_DTYPE из simulator/pick.py
+layout(std430, binding = 14) writeonly restrict buffer PickResult {
+// xyz - позиция ячейки, w - количество юнитов в ней, -1, если луч не встретил вещество
+    ivec4 cell;
+// Расстояние от камеры до входа луча в ячейку
+    float distance;
+    float padding_0;
+    float padding_1;
+    float padding_2;
+// Упакованные юниты ячейки, декодируются на процессоре по схеме Unit
+    uvec4 units[cell_size];
+} u_pick_result;
+
+
+// Один вызов повторяет проход луча из fragment.glsl для одного пикселя
+// и останавливается на первой ячейке, в которой есть юниты
+void main() {
+    RayMarch march = start_ray_march(get_ray_forward(u_pick_pixel));
+    u_pick_result.cell = ivec4(0, 0, 0, -1);
+    u_pick_result.distance = 0.0;
+
+    for (int iteration = 0; iteration < march.max_iterations; iteration++) {
+        if (!is_ray_in_world(march)) break;
+
+        ivec3 cell_position = ivec3(march.cell_position);
+        Cell cell = read_cell(cell_position);
+        if (cell.filled_units > 0) {
+            u_pick_result.cell = ivec4(cell_position, cell.filled_units);
+            u_pick_result.distance = march.ray_length;
+            for (int unit_index = 0; unit_index < cell.filled_units; unit_index++) {
+                ivec3 unit_position = unit_index_to_position(cell_position, unit_index);
+                u_pick_result.units[unit_index] = pack_unit(read_unit(unit_position), unit_position);
+            }
+            break;
+        }
+
+        advance_ray_march(march);
+    }
+}
@@ -0,0 +1,128 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include optics_volume_component
+
+
+#include ray_functions
+
+
+// Плитка экрана - одна рабочая группа, пиксель - один вызов.
+// Кирпич - куб brick_shape^3 текселей одного уровня объема оптики, загружаемый группой в общую память
+const int tile_shape = 8;
+const int tile_size = tile_shape * tile_shape;
+const int brick_shape = 4;
+const int brick_size = brick_shape * brick_shape * brick_shape;
+
+layout(local_size_x = tile_shape, local_size_y = tile_shape, local_size_z = 1) in;
+
+
+uniform vec4 u_background;
+// Больше 1 - более грубые уровни детализации ближе к камере
+uniform float u_optics_lod_bias;
+
+// Должен совпадать с TileRaymarcher из simulator/raymarch.py
+layout(std430, binding = 22) readonly restrict buffer TileTarget {
+    writeonly image2D image;
+} u_tile_target;
+
+
+shared vec4 s_brick[brick_size];
+// xyz - позиция кирпича в кирпичах уровня, w - уровень
+shared ivec4 s_brick_key;
+shared int s_leader;
+shared int s_active_count;
+
+
+ivec4 get_brick_key(RayMarch march) {
+    return ivec4(ivec3(march.cell_position) / brick_shape, march.level);
+}
+
+
+// Лучи плитки идут через мир по очереди кирпичей: в каждом раунде группа загружает кирпич, нужный первому
+// незавершенному лучу, и все лучи, находящиеся в этом кирпиче, проходят его целиком, читая только общую память.
+// Соседние лучи обычно идут через одни и те же кирпичи, поэтому каждый тексел читается из объема один раз на плитку,
+// а не один раз на пиксель. Плитка завершается, когда непрозрачными или вышедшими из мира стали все ее лучи
+void main() {
+    ivec2 pixel = ivec2(gl_GlobalInvocationID.xy);
+    ivec2 target_size = ivec2(u_window_size);
+    int invocation = int(gl_LocalInvocationIndex);
+
+    vec3 ray_forward = get_ray_forward(vec2(pixel) + 0.5);
+    RayMarch march = start_ray_march(ray_forward);
+    vec4 ray_color = vec4(0.0, 0.0, 0.0, 0.0);
+    float pixel_footprint = get_pixel_footprint() * u_optics_lod_bias;
+    bool ray_active = all(lessThan(pixel, target_size)) && march.max_iterations > 0;
+
+    // Каждый раунд продвигает хотя бы луч-лидер на один кирпич или один уровень
+    int max_rounds = tile_size * (world_shape.x + world_shape.y + world_shape.z + optics_level_count);
+    for (int round_index = 0; round_index < max_rounds; round_index++) {
+        if (ray_active) {
+            int level = get_optics_level(march.ray_length * pixel_footprint);
+            if (level > march.level) {
+                set_ray_march_level(march, ray_forward, level);
+            }
+            ray_active = is_ray_in_world(march);
+        }
+
+        if (invocation == 0) {
+            s_leader = tile_size;
+            s_active_count = 0;
+        }
+        barrier();
+        if (ray_active) {
+            atomicMin(s_leader, invocation);
+            atomicAdd(s_active_count, 1);
+        }
+        barrier();
+        if (s_active_count == 0) break;
+
+        if (invocation == s_leader) {
+            s_brick_key = get_brick_key(march);
+        }
+        barrier();
+
+        ivec4 brick_key = s_brick_key;
+        ivec3 brick_offset = ivec3(
+        invocation % brick_shape,
+        (invocation / brick_shape) % brick_shape,
+        invocation / (brick_shape * brick_shape)
+        );
+        ivec3 texel_position = brick_key.xyz * brick_shape + brick_offset;
+        bool in_level = all(lessThan(texel_position, get_optics_level_shape(brick_key.w)));
+        s_brick[invocation] = in_level ? read_optics(texel_position, brick_key.w) : vec4(0.0);
+        barrier();
+
+        if (ray_active && get_brick_key(march) == brick_key) {
+            ivec3 brick_origin = brick_key.xyz * brick_shape;
+            for (int step_index = 0; step_index < 3 * brick_shape; step_index++) {
+                ivec3 local_position = ivec3(march.cell_position) - brick_origin;
+                bool in_brick = all(greaterThanEqual(local_position, ivec3(0)))
+                && all(lessThan(local_position, ivec3(brick_shape)));
+                if (!in_brick) break;
+                if (!is_ray_in_world(march)) {
+                    ray_active = false;
+                    break;
+                }
+                if (get_optics_level(march.ray_length * pixel_footprint) > march.level) break;
+
+                int brick_index = local_position.x + brick_shape * (local_position.y + brick_shape * local_position.z);
+                vec4 cell_color = get_optics_color(s_brick[brick_index], get_ray_cell_distance(march));
+                if (blend_optics_color(ray_color, cell_color)) {
+                    ray_active = false;
+                    break;
+                }
+
+                advance_ray_march(march);
+            }
+        }
+        // Кирпич и общие переменные перезаписываются в следующем раунде
+        barrier();
+    }
+
+    if (all(lessThan(pixel, target_size))) {
+        imageStore(u_tile_target.image, pixel, vec4(ray_color.rgb + (1.0 - ray_color.a) * u_background.rgb, 1.0));
+    }
+}
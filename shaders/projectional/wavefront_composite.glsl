@@ -0,0 +1,32 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include optics_volume_component
+
+
+#include ray_functions
+#include wavefront_functions
+
+
+layout(local_size_x = 8, local_size_y = 8, local_size_z = 1) in;
+
+
+// Должен совпадать с WavefrontRaymarcher из simulator/raymarch.py
+layout(std430, binding = 22) readonly restrict buffer TileTarget {
+    writeonly image2D image;
+} u_tile_target;
+
+
+// Сумма вкладов всех лучей пикселя - итоговый цвет
+void main() {
+    ivec2 pixel = ivec2(gl_GlobalInvocationID.xy);
+    ivec2 target_size = ivec2(u_window_size);
+    if (any(greaterThanEqual(pixel, target_size))) {
+        return;
+    }
+
+    vec3 color = decode_wavefront_color(u_wavefront_pixels.colors[pixel.x + pixel.y * target_size.x]);
+    imageStore(u_tile_target.image, pixel, vec4(color, 1.0));
+}
@@ -0,0 +1,36 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include optics_volume_component
+
+
+#include ray_functions
+#include wavefront_functions
+
+
+layout(local_size_x = 8, local_size_y = 8, local_size_z = 1) in;
+
+
+// Первичные лучи: один вызов - один пиксель. Вклад луча до первого ветвления записывается в цвет пикселя
+// (первичный проход задает его целиком), отраженные и преломленные лучи уходят в очередь
+void main() {
+    ivec2 pixel = ivec2(gl_GlobalInvocationID.xy);
+    ivec2 target_size = ivec2(u_window_size);
+    if (any(greaterThanEqual(pixel, target_size))) {
+        return;
+    }
+
+    WavefrontRay ray;
+    ray.origin = u_view_position;
+    ray.path_length = 0.0;
+    ray.direction = get_ray_forward(vec2(pixel) + 0.5);
+    ray.weight = 1.0;
+    ray.pixel = pixel.x + pixel.y * target_size.x;
+    ray.refractive_index = 1.0;
+    ray.bounce = 0;
+    ray.padding = 0;
+
+    u_wavefront_pixels.colors[ray.pixel] = encode_wavefront_color(trace_wavefront_ray(ray, u_near, false));
+}
@@ -0,0 +1,25 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include optics_volume_component
+
+
+#include ray_functions
+#include wavefront_functions
+
+
+layout(local_size_x = 1, local_size_y = 1, local_size_z = 1) in;
+
+
+// Между проходами: выходная очередь прошлого прохода становится входной (буферы меняет WavefrontRaymarcher),
+// размер сетки следующего прохода считается на видеокарте, и читать счетчик на процессор не нужно
+void main() {
+    uint count = min(u_wavefront_state.output_count, u_queue_capacity);
+    u_wavefront_state.input_count = count;
+    u_wavefront_state.output_count = 0u;
+    u_wavefront_state.dispatch_x = (count + 63u) / 64u;
+    u_wavefront_state.dispatch_y = 1u;
+    u_wavefront_state.dispatch_z = 1u;
+}
@@ -0,0 +1,32 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include optics_volume_component
+
+
+#include ray_functions
+#include wavefront_functions
+
+
+layout(local_size_x = 64, local_size_y = 1, local_size_z = 1) in;
+
+
+// Лучи входной очереди лежат подряд, поэтому группы заняты целиком, кроме последней,
+// а стоимость прохода пропорциональна числу лучей, которым отражение или преломление действительно нужно
+void main() {
+    uint ray_index = gl_GlobalInvocationID.x;
+    if (ray_index >= u_wavefront_state.input_count) {
+        return;
+    }
+
+    WavefrontRay ray = u_wavefront_input.rays[ray_index];
+    if (ray.pixel < 0) {
+        return;
+    }
+    uvec4 color = encode_wavefront_color(trace_wavefront_ray(ray, 0.0, true));
+    atomicAdd(u_wavefront_pixels.colors[ray.pixel].r, color.r);
+    atomicAdd(u_wavefront_pixels.colors[ray.pixel].g, color.g);
+    atomicAdd(u_wavefront_pixels.colors[ray.pixel].b, color.b);
+}
@@ -0,0 +1,90 @@
+#version 460
+#extension GL_ARB_bindless_texture : require
+
+
+#include physical_constants
+#include packing_constants
+#include random_functions
+
+#include unit_component
+#include plan_component
+#include cell_component
+#include world_component
+
+
+layout(local_size_x = cell_group_shape.x, local_size_y = cell_group_shape.y, local_size_z = cell_group_shape.z) in;
+
+
+const int unit_channels = unit_channels_placeholder;
+const int plan_channels = plan_channels_placeholder;
+const int cell_channels = cell_channels_placeholder;
+// Начальные состояния двух 32-битных половин отпечатка
+const uvec2 fingerprint_seeds = uvec2(0u, 2654435769u);
+
+
+// Должен совпадать с StateFingerprint из simulator/fingerprint.py.
+// Отпечатки - суммы по модулю 2^32 каждой половины, поэтому не зависят от порядка сложения
+layout(std430, binding = 28) restrict buffer FingerprintBuffer {
+    // Весь пакет миров
+    uvec2 total;
+    uvec2 worlds[world_batch_size];
+    // Рабочие группы ячеек в порядке x, y, z по всем текстурам пакета
+    uvec2 bricks[];
+} u_fingerprint;
+
+
+shared uint brick_digest[2];
+
+
+uvec2 add_fingerprint_words(uvec2 digest, uvec4 texel, int channels) {
+    for (int channel = 0; channel < channels; channel++) {
+        digest = uvec2(hash(digest.x ^ texel[channel]), hash(digest.y ^ texel[channel]));
+    }
+    return digest;
+}
+
+
+// Отпечаток ячейки: хэш ее позиции в своем мире, слов ячейки, плана и юнитов по порядку.
+// Должен совпадать с get_cell_fingerprints из simulator/fingerprint.py
+uvec2 get_cell_fingerprint(ivec3 cell_position) {
+    ivec3 world_position = ivec3(cell_position.xy, cell_position.z % world_shape.z);
+    uint index = uint(world_position.x + world_shape.x * (world_position.y + world_shape.y * world_position.z));
+    uvec2 digest = uvec2(hash(fingerprint_seeds.x ^ index), hash(fingerprint_seeds.y ^ index));
+
+    digest = add_fingerprint_words(digest, texelFetch(u_read_cell.handles[0], cell_position, 0), cell_channels);
+    digest = add_fingerprint_words(digest, texelFetch(u_read_plan.handles[0], cell_position, 0), plan_channels);
+    for (int local_index = 0; local_index < cell_size; local_index++) {
+        ivec3 unit_position = unit_index_to_position(cell_position, local_index);
+        digest = add_fingerprint_words(digest, texelFetch(u_read_unit.handles[0], unit_position, 0), unit_channels);
+    }
+    return digest;
+}
+
+
+// Отпечатки последнего записанного состояния (текстуры для чтения) по кирпичам - рабочим группам ячеек,
+// мирам пакета и всему пакету. Буфер обнуляется перед проходом
+void main() {
+    if (gl_LocalInvocationIndex == 0) {
+        brick_digest[0] = 0u;
+        brick_digest[1] = 0u;
+    }
+    barrier();
+
+    uvec2 digest = get_cell_fingerprint(ivec3(gl_GlobalInvocationID));
+    atomicAdd(brick_digest[0], digest.x);
+    atomicAdd(brick_digest[1], digest.y);
+    barrier();
+
+    if (gl_LocalInvocationIndex == 0) {
+        ivec3 group = ivec3(gl_WorkGroupID);
+        ivec3 group_count = ivec3(gl_NumWorkGroups);
+        int brick_index = group.x + group_count.x * (group.y + group_count.y * group.z);
+        u_fingerprint.bricks[brick_index] = uvec2(brick_digest[0], brick_digest[1]);
+
+        int world_index = get_world_index(group);
+        atomicAdd(u_fingerprint.worlds[world_index].x, brick_digest[0]);
+        atomicAdd(u_fingerprint.worlds[world_index].y, brick_digest[1]);
+        atomicAdd(u_fingerprint.total.x, brick_digest[0]);
+        atomicAdd(u_fingerprint.total.y, brick_digest[1]);
+    }
+}
@@ -0,0 +1,65 @@
+#version 460
+
+
+// Исключающая префиксная сумма (Blelloch) блоков по scan_block_size элементов.
+// Сумма каждого блока записывается в следующий уровень, начиная с u_sums_offset
+const int scan_group_size = 512;
+const int scan_block_size = scan_group_size * 2;
+
+
+layout(local_size_x = scan_group_size) in;
+shared uint block[scan_block_size];
+
+
+layout(std430, binding = 60) restrict buffer ScanBuffer {
+    uint data[];
+} u_scan_buffer;
+
+
+uniform int u_scan_offset;
+uniform int u_scan_count;
+uniform int u_sums_offset;
+
+
+void main() {
+    int thread = int(gl_LocalInvocationID.x);
+    int group = int(gl_WorkGroupID.x);
+    int block_start = group * scan_block_size;
+
+    for (int part = 0; part < 2; part++) {
+        int index = block_start + thread + part * scan_group_size;
+        block[thread + part * scan_group_size] = index < u_scan_count ? u_scan_buffer.data[u_scan_offset + index] : 0u;
+    }
+    barrier();
+
+    for (int stride = 1; stride < scan_block_size; stride *= 2) {
+        int index = (thread + 1) * stride * 2 - 1;
+        if (index < scan_block_size) {
+            block[index] += block[index - stride];
+        }
+        barrier();
+    }
+
+    if (thread == 0) {
+        u_scan_buffer.data[u_sums_offset + group] = block[scan_block_size - 1];
+        block[scan_block_size - 1] = 0u;
+    }
+    barrier();
+
+    for (int stride = scan_block_size / 2; stride > 0; stride /= 2) {
+        int index = (thread + 1) * stride * 2 - 1;
+        if (index < scan_block_size) {
+            uint left = block[index - stride];
+            block[index - stride] = block[index];
+            block[index] += left;
+        }
+        barrier();
+    }
+
+    for (int part = 0; part < 2; part++) {
+        int index = block_start + thread + part * scan_group_size;
+        if (index < u_scan_count) {
+            u_scan_buffer.data[u_scan_offset + index] = block[thread + part * scan_group_size];
+        }
+    }
+}
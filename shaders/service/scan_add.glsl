@@ -0,0 +1,33 @@
+#version 460
+
+
+// Прибавляет к элементам каждого блока уже просуммированное смещение этого блока из следующего уровня
+const int scan_group_size = 512;
+const int scan_block_size = scan_group_size * 2;
+
+
+layout(local_size_x = scan_group_size) in;
+
+
+layout(std430, binding = 60) restrict buffer ScanBuffer {
+    uint data[];
+} u_scan_buffer;
+
+
+uniform int u_scan_offset;
+uniform int u_scan_count;
+uniform int u_sums_offset;
+
+
+void main() {
+    int thread = int(gl_LocalInvocationID.x);
+    int group = int(gl_WorkGroupID.x);
+    uint block_offset = u_scan_buffer.data[u_sums_offset + group];
+
+    for (int part = 0; part < 2; part++) {
+        int index = group * scan_block_size + thread + part * scan_group_size;
+        if (index < u_scan_count) {
+            u_scan_buffer.data[u_scan_offset + index] += block_offset;
+        }
+    }
+}
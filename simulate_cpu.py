@@ -0,0 +1,89 @@
+import argparse
+import time
+
+import pyglet
+
+
+def simulate_cpu(
+        tick_count: int,
+        worker_count: int | None,
+        report_period: int,
+        fingerprint_period: int,
+        headless: bool
+) -> None:
+    if headless:
+        # Окно не нужно, но описания полей (core.service.bitfield) импортируют OpenGL
+        pyglet.options["headless"] = True
+
+    from simulator.cpu_physics import CpuWorld
+    from simulator.fingerprint import FingerprintLog, get_fingerprints
+
+    world = CpuWorld(worker_count = worker_count)
+    settings = world.settings
+    log = None
+    if fingerprint_period > 0:
+        log = FingerprintLog(
+            FingerprintLog.get_path(settings.WORLD_SEED, "cpu"),
+            world.shape,
+            settings.CELL_GROUP_SHAPE,
+            1,
+            settings.WORLD_SEED,
+            "cpu",
+            CpuWorld.GRAVITY_FIELD,
+            CpuWorld.PRESSURE_STIFFNESS,
+            CpuWorld.REACTION_COUNT,
+            CpuWorld.CREATURE_COUNT
+        )
+    try:
+        started = time.perf_counter()
+        done = 0
+        while done < tick_count:
+            ticks = min(report_period, tick_count - done)
+            step_started = time.perf_counter()
+            if log is None:
+                world.step(ticks)
+            else:
+                for _ in range(ticks):
+                    world.step()
+                    # Как у видеокарты: отпечаток с возрастом тика, после которого он снят
+                    age = world.age - world.update_period
+                    if age % fingerprint_period == 0:
+                        fingerprints = get_fingerprints(
+                            *world.get_texels(),
+                            world.shape,
+                            settings.CELL_SHAPE,
+                            settings.CELL_GROUP_SHAPE
+                        )
+                        log.write(age, *fingerprints)
+            done += ticks
+            print(f"Тиков: {done}, {(time.perf_counter() - step_started) * 1000 / ticks:.3f} мс на тик")
+            world.log_timings()
+        if done > 0:
+            print(f"В среднем {(time.perf_counter() - started) * 1000 / done:.3f} мс на тик")
+    finally:
+        if log is not None:
+            log.close()
+        world.stop()
+        print(f"Симуляция на процессоре окончена. Возраст мира: {world.age}, работников: {world.worker_count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Физика мира (создание, импульс, перемещение) на ядрах процессора")
+    parser.add_argument("ticks", type = int, help = "количество тиков")
+    parser.add_argument("--workers", type = int, default = None, help = "количество процессов, по умолчанию ядер")
+    parser.add_argument("--report", type = int, default = 100, help = "тиков между отчетами о времени")
+    parser.add_argument(
+        "--fingerprint",
+        type = int,
+        default = 0,
+        help = "период отпечатков состояния в тиках для сравнения с видеокартой (compare_fingerprints.py), 0 - без них"
+    )
+    parser.add_argument("--headless", action = "store_true", help = "без оконной системы (EGL)")
+    arguments = parser.parse_args()
+    simulate_cpu(
+        arguments.ticks,
+        arguments.workers,
+        max(arguments.report, 1),
+        max(arguments.fingerprint, 0),
+        arguments.headless
+    )
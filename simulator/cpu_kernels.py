@@ -0,0 +1,401 @@
+import numba
+import numpy as np
+import numpy.typing as npt
+from numba import boolean, float32, int32, int64, prange, uint32, void
+from pyglet.math import Vec3
+
+from core.service.bitfield import BitfieldLayout
+from simulator.cpu_physics import CELL_FIELDS, SlabState, UNIT_FIELDS
+
+
+# Стадии физики на процессоре, скомпилированные Numba: те же create_slab, plan_units и move_units,
+# что и в cpu_physics.py, но циклом по ячейкам, параллельным по плоскостям слоя.
+# Сигнатуры заданы явно, поэтому функции компилируются при импорте модуля, а cache = True сохраняет результат
+# рядом с модулем: компиляцию оплачивает первый запуск (CpuWorld импортирует модуль до старта работников),
+# а работники и следующие запуски загружают готовый код.
+# Деление на 0 дает inf, как в GLSL, а не исключение (error_model = "numpy")
+
+# Массивы слоя: ячейки (x, y, z), юниты (x, y, z, юнит), импульсы (x, y, z, юнит, компонента)
+CELLS = int32[:, :, ::1]
+UNITS = int32[:, :, :, ::1]
+MOMENTA = int32[:, :, :, :, ::1]
+FLAGS = boolean[:, :, :, ::1]
+VECTOR = int32[::1]
+
+INT_MIN = np.iinfo(np.int32).min
+INT_MAX = np.iinfo(np.int32).max
+
+SUBSTANCE_ID_FIELD = (UNIT_FIELDS["substance_id"].bits, UNIT_FIELDS["substance_id"].zero_offset)
+QUANTITY_FIELD = (UNIT_FIELDS["quantity"].bits, UNIT_FIELDS["quantity"].zero_offset)
+MOMENTUM_FIELD = (UNIT_FIELDS["momentum"].bits, UNIT_FIELDS["momentum"].zero_offset)
+FILLED_UNITS_FIELD = (CELL_FIELDS["filled_units"].bits, CELL_FIELDS["filled_units"].zero_offset)
+BACKWARD_PLANS_FIELD = (CELL_FIELDS["backward_plans"].bits, CELL_FIELDS["backward_plans"].zero_offset)
+FORWARD_PLANS_FIELD = (CELL_FIELDS["forward_plans"].bits, CELL_FIELDS["forward_plans"].zero_offset)
+TOTAL_QUANTITY_FIELD = (CELL_FIELDS["total_quantity"].bits, CELL_FIELDS["total_quantity"].zero_offset)
+
+OPTIONS = {"parallel": True, "cache": True, "nogil": True, "error_model": "numpy"}
+
+
+# wrap_field для одного значения: field - (бит, смещение нуля)
+@numba.njit(int64(int64, numba.types.UniTuple(int64, 2)), cache = True, nogil = True)
+def wrap(value: int, field: tuple[int, int]) -> int:
+    bits, zero_offset = field
+    return ((value + zero_offset) & ((1 << bits) - 1)) - zero_offset
+
+
+@numba.njit(void(CELLS, CELLS, UNITS, UNITS, int64, int64, int64, int64, int64), **OPTIONS)
+def create_kernel(
+        filled_units: npt.NDArray[np.int32],
+        total_quantity: npt.NDArray[np.int32],
+        substance_id: npt.NDArray[np.int32],
+        quantity: npt.NDArray[np.int32],
+        x_start: int,
+        shape_x: int,
+        shape_y: int,
+        shape_z: int,
+        substance_count: int
+) -> None:
+    plane_count = filled_units.shape[0] - 2
+    center_x = float32(shape_x) / float32(2.0)
+    center_y = float32(shape_y) / float32(2.0)
+    center_z = float32(shape_z) / float32(2.0)
+    sphere_radius = float32(min(shape_x, shape_y, shape_z)) / float32(2.0)
+    layer_count = substance_count - 1
+
+    for plane in prange(1, plane_count + 1):
+        dx = float32(x_start + plane - 1) - center_x
+        for y in range(shape_y):
+            dy = float32(y) - center_y
+            for z in range(shape_z):
+                dz = float32(z) - center_z
+                radius = np.sqrt(float32(dx * dx + dy * dy + dz * dz))
+                layer = min(max(int(float32(layer_count) * (radius / sphere_radius)), 0), layer_count - 1) + 1
+                value = float32(300.0) * (sphere_radius - radius) / radius
+                # int(inf) в GLSL не определен, видеокарты и llvmpipe дают минимальный int
+                if not np.isfinite(value) or value <= INT_MIN:
+                    unit_quantity = INT_MIN
+                elif value >= INT_MAX:
+                    unit_quantity = INT_MAX
+                else:
+                    unit_quantity = int(value)
+
+                filled = unit_quantity > 0
+                substance_id[plane, y, z, 0] = wrap(layer if filled else 0, SUBSTANCE_ID_FIELD)
+                quantity[plane, y, z, 0] = wrap(unit_quantity, QUANTITY_FIELD)
+                filled_units[plane, y, z] = 1 if filled else 0
+                total_quantity[plane, y, z] = quantity[plane, y, z, 0] if filled else 0
+
+
+@numba.njit(
+    void(CELLS, CELLS, CELLS, UNITS, UNITS, MOMENTA, FLAGS, FLAGS, int64, int64, VECTOR, int64, VECTOR),
+    **OPTIONS
+)
+def plan_kernel(
+        filled_units: npt.NDArray[np.int32],
+        backward_plans: npt.NDArray[np.int32],
+        forward_plans: npt.NDArray[np.int32],
+        substance_id: npt.NDArray[np.int32],
+        quantity: npt.NDArray[np.int32],
+        momentum: npt.NDArray[np.int32],
+        presence: npt.NDArray[np.bool_],
+        direction: npt.NDArray[np.bool_],
+        x_start: int,
+        age: int,
+        gravity_vector: npt.NDArray[np.int32],
+        update_period: int,
+        mass: npt.NDArray[np.int32]
+) -> None:
+    plane_count, length, height = filled_units.shape
+    cell_size = quantity.shape[-1]
+    axis = age % 3
+
+    for plane in prange(1, plane_count - 1):
+        gravity_applied = x_start + plane - 1 > 0
+        for y in range(length):
+            for z in range(height):
+                filled = filled_units[plane, y, z]
+                backward = 0
+                forward = 0
+                for unit in range(cell_size):
+                    presence[plane, y, z, unit] = False
+                    direction[plane, y, z, unit] = False
+                    if unit >= filled:
+                        continue
+
+                    # Заявка решается по импульсу до усечения до ширины поля
+                    momentum_d = 0
+                    for component in range(3):
+                        value = int64(momentum[plane, y, z, unit, component])
+                        if gravity_applied:
+                            value += int64(gravity_vector[component]) * quantity[plane, y, z, unit] * update_period
+                        momentum[plane, y, z, unit, component] = wrap(value, MOMENTUM_FIELD)
+                        if component == axis:
+                            momentum_d = value
+
+                    if momentum_d != 0 and abs(momentum_d) >= mass[substance_id[plane, y, z, unit]]:
+                        presence[plane, y, z, unit] = True
+                        direction[plane, y, z, unit] = momentum_d > 0
+                        if momentum_d > 0:
+                            forward += 1
+                        else:
+                            backward += 1
+                backward_plans[plane, y, z] = wrap(backward, BACKWARD_PLANS_FIELD)
+                forward_plans[plane, y, z] = wrap(forward, FORWARD_PLANS_FIELD)
+
+
+@numba.njit(
+    void(
+        CELLS, CELLS, CELLS, UNITS, UNITS, MOMENTA, FLAGS, FLAGS,
+        CELLS, CELLS, CELLS, CELLS, UNITS, UNITS, MOMENTA, FLAGS, FLAGS,
+        int64, int64, VECTOR
+    ),
+    **OPTIONS
+)
+def move_kernel(
+        read_filled_units: npt.NDArray[np.int32],
+        read_backward_plans: npt.NDArray[np.int32],
+        read_forward_plans: npt.NDArray[np.int32],
+        read_substance_id: npt.NDArray[np.int32],
+        read_quantity: npt.NDArray[np.int32],
+        read_momentum: npt.NDArray[np.int32],
+        read_presence: npt.NDArray[np.bool_],
+        read_direction: npt.NDArray[np.bool_],
+        write_filled_units: npt.NDArray[np.int32],
+        write_backward_plans: npt.NDArray[np.int32],
+        write_forward_plans: npt.NDArray[np.int32],
+        write_total_quantity: npt.NDArray[np.int32],
+        write_substance_id: npt.NDArray[np.int32],
+        write_quantity: npt.NDArray[np.int32],
+        write_momentum: npt.NDArray[np.int32],
+        write_presence: npt.NDArray[np.bool_],
+        write_direction: npt.NDArray[np.bool_],
+        x_start: int,
+        age: int,
+        mass: npt.NDArray[np.int32]
+) -> None:
+    plane_count, length, height = read_filled_units.shape
+    cell_size = read_quantity.shape[-1]
+    axis = age % 3
+    parity = (age // 3) % 2
+
+    for plane in prange(1, plane_count - 1):
+        for y in range(length):
+            for z in range(height):
+                if axis == 0:
+                    coordinate = x_start + plane - 1
+                elif axis == 1:
+                    coordinate = y
+                else:
+                    coordinate = z
+                pair_side = 1 if (coordinate + parity) % 2 == 0 else -1
+                forward_side = pair_side > 0
+                # Соседи за границей слоя лежат в гало
+                partner_plane, partner_y, partner_z = plane, y, z
+                if axis == 0:
+                    partner_plane = plane + pair_side
+                elif axis == 1:
+                    partner_y = (y + pair_side) % length
+                else:
+                    partner_z = (z + pair_side) % height
+
+                cell_filled = read_filled_units[plane, y, z]
+                partner_filled = read_filled_units[partner_plane, partner_y, partner_z]
+                if forward_side:
+                    outgoing = read_forward_plans[plane, y, z]
+                    incoming = read_backward_plans[partner_plane, partner_y, partner_z]
+                else:
+                    outgoing = read_backward_plans[plane, y, z]
+                    incoming = read_forward_plans[partner_plane, partner_y, partner_z]
+                # Сначала юниты обмениваются попарно, остальные заявки выполняются, пока есть место
+                swapped = min(outgoing, incoming)
+                sent = swapped + min(outgoing - swapped, cell_size - partner_filled)
+                received = swapped + min(incoming - swapped, cell_size - cell_filled)
+
+                # Оставшиеся юниты сдвигаются к началу ячейки в прежнем порядке, пришедшие дописываются за ними
+                target = 0
+                left = 0
+                cell_quantity = 0
+                for unit in range(cell_filled):
+                    if (
+                            left < sent
+                            and read_presence[plane, y, z, unit]
+                            and read_direction[plane, y, z, unit] == forward_side
+                    ):
+                        left += 1
+                        continue
+                    write_substance_id[plane, y, z, target] = read_substance_id[plane, y, z, unit]
+                    write_quantity[plane, y, z, target] = read_quantity[plane, y, z, unit]
+                    cell_quantity += read_quantity[plane, y, z, unit]
+                    for component in range(3):
+                        write_momentum[plane, y, z, target, component] = read_momentum[plane, y, z, unit, component]
+                    target += 1
+
+                arrived = 0
+                for unit in range(partner_filled):
+                    if (
+                            arrived >= received
+                            or not read_presence[partner_plane, partner_y, partner_z, unit]
+                            or read_direction[partner_plane, partner_y, partner_z, unit] == forward_side
+                    ):
+                        continue
+                    arrived += 1
+                    unit_substance_id = read_substance_id[partner_plane, partner_y, partner_z, unit]
+                    write_substance_id[plane, y, z, target] = unit_substance_id
+                    write_quantity[plane, y, z, target] = read_quantity[partner_plane, partner_y, partner_z, unit]
+                    cell_quantity += read_quantity[partner_plane, partner_y, partner_z, unit]
+                    for component in range(3):
+                        value = int64(read_momentum[partner_plane, partner_y, partner_z, unit, component])
+                        # Переход в соседнюю ячейку расходует импульс, равный массе вещества
+                        if component == axis:
+                            value = wrap(value + pair_side * mass[unit_substance_id], MOMENTUM_FIELD)
+                        write_momentum[plane, y, z, target, component] = value
+                    target += 1
+
+                for unit in range(target, cell_size):
+                    write_substance_id[plane, y, z, unit] = 0
+                    write_quantity[plane, y, z, unit] = 0
+                    for component in range(3):
+                        write_momentum[plane, y, z, unit, component] = 0
+                for unit in range(cell_size):
+                    write_presence[plane, y, z, unit] = False
+                    write_direction[plane, y, z, unit] = False
+                write_filled_units[plane, y, z] = wrap(target, FILLED_UNITS_FIELD)
+                write_backward_plans[plane, y, z] = 0
+                write_forward_plans[plane, y, z] = 0
+                write_total_quantity[plane, y, z] = wrap(cell_quantity, TOTAL_QUANTITY_FIELD)
+
+
+# Упаковка столбцов значений (запись, столбец) в слова текселов (запись, канал) по таблице частей полей:
+# строка - (столбец, слово, сдвиг в слове, бит, сдвиг в значении, смещение нуля), как BitfieldLayout.encode
+@numba.njit(void(int64[:, ::1], int64[:, ::1], uint32[:, ::1]), **OPTIONS)
+def pack_kernel(values: npt.NDArray[np.int64], table: npt.NDArray[np.int64], texels: npt.NDArray[np.uint32]) -> None:
+    for record in prange(values.shape[0]):
+        for channel in range(texels.shape[1]):
+            texels[record, channel] = 0
+        for row in range(table.shape[0]):
+            column, word, offset, bits, source_offset, zero_offset = table[row]
+            part = ((values[record, column] + zero_offset) >> source_offset) & ((1 << bits) - 1)
+            texels[record, word] |= uint32(part << offset)
+
+
+@numba.njit(void(uint32[:, ::1], int64[:, ::1], int64[:, ::1]), **OPTIONS)
+def unpack_kernel(texels: npt.NDArray[np.uint32], table: npt.NDArray[np.int64], values: npt.NDArray[np.int64]) -> None:
+    for record in prange(texels.shape[0]):
+        for column in range(values.shape[1]):
+            values[record, column] = 0
+        for row in range(table.shape[0]):
+            column, word, offset, bits, source_offset, _ = table[row]
+            part = (int64(texels[record, word]) >> offset) & ((1 << bits) - 1)
+            values[record, column] |= part << source_offset
+        for row in range(table.shape[0]):
+            # Смещение нуля вычитается один раз на столбец: по первой части поля
+            column, _, _, _, source_offset, zero_offset = table[row]
+            if source_offset == 0:
+                values[record, column] -= zero_offset
+
+
+# Таблица частей полей записи для pack_kernel и unpack_kernel и столбцы значений: (поле, компонента)
+def get_slice_table(layout: BitfieldLayout) -> tuple[npt.NDArray[np.int64], list[tuple[str, int]]]:
+    columns = [(field.name, component) for field in layout.fields for component in range(field.components)]
+    table = np.array(
+        [
+            (
+                columns.index((bit_slice.field.name, bit_slice.component)),
+                bit_slice.word,
+                bit_slice.offset,
+                bit_slice.bits,
+                bit_slice.source_offset,
+                bit_slice.field.zero_offset
+            )
+            for bit_slice in layout.slices
+        ],
+        dtype = np.int64
+    )
+    return table, columns
+
+
+# Параллельные аналоги BitfieldLayout.encode и BitfieldLayout.decode
+def encode(layout: BitfieldLayout, values: npt.NDArray) -> npt.NDArray[np.uint32]:
+    table, columns = get_slice_table(layout)
+    flat = values.reshape(-1)
+    matrix = np.empty((flat.shape[0], len(columns)), dtype = np.int64)
+    for column, (name, component) in enumerate(columns):
+        matrix[:, column] = flat[name] if flat[name].ndim == 1 else flat[name][:, component]
+    texels = np.empty((flat.shape[0], layout.channels), dtype = np.uint32)
+    pack_kernel(matrix, table, texels)
+    return texels.reshape(*values.shape, layout.channels)
+
+
+def decode(layout: BitfieldLayout, texels: npt.NDArray[np.uint32]) -> npt.NDArray:
+    table, columns = get_slice_table(layout)
+    matrix = np.empty((texels[..., 0].size, len(columns)), dtype = np.int64)
+    unpack_kernel(np.ascontiguousarray(texels, dtype = np.uint32).reshape(-1, layout.channels), table, matrix)
+    values = np.zeros(matrix.shape[0], dtype = layout.dtype)
+    for column, (name, component) in enumerate(columns):
+        if values[name].ndim == 1:
+            values[name] = matrix[:, column]
+        else:
+            values[name][:, component] = matrix[:, column]
+    return values.reshape(texels.shape[:-1])
+
+
+# --- Обертки с сигнатурами стадий cpu_physics.py ---
+
+def create_slab(state: SlabState, x_start: int, shape: Vec3, substance_count: int) -> None:
+    for array in state.arrays.values():
+        array[...] = 0
+    create_kernel(state.filled_units, state.total_quantity, state.substance_id, state.quantity, x_start, *shape, substance_count)
+
+
+def plan_units(
+        state: SlabState,
+        x_start: int,
+        age: int,
+        gravity_vector: npt.NDArray[np.int32],
+        update_period: int,
+        mass: npt.NDArray[np.int32]
+) -> None:
+    plan_kernel(
+        state.filled_units,
+        state.backward_plans,
+        state.forward_plans,
+        state.substance_id,
+        state.quantity,
+        state.momentum,
+        state.presence,
+        state.direction,
+        x_start,
+        age,
+        gravity_vector,
+        update_period,
+        mass
+    )
+
+
+def move_units(read: SlabState, write: SlabState, x_start: int, age: int, mass: npt.NDArray[np.int32]) -> None:
+    move_kernel(
+        read.filled_units,
+        read.backward_plans,
+        read.forward_plans,
+        read.substance_id,
+        read.quantity,
+        read.momentum,
+        read.presence,
+        read.direction,
+        write.filled_units,
+        write.backward_plans,
+        write.forward_plans,
+        write.total_quantity,
+        write.substance_id,
+        write.quantity,
+        write.momentum,
+        write.presence,
+        write.direction,
+        x_start,
+        age,
+        mass
+    )
+
+
+def set_thread_count(thread_count: int) -> None:
+    numba.set_num_threads(max(1, min(thread_count, numba.config.NUMBA_NUM_THREADS)))
@@ -0,0 +1,683 @@
+import importlib.util
+import math
+import multiprocessing
+import multiprocessing.connection
+import threading
+import time
+from multiprocessing import shared_memory
+from types import ModuleType
+from typing import Any, Callable
+
+import numpy as np
+import numpy.typing as npt
+from pyglet.math import Vec3
+
+from core.service.bitfield import BitField, BitfieldLayout, CELL_LAYOUT, PLAN_LAYOUT, UNIT_LAYOUT
+from core.service.object import ProjectMixin
+from core.service.threads.jobs import ArrayDescriptor, SharedArray
+from simulator.substance import SUBSTANCES
+
+
+class CpuPhysicsError(Exception):
+    pass
+
+
+UNIT_FIELDS = {field.name: field for field in UNIT_LAYOUT.fields}
+CELL_FIELDS = {field.name: field for field in CELL_LAYOUT.fields}
+# Поля ячейки в состоянии слоя совпадают с полями Cell
+CELL_STATE_FIELDS = tuple(CELL_FIELDS)
+
+
+# Значение поля после упаковки в тексел и распаковки: биты сверх ширины поля теряются, как в bitfieldInsert
+def wrap_field(values: npt.NDArray, field: BitField) -> npt.NDArray[np.int32]:
+    mask = (1 << field.bits) - 1
+    stored = (values.astype(np.int64) + field.zero_offset) & mask
+    return (stored - field.zero_offset).astype(np.int32)
+
+
+# Поля состояния ячеек и юнитов в распакованном виде: (имя, тип, форма после формы ячеек)
+def get_state_fields(cell_size: int) -> list[tuple[str, np.dtype, tuple[int, ...]]]:
+    return [
+        ("filled_units", np.dtype(np.int32), ()),
+        ("backward_plans", np.dtype(np.int32), ()),
+        ("forward_plans", np.dtype(np.int32), ()),
+        ("total_quantity", np.dtype(np.int32), ()),
+        ("substance_id", np.dtype(np.int32), (cell_size,)),
+        ("quantity", np.dtype(np.int32), (cell_size,)),
+        ("momentum", np.dtype(np.int32), (cell_size, 3)),
+        # Заявки юнитов (Plan) по одному флагу на юнит
+        ("presence", np.dtype(np.bool_), (cell_size,)),
+        ("direction", np.dtype(np.bool_), (cell_size,))
+    ]
+
+
+# Состояние слоя мира: массивы ячеек формы (x, y, z, ...) с осью x первой.
+# У слоя работника по оси x есть еще по плоскости с каждой стороны (гало) - копии крайних плоскостей соседей
+class SlabState:
+    def __init__(self, arrays: dict[str, npt.NDArray]) -> None:
+        self.arrays = arrays
+        self.filled_units = arrays["filled_units"]
+        self.backward_plans = arrays["backward_plans"]
+        self.forward_plans = arrays["forward_plans"]
+        self.total_quantity = arrays["total_quantity"]
+        self.substance_id = arrays["substance_id"]
+        self.quantity = arrays["quantity"]
+        self.momentum = arrays["momentum"]
+        self.presence = arrays["presence"]
+        self.direction = arrays["direction"]
+
+
+# Размещение двух наборов состояния слоя (для чтения и для записи, как текстуры мира) в одном блоке памяти
+class SlabLayout:
+    ALIGNMENT = 64
+
+    def __init__(self, plane_count: int, shape: Vec3, cell_size: int) -> None:
+        # Плоскости вместе с гало
+        self.plane_count = plane_count + 2
+        self.cell_shape = (self.plane_count, shape.y, shape.z)
+        self.entries: list[tuple[int, str, np.dtype, tuple[int, ...]]] = []
+        offset = 0
+        for state_index in range(2):
+            for name, dtype, tail in get_state_fields(cell_size):
+                field_shape = (*self.cell_shape, *tail)
+                self.entries.append((state_index, name, dtype, field_shape))
+                offset += math.ceil(math.prod(field_shape) * dtype.itemsize / self.ALIGNMENT) * self.ALIGNMENT
+        self.size = offset
+
+    def get_states(self, buffer: memoryview) -> tuple[SlabState, SlabState]:
+        arrays: tuple[dict[str, npt.NDArray], dict[str, npt.NDArray]] = ({}, {})
+        offset = 0
+        for state_index, name, dtype, field_shape in self.entries:
+            arrays[state_index][name] = np.ndarray(field_shape, dtype, buffer, offset)
+            offset += math.ceil(math.prod(field_shape) * dtype.itemsize / self.ALIGNMENT) * self.ALIGNMENT
+        return SlabState(arrays[0]), SlabState(arrays[1])
+
+
+# --- Стадии мира на процессоре, повторяют creation.glsl, stage_0.glsl и stage_1.glsl для одного мира ---
+
+# creation.glsl для плоскостей слоя, x_start - координата x первой плоскости в мире
+def create_slab(state: SlabState, x_start: int, shape: Vec3, substance_count: int) -> None:
+    for array in state.arrays.values():
+        array[...] = 0
+
+    inner = slice(1, -1)
+    plane_count = state.filled_units.shape[0] - 2
+    x = np.arange(x_start, x_start + plane_count, dtype = np.float32)[:, None, None]
+    y = np.arange(shape.y, dtype = np.float32)[None, :, None]
+    z = np.arange(shape.z, dtype = np.float32)[None, None, :]
+    center = np.array(tuple(shape), dtype = np.float32) / np.float32(2.0)
+    radius = np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2 + (z - center[2]) ** 2)
+    sphere_radius = np.float32(min(shape)) / np.float32(2.0)
+
+    layer_count = substance_count - 1
+    layer = np.clip((np.float32(layer_count) * (radius / sphere_radius)).astype(np.int32), 0, layer_count - 1) + 1
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        quantity = np.float32(300.0) * (sphere_radius - radius) / radius
+    # В центре мира деление на 0: int(inf) в GLSL не определен, видеокарты и llvmpipe дают минимальный int,
+    # поэтому центральная ячейка остается пустой
+    int_min = np.iinfo(np.int32).min
+    quantity = np.nan_to_num(quantity, nan = int_min, posinf = int_min, neginf = int_min)
+    quantity = np.clip(quantity, np.iinfo(np.int32).min, np.iinfo(np.int32).max).astype(np.int64)
+
+    filled = quantity > 0
+    state.substance_id[inner, ..., 0] = wrap_field(np.where(filled, layer, 0), UNIT_FIELDS["substance_id"])
+    state.quantity[inner, ..., 0] = wrap_field(quantity, UNIT_FIELDS["quantity"])
+    state.filled_units[inner] = filled
+    state.total_quantity[inner] = np.where(filled, state.quantity[inner, ..., 0], 0)
+
+
+# stage_0.glsl: импульс от гравитации и заявки юнитов на переход. Меняет плоскости слоя на месте
+def plan_units(
+        state: SlabState,
+        x_start: int,
+        age: int,
+        gravity_vector: npt.NDArray[np.int32],
+        update_period: int,
+        mass: npt.NDArray[np.int32]
+) -> None:
+    inner = slice(1, -1)
+    filled = state.filled_units[inner]
+    cell_size = state.quantity.shape[-1]
+    active = np.arange(cell_size) < filled[..., None]
+
+    plane_count = filled.shape[0]
+    gravity_applied = (np.arange(x_start, x_start + plane_count) > 0)[:, None, None, None]
+    quantity = state.quantity[inner]
+    impulse = gravity_vector.astype(np.int64) * (quantity[..., None].astype(np.int64) * update_period)
+    momentum = np.where(
+        (active & gravity_applied)[..., None],
+        state.momentum[inner].astype(np.int64) + impulse,
+        state.momentum[inner]
+    )
+    # Как и на видеокарте, заявка решается по импульсу до усечения до ширины поля, а усекается только записываемый
+    state.momentum[inner] = wrap_field(momentum, UNIT_FIELDS["momentum"])
+
+    momentum_d = momentum[..., age % 3]
+    unit_mass = mass[np.where(active, state.substance_id[inner], 0)]
+    planned = active & (momentum_d != 0) & (np.abs(momentum_d) >= unit_mass)
+    backward = planned & (momentum_d < 0)
+    forward = planned & (momentum_d > 0)
+    state.presence[inner] = planned
+    state.direction[inner] = forward
+    state.backward_plans[inner] = wrap_field(np.sum(backward, axis = -1), CELL_FIELDS["backward_plans"])
+    state.forward_plans[inner] = wrap_field(np.sum(forward, axis = -1), CELL_FIELDS["forward_plans"])
+
+
+# stage_1.glsl: обмен юнитами с парной ячейкой по оси age % 3. Читает read вместе с гало, пишет плоскости write
+def move_units(read: SlabState, write: SlabState, x_start: int, age: int, mass: npt.NDArray[np.int32]) -> None:
+    inner = slice(1, -1)
+    plane_count, length, height = read.filled_units[inner].shape
+    cell_size = read.quantity.shape[-1]
+    axis = age % 3
+    parity = (age // 3) % 2
+
+    # Индексы ячеек в массивах с гало и координата ячейки в мире по оси обмена
+    x_index, y_index, z_index = np.meshgrid(
+        np.arange(1, plane_count + 1),
+        np.arange(length),
+        np.arange(height),
+        indexing = "ij"
+    )
+    coordinates = (x_index - 1 + x_start, y_index, z_index)
+    pair_side = np.where((coordinates[axis] + parity) % 2 == 0, 1, -1)
+    partner_index = [x_index, y_index, z_index]
+    if axis == 0:
+        # Соседи за границей слоя лежат в гало, переход через границу мира учтен при обмене гало
+        partner_index[0] = x_index + pair_side
+    else:
+        partner_index[axis] = (partner_index[axis] + pair_side) % (length, height)[axis - 1]
+    partner_index = tuple(partner_index)
+
+    cell_count = plane_count * length * height
+    pair_side = pair_side.reshape(cell_count)
+    forward_side = pair_side > 0
+    cell_filled = read.filled_units[inner].reshape(cell_count)
+    partner_filled = read.filled_units[partner_index].reshape(cell_count)
+
+    # Сначала юниты обмениваются попарно, остальные заявки выполняются, пока есть место
+    outgoing = np.where(
+        forward_side,
+        read.forward_plans[inner].reshape(cell_count),
+        read.backward_plans[inner].reshape(cell_count)
+    )
+    incoming = np.where(
+        forward_side,
+        read.backward_plans[partner_index].reshape(cell_count),
+        read.forward_plans[partner_index].reshape(cell_count)
+    )
+    swapped = np.minimum(outgoing, incoming)
+    sent = swapped + np.minimum(outgoing - swapped, cell_size - partner_filled)
+    received = swapped + np.minimum(incoming - swapped, cell_size - cell_filled)
+
+    unit_indices = np.arange(cell_size)
+    active = unit_indices < cell_filled[:, None]
+    leaving = (
+            active
+            & read.presence[inner].reshape(cell_count, cell_size)
+            & (read.direction[inner].reshape(cell_count, cell_size) == forward_side[:, None])
+    )
+    # Уходят первые sent юнитов с заявками в сторону пары
+    leaving &= np.cumsum(leaving, axis = 1) <= sent[:, None]
+    kept = active & ~leaving
+    kept_count = kept.sum(axis = 1)
+
+    partner_active = unit_indices < partner_filled[:, None]
+    arriving = (
+            partner_active
+            & read.presence[partner_index].reshape(cell_count, cell_size)
+            & (read.direction[partner_index].reshape(cell_count, cell_size) != forward_side[:, None])
+    )
+    arriving &= np.cumsum(arriving, axis = 1) <= received[:, None]
+
+    substance_id = np.zeros((cell_count, cell_size), dtype = np.int32)
+    quantity = np.zeros((cell_count, cell_size), dtype = np.int32)
+    momentum = np.zeros((cell_count, cell_size, 3), dtype = np.int32)
+
+    # Оставшиеся юниты сдвигаются к началу ячейки в прежнем порядке, пришедшие дописываются за ними
+    cells, units = np.nonzero(kept)
+    targets = (np.cumsum(kept, axis = 1) - 1)[cells, units]
+    substance_id[cells, targets] = read.substance_id[inner].reshape(cell_count, cell_size)[cells, units]
+    quantity[cells, targets] = read.quantity[inner].reshape(cell_count, cell_size)[cells, units]
+    momentum[cells, targets] = read.momentum[inner].reshape(cell_count, cell_size, 3)[cells, units]
+
+    cells, units = np.nonzero(arriving)
+    targets = (np.cumsum(arriving, axis = 1) - 1 + kept_count[:, None])[cells, units]
+    arrived_substance_id = read.substance_id[partner_index].reshape(cell_count, cell_size)[cells, units]
+    arrived_momentum = read.momentum[partner_index].reshape(cell_count, cell_size, 3)[cells, units]
+    # Переход в соседнюю ячейку расходует импульс, равный массе вещества
+    arrived_momentum[:, axis] = wrap_field(
+        arrived_momentum[:, axis].astype(np.int64) + pair_side[cells] * mass[arrived_substance_id],
+        UNIT_FIELDS["momentum"]
+    )
+    substance_id[cells, targets] = arrived_substance_id
+    quantity[cells, targets] = read.quantity[partner_index].reshape(cell_count, cell_size)[cells, units]
+    momentum[cells, targets] = arrived_momentum
+
+    shape = (plane_count, length, height)
+    write.substance_id[inner] = substance_id.reshape(*shape, cell_size)
+    write.quantity[inner] = quantity.reshape(*shape, cell_size)
+    write.momentum[inner] = momentum.reshape(*shape, cell_size, 3)
+    write.filled_units[inner] = wrap_field(
+        (kept_count + arriving.sum(axis = 1)).reshape(shape),
+        CELL_FIELDS["filled_units"]
+    )
+    write.backward_plans[inner] = 0
+    write.forward_plans[inner] = 0
+    write.total_quantity[inner] = wrap_field(quantity.sum(axis = 1).reshape(shape), CELL_FIELDS["total_quantity"])
+    write.presence[inner] = False
+    write.direction[inner] = False
+
+
+# Реализации стадий: "numpy" - функции выше, "numba" - скомпилированные циклы по ячейкам (simulator/cpu_kernels.py)
+BACKENDS = ("numpy", "numba")
+
+
+def is_numba_available() -> bool:
+    return importlib.util.find_spec("numba") is not None
+
+
+# Модуль ядер Numba (simulator/cpu_kernels.py). Ядра в каждом процессе вызывает один поток, поэтому достаточно
+# простого слоя потоков workqueue: с TBB основной процесс не завершается после работы процессов-работников,
+# запущенных через fork. Слой запускается уже при компиляции параллельных ядер, поэтому выбирается до импорта
+def import_kernels() -> ModuleType:
+    import numba
+
+    numba.config.THREADING_LAYER = "workqueue"
+    from simulator import cpu_kernels
+
+    return cpu_kernels
+
+
+# (create_slab, plan_units, move_units) реализации
+def get_stages(backend: str) -> tuple[Callable[..., None], Callable[..., None], Callable[..., None]]:
+    if backend == "numba":
+        cpu_kernels = import_kernels()
+        return cpu_kernels.create_slab, cpu_kernels.plan_units, cpu_kernels.move_units
+    return create_slab, plan_units, move_units
+
+
+# (encode, decode) записей в тексели реализации, с аргументами (layout, значения) как у BitfieldLayout
+def get_codec(backend: str) -> tuple[Callable[..., npt.NDArray], Callable[..., npt.NDArray]]:
+    if backend == "numba":
+        cpu_kernels = import_kernels()
+        return cpu_kernels.encode, cpu_kernels.decode
+    return BitfieldLayout.encode, BitfieldLayout.decode
+
+
+# --- Работники ---
+
+COMMAND_STOP = 0
+COMMAND_CREATE = 1
+COMMAND_TICK = 2
+
+# Столбцы статистики работника
+TIMING_WORK = 0
+TIMING_EXCHANGE = 1
+TIMING_WAIT = 2
+TIMING_TICKS = 3
+
+
+# Копирует крайние плоскости слоя в гало соседей
+def exchange_halo(state: SlabState, left: SlabState, right: SlabState) -> None:
+    for name, array in state.arrays.items():
+        left.arrays[name][-1] = array[1]
+        right.arrays[name][0] = array[-2]
+
+
+# Выполняется в процессе-работнике. Работник владеет слоем плоскостей [x_start; x_stop) и шагает со всеми
+# в ногу: после stage_0 каждый пишет свои крайние плоскости в гало соседей и ждет на барьере остальных,
+# затем выполняет stage_1. Наборы состояния чередуются, как текстуры мира, поэтому гало следующего тика пишутся
+# в другой набор, чем читается в этом, и второй барьер за тик не нужен
+def run_worker(
+        index: int,
+        slab_names: list[str],
+        bounds: list[tuple[int, int]],
+        shape: tuple[int, int, int],
+        cell_size: int,
+        parameters: dict[str, Any],
+        control: ArrayDescriptor,
+        timings: ArrayDescriptor,
+        control_barrier: threading.Barrier,
+        tick_barrier: threading.Barrier
+) -> None:
+    worker_count = len(bounds)
+    neighbours = {index, (index - 1) % worker_count, (index + 1) % worker_count}
+    try:
+        # Присоединение к памяти тоже может завершиться ошибкой, и тогда барьеры должны быть сломаны
+        memories = {
+            neighbour: shared_memory.SharedMemory(slab_names[neighbour], track = False) for neighbour in neighbours
+        }
+        control_memory = shared_memory.SharedMemory(control[0], track = False)
+        timing_memory = shared_memory.SharedMemory(timings[0], track = False)
+        run_worker_loop(
+            index,
+            {
+                neighbour: SlabLayout(bounds[neighbour][1] - bounds[neighbour][0], Vec3(*shape), cell_size).get_states(
+                    memory.buf
+                )
+                for neighbour, memory in memories.items()
+            },
+            bounds[index][0],
+            Vec3(*shape),
+            parameters,
+            np.ndarray(control[1], np.dtype(control[2]), control_memory.buf),
+            np.ndarray(timings[1], np.dtype(timings[2]), timing_memory.buf)[index],
+            control_barrier,
+            tick_barrier
+        )
+    except BaseException:
+        # Остальные работники и основной процесс не должны ждать на барьерах вечно.
+        # Память не закрывается: на нее еще ссылаются представления в трассировке исключения
+        control_barrier.abort()
+        tick_barrier.abort()
+        raise
+    # Представления над памятью живут только в run_worker_loop, поэтому здесь ее уже можно закрыть
+    for memory in (*memories.values(), control_memory, timing_memory):
+        memory.close()
+
+
+def run_worker_loop(
+        index: int,
+        states: dict[int, tuple[SlabState, SlabState]],
+        x_start: int,
+        shape: Vec3,
+        parameters: dict[str, Any],
+        command: npt.NDArray[np.int64],
+        timing: npt.NDArray[np.float64],
+        control_barrier: threading.Barrier,
+        tick_barrier: threading.Barrier
+) -> None:
+    worker_count = len(parameters["bounds"])
+    own = states[index]
+    left = states[(index - 1) % worker_count]
+    right = states[(index + 1) % worker_count]
+    mass = np.asarray(parameters["mass"], dtype = np.int32)
+    gravity_vector = np.asarray(parameters["gravity_vector"], dtype = np.int32)
+    update_period = parameters["update_period"]
+    create, plan, move = get_stages(parameters["backend"])
+    if parameters["backend"] == "numba":
+        from simulator.cpu_kernels import set_thread_count
+
+        # Работники делят ядра: без ограничения каждый процесс запустил бы поток на каждое ядро
+        set_thread_count(parameters["thread_count"])
+    state_index = 0
+
+    while True:
+        control_barrier.wait()
+        if command[0] == COMMAND_STOP:
+            return
+        # Возраст задает основной процесс: мир мог быть загружен (CpuWorld.load_texels)
+        age = int(command[2])
+        if command[0] == COMMAND_CREATE:
+            state_index = 0
+            create(own[state_index], x_start, shape, parameters["substance_count"])
+        elif command[0] == COMMAND_TICK:
+            for _ in range(int(command[1])):
+                started = time.perf_counter()
+                read, write = own[state_index], own[1 - state_index]
+                plan(read, x_start, age, gravity_vector, update_period, mass)
+                exchanged = time.perf_counter()
+                # Гало нужны только при обмене по оси x
+                if age % 3 == 0:
+                    exchange_halo(read, left[state_index], right[state_index])
+                waited = time.perf_counter()
+                tick_barrier.wait()
+                resumed = time.perf_counter()
+                move(read, write, x_start, age, mass)
+                finished = time.perf_counter()
+
+                timing[TIMING_WORK] += (exchanged - started) + (finished - resumed)
+                timing[TIMING_EXCHANGE] += waited - exchanged
+                timing[TIMING_WAIT] += resumed - waited
+                timing[TIMING_TICKS] += 1
+                state_index = 1 - state_index
+                age += update_period
+        control_barrier.wait()
+
+
+# Физика мира на процессоре для машин без подходящей видеокарты.
+# Мир делится по оси x на слои по числу работников, каждый слой с гало лежит в своем блоке разделяемой памяти
+# и считается своим процессом (run_worker), поэтому данные работника не делят кэш с другими.
+# Вызов step() выполняет тики всеми работниками в ногу и возвращается после последнего.
+# Реакции и существа на процессоре не считаются, мир один (без пакета), тяготение - постоянный GRAVITY_VECTOR.
+# Поле тяготения GRAVITY_FIELD и давление PRESSURE_STIFFNESS считаются только на видеокарте, но сумма количеств
+# вещества ячейки (Cell.total_quantity) поддерживается, чтобы состояние можно было передать видеокарте
+class CpuWorld(ProjectMixin):
+    # Физика, которую считает процессор, независимо от настроек (пишется в заголовок журнала отпечатков)
+    GRAVITY_FIELD = False
+    PRESSURE_STIFFNESS = 0.0
+    REACTION_COUNT = 0
+    CREATURE_COUNT = 0
+
+    def __init__(self, shape: Vec3 | None = None, worker_count: int | None = None) -> None:
+        self.shape = self.settings.WORLD_SHAPE if shape is None else shape
+        self.worker_count = self.settings.CPU_PHYSICS_WORKER_COUNT if worker_count is None else worker_count
+        if not 0 < self.worker_count <= self.shape.x:
+            raise CpuPhysicsError(f"Worker count ({self.worker_count}) must be in [1; {self.shape.x}] (world width)")
+        self.cell_size = self.settings.CELL_SIZE
+        self.update_period = self.settings.WORLD_UPDATE_PERIOD
+        physics = (self.settings.GRAVITY_FIELD, self.settings.PRESSURE_STIFFNESS)
+        if physics != (self.GRAVITY_FIELD, self.PRESSURE_STIFFNESS):
+            self.logger.warning("CPU physics ignores GRAVITY_FIELD and PRESSURE_STIFFNESS, results differ from the GPU")
+        self.backend = self.settings.CPU_PHYSICS_BACKEND
+        if self.backend == "numba" and not is_numba_available():
+            self.logger.warning("Numba is not installed, CPU physics uses NumPy")
+            self.backend = "numpy"
+        # Numba компилирует стадии при импорте (или загружает из кэша) здесь, до старта работников,
+        # поэтому работники не компилируют их одновременно
+        get_stages(self.backend)
+        self.encode, self.decode = get_codec(self.backend)
+
+        widths = [len(part) for part in np.array_split(np.arange(self.shape.x), self.worker_count)]
+        starts = np.cumsum([0, *widths[:-1]])
+        self.bounds = [(int(start), int(start + width)) for start, width in zip(starts, widths)]
+        self.layouts = [SlabLayout(width, self.shape, self.cell_size) for width in widths]
+        self.slabs = [shared_memory.SharedMemory(create = True, size = layout.size) for layout in self.layouts]
+        self.states = [layout.get_states(slab.buf) for layout, slab in zip(self.layouts, self.slabs)]
+
+        # Команда, количество тиков, возраст для создания
+        self.control = SharedArray(3, np.int64)
+        self.timings = SharedArray((self.worker_count, 4), np.float64)
+        self.state_index = 0
+        self.age = 0
+
+        context = multiprocessing.get_context()
+        self.control_barrier = context.Barrier(self.worker_count + 1)
+        self.tick_barrier = context.Barrier(self.worker_count)
+        parameters = {
+            "mass": SUBSTANCES.mass[:len(SUBSTANCES)].astype(np.int32),
+            "substance_count": len(SUBSTANCES),
+            "gravity_vector": tuple(self.settings.GRAVITY_VECTOR),
+            "update_period": self.update_period,
+            "bounds": self.bounds,
+            "backend": self.backend,
+            "thread_count": max(1, self.settings.CPU_COUNT // self.worker_count)
+        }
+        self.processes = [
+            context.Process(
+                target = run_worker,
+                args = (
+                    index,
+                    [slab.name for slab in self.slabs],
+                    self.bounds,
+                    tuple(self.shape),
+                    self.cell_size,
+                    parameters,
+                    self.control.descriptor,
+                    self.timings.descriptor,
+                    self.control_barrier,
+                    self.tick_barrier
+                ),
+                name = f"cpu_physics_{index}",
+                daemon = True
+            )
+            for index in range(self.worker_count)
+        ]
+        for process in self.processes:
+            process.start()
+        self.stopping = False
+        self.watcher = threading.Thread(target = self.watch_workers, name = "cpu_physics_watcher", daemon = True)
+        self.watcher.start()
+
+        self.logger.info(
+            f"CPU physics ({self.backend}): {self.worker_count} workers, slab widths {widths},"
+            f" {format(sum(layout.size for layout in self.layouts) / (1 << 20), ".1f")} MiB of shared memory"
+        )
+        self.run_command(COMMAND_CREATE)
+
+    # Работник, завершившийся без исключения (например, убитый системой), сам барьеры не сломает,
+    # поэтому поток наблюдения ломает их за него, и основной процесс не ждет мертвого работника
+    def watch_workers(self) -> None:
+        multiprocessing.connection.wait([process.sentinel for process in self.processes])
+        if not self.stopping:
+            self.control_barrier.abort()
+            self.tick_barrier.abort()
+
+    # Имена завершившихся работников. Дескриптор sentinel закрывается при завершении раньше,
+    # чем процесс можно дождаться, поэтому is_alive сразу после сбоя еще может вернуть True
+    def get_dead_workers(self) -> list[str]:
+        finished = multiprocessing.connection.wait([process.sentinel for process in self.processes], timeout = 0)
+        return [process.name for process in self.processes if process.sentinel in finished]
+
+    def run_command(self, command: int, tick_count: int = 0) -> None:
+        dead = self.get_dead_workers()
+        if dead:
+            raise CpuPhysicsError(f"CPU physics workers {dead} are not running")
+
+        self.control.array[:] = (command, tick_count, self.age)
+        timeout = self.settings.CPU_PHYSICS_TIMEOUT
+        started = time.perf_counter()
+        try:
+            # Первый барьер запускает команду, второй дожидается ее выполнения всеми работниками
+            self.control_barrier.wait(timeout)
+            if command != COMMAND_STOP:
+                self.control_barrier.wait(timeout * max(tick_count, 1))
+        except threading.BrokenBarrierError as error:
+            dead = self.get_dead_workers()
+            if dead:
+                raise CpuPhysicsError(f"CPU physics workers {dead} died, see their tracebacks") from error
+            if time.perf_counter() - started < timeout:
+                raise CpuPhysicsError("A CPU physics worker failed, see its traceback") from error
+            raise CpuPhysicsError(
+                f"CPU physics workers did not respond in {timeout} s per tick (CPU_PHYSICS_TIMEOUT)"
+            ) from error
+
+    def step(self, tick_count: int = 1) -> None:
+        self.run_command(COMMAND_TICK, tick_count)
+        if tick_count % 2 == 1:
+            self.state_index = 1 - self.state_index
+        self.age += tick_count * self.update_period
+
+    # Текущее состояние мира целиком (копия), формы (x, y, z, ...)
+    def gather(self) -> dict[str, npt.NDArray]:
+        return {
+            name: np.concatenate([states[self.state_index].arrays[name][1:-1] for states in self.states])
+            for name, _, _ in get_state_fields(self.cell_size)
+        }
+
+    # Состояние мира в формате текстур видеокарты: юниты, планы и ячейки формы (z, y, x, каналы),
+    # юниты ячейки лежат блоком CELL_SHAPE, как в unit_index_to_position
+    def get_texels(self) -> tuple[npt.NDArray[np.uint32], npt.NDArray[np.uint32], npt.NDArray[np.uint32]]:
+        state = self.gather()
+        cell_shape = self.settings.CELL_SHAPE
+
+        units = np.zeros(state["quantity"].shape, dtype = UNIT_LAYOUT.dtype)
+        for name in ("substance_id", "quantity", "momentum"):
+            units[name] = state[name]
+        unit_texels = self.encode(UNIT_LAYOUT, units)
+        unit_texels = unit_texels.reshape(*self.shape, cell_shape.z, cell_shape.y, cell_shape.x, UNIT_LAYOUT.channels)
+        unit_texels = unit_texels.transpose(2, 3, 1, 4, 0, 5, 6).reshape(
+            self.shape.z * cell_shape.z,
+            self.shape.y * cell_shape.y,
+            self.shape.x * cell_shape.x,
+            UNIT_LAYOUT.channels
+        )
+
+        # Биты заявок юнитов [0; 31] и [32; 63] в двух словах
+        plans = np.zeros(self.shape, dtype = PLAN_LAYOUT.dtype)
+        words = np.zeros((*self.shape, 64), dtype = np.uint64)
+        weights = np.uint64(1) << (np.arange(64, dtype = np.uint64) % np.uint64(32))
+        for name in ("presence", "direction"):
+            words[...] = 0
+            words[..., :self.cell_size] = state[name]
+            plans[name] = (words * weights).reshape(*self.shape, 2, 32).sum(axis = -1).astype(np.uint32)
+        plan_texels = self.encode(PLAN_LAYOUT, plans).transpose(2, 1, 0, 3)
+
+        cells = np.zeros(self.shape, dtype = CELL_LAYOUT.dtype)
+        for name in CELL_STATE_FIELDS:
+            cells[name] = state[name]
+        cell_texels = self.encode(CELL_LAYOUT, cells).transpose(2, 1, 0, 3)
+        return np.ascontiguousarray(unit_texels), np.ascontiguousarray(plan_texels), np.ascontiguousarray(cell_texels)
+
+    # Загружает состояние в формате get_texels, например прочитанное с видеокарты, вместе с возрастом мира.
+    # Гало не обновляются: до обмена гало по оси x их никто не читает
+    def load_texels(
+            self,
+            unit_texels: npt.NDArray[np.uint32],
+            plan_texels: npt.NDArray[np.uint32],
+            cell_texels: npt.NDArray[np.uint32],
+            age: int
+    ) -> None:
+        cell_shape = self.settings.CELL_SHAPE
+        units = self.decode(UNIT_LAYOUT, unit_texels).reshape(
+            self.shape.z,
+            cell_shape.z,
+            self.shape.y,
+            cell_shape.y,
+            self.shape.x,
+            cell_shape.x
+        )
+        units = units.transpose(4, 2, 0, 1, 3, 5).reshape(*self.shape, self.cell_size)
+        plans = self.decode(PLAN_LAYOUT, plan_texels.transpose(2, 1, 0, 3))
+        cells = self.decode(CELL_LAYOUT, cell_texels.transpose(2, 1, 0, 3))
+
+        state = {name: cells[name] for name in CELL_STATE_FIELDS}
+        state.update({name: units[name] for name in ("substance_id", "quantity", "momentum")})
+        bit_indices = np.arange(self.cell_size)
+        for name in ("presence", "direction"):
+            words = plans[name][..., bit_indices // 32]
+            state[name] = (words >> (bit_indices % 32).astype(np.uint32)) & 1 == 1
+
+        for (x_start, x_stop), states in zip(self.bounds, self.states):
+            for name, array in states[self.state_index].arrays.items():
+                array[1:-1] = state[name][x_start:x_stop]
+        self.age = age
+
+    # Возвращает и сбрасывает статистику работников: номер -> (работа, обмен гало, ожидание остальных, тики), в секундах
+    def collect_timings(self) -> list[tuple[float, float, float, int]]:
+        timings = [
+            (float(work), float(exchange), float(wait), int(ticks))
+            for work, exchange, wait, ticks in self.timings.array
+        ]
+        self.timings.array[...] = 0
+        return timings
+
+    # Несбалансированность - насколько самый медленный работник дольше среднего
+    def log_timings(self) -> None:
+        timings = self.collect_timings()
+        work_times = [work for work, _, _, _ in timings]
+        mean_work_time = sum(work_times) / len(work_times)
+        imbalance = max(work_times) / mean_work_time - 1 if mean_work_time > 0 else 0.0
+        for index, (work, exchange, wait, ticks) in enumerate(timings):
+            per_tick = 1000 / max(ticks, 1)
+            self.logger.debug(
+                f"cpu worker {index} {self.bounds[index]}: {ticks} ticks, work {work * per_tick:.3f} ms,"
+                f" halo {exchange * per_tick:.3f} ms, waited {wait * per_tick:.3f} ms per tick"
+            )
+        self.logger.info(f"CPU physics imbalance: {imbalance * 100:.1f}% (slowest worker over mean work time)")
+
+    def stop(self) -> None:
+        self.stopping = True
+        if len(self.get_dead_workers()) < len(self.processes):
+            try:
+                self.run_command(COMMAND_STOP)
+            except CpuPhysicsError:
+                pass
+        for process in self.processes:
+            process.join()
+        del self.states
+        for slab in self.slabs:
+            slab.close()
+            slab.unlink()
+        self.control.delete()
+        self.timings.delete()
@@ -0,0 +1,143 @@
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+from pyglet import gl
+from pyglet.graphics.shader import ComputeShaderProgram
+
+from core.service.buffer import StorageBuffer
+from core.service.glsl import load_shader, write_uniforms
+from core.service.object import PhysicalObject
+from core.service.scan import PrefixSum
+from simulator.neural import NeuralNetworks
+
+
+if TYPE_CHECKING:
+    from simulator.world import World
+
+
+# Существа на видеокарте: структура массивов, стек свободных слотов и сетка существ по ячейкам мира,
+# которая каждый тик перестраивается сортировкой подсчетом (подсчет -> префиксная сумма -> раскладка).
+# Взаимодействие с миром (сенсоры и поглощение юнитов) выполняется физической стадией stage_0.glsl
+class CreatureEngine(PhysicalObject):
+    # Точки привязки, должны совпадать с creature.glsl
+    POSITION_BINDING = 30
+    VELOCITY_BINDING = 31
+    ENERGY_BINDING = 32
+    STATE_BINDING = 33
+    CELL_BINDING = 34
+    RANK_BINDING = 35
+    FREE_SLOT_BINDING = 36
+    COUNTER_BINDING = 37
+    SPAWN_BINDING = 38
+    SENSOR_BINDING = 39
+    GRID_OFFSET_BINDING = 40
+    GRID_BINDING = 41
+    APPETITE_BINDING = 42
+    SPAWNED_SLOT_BINDING = 43
+
+    def __init__(self, world: "World") -> None:
+        super().__init__()
+
+        self.world = world
+        self.capacity = self.settings.CREATURE_CAPACITY
+        self.group_count = self.capacity // self.settings.CREATURE_GROUP_SIZE
+        self.spawn_batch = self.settings.CREATURE_SPAWN_BATCH
+
+        self.positions = StorageBuffer(self.POSITION_BINDING, self.capacity * 16)
+        self.velocities = StorageBuffer(self.VELOCITY_BINDING, self.capacity * 16)
+        self.energies = StorageBuffer(self.ENERGY_BINDING, self.capacity * 4)
+        self.states = StorageBuffer(self.STATE_BINDING, self.capacity * 4)
+        self.cells = StorageBuffer(self.CELL_BINDING, self.capacity * 4)
+        self.ranks = StorageBuffer(self.RANK_BINDING, self.capacity * 4)
+        self.sensors = StorageBuffer(self.SENSOR_BINDING, self.capacity * self.settings.CREATURE_SENSOR_COUNT * 4)
+        self.appetites = StorageBuffer(self.APPETITE_BINDING, self.capacity * 4)
+
+        # Изначально свободны все слоты, сверху стека - слот 0
+        self.free_slots = StorageBuffer(
+            self.FREE_SLOT_BINDING,
+            self.capacity * 4,
+            np.arange(self.capacity, dtype = np.uint32)[::-1]
+        )
+        self.counters = StorageBuffer(self.COUNTER_BINDING, 16, np.array([self.capacity, 0, 0, 0], dtype = np.int32))
+
+        # Позиция и энергия (w), скорость
+        self.spawn_buffer = StorageBuffer(self.SPAWN_BINDING, self.spawn_batch * 32)
+        self.spawned_slots = StorageBuffer(self.SPAWNED_SLOT_BINDING, self.spawn_batch * 4)
+        self.spawn_queue: list[npt.NDArray[np.float32]] = []
+
+        # Дополнительный элемент после префиксной суммы хранит общее количество существ
+        self.grid_offsets = PrefixSum(self.world.cell_count + 1, self.GRID_OFFSET_BINDING)
+        self.grid = StorageBuffer(self.GRID_BINDING, self.capacity * 4)
+
+        self.spawn_shader = ComputeShaderProgram(load_shader(f"{self.settings.CREATURE_SHADERS}/spawn.glsl"))
+        self.move_shader = ComputeShaderProgram(load_shader(f"{self.settings.CREATURE_SHADERS}/move.glsl"))
+        self.scatter_shader = ComputeShaderProgram(load_shader(f"{self.settings.CREATURE_SHADERS}/scatter.glsl"))
+
+        uniforms = {
+            "u_world_update_period": (self.settings.WORLD_UPDATE_PERIOD, True, True),
+            "u_creature_metabolism": (self.settings.CREATURE_METABOLISM, True, True)
+        }
+        write_uniforms(self.move_shader, uniforms)
+
+        self.networks = NeuralNetworks(self)
+
+    def spawn(
+            self,
+            positions: npt.ArrayLike,
+            velocities: npt.ArrayLike,
+            energies: npt.ArrayLike
+    ) -> None:
+        positions = np.asarray(positions, dtype = np.float32)
+        if len(positions) == 0:
+            return
+        requests = np.zeros((len(positions), 8), dtype = np.float32)
+        requests[:, :3] = positions
+        requests[:, 3] = energies
+        requests[:, 4:7] = velocities
+        self.spawn_queue.append(requests)
+
+    def spawn_random(self, amount: int, generator: np.random.Generator) -> None:
+        directions = generator.normal(size = (amount, 3))
+        directions /= np.linalg.norm(directions, axis = 1, keepdims = True)
+        self.spawn(
+            generator.uniform((0, 0, 0), tuple(self.world.shape), (amount, 3)),
+            directions * self.settings.CREATURE_INITIAL_SPEED,
+            np.full(amount, self.settings.CREATURE_INITIAL_ENERGY)
+        )
+
+    def dispatch(self, shader: ComputeShaderProgram, group_count: int) -> None:
+        shader.use()
+        gl.glDispatchCompute(group_count, 1, 1)
+        gl.glMemoryBarrier(gl.GL_SHADER_STORAGE_BARRIER_BIT)
+
+    # Создает не более spawn_batch существ из очереди и возвращает количество заявок
+    def flush_spawns(self) -> int:
+        if not self.spawn_queue:
+            return 0
+
+        requests = np.concatenate(self.spawn_queue)
+        batch, rest = requests[:self.spawn_batch], requests[self.spawn_batch:]
+        self.spawn_queue = [rest] if len(rest) > 0 else []
+
+        self.spawn_buffer.write(0, batch)
+        write_uniforms(self.spawn_shader, {"u_spawn_count": (len(batch), True, True)})
+        self.dispatch(self.spawn_shader, math.ceil(len(batch) / self.settings.CREATURE_GROUP_SIZE))
+        return len(batch)
+
+    def start(self) -> None:
+        generator = np.random.default_rng(self.world.seed)
+        self.spawn_random(self.settings.CREATURE_INITIAL_COUNT, generator)
+
+    def on_update(self) -> None:
+        spawn_count = self.flush_spawns()
+        if spawn_count > 0:
+            self.networks.on_spawn(spawn_count)
+        # Сети читают сенсоры, записанные стадией stage_0 прошлого тика, и задают скорость и аппетит
+        self.networks.on_update()
+
+        self.grid_offsets.buffer.clear()
+        self.dispatch(self.move_shader, self.group_count)
+        self.grid_offsets.run()
+        self.dispatch(self.scatter_shader, self.group_count)
@@ -0,0 +1,297 @@
+import datetime
+import json
+import math
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+import numpy as np
+import numpy.typing as npt
+from pyglet import gl
+from pyglet.graphics.shader import ComputeShaderProgram
+from pyglet.math import Vec3
+
+from core.service.buffer import StorageBuffer
+from core.service.glsl import load_shader
+from core.service.object import ProjectMixin
+from core.service.readback import Readback
+from simulator.reaction import REACTIONS
+
+
+if TYPE_CHECKING:
+    from simulator.world import World
+
+
+# Начальные состояния двух 32-битных половин отпечатка, должны совпадать с fingerprint.glsl
+FINGERPRINT_SEEDS = (0, 2654435769)
+
+
+# PCG-хэш из random.glsl над массивом слов
+def hash_words(values: npt.NDArray[np.uint32]) -> npt.NDArray[np.uint32]:
+    state = values * np.uint32(747796405) + np.uint32(2891336453)
+    word = ((state >> ((state >> np.uint32(28)) + np.uint32(4))) ^ state) * np.uint32(277803737)
+    return (word >> np.uint32(22)) ^ word
+
+
+# Отпечатки ячеек (z, y, x, 2) текстур пакета формы (z, y, x, каналы), как get_cell_fingerprint из fingerprint.glsl
+def get_cell_fingerprints(
+        unit_texels: npt.NDArray[np.uint32],
+        plan_texels: npt.NDArray[np.uint32],
+        cell_texels: npt.NDArray[np.uint32],
+        world_shape: Vec3,
+        cell_shape: Vec3
+) -> npt.NDArray[np.uint32]:
+    depth, length, width = cell_texels.shape[:3]
+    z, y, x = np.meshgrid(np.arange(depth), np.arange(length), np.arange(width), indexing = "ij")
+    index = (x + world_shape.x * (y + world_shape.y * (z % world_shape.z))).astype(np.uint32)
+
+    # Слова ячейки по порядку хэширования: ячейка, план, юниты в порядке unit_index_to_position
+    units = unit_texels.reshape(depth, cell_shape.z, length, cell_shape.y, width, cell_shape.x, -1)
+    units = units.transpose(0, 2, 4, 1, 3, 5, 6).reshape(depth, length, width, -1)
+    words = np.concatenate((cell_texels, plan_texels, units), axis = -1).astype(np.uint32)
+
+    digests = np.empty((depth, length, width, 2), dtype = np.uint32)
+    for lane, seed in enumerate(FINGERPRINT_SEEDS):
+        digest = hash_words(np.uint32(seed) ^ index)
+        for word in np.moveaxis(words, -1, 0):
+            digest = hash_words(digest ^ word)
+        digests[..., lane] = digest
+    return digests
+
+
+# Отпечатки всего пакета (2,), миров пакета (batch_size, 2) и кирпичей (количество, 2) в порядке fingerprint.glsl
+def get_fingerprints(
+        unit_texels: npt.NDArray[np.uint32],
+        plan_texels: npt.NDArray[np.uint32],
+        cell_texels: npt.NDArray[np.uint32],
+        world_shape: Vec3,
+        cell_shape: Vec3,
+        brick_shape: Vec3
+) -> tuple[npt.NDArray[np.uint32], npt.NDArray[np.uint32], npt.NDArray[np.uint32]]:
+    cells = get_cell_fingerprints(unit_texels, plan_texels, cell_texels, world_shape, cell_shape)
+    depth, length, width = cells.shape[:3]
+    bricks = cells.reshape(
+        depth // brick_shape.z,
+        brick_shape.z,
+        length // brick_shape.y,
+        brick_shape.y,
+        width // brick_shape.x,
+        brick_shape.x,
+        2
+    ).sum(axis = (1, 3, 5), dtype = np.uint32)
+    batch_size = depth // world_shape.z
+    worlds = bricks.reshape(batch_size, -1, 2).sum(axis = 1, dtype = np.uint32)
+    return worlds.sum(axis = 0, dtype = np.uint32), worlds, bricks.reshape(-1, 2)
+
+
+def format_digest(digest: npt.NDArray[np.uint32]) -> str:
+    return f"{(int(digest[1]) << 32) | int(digest[0]):016x}"
+
+
+# Журнал отпечатков одного запуска (JSON Lines): первая строка - заголовок с формой мира и кирпичей, зерном
+# и физикой, которую считал запуск (поле тяготения, жесткость давления, количество реакций и начальных существ),
+# каждая следующая - отпечатки одного тика вместе с возрастом и зерном мира.
+# Отпечатки кирпичей пишутся одной шестнадцатеричной строкой байтов, по 16 символов на кирпич
+class FingerprintLog(ProjectMixin):
+    def __init__(
+            self,
+            path: Path,
+            world_shape: Vec3,
+            brick_shape: Vec3,
+            batch_size: int,
+            seed: int,
+            backend: str,
+            gravity_field: bool,
+            pressure_stiffness: float,
+            reaction_count: int,
+            creature_count: int
+    ) -> None:
+        self.path = path
+        self.seed = seed
+        self.path.parent.mkdir(parents = True, exist_ok = True)
+        self.file = open(self.path, "w", encoding = "utf-8")
+        header = {
+            "world_shape": tuple(world_shape),
+            "brick_shape": tuple(brick_shape),
+            "batch_size": batch_size,
+            "seed": seed,
+            "backend": backend,
+            "gravity_field": gravity_field,
+            "pressure_stiffness": pressure_stiffness,
+            "reaction_count": reaction_count,
+            "creature_count": creature_count
+        }
+        self.file.write(json.dumps(header) + "\n")
+        self.logger.info(f"Fingerprint log: {self.path}")
+
+    # Файл журнала в FINGERPRINT_FOLDER с временем запуска и зерном в имени
+    @classmethod
+    def get_path(cls, seed: int, backend: str) -> Path:
+        started = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        return Path(cls.settings.FINGERPRINT_FOLDER) / f"{started}_{backend}_{seed}.jsonl"
+
+    def write(
+            self,
+            age: int,
+            total: npt.NDArray[np.uint32],
+            worlds: npt.NDArray[np.uint32],
+            bricks: npt.NDArray[np.uint32] | None
+    ) -> None:
+        record = {
+            "age": age,
+            "seed": self.seed,
+            "digest": format_digest(total),
+            "worlds": [format_digest(digest) for digest in worlds]
+        }
+        if bricks is not None:
+            record["bricks"] = np.ascontiguousarray(bricks, dtype = "<u4").tobytes().hex()
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_fingerprint_log(path: Path) -> tuple[dict, Iterator[dict]]:
+    file = open(path, "r", encoding = "utf-8")
+    header = json.loads(file.readline())
+
+    def records() -> Iterator[dict]:
+        with file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, records()
+
+
+# Отпечатки состояния мира на видеокарте (fingerprint.glsl): каждый кирпич - рабочая группа ячеек вместе с их планами
+# и юнитами - сворачивается в 64-битный отпечаток, отпечатки кирпичей складываются в отпечатки миров пакета,
+# а те - в отпечаток пакета. Буфер отпечатков мал и читается асинхронно (ReadbackService),
+# поэтому сравнение состояния двух запусков или способов счета не требует чтения текстур мира.
+# Отпечаток считается каждые FINGERPRINT_PERIOD тиков по состоянию после тика и пишется в FingerprintLog
+class StateFingerprint(ProjectMixin):
+    # Должна совпадать с fingerprint.glsl
+    BINDING = 28
+    DIGEST_SIZE = 8
+
+    def __init__(self, world: "World") -> None:
+        self.world = world
+        self.period = self.settings.FINGERPRINT_PERIOD
+        self.brick_count = math.prod(world.group_shape)
+        self.shader = ComputeShaderProgram(load_shader(f"{self.settings.SERVICE_SHADERS}/fingerprint.glsl"))
+        self.buffer = StorageBuffer(self.BINDING, self.get_size(self.world.batch_size, self.brick_count))
+
+        self.log = FingerprintLog(
+            FingerprintLog.get_path(self.world.seed, "gpu"),
+            self.world.shape,
+            self.settings.CELL_GROUP_SHAPE,
+            self.world.batch_size,
+            self.world.seed,
+            "gpu",
+            self.world.gravity is not None,
+            self.settings.PRESSURE_STIFFNESS,
+            len(REACTIONS),
+            self.settings.CREATURE_INITIAL_COUNT
+        )
+        self.world.readback.add_buffer("fingerprints", self.buffer.gl_id.value, self.buffer.size, period = self.period)
+        self.world.readback.subscribe("fingerprints", self.on_readback)
+
+    # Весь пакет, миры пакета и кирпичи
+    @classmethod
+    def get_size(cls, batch_size: int, brick_count: int) -> int:
+        return (1 + batch_size + brick_count) * cls.DIGEST_SIZE
+
+    # Вызывается после последней стадии тика, до запроса чтения с тем же возрастом
+    def update(self) -> None:
+        if self.world.age % self.period != 0:
+            return
+        self.buffer.clear()
+        self.shader.use()
+        gl.glDispatchCompute(*self.world.group_shape)
+        gl.glMemoryBarrier(gl.GL_SHADER_STORAGE_BARRIER_BIT | gl.GL_BUFFER_UPDATE_BARRIER_BIT)
+
+    def on_readback(self, readback: Readback) -> None:
+        digests = readback.view.reshape(-1, 2)
+        bricks = digests[1 + self.world.batch_size:] if self.settings.FINGERPRINT_BRICKS else None
+        self.log.write(readback.age, digests[0], digests[1:1 + self.world.batch_size], bricks)
+
+    def delete(self) -> None:
+        self.log.close()
+        self.buffer.delete()
+
+
+class FingerprintError(Exception):
+    pass
+
+
+# Расхождение двух журналов отпечатков: возраст, номера разошедшихся миров пакета
+# и номера разошедшихся кирпичей с их позициями в ячейках текстур пакета
+class Divergence:
+    def __init__(self, age: int, worlds: list[int], bricks: list[tuple[int, Vec3]] | None) -> None:
+        self.age = age
+        self.worlds = worlds
+        # None - в журналах нет отпечатков кирпичей
+        self.bricks = bricks
+
+
+# Позиция кирпича с номером index в ячейках текстур пакета
+def get_brick_position(index: int, header: dict) -> Vec3:
+    world_shape = Vec3(*header["world_shape"])
+    brick_shape = Vec3(*header["brick_shape"])
+    group_shape = Vec3(world_shape.x, world_shape.y, world_shape.z * header["batch_size"]) // brick_shape
+    brick = Vec3(
+        index % group_shape.x,
+        index // group_shape.x % group_shape.y,
+        index // (group_shape.x * group_shape.y)
+    )
+    return brick * brick_shape
+
+
+def get_divergence(header: dict, record: dict, other: dict) -> Divergence:
+    worlds = [index for index, (digest, other_digest) in enumerate(zip(record["worlds"], other["worlds"]))
+              if digest != other_digest]
+    bricks = None
+    if "bricks" in record and "bricks" in other:
+        digests = np.frombuffer(bytes.fromhex(record["bricks"]), dtype = "<u8")
+        other_digests = np.frombuffer(bytes.fromhex(other["bricks"]), dtype = "<u8")
+        bricks = [
+            (int(index), get_brick_position(int(index), header))
+            for index in np.flatnonzero(digests != other_digests)
+        ]
+    return Divergence(record["age"], worlds, bricks)
+
+
+# Первое расхождение журналов (None, если общие тики совпадают) и количество сравненных тиков
+def find_divergence(first: Path, second: Path) -> tuple[Divergence | None, int]:
+    first_header, first_records = read_fingerprint_log(first)
+    second_header, second_records = read_fingerprint_log(second)
+    # Запуски с разным зерном создают разные миры и расходятся уже на первом отпечатке
+    for key in ("world_shape", "brick_shape", "batch_size", "seed"):
+        if first_header[key] != second_header[key]:
+            raise FingerprintError(f"Fingerprint logs differ in {key}: {first_header[key]} and {second_header[key]}")
+    # Запуски с разной физикой расходятся с первого тика, например видеокарта с полем тяготения, давлением,
+    # реакциями или существами и процессор (CpuWorld), который их не считает
+    for key in ("gravity_field", "pressure_stiffness", "reaction_count", "creature_count"):
+        if first_header.get(key) != second_header.get(key):
+            raise FingerprintError(
+                f"Fingerprint logs differ in {key}: {first_header.get(key)} and {second_header.get(key)},"
+                f" runs with different physics can not be compared"
+            )
+
+    # Журналы упорядочены по возрасту. Тики, пропущенные одним из них (например, чтение не успело), не сравниваются
+    compared = 0
+    record = next(first_records, None)
+    other = next(second_records, None)
+    while record is not None and other is not None:
+        if record["age"] != other["age"]:
+            if record["age"] < other["age"]:
+                record = next(first_records, None)
+            else:
+                other = next(second_records, None)
+            continue
+
+        compared += 1
+        if record["digest"] != other["digest"]:
+            return get_divergence(first_header, record, other), compared
+        record = next(first_records, None)
+        other = next(second_records, None)
+    return None, compared
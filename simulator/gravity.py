@@ -0,0 +1,141 @@
+import ctypes
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pyglet import gl
+from pyglet.graphics.shader import ComputeShaderProgram
+from pyglet.math import Vec3
+
+from core.service.glsl import load_shader, write_uniforms
+from core.service.object import ProjectMixin
+
+
+if TYPE_CHECKING:
+    from simulator.world import World
+
+
+# Поле тяготения всех миров пакета (gravity_field.glsl): потенциал из уравнения Пуассона с правой частью
+# 4 pi G на количество вещества ячейки, решаемого геометрическим многосеточным методом на видеокарте.
+# Каждый тик выполняется один V-цикл: на пути вниз уровень сглаживается и передает невязку следующему,
+# самый грубый уровень сглаживается многими проходами, на пути вверх поправка грубого уровня интерполируется
+# и уровень снова сглаживается. Решение уровня 0 остается с прошлого тика и служит начальным приближением,
+# а распределение вещества за тик меняется мало, поэтому одного цикла хватает, и поле считается за O(N).
+# Итог каждого уровня - в копии 0 его потенциала, сглаживание до перехода вниз пишет копию 1
+class GravityField(ProjectMixin):
+    # Должна совпадать с gravity_field.glsl
+    BINDING = 23
+    TEXEL_FORMAT = gl.GL_R32F
+    TEXEL_SIZE = 4
+    # Две копии потенциала и правая часть
+    TEXTURES_PER_LEVEL = 3
+    RESTRICT_GROUP_SIZE = 4
+
+    def __init__(self, world: "World") -> None:
+        self.world = world
+        self.level_count = self.settings.GRAVITY_LEVEL_COUNT
+        self.level_shapes = self.get_level_shapes(self.world.texture_shape, self.level_count)
+        self.smoothing_sweeps = self.settings.GRAVITY_SMOOTHING_SWEEPS
+        self.coarse_sweeps = self.settings.GRAVITY_COARSE_SWEEPS
+
+        shaders = self.settings.PHYSICAL_SHADERS
+        self.density_shader = ComputeShaderProgram(load_shader(f"{shaders}/gravity_density.glsl"))
+        self.smooth_shader = ComputeShaderProgram(load_shader(f"{shaders}/gravity_smooth.glsl"))
+        self.restrict_shader = ComputeShaderProgram(load_shader(f"{shaders}/gravity_restrict.glsl"))
+        write_uniforms(
+            self.density_shader,
+            {"u_source_scale": (4 * math.pi * self.settings.GRAVITY_CONSTANT, True, True)}
+        )
+
+        # Текстуры уровня level: потенциал (копии 0 и 1) и правая часть
+        self.texture_ids = (gl.GLuint * (self.level_count * self.TEXTURES_PER_LEVEL))()
+        gl.glCreateTextures(gl.GL_TEXTURE_3D, len(self.texture_ids), self.texture_ids)
+        potential_ids = []
+        source_ids = []
+        for level, shape in enumerate(self.level_shapes):
+            level_ids = self.texture_ids[level * self.TEXTURES_PER_LEVEL:(level + 1) * self.TEXTURES_PER_LEVEL]
+            for texture_id in level_ids:
+                gl.glTextureStorage3D(texture_id, 1, self.TEXEL_FORMAT, *shape)
+                gl.glTextureParameteri(texture_id, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+                gl.glTextureParameteri(texture_id, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+                # Начальное приближение первого тика - нулевой потенциал
+                gl.glClearTexImage(texture_id, 0, gl.GL_RED, gl.GL_FLOAT, None)
+            potential_ids.extend(level_ids[:2])
+            source_ids.append(level_ids[2])
+
+        # Дескрипторы для чтения потенциалов и правых частей, затем для записи в том же порядке
+        texture_order = potential_ids + source_ids
+        handles = np.zeros(2 * len(texture_order), dtype = np.uint64)
+        for index, texture_id in enumerate(texture_order):
+            handles[index] = self.world.handles.add_texture(gl.glGetTextureHandleARB(texture_id))
+            handle = gl.glGetImageHandleARB(texture_id, 0, gl.GL_TRUE, 0, self.TEXEL_FORMAT)
+            handles[len(texture_order) + index] = self.world.handles.add_image(handle, gl.GL_WRITE_ONLY)
+
+        self.buffer_id = gl.GLuint()
+        gl.glCreateBuffers(1, ctypes.byref(self.buffer_id))
+        gl.glNamedBufferStorage(self.buffer_id, handles.nbytes, handles.ctypes.data, 0)
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.BINDING, self.buffer_id)
+
+    # Формы уровней в текселях для текстур пакета формы texture_shape: каждый следующий уровень вдвое меньше
+    @staticmethod
+    def get_level_shapes(texture_shape: Vec3, level_count: int) -> list[Vec3]:
+        return [Vec3(*(component >> level for component in texture_shape)) for level in range(level_count)]
+
+    @classmethod
+    def get_size(cls, texture_shape: Vec3, level_count: int) -> int:
+        return sum(
+            int(shape.x * shape.y * shape.z) * cls.TEXEL_SIZE * cls.TEXTURES_PER_LEVEL
+            for shape in cls.get_level_shapes(texture_shape, level_count)
+        )
+
+    def smooth(
+            self,
+            level: int,
+            source: int,
+            sweeps: int,
+            zero_guess: bool = False,
+            prolongate: bool = False
+    ) -> None:
+        uniforms = {
+            "u_level": (level, True, True),
+            "u_source": (source, True, True),
+            "u_zero_guess": (zero_guess, True, True),
+            "u_prolongate": (prolongate, True, True),
+            "u_sweeps": (sweeps, True, True)
+        }
+        write_uniforms(self.smooth_shader, uniforms)
+        self.smooth_shader.use()
+        group_shape = self.settings.CELL_GROUP_SHAPE
+        gl.glDispatchCompute(
+            *(math.ceil(component / group) for component, group in zip(self.level_shapes[level], group_shape))
+        )
+        gl.glMemoryBarrier(gl.GL_TEXTURE_FETCH_BARRIER_BIT)
+
+    # Правая часть уровня level - невязка уровня level - 1 по копии source
+    def restrict(self, level: int, source: int) -> None:
+        write_uniforms(self.restrict_shader, {"u_level": (level, True, True), "u_source": (source, True, True)})
+        self.restrict_shader.use()
+        gl.glDispatchCompute(
+            *(math.ceil(component / self.RESTRICT_GROUP_SIZE) for component in self.level_shapes[level])
+        )
+        gl.glMemoryBarrier(gl.GL_TEXTURE_FETCH_BARRIER_BIT)
+
+    # Вызывается тиком мира до stage_0, читает текстуры мира для чтения
+    def update(self) -> None:
+        self.density_shader.use()
+        gl.glDispatchCompute(*self.world.group_shape)
+        gl.glMemoryBarrier(gl.GL_TEXTURE_FETCH_BARRIER_BIT)
+
+        coarsest = self.level_count - 1
+        for level in range(coarsest):
+            # Решение уровня 0 - с прошлого тика, поправки грубых уровней начинаются с нуля
+            self.smooth(level, 0, self.smoothing_sweeps, zero_guess = level > 0)
+            self.restrict(level + 1, 1)
+        self.smooth(coarsest, 0, self.coarse_sweeps, zero_guess = coarsest > 0)
+        self.smooth(coarsest, 1, self.coarse_sweeps)
+        for level in reversed(range(coarsest)):
+            self.smooth(level, 1, self.smoothing_sweeps, prolongate = True)
+
+    def delete(self) -> None:
+        gl.glDeleteBuffers(1, ctypes.byref(self.buffer_id))
+        gl.glDeleteTextures(len(self.texture_ids), self.texture_ids)
@@ -0,0 +1,273 @@
+import ctypes
+import math
+
+from pyglet import gl
+from pyglet.math import Vec3
+
+from core.service.bitfield import CELL_LAYOUT, PLAN_LAYOUT, UNIT_LAYOUT
+from core.service.object import ProjectMixin
+from core.service.overflow import OVERFLOW_REPORT_DTYPE, OverflowMonitor
+from core.service.scan import PrefixSum
+from core.service.settings import SettingError
+from simulator.fingerprint import StateFingerprint
+from simulator.gravity import GravityField
+from simulator.neural import NeuralNetworks
+from simulator.optics import OpticsVolume
+from simulator.pick import CellPicker
+from simulator.raymarch import TileRaymarcher, WavefrontRaymarcher
+from simulator.reaction import REACTIONS, ReactionTable
+from simulator.substance import SUBSTANCES, SubstanceRegistry
+
+
+class MemoryPlanError(SettingError):
+    pass
+
+
+# Расширения, сообщающие свободную видеопамять (в КиБ)
+GPU_MEMORY_INFO_CURRENT_AVAILABLE_VIDMEM_NVX = 0x9049
+TEXTURE_FREE_MEMORY_ATI = 0x87FC
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} {unit}"
+        size /= 1024
+    return f"{size:.2f} GiB"
+
+
+class MemoryEntry:
+    def __init__(self, group: str, name: str, size: int, count: int = 1) -> None:
+        self.group = group
+        self.name = name
+        # Размер одной копии ресурса и количество копий (наборы текстур, части мира)
+        self.size = size
+        self.count = count
+
+    @property
+    def total(self) -> int:
+        return self.size * self.count
+
+
+# План видеопамяти: точный размер каждого ресурса, который создают мир, существа и сервисы при текущих настройках.
+# Размеры должны совпадать с конструкторами соответствующих классов.
+# Проверяется до создания ресурсов, чтобы неподходящие настройки приводили к понятной ошибке с разбивкой,
+# а не к падению внутри драйвера при выделении памяти
+class MemoryPlan(ProjectMixin):
+    # Количество наборов текстур мира (чтение и запись)
+    TEXTURE_SET_COUNT = 2
+
+    def __init__(self, world_shape: Vec3 | None = None) -> None:
+        self.world_shape = self.settings.WORLD_SHAPE if world_shape is None else world_shape
+        self.entries: list[MemoryEntry] = []
+        # Размеры текстур в текселях, для проверки ограничений драйвера
+        self.texture_shapes: dict[str, Vec3] = {}
+        # Пояснения к плану, выводятся после разбивки
+        self.notes: list[str] = []
+        self.build()
+
+    def add(self, group: str, name: str, size: int, count: int = 1) -> None:
+        self.entries.append(MemoryEntry(group, name, size, count))
+
+    def build(self) -> None:
+        settings = self.settings
+        cell_count = self.world_shape.x * self.world_shape.y * self.world_shape.z
+        copies = self.TEXTURE_SET_COUNT * settings.CHUNK_COUNT
+
+        # Каждая часть пока имеет форму всего пакета миров
+        texture_shape = Vec3(self.world_shape.x, self.world_shape.y, self.world_shape.z * settings.WORLD_BATCH_SIZE)
+        for name, shape, layout in (
+                ("unit textures", texture_shape * settings.CELL_SHAPE, UNIT_LAYOUT),
+                ("plan textures", texture_shape, PLAN_LAYOUT),
+                ("cell textures", texture_shape, CELL_LAYOUT)
+        ):
+            self.texture_shapes[name] = shape
+            self.add("world", name, shape.x * shape.y * shape.z * layout.channels * 4, copies)
+        # Счетчики юнитов и заявок до CELL_SIZE (до 63) требуют по 6 бит, сумма количеств до 63 * 1023 - 16 бит,
+        # поэтому ячейка не помещается в одно слово и занимает тексель из двух
+        if CELL_LAYOUT.words > 1:
+            cell_texels = texture_shape.x * texture_shape.y * texture_shape.z
+            one_word_size = cell_texels * 4
+            cell_size = cell_texels * CELL_LAYOUT.channels * 4
+            self.notes.append(
+                f"Cell takes {CELL_LAYOUT.bit_count} bits, {CELL_LAYOUT.channels * 4} byte texels instead of 4:"
+                f" cell textures take {format_size(cell_size)} instead of {format_size(one_word_size)} per copy"
+                f" (+{format_size((cell_size - one_word_size) * copies)} in total),"
+                f" every pass reading or writing them moves {format_size(cell_size)}"
+                f" instead of {format_size(one_word_size)}"
+            )
+        # Буферы дескрипторов текстур для чтения и записи каждого типа
+        self.add("world", "texture handles", settings.CHUNK_COUNT * 8, self.TEXTURE_SET_COUNT * 3 * 2)
+        self.add("world", "world parameters", settings.WORLD_BATCH_SIZE * 32)
+        # CameraBuffer из world.py
+        self.add("world", "camera", 64)
+        if settings.GRAVITY_FIELD:
+            self.add("world", "gravity levels", GravityField.get_size(texture_shape, settings.GRAVITY_LEVEL_COUNT))
+            # Дескрипторы для чтения и записи каждой текстуры уровней
+            handle_count = settings.GRAVITY_LEVEL_COUNT * GravityField.TEXTURES_PER_LEVEL * 2
+            self.add("world", "gravity handles", handle_count * 8)
+
+        capacity = settings.CREATURE_CAPACITY
+        for name, stride in (
+                ("positions", 16),
+                ("velocities", 16),
+                ("energies", 4),
+                ("states", 4),
+                ("cells", 4),
+                ("ranks", 4),
+                ("sensors", settings.CREATURE_SENSOR_COUNT * 4),
+                ("appetites", 4),
+                ("free slots", 4),
+                ("grid", 4)
+        ):
+            self.add("creatures", name, capacity * stride)
+        self.add("creatures", "counters", 16)
+        self.add("creatures", "spawn requests", settings.CREATURE_SPAWN_BATCH * 32)
+        self.add("creatures", "spawned slots", settings.CREATURE_SPAWN_BATCH * 4)
+        self.add("creatures", "grid offsets", PrefixSum.get_levels(cell_count + 1)[1] * 4)
+
+        neuron_count = capacity * settings.NEURAL_NEURON_COUNT
+        self.add("neural", "sizes", capacity * 4)
+        self.add("neural", "biases", neuron_count * 4)
+        self.add("neural", "states", neuron_count * 2 * 4)
+        self.add("neural", "edge offsets", (neuron_count + 1) * 4)
+        self.add("neural", "edges", settings.NEURAL_EDGE_CAPACITY * NeuralNetworks.EDGE_STRIDE, 2)
+        self.add("neural", "appended edges", settings.NEURAL_APPEND_CAPACITY * NeuralNetworks.APPENDED_EDGE_STRIDE)
+        self.add("neural", "counters", 16)
+        self.add("neural", "compacted edge offsets", PrefixSum.get_levels(neuron_count + 1)[1] * 4)
+
+        substance_capacity = max(SUBSTANCES.capacity, settings.SUBSTANCE_CAPACITY)
+        self.add("substances", "physics", substance_capacity * SubstanceRegistry.PHYSICS_STRIDE)
+        self.add("substances", "optics", substance_capacity * SubstanceRegistry.OPTICS_STRIDE)
+        self.add("substances", "reactions", ReactionTable.get_size(len(REACTIONS)))
+
+        if settings.SHADER_OVERFLOW_CHECKS:
+            report_size = (
+                    OverflowMonitor.HEADER_SIZE + settings.OVERFLOW_REPORT_CAPACITY * OVERFLOW_REPORT_DTYPE.itemsize
+            )
+            self.add("service", "overflow reports", report_size)
+            self.add("service", "overflow readback", report_size, settings.READBACK_RING_DEPTH)
+        if settings.FINGERPRINT_PERIOD > 0:
+            # Кирпич - рабочая группа ячеек
+            brick_count = math.prod(texture_shape) // math.prod(settings.CELL_GROUP_SHAPE)
+            fingerprint_size = StateFingerprint.get_size(settings.WORLD_BATCH_SIZE, brick_count)
+            self.add("service", "fingerprints", fingerprint_size)
+            self.add("service", "fingerprint readback", fingerprint_size, settings.READBACK_RING_DEPTH)
+        # PickResult из pick.glsl
+        self.add("service", "pick results", 32 + settings.CELL_SIZE * UNIT_LAYOUT.channels * 4, CellPicker.DEPTH)
+
+        # С потоком симуляции объемов оптики два
+        optics_count = 2 if settings.SIMULATION_THREAD else 1
+        self.add(
+            "projection",
+            "optics volume",
+            OpticsVolume.get_size(self.world_shape, settings.OPTICS_LEVEL_COUNT),
+            optics_count
+        )
+        self.add("projection", "optics handles", (1 + settings.OPTICS_LEVEL_COUNT) * 8, optics_count)
+        # Буферы вычислительной отрисовки зависят от размера цели: окна или кадра внеэкранной отрисовки.
+        # Изображение цели создается каждым способом отрисовки при первом использовании и остается до выхода
+        target_pixels = max(settings.WINDOW_WIDTH * settings.WINDOW_HEIGHT, math.prod(settings.RENDER_SIZE))
+        self.add("projection", "tile target", TileRaymarcher.get_target_size(target_pixels))
+        self.add("projection", "wavefront target", WavefrontRaymarcher.get_target_size(target_pixels))
+        self.add("projection", "wavefront buffers", WavefrontRaymarcher.get_size(target_pixels))
+
+    @property
+    def total(self) -> int:
+        return sum(entry.total for entry in self.entries)
+
+    def group_totals(self) -> dict[str, int]:
+        totals = {}
+        for entry in self.entries:
+            totals[entry.group] = totals.get(entry.group, 0) + entry.total
+        return totals
+
+    def describe(self) -> str:
+        lines = []
+        for group, group_total in self.group_totals().items():
+            lines.append(f"{group}: {format_size(group_total)}")
+            for entry in self.entries:
+                if entry.group == group:
+                    copies = f" ({entry.count} x {format_size(entry.size)})" if entry.count > 1 else ""
+                    lines.append(f"    {entry.name}: {format_size(entry.total)}{copies}")
+        lines.append(f"total: {format_size(self.total)}")
+        lines.extend(self.notes)
+        return "\n".join(lines)
+
+    # Свободная видеопамять по данным драйвера в байтах или None, если драйвер ее не сообщает
+    @staticmethod
+    def query_available_memory() -> int | None:
+        if gl.gl_info.have_extension("GL_NVX_gpu_memory_info"):
+            value = gl.GLint()
+            gl.glGetIntegerv(GPU_MEMORY_INFO_CURRENT_AVAILABLE_VIDMEM_NVX, ctypes.byref(value))
+            return value.value * 1024
+        if gl.gl_info.have_extension("GL_ATI_meminfo"):
+            # Свободно всего, самый большой блок, свободно вспомогательной памяти, ее самый большой блок
+            values = (gl.GLint * 4)()
+            gl.glGetIntegerv(TEXTURE_FREE_MEMORY_ATI, values)
+            return values[0] * 1024
+        return None
+
+    def get_budget(self) -> int | None:
+        if self.settings.VRAM_BUDGET is not None:
+            return self.settings.VRAM_BUDGET
+        available = self.query_available_memory()
+        if available is None:
+            return None
+        return int(available * (1 - self.settings.VRAM_RESERVE))
+
+    # Самая большая глубина мира (кратная рабочей группе), при которой план помещается в бюджет, или 0
+    def find_fitting_depth(self, budget: int) -> int:
+        step = self.settings.CELL_GROUP_SHAPE.z
+        if self.settings.GRAVITY_FIELD:
+            # Глубина каждого уровня поля тяготения должна быть целой
+            step = max(step, 1 << (self.settings.GRAVITY_LEVEL_COUNT - 1))
+        depth = self.world_shape.z - step
+        while depth >= step:
+            shape = Vec3(self.world_shape.x, self.world_shape.y, depth)
+            if MemoryPlan(shape).total <= budget:
+                return depth
+            depth -= step
+        return 0
+
+    def check_texture_limits(self) -> None:
+        max_size = gl.GLint()
+        gl.glGetIntegerv(gl.GL_MAX_3D_TEXTURE_SIZE, ctypes.byref(max_size))
+        for name, shape in self.texture_shapes.items():
+            if max(shape) > max_size.value:
+                raise MemoryPlanError(
+                    f"{name} shape {tuple(shape)} exceeds GL_MAX_3D_TEXTURE_SIZE ({max_size.value})"
+                )
+
+    # Проверяет план перед созданием ресурсов и возвращает бюджет (None, если он неизвестен)
+    def validate(self) -> int | None:
+        self.check_texture_limits()
+        if self.settings.CHUNK_COUNT > 1:
+            self.logger.warning(
+                f"CHUNK_COUNT ({self.settings.CHUNK_COUNT}) > 1 multiplies world textures,"
+                " shaders address only the first chunk"
+            )
+
+        budget = self.get_budget()
+        self.logger.info(f"Video memory plan for WORLD_SHAPE {tuple(self.world_shape)}:\n{self.describe()}")
+        if budget is None:
+            self.logger.warning("Available video memory is unknown, the memory plan is not checked")
+            return None
+
+        self.logger.info(f"Video memory budget: {format_size(budget)}")
+        if self.total > budget:
+            depth = self.find_fitting_depth(budget)
+            suggestion = (
+                f"WORLD_SHAPE.z <= {depth} would fit" if depth > 0 else
+                "no world depth fits, reduce CREATURE_CAPACITY or NEURAL_* capacities"
+            )
+            raise MemoryPlanError(
+                f"Planned video memory ({format_size(self.total)}) exceeds the budget ({format_size(budget)}),"
+                f" {suggestion}:\n{self.describe()}"
+            )
+        return budget
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{group} {format_size(group_total)}" for group, group_total in self.group_totals().items()
+        ) + f", total {format_size(self.total)}"
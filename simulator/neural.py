@@ -0,0 +1,153 @@
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pyglet import gl
+from pyglet.graphics.shader import ComputeShaderProgram
+
+from core.service.buffer import StorageBuffer
+from core.service.glsl import load_shader, write_uniforms
+from core.service.object import PhysicalObject
+from core.service.scan import PrefixSum
+from core.service.settings import SettingError
+
+
+if TYPE_CHECKING:
+    from simulator.creature import CreatureEngine
+
+
+class NeuralNetworkError(SettingError):
+    pass
+
+
+# Нейронные сети всех существ, вычисляемые одним проходом на видеокарте.
+# Входы нейронов хранятся как CSR (смещения + упакованные связи), состояния нейронов - в двойном буфере.
+# Новые связи (от мутаций и новых существ) дописываются в отдельный буфер,
+# а удаленные только помечаются - сеть перестраивается проходом уплотнения
+class NeuralNetworks(PhysicalObject):
+    # Точки привязки, должны совпадать с neural.glsl
+    SIZE_BINDING = 44
+    BIAS_BINDING = 45
+    STATE_BINDING = 46
+    EDGE_OFFSET_BINDING = 47
+    EDGE_BINDING = 48
+    COMPACTED_EDGE_BINDING = 49
+    APPENDED_EDGE_BINDING = 50
+    COUNTER_BINDING = 51
+    COMPACTED_EDGE_OFFSET_BINDING = 52
+
+    # Размеры Edge и AppendedEdge (std430)
+    EDGE_STRIDE = 8
+    APPENDED_EDGE_STRIDE = 16
+    # Выходы сети - первые нейроны блока существа: 3 компоненты скорости и аппетит.
+    # Должно совпадать с neural_output_count в neural.glsl, выходы читает evaluate.glsl
+    OUTPUT_COUNT = 4
+
+    def __init__(self, creatures: "CreatureEngine") -> None:
+        super().__init__()
+
+        if self.settings.NEURAL_NEURON_COUNT < self.OUTPUT_COUNT:
+            raise NeuralNetworkError(
+                f"self.NEURAL_NEURON_COUNT ({self.settings.NEURAL_NEURON_COUNT}) must not be less than"
+                f" the network output count ({self.OUTPUT_COUNT})"
+            )
+
+        self.creatures = creatures
+        self.neuron_count = self.creatures.capacity * self.settings.NEURAL_NEURON_COUNT
+        self.group_count = math.ceil(self.neuron_count / self.settings.CREATURE_GROUP_SIZE)
+        self.edge_capacity = self.settings.NEURAL_EDGE_CAPACITY
+        self.append_capacity = self.settings.NEURAL_APPEND_CAPACITY
+
+        self.sizes = StorageBuffer(self.SIZE_BINDING, self.creatures.capacity * 4)
+        self.biases = StorageBuffer(self.BIAS_BINDING, self.neuron_count * 4)
+        self.states = StorageBuffer(self.STATE_BINDING, self.neuron_count * 2 * 4)
+        self.edge_offsets = StorageBuffer(self.EDGE_OFFSET_BINDING, (self.neuron_count + 1) * 4)
+        self.edges = StorageBuffer(self.EDGE_BINDING, self.edge_capacity * self.EDGE_STRIDE)
+        self.compacted_edges = StorageBuffer(self.COMPACTED_EDGE_BINDING, self.edge_capacity * self.EDGE_STRIDE)
+        self.appended_edges = StorageBuffer(self.APPENDED_EDGE_BINDING, self.append_capacity * self.APPENDED_EDGE_STRIDE)
+        self.counters = StorageBuffer(self.COUNTER_BINDING, 16)
+        self.compacted_edge_offsets = PrefixSum(self.neuron_count + 1, self.COMPACTED_EDGE_OFFSET_BINDING)
+
+        self.spawn_shader = self.load("spawn")
+        self.evaluate_shader = self.load("evaluate")
+        self.mutate_shader = self.load("mutate")
+        self.compact_count_shader = self.load("compact_count")
+        self.compact_count_appended_shader = self.load("compact_count_appended")
+        self.compact_scatter_shader = self.load("compact_scatter")
+        self.compact_scatter_appended_shader = self.load("compact_scatter_appended")
+
+        write_uniforms(self.spawn_shader, {"u_initial_edges": (self.settings.NEURAL_INITIAL_EDGES, True, True)})
+        write_uniforms(self.evaluate_shader, {"u_creature_max_speed": (self.settings.CREATURE_MAX_SPEED, True, True)})
+        uniforms = {
+            "u_weight_mutation": (self.settings.NEURAL_WEIGHT_MUTATION, True, True),
+            "u_edge_removal": (self.settings.NEURAL_EDGE_REMOVAL, True, True),
+            "u_edge_addition": (self.settings.NEURAL_EDGE_ADDITION, True, True),
+            "u_mutation_strength": (self.settings.NEURAL_MUTATION_STRENGTH, True, True)
+        }
+        write_uniforms(self.mutate_shader, uniforms)
+
+        self.evaluation_count = 0
+        # Нужно ли уплотнение перед следующим вычислением сетей
+        self.topology_changed = False
+
+    def load(self, name: str) -> ComputeShaderProgram:
+        return ComputeShaderProgram(load_shader(f"{self.settings.NEURAL_SHADERS}/{name}.glsl"))
+
+    def seed(self, salt: int) -> int:
+        return (self.settings.WORLD_SEED * 1000003 + self.creatures.world.age * 31 + salt) & 0x7FFFFFFF
+
+    # Создает сети для существ, созданных в этом тике (их слоты записаны в u_creature_spawned_slots)
+    def on_spawn(self, spawn_count: int) -> None:
+        uniforms = {
+            "u_spawn_count": (spawn_count, True, True),
+            "u_seed": (self.seed(0), True, True)
+        }
+        write_uniforms(self.spawn_shader, uniforms)
+        self.creatures.dispatch(
+            self.spawn_shader,
+            math.ceil(spawn_count * self.settings.NEURAL_NEURON_COUNT / self.settings.CREATURE_GROUP_SIZE)
+        )
+        self.topology_changed = True
+
+    def mutate(self) -> None:
+        write_uniforms(self.mutate_shader, {"u_seed": (self.seed(1), True, True)})
+        self.creatures.dispatch(self.mutate_shader, self.group_count)
+        self.topology_changed = True
+
+    def compact(self) -> None:
+        append_group_count = math.ceil(self.append_capacity / self.settings.CREATURE_GROUP_SIZE)
+
+        self.compacted_edge_offsets.buffer.clear()
+        self.creatures.dispatch(self.compact_count_shader, self.group_count)
+        self.creatures.dispatch(self.compact_count_appended_shader, append_group_count)
+        self.compacted_edge_offsets.run()
+        self.creatures.dispatch(self.compact_scatter_shader, self.group_count)
+        self.creatures.dispatch(self.compact_scatter_appended_shader, append_group_count)
+
+        gl.glCopyNamedBufferSubData(
+            self.compacted_edge_offsets.buffer.gl_id,
+            self.edge_offsets.gl_id,
+            0,
+            0,
+            self.edge_offsets.size
+        )
+        # Уплотненный массив связей становится основным
+        self.edges, self.compacted_edges = self.compacted_edges, self.edges
+        self.edges.binding, self.compacted_edges.binding = self.EDGE_BINDING, self.COMPACTED_EDGE_BINDING
+        self.edges.bind()
+        self.compacted_edges.bind()
+        self.counters.write(0, np.zeros(4, dtype = np.int32))
+
+        self.topology_changed = False
+
+    def evaluate(self) -> None:
+        write_uniforms(self.evaluate_shader, {"u_state_parity": (self.evaluation_count % 2, True, True)})
+        self.creatures.dispatch(self.evaluate_shader, self.group_count)
+        self.evaluation_count += 1
+
+    def on_update(self) -> None:
+        if self.creatures.world.age % self.settings.NEURAL_MUTATION_PERIOD == 0:
+            self.mutate()
+        if self.topology_changed:
+            self.compact()
+        self.evaluate()
@@ -0,0 +1,210 @@
+import ctypes
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pyglet import gl
+from pyglet.graphics.shader import ComputeShaderProgram
+from pyglet.math import Vec3
+
+from core.service.glsl import load_shader, write_uniforms
+from core.service.object import ProjectMixin
+from core.service.threads.lock import Lock
+
+
+if TYPE_CHECKING:
+    from simulator.world import World
+
+
+# Один экземпляр объема с цепочкой уровней: текстура и буфер с ее дескрипторами для привязки BINDING
+class OpticsGeneration:
+    def __init__(self, texture_id: gl.GLuint, buffer_id: gl.GLuint) -> None:
+        self.texture_id = texture_id
+        self.buffer_id = buffer_id
+        # Возраст мира, для которого объем посчитан
+        self.age: int | None = None
+        # Ограждение записи объема потоком симуляции, ждется потоком отрисовки
+        self.ready_fence: gl.GLsync | None = None
+        # Ограждение последнего чтения объема потоком отрисовки, ждется потоком симуляции перед перезаписью
+        self.release_fence: gl.GLsync | None = None
+        # Поток отрисовки хотя бы раз начал чтение этого объема
+        self.acquired = False
+
+    def delete(self) -> None:
+        for fence in (self.ready_fence, self.release_fence):
+            if fence is not None:
+                gl.glDeleteSync(fence)
+        gl.glDeleteBuffers(1, ctypes.byref(self.buffer_id))
+        gl.glDeleteTextures(1, ctypes.byref(self.texture_id))
+
+
+# Объем оптики первого мира пакета с цепочкой уровней детализации для отрисовки (optics_volume.glsl).
+# Уровень 0 считается из юнитов ячеек, каждый следующий - усреднением предыдущего.
+# В одном потоке (generation_count == 1) объем пересчитывается не чаще одного раза за тик мира,
+# перед первой отрисовкой после него (acquire).
+# С потоком симуляции объемов два: поток симуляции после тика пишет в тот, который не последний и не читается
+# (publish), а поток отрисовки всегда читает последний записанный (acquire - release), поэтому видит только
+# завершенные тики. Объемы передаются через ограждения OpenGL, а выбор объема делается под блокировкой.
+# Новый объем пишется, только если отрисовка уже взяла предыдущий, то есть не чаще, чем рисуются кадры
+class OpticsVolume(ProjectMixin):
+    # Должна совпадать с optics_volume.glsl
+    BINDING = 21
+    TEXEL_FORMAT = gl.GL_RGBA32F
+    TEXEL_SIZE = 16
+    DOWNSAMPLE_GROUP_SIZE = 4
+
+    def __init__(self, world: "World", generation_count: int = 1) -> None:
+        self.world = world
+        self.level_count = self.settings.OPTICS_LEVEL_COUNT
+        self.level_shapes = self.get_level_shapes(self.world.shape, self.level_count)
+
+        self.shader = ComputeShaderProgram(load_shader(f"{self.settings.PROJECTIONAL_SHADERS}/optics.glsl"))
+        self.downsample_shader = ComputeShaderProgram(
+            load_shader(f"{self.settings.PROJECTIONAL_SHADERS}/optics_downsample.glsl")
+        )
+        uniforms = {
+            "u_optical_density_scale": (self.settings.OPTICAL_DENSITY_SCALE, False, False),
+
+            "u_test_color_cube_start": (self.settings.TEST_COLOR_CUBE_START, False, False),
+            "u_test_color_cube_end": (self.settings.TEST_COLOR_CUBE_END, False, False)
+        }
+        write_uniforms(self.shader, uniforms)
+
+        self.generations = [self.init_generation() for _ in range(generation_count)]
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.BINDING, self.generations[0].buffer_id)
+        self.lock = Lock("optics")
+        # Последний записанный объем и объем, который сейчас читает поток отрисовки
+        self.latest: OpticsGeneration | None = None
+        self.held: OpticsGeneration | None = None
+        # Тики, после которых объем не был записан, потому что свободного объема не было
+        self.skipped = 0
+
+    @property
+    def threaded(self) -> bool:
+        return len(self.generations) > 1
+
+    # Формы уровней в текселях: каждый следующий уровень вдвое меньше с округлением вверх
+    @staticmethod
+    def get_level_shapes(shape: Vec3, level_count: int) -> list[Vec3]:
+        return [
+            Vec3(*(max(1, math.ceil(component / (1 << level))) for component in shape))
+            for level in range(level_count)
+        ]
+
+    @classmethod
+    def get_size(cls, shape: Vec3, level_count: int) -> int:
+        return sum(
+            int(level_shape.x * level_shape.y * level_shape.z) * cls.TEXEL_SIZE
+            for level_shape in cls.get_level_shapes(shape, level_count)
+        )
+
+    def init_generation(self) -> OpticsGeneration:
+        texture_id = gl.GLuint()
+        gl.glCreateTextures(gl.GL_TEXTURE_3D, 1, ctypes.byref(texture_id))
+        gl.glTextureStorage3D(texture_id, self.level_count, self.TEXEL_FORMAT, *self.world.shape)
+        gl.glTextureParameteri(texture_id, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST_MIPMAP_NEAREST)
+        gl.glTextureParameteri(texture_id, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+
+        # Дескриптор для чтения всех уровней и дескрипторы записи каждого уровня
+        handles = np.zeros(1 + self.level_count, dtype = np.uint64)
+        handles[0] = self.world.handles.add_texture(gl.glGetTextureHandleARB(texture_id))
+        for level in range(self.level_count):
+            handle = gl.glGetImageHandleARB(texture_id, level, gl.GL_TRUE, 0, self.TEXEL_FORMAT)
+            handles[1 + level] = self.world.handles.add_image(handle, gl.GL_WRITE_ONLY)
+
+        buffer_id = gl.GLuint()
+        gl.glCreateBuffers(1, ctypes.byref(buffer_id))
+        gl.glNamedBufferStorage(buffer_id, handles.nbytes, handles.ctypes.data, 0)
+        return OpticsGeneration(texture_id, buffer_id)
+
+    # Считает объем в привязанный к BINDING экземпляр
+    def compute(self) -> None:
+        self.shader.use()
+        gl.glDispatchCompute(*self.settings.WORLD_GROUP_SHAPE)
+        for level in range(1, self.level_count):
+            gl.glMemoryBarrier(gl.GL_TEXTURE_FETCH_BARRIER_BIT)
+            write_uniforms(self.downsample_shader, {"u_level": (level, True, True)})
+            self.downsample_shader.use()
+            shape = self.level_shapes[level]
+            gl.glDispatchCompute(
+                *(math.ceil(component / self.DOWNSAMPLE_GROUP_SIZE) for component in (shape.x, shape.y, shape.z))
+            )
+        gl.glMemoryBarrier(gl.GL_TEXTURE_FETCH_BARRIER_BIT)
+
+    # Пересчитывает единственный объем, если мир изменился с прошлого пересчета
+    def update(self) -> None:
+        generation = self.generations[0]
+        if generation.age == self.world.age:
+            return
+        generation.age = self.world.age
+        self.compute()
+
+    # Вызывается потоком симуляции после тика
+    def publish(self) -> None:
+        with self.lock:
+            if self.latest is not None and not self.latest.acquired:
+                return
+            generation = next(
+                (generation for generation in self.generations if generation not in (self.latest, self.held)),
+                None
+            )
+            if generation is None:
+                self.skipped += 1
+                return
+            release_fence, generation.release_fence = generation.release_fence, None
+
+        # Отрисовка могла еще не дочитать объем на видеокарте
+        if release_fence is not None:
+            gl.glWaitSync(release_fence, 0, gl.GL_TIMEOUT_IGNORED)
+            gl.glDeleteSync(release_fence)
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.BINDING, generation.buffer_id)
+        self.compute()
+        ready_fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        # Ограждение видно другому контексту только после отправки команд
+        gl.glFlush()
+
+        with self.lock:
+            generation.age = self.world.age
+            generation.ready_fence = ready_fence
+            generation.acquired = False
+            self.latest = generation
+
+    # Вызывается потоком отрисовки перед отрисовкой, False - рисовать еще нечего
+    def acquire(self) -> bool:
+        if not self.threaded:
+            self.update()
+            return True
+
+        with self.lock:
+            generation = self.latest
+            if generation is None:
+                return False
+            generation.acquired = True
+            self.held = generation
+            ready_fence, generation.ready_fence = generation.ready_fence, None
+
+        # Ожидание на видеокарте: процессор не блокируется
+        if ready_fence is not None:
+            gl.glWaitSync(ready_fence, 0, gl.GL_TIMEOUT_IGNORED)
+            gl.glDeleteSync(ready_fence)
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.BINDING, generation.buffer_id)
+        return True
+
+    # Вызывается потоком отрисовки после отрисовки, начатой успешным acquire
+    def release(self) -> None:
+        if not self.threaded:
+            return
+
+        release_fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        gl.glFlush()
+        with self.lock:
+            generation = self.held
+            previous_fence, generation.release_fence = generation.release_fence, release_fence
+            self.held = None
+        # Более раннее ограждение того же контекста перекрывается новым
+        if previous_fence is not None:
+            gl.glDeleteSync(previous_fence)
+
+    def delete(self) -> None:
+        for generation in self.generations:
+            generation.delete()
@@ -0,0 +1,126 @@
+from typing import Callable, TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+from pyglet import gl
+from pyglet.graphics.shader import ComputeShaderProgram
+
+from core.service.bitfield import UNIT_LAYOUT
+from core.service.glsl import load_shader, write_uniforms
+from core.service.object import ProjectMixin
+from core.service.readback import ReadbackSlot
+
+
+if TYPE_CHECKING:
+    from simulator.world import WorldProjection
+
+
+class PickResult:
+    def __init__(self, pixel: tuple[int, int], age: int, data: np.void) -> None:
+        self.pixel = pixel
+        # Возраст мира на момент выбора
+        self.age = age
+        self.found = bool(data["cell"][3] >= 0)
+        self.cell_position = tuple(int(value) for value in data["cell"][:3])
+        self.distance = float(data["distance"])
+        # Структурированный массив с полями Unit
+        self.units: npt.NDArray = UNIT_LAYOUT.decode(data["units"][:max(int(data["cell"][3]), 0)])
+
+    def __repr__(self) -> str:
+        if not self.found:
+            return f"PickResult(pixel = {self.pixel}, nothing)"
+        return (
+            f"PickResult(pixel = {self.pixel}, cell = {self.cell_position},"
+            f" distance = {self.distance:.2f}, units = {len(self.units)})"
+        )
+
+
+PickCallback = Callable[[PickResult], None]
+
+
+# Выбор ячейки под курсором без чтения текстур мира целиком и без остановки конвейера.
+# Один вызов вычислительного шейдера повторяет проход луча отрисовки для одного пикселя и пишет первую непустую ячейку
+# с ее юнитами в маленький постоянно отображенный буфер. Результат забирается poll() в одном из следующих кадров,
+# когда сработает fence
+class CellPicker(ProjectMixin):
+    RESULT_BINDING = 14
+    # Выборы, ожидающие видеокарту, лишние клики пропускаются
+    DEPTH = 2
+
+    def __init__(self, projection: "WorldProjection") -> None:
+        self.projection = projection
+        self.world = projection.world
+
+        self.shader = ComputeShaderProgram(load_shader(f"{self.settings.PROJECTIONAL_SHADERS}/pick.glsl"))
+        projector = self.world.window.projector
+        # Размер окна, для которого заданы координаты выбора, передается с каждым выбором
+        self.window_size = tuple(self.world.window.size)
+        uniforms = {
+            "u_window_size": (self.window_size, True, True),
+            "u_fov_scale": (projector.projection.fov_scale, True, True),
+            "u_near": (projector.projection.near, True, True),
+            "u_far": (projector.projection.far, True, True)
+        }
+        write_uniforms(self.shader, uniforms)
+
+        # PickResult из pick.glsl (std430)
+        self.result_dtype = np.dtype(
+            [
+                ("cell", np.int32, 4),
+                ("distance", np.float32),
+                ("padding", np.float32, 3),
+                ("units", np.uint32, (self.settings.CELL_SIZE, UNIT_LAYOUT.channels))
+            ]
+        )
+        size = self.result_dtype.itemsize
+        self.slots = [ReadbackSlot(size, np.uint8, (size,)) for _ in range(self.DEPTH)]
+        self.in_flight: list[tuple[ReadbackSlot, tuple[int, int], PickCallback]] = []
+        self.dropped = 0
+
+    # x, y - координаты пикселя в окне размера window_size (начало - левый нижний угол), callback получит PickResult.
+    # Размер окна приходит вместе с выбором: с потоком симуляции программу выбора меняет только он
+    def pick(self, x: int, y: int, window_size: tuple[int, int], callback: PickCallback) -> bool:
+        slot = next((slot for slot in self.slots if not slot.busy), None)
+        if slot is None:
+            self.dropped += 1
+            return False
+
+        uniforms = {"u_pick_pixel": ((x + 0.5, y + 0.5), True, True)}
+        if tuple(window_size) != self.window_size:
+            self.window_size = tuple(window_size)
+            uniforms["u_window_size"] = (self.window_size, True, True)
+        write_uniforms(self.shader, uniforms)
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.RESULT_BINDING, slot.gl_id)
+        self.shader.use()
+        gl.glDispatchCompute(1, 1, 1)
+        # Запись шейдера в постоянно отображенный буфер становится видна процессору после fence
+        gl.glMemoryBarrier(gl.GL_CLIENT_MAPPED_BUFFER_BARRIER_BIT)
+        slot.fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        slot.age = self.world.age
+        slot.busy = True
+        self.in_flight.append((slot, (x, y), callback))
+        gl.glFlush()
+        return True
+
+    # Отдает готовые результаты, не блокируясь
+    def poll(self) -> None:
+        while self.in_flight:
+            slot, pixel, callback = self.in_flight[0]
+            status = gl.glClientWaitSync(slot.fence, 0, 0)
+            if status == gl.GL_TIMEOUT_EXPIRED:
+                break
+
+            self.in_flight.pop(0)
+            gl.glDeleteSync(slot.fence)
+            slot.fence = None
+            try:
+                if status == gl.GL_WAIT_FAILED:
+                    self.logger.warning(f"Waiting for pick at {pixel} failed")
+                else:
+                    callback(PickResult(pixel, slot.age, slot.view.view(self.result_dtype)[0]))
+            finally:
+                slot.busy = False
+
+    def delete(self) -> None:
+        for slot in self.slots:
+            slot.delete()
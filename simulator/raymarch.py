@@ -0,0 +1,248 @@
+import ctypes
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pyglet import gl
+from pyglet.graphics.shader import ComputeShaderProgram
+
+from core.service.colors import ProjectColors
+from core.service.glsl import load_shader, write_uniforms
+from core.service.object import ProjectMixin
+
+
+if TYPE_CHECKING:
+    from simulator.world import WorldProjection
+
+
+# WavefrontRay из wavefront.glsl (std430)
+WAVEFRONT_RAY_DTYPE = np.dtype(
+    [
+        ("origin", np.float32, 3),
+        ("path_length", np.float32),
+        ("direction", np.float32, 3),
+        ("weight", np.float32),
+        ("pixel", np.int32),
+        ("refractive_index", np.float32),
+        ("bounce", np.int32),
+        ("padding", np.int32)
+    ]
+)
+
+
+# Отрисовка мира вычислительными шейдерами в изображение размера цели, которое копируется в текущий буфер кадра
+class ComputeRaymarcher(ProjectMixin):
+    # Должна совпадать с tile.glsl и wavefront_composite.glsl
+    TARGET_BINDING = 22
+    # RGBA8
+    TARGET_TEXEL_SIZE = 4
+    HANDLE_SIZE = 8
+
+    def __init__(self, projection: "WorldProjection", shaders: list[ComputeShaderProgram]) -> None:
+        self.projection = projection
+        self.shaders = shaders
+        projector = projection.window.projector
+        uniforms = {
+            "u_fov_scale": (projector.projection.fov_scale, False, False),
+            "u_near": (projector.projection.near, False, False),
+            "u_far": (projector.projection.far, False, False),
+
+            "u_background": (ProjectColors.to_opengl(self.settings.WINDOW_BACKGROUND_COLOR), False, False),
+            "u_optics_lod_bias": (self.settings.OPTICS_LOD_BIAS, False, False)
+        }
+        for shader in self.shaders:
+            write_uniforms(shader, uniforms)
+
+        self.size: tuple[int, int] | None = None
+        self.texture_id = gl.GLuint()
+        self.framebuffer_id = gl.GLuint()
+        self.buffer_id = gl.GLuint()
+
+    # Изображение цели из pixel_count пикселей и буфер его дескриптора
+    @classmethod
+    def get_target_size(cls, pixel_count: int) -> int:
+        return pixel_count * cls.TARGET_TEXEL_SIZE + cls.HANDLE_SIZE
+
+    # Пересоздает изображение под размер цели
+    def resize(self, size: tuple[int, int]) -> None:
+        if self.size == tuple(size):
+            return
+        self.delete_target()
+        self.size = tuple(size)
+        for shader in self.shaders:
+            write_uniforms(shader, {"u_window_size": (self.size, False, False)})
+
+        gl.glCreateTextures(gl.GL_TEXTURE_2D, 1, ctypes.byref(self.texture_id))
+        gl.glTextureStorage2D(self.texture_id, 1, gl.GL_RGBA8, *self.size)
+        handles = np.zeros(1, dtype = np.uint64)
+        handles[0] = gl.glGetImageHandleARB(self.texture_id, 0, gl.GL_FALSE, 0, gl.GL_RGBA8)
+        gl.glMakeImageHandleResidentARB(int(handles[0]), gl.GL_WRITE_ONLY)
+        gl.glCreateBuffers(1, ctypes.byref(self.buffer_id))
+        gl.glNamedBufferStorage(self.buffer_id, handles.nbytes, handles.ctypes.data, 0)
+
+        gl.glCreateFramebuffers(1, ctypes.byref(self.framebuffer_id))
+        gl.glNamedFramebufferTexture(self.framebuffer_id, gl.GL_COLOR_ATTACHMENT0, self.texture_id, 0)
+        gl.glNamedFramebufferReadBuffer(self.framebuffer_id, gl.GL_COLOR_ATTACHMENT0)
+        self.init_target()
+
+    # Ресурсы подкласса, зависящие от размера цели
+    def init_target(self) -> None:
+        pass
+
+    # Рисует мир в изображение, привязанное к TARGET_BINDING
+    def render(self) -> None:
+        raise NotImplementedError()
+
+    # Рисует мир в изображение и копирует его в область просмотра текущего буфера кадра
+    def draw(self) -> None:
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.TARGET_BINDING, self.buffer_id)
+        self.render()
+        gl.glMemoryBarrier(gl.GL_FRAMEBUFFER_BARRIER_BIT)
+
+        draw_framebuffer = gl.GLint()
+        gl.glGetIntegerv(gl.GL_DRAW_FRAMEBUFFER_BINDING, ctypes.byref(draw_framebuffer))
+        viewport = (gl.GLint * 4)()
+        gl.glGetIntegerv(gl.GL_VIEWPORT, viewport)
+        gl.glBlitNamedFramebuffer(
+            self.framebuffer_id,
+            draw_framebuffer.value,
+            0,
+            0,
+            *self.size,
+            viewport[0],
+            viewport[1],
+            viewport[0] + viewport[2],
+            viewport[1] + viewport[3],
+            gl.GL_COLOR_BUFFER_BIT,
+            gl.GL_NEAREST
+        )
+
+    def delete_target(self) -> None:
+        if self.size is None:
+            return
+        gl.glDeleteFramebuffers(1, ctypes.byref(self.framebuffer_id))
+        gl.glDeleteBuffers(1, ctypes.byref(self.buffer_id))
+        gl.glDeleteTextures(1, ctypes.byref(self.texture_id))
+        self.size = None
+
+    def delete(self) -> None:
+        self.delete_target()
+
+
+# Отрисовка мира вычислительным шейдером по плиткам экрана (tile.glsl) - альтернатива полноэкранному проходу
+# fragment.glsl. Лучи плитки делят загруженные в общую память кирпичи объема оптики и завершаются всей плиткой
+class TileRaymarcher(ComputeRaymarcher):
+    # Должна совпадать с tile.glsl
+    TILE_SHAPE = 8
+
+    def __init__(self, projection: "WorldProjection") -> None:
+        self.shader = ComputeShaderProgram(load_shader(f"{self.settings.PROJECTIONAL_SHADERS}/tile.glsl"))
+        super().__init__(projection, [self.shader])
+
+    def render(self) -> None:
+        self.shader.use()
+        gl.glDispatchCompute(*(math.ceil(component / self.TILE_SHAPE) for component in self.size), 1)
+
+
+# Волновой конвейер лучей (wavefront.glsl) с отражением и преломлением на границах сред.
+# Первичный проход ведет по лучу на пиксель и кладет отраженные и преломленные лучи в очередь, каждый следующий
+# проход обрабатывает очередь прошлого и пополняет другую, затем цвета пикселей, накопленные всеми лучами,
+# записываются в изображение. Размер сетки прохода считается на видеокарте (wavefront_queue.glsl),
+# поэтому стоимость ветвлений пропорциональна числу лучей, которым они нужны, а процессор ничего не ждет
+class WavefrontRaymarcher(ComputeRaymarcher):
+    # Должны совпадать с wavefront.glsl
+    STATE_BINDING = 24
+    INPUT_BINDING = 25
+    OUTPUT_BINDING = 26
+    PIXELS_BINDING = 27
+    # Аргументы непрямого запуска, счетчики входной и выходной очередей
+    STATE_SIZE = 5 * 4
+    PIXEL_SIZE = 16
+    PIXEL_GROUP_SHAPE = 8
+
+    def __init__(self, projection: "WorldProjection") -> None:
+        shaders = self.settings.PROJECTIONAL_SHADERS
+        self.primary_shader = ComputeShaderProgram(load_shader(f"{shaders}/wavefront_primary.glsl"))
+        self.secondary_shader = ComputeShaderProgram(load_shader(f"{shaders}/wavefront_secondary.glsl"))
+        self.queue_shader = ComputeShaderProgram(load_shader(f"{shaders}/wavefront_queue.glsl"))
+        self.composite_shader = ComputeShaderProgram(load_shader(f"{shaders}/wavefront_composite.glsl"))
+        super().__init__(
+            projection,
+            [self.primary_shader, self.secondary_shader, self.queue_shader, self.composite_shader]
+        )
+        self.max_bounces = self.settings.WAVEFRONT_MAX_BOUNCES
+        uniforms = {
+            "u_refractivity": (self.settings.WAVEFRONT_REFRACTIVITY, False, False),
+            "u_interface_threshold": (self.settings.WAVEFRONT_INTERFACE_THRESHOLD, False, False),
+            "u_min_weight": (self.settings.WAVEFRONT_MIN_WEIGHT, False, False),
+            "u_max_bounces": (self.max_bounces, False, False)
+        }
+        for shader in self.shaders:
+            write_uniforms(shader, uniforms)
+
+        self.state_buffer_id = gl.GLuint()
+        self.queue_buffer_ids = (gl.GLuint * 2)()
+        self.pixels_buffer_id = gl.GLuint()
+
+    # Вместимость каждой очереди в лучах
+    @classmethod
+    def get_queue_capacity(cls, pixel_count: int) -> int:
+        return max(1, int(pixel_count * cls.settings.WAVEFRONT_QUEUE_RAYS_PER_PIXEL))
+
+    # Состояние, две очереди и цвета пикселей для цели из pixel_count пикселей
+    @classmethod
+    def get_size(cls, pixel_count: int) -> int:
+        return (
+                cls.STATE_SIZE
+                + 2 * cls.get_queue_capacity(pixel_count) * WAVEFRONT_RAY_DTYPE.itemsize
+                + pixel_count * cls.PIXEL_SIZE
+        )
+
+    def init_target(self) -> None:
+        pixel_count = self.size[0] * self.size[1]
+        capacity = self.get_queue_capacity(pixel_count)
+        for shader in self.shaders:
+            write_uniforms(shader, {"u_queue_capacity": (capacity, False, False)})
+
+        gl.glCreateBuffers(1, ctypes.byref(self.state_buffer_id))
+        gl.glNamedBufferStorage(self.state_buffer_id, self.STATE_SIZE, None, gl.GL_DYNAMIC_STORAGE_BIT)
+        gl.glCreateBuffers(2, self.queue_buffer_ids)
+        for buffer_id in self.queue_buffer_ids:
+            gl.glNamedBufferStorage(buffer_id, capacity * WAVEFRONT_RAY_DTYPE.itemsize, None, 0)
+        gl.glCreateBuffers(1, ctypes.byref(self.pixels_buffer_id))
+        gl.glNamedBufferStorage(self.pixels_buffer_id, pixel_count * self.PIXEL_SIZE, None, 0)
+
+    def render(self) -> None:
+        gl.glClearNamedBufferData(self.state_buffer_id, gl.GL_R32UI, gl.GL_RED_INTEGER, gl.GL_UNSIGNED_INT, None)
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.STATE_BINDING, self.state_buffer_id)
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.PIXELS_BINDING, self.pixels_buffer_id)
+        gl.glBindBuffer(gl.GL_DISPATCH_INDIRECT_BUFFER, self.state_buffer_id)
+        pixel_groups = [math.ceil(component / self.PIXEL_GROUP_SHAPE) for component in self.size]
+
+        output = 0
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.OUTPUT_BINDING, self.queue_buffer_ids[output])
+        self.primary_shader.use()
+        gl.glDispatchCompute(*pixel_groups, 1)
+
+        for _ in range(self.max_bounces):
+            gl.glMemoryBarrier(gl.GL_SHADER_STORAGE_BARRIER_BIT)
+            # Выходная очередь прошлого прохода становится входной
+            gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.INPUT_BINDING, self.queue_buffer_ids[output])
+            output = 1 - output
+            gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, self.OUTPUT_BINDING, self.queue_buffer_ids[output])
+            self.queue_shader.use()
+            gl.glDispatchCompute(1, 1, 1)
+            gl.glMemoryBarrier(gl.GL_SHADER_STORAGE_BARRIER_BIT | gl.GL_COMMAND_BARRIER_BIT)
+            self.secondary_shader.use()
+            gl.glDispatchComputeIndirect(0)
+
+        gl.glMemoryBarrier(gl.GL_SHADER_STORAGE_BARRIER_BIT)
+        self.composite_shader.use()
+        gl.glDispatchCompute(*pixel_groups, 1)
+
+    def delete_target(self) -> None:
+        if self.size is not None:
+            gl.glDeleteBuffers(1, ctypes.byref(self.state_buffer_id))
+            gl.glDeleteBuffers(2, self.queue_buffer_ids)
+            gl.glDeleteBuffers(1, ctypes.byref(self.pixels_buffer_id))
+        super().delete_target()
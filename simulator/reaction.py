@@ -0,0 +1,177 @@
+import numpy as np
+import numpy.typing as npt
+
+from core.service.buffer import StorageBuffer
+from core.service.object import ProjectMixin
+from core.service.singleton import Singleton
+from simulator.substance import SUBSTANCES
+
+
+class ReactionError(Exception):
+    pass
+
+
+# Таблица химических реакций двух веществ: A + B -> C + D.
+# Реакции лежат в хэш-таблице с открытой адресацией, ключ - пара (меньшее вещество, большее вещество),
+# поэтому ее размер зависит только от числа реагирующих пар, а не от числа веществ.
+# Запись хранит ключ вместе с продуктами и порогом, а таблица заполнена не больше чем на MAX_LOAD,
+# поэтому поиск пары почти всегда - одна выборка (uvec4) из буфера.
+# Отсутствующая пара дает пустую реакцию с нулевым порогом, поэтому шейдеру не нужно ветвление на ее отсутствие
+class ReactionTable(Singleton, ProjectMixin):
+    # Точка привязки буфера, должна совпадать с reaction.glsl
+    BINDING = 12
+    # Заголовок (сдвиг хэша) и размер одной записи в буфере видеокарты (std430)
+    HEADER_SIZE = 16
+    ENTRY_STRIDE = 16
+    # Вероятность реакции переводится в порог для 16-битного случайного числа
+    PROBABILITY_SCALE = 1 << 16
+    MAX_REACTION_COUNT = (1 << 16) - 1
+    # Наибольшая доля занятых записей таблицы
+    MAX_LOAD = 0.25
+    MIN_CAPACITY = 16
+    # Множитель хэша Фибоначчи, должен совпадать с reaction.glsl
+    HASH_MULTIPLIER = 2654435769
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # Реагенты (меньшее вещество, большее вещество) -> номер записи в таблице
+        self.pairs: dict[tuple[int, int], int] = {}
+        self.capacity = 0
+        # Записи таблицы: ключ, продукты, порог, не используется. Ключ 0 - свободная запись
+        self.entries: npt.NDArray[np.uint32] = np.zeros((0, 4), dtype = np.uint32)
+        self.dirty_entries: tuple[int, int] = (0, 0)
+        # Таблица перестроена и должна быть загружена на видеокарту целиком
+        self.rebuilt = False
+
+        self.buffer: StorageBuffer | None = None
+        self.rebuild(self.MIN_CAPACITY)
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    # Ключ пары, должен совпадать с read_reaction из reaction.glsl
+    @staticmethod
+    def get_key(low: int, high: int) -> int:
+        return low | high << 16
+
+    @property
+    def shift(self) -> int:
+        return 32 - (self.capacity.bit_length() - 1)
+
+    def get_slot(self, key: int) -> int:
+        return ((key * self.HASH_MULTIPLIER) & 0xFFFFFFFF) >> self.shift
+
+    @classmethod
+    def get_capacity(cls, reaction_count: int) -> int:
+        capacity = cls.MIN_CAPACITY
+        while reaction_count > capacity * cls.MAX_LOAD:
+            capacity *= 2
+        return capacity
+
+    # Размер буфера таблицы для reaction_count реакций
+    @classmethod
+    def get_size(cls, reaction_count: int) -> int:
+        return cls.HEADER_SIZE + cls.get_capacity(reaction_count) * cls.ENTRY_STRIDE
+
+    @staticmethod
+    def mark_dirty(dirty: tuple[int, int], start: int, stop: int) -> tuple[int, int]:
+        if dirty[0] == dirty[1]:
+            return start, stop
+        return min(dirty[0], start), max(dirty[1], stop)
+
+    # Записывает реакцию в первую свободную запись после слота ключа
+    def insert(self, entry: npt.NDArray[np.uint32]) -> int:
+        slot = self.get_slot(int(entry[0]))
+        while self.entries[slot, 0] != 0:
+            slot = (slot + 1) % self.capacity
+        self.entries[slot] = entry
+        return slot
+
+    def rebuild(self, capacity: int) -> None:
+        entries = self.entries[self.entries[:, 0] != 0]
+        self.capacity = capacity
+        self.entries = np.zeros((capacity, 4), dtype = np.uint32)
+        for entry in entries:
+            slot = self.insert(entry)
+            low, high = int(entry[0]) & 0xFFFF, int(entry[0]) >> 16
+            self.pairs[(low, high)] = slot
+        self.rebuilt = True
+
+    def add(self, reagents: tuple[int, int], products: tuple[int, int], probability: float) -> None:
+        reagents = (int(reagents[0]), int(reagents[1]))
+        products = (int(products[0]), int(products[1]))
+        substance_count = len(SUBSTANCES)
+        if not all(0 < substance < substance_count for substance in (*reagents, *products)):
+            raise ReactionError(f"Reaction {reagents} -> {products} references unknown substances or Vacuum")
+        if not 0 < probability <= 1:
+            raise ReactionError(f"Reaction probability ({probability}) must be in (0; 1]")
+        if len(self) >= self.MAX_REACTION_COUNT:
+            raise ReactionError(f"Reaction count must not exceed {self.MAX_REACTION_COUNT}")
+
+        # Реакция хранится в порядке (меньшее вещество, большее вещество)
+        if reagents[0] > reagents[1]:
+            reagents = reagents[::-1]
+            products = products[::-1]
+        if reagents in self.pairs:
+            raise ReactionError(f"Reaction for reagents {reagents} already exists")
+
+        capacity = self.get_capacity(len(self) + 1)
+        if capacity != self.capacity:
+            self.rebuild(capacity)
+        entry = np.array(
+            (
+                self.get_key(*reagents),
+                products[0] | products[1] << 16,
+                max(1, round(probability * self.PROBABILITY_SCALE)),
+                0
+            ),
+            dtype = np.uint32
+        )
+        slot = self.insert(entry)
+        self.pairs[reagents] = slot
+        self.dirty_entries = self.mark_dirty(self.dirty_entries, slot, slot + 1)
+
+    # Процедурная генерация реакций между уже зарегистрированными веществами, воспроизводимая по seed
+    def generate(self, amount: int, seed: int) -> None:
+        substance_count = len(SUBSTANCES)
+        generator = np.random.default_rng(seed)
+        max_pairs = (substance_count - 1) * substance_count // 2
+        amount = min(amount, max_pairs - len(self))
+
+        while amount > 0:
+            reagents = tuple(int(substance) for substance in generator.integers(1, substance_count, 2))
+            if tuple(sorted(reagents)) in self.pairs:
+                continue
+            products = tuple(int(substance) for substance in generator.integers(1, substance_count, 2))
+            self.add(reagents, products, float(generator.uniform(0.001, 0.1)))
+            amount -= 1
+
+    def header_data(self) -> npt.NDArray[np.uint32]:
+        return np.array((self.shift, 0, 0, 0), dtype = np.uint32)
+
+    def init_buffers(self) -> None:
+        self.buffer = StorageBuffer(self.BINDING, self.HEADER_SIZE + self.entries.nbytes)
+        self.buffer.write(0, self.header_data())
+        self.buffer.write(self.HEADER_SIZE, self.entries)
+        self.rebuilt = False
+        self.dirty_entries = (0, 0)
+
+    # Догружает на видеокарту только измененные записи, перестроенная таблица загружается целиком
+    def upload(self) -> None:
+        if self.rebuilt:
+            self.buffer.resize(self.HEADER_SIZE + self.entries.nbytes)
+            self.buffer.write(0, self.header_data())
+            self.buffer.write(self.HEADER_SIZE, self.entries)
+            self.rebuilt = False
+            self.dirty_entries = (0, 0)
+
+        start, stop = self.dirty_entries
+        if start != stop:
+            self.buffer.write(self.HEADER_SIZE + start * self.ENTRY_STRIDE, self.entries[start:stop])
+            self.dirty_entries = (0, 0)
+
+
+REACTIONS = ReactionTable()
+if REACTIONS.settings.REACTION_GENERATED_COUNT > 0:
+    REACTIONS.generate(REACTIONS.settings.REACTION_GENERATED_COUNT, REACTIONS.settings.WORLD_SEED)
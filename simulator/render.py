@@ -0,0 +1,291 @@
+import bisect
+import ctypes
+import json
+import pathlib
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Self, TYPE_CHECKING
+
+import numpy as np
+import numpy.typing as npt
+from PIL import Image
+from pyglet import gl
+from pyglet.math import Vec3
+
+from core.service.object import ProjectMixin
+from core.service.readback import ReadbackSlot
+
+
+if TYPE_CHECKING:
+    from core.gui.projector import ProjectCameraData
+    from simulator.world import WorldProjection
+
+
+class RenderError(Exception):
+    pass
+
+
+# Положение камеры в момент age (в тиках мира).
+# Имеет те же position, forward, right, up и zoom, что и ProjectCameraData, поэтому записывается в CameraBuffer так же
+class CameraKeyframe:
+    def __init__(self, age: float, position: Vec3, forward: Vec3, up: Vec3, zoom: float) -> None:
+        self.age = age
+        self.position = position
+        self.forward = forward.normalize()
+        self.right = self.forward.cross(up).normalize()
+        # Верх делается перпендикулярным направлению взгляда, даже если в ключевом кадре он задан приблизительно
+        self.up = self.right.cross(self.forward).normalize()
+        self.zoom = zoom
+
+    @classmethod
+    def from_view(cls, view: "ProjectCameraData", age: float) -> Self:
+        return cls(age, view.position, view.forward, view.up, view.zoom)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        return cls(
+            data["age"],
+            Vec3(*data["position"]),
+            Vec3(*data["forward"]),
+            Vec3(*data["up"]),
+            data.get("zoom", 1)
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "age": self.age,
+            "position": tuple(self.position),
+            "forward": tuple(self.forward),
+            "up": tuple(self.up),
+            "zoom": self.zoom
+        }
+
+    # Направления интерполируются линейно с нормализацией, поэтому соседние ключевые кадры
+    # не должны смотреть в противоположные стороны. Зум интерполируется геометрически, чтобы приближение было равномерным
+    def interpolate(self, other: "CameraKeyframe", alpha: float) -> "CameraKeyframe":
+        return CameraKeyframe(
+            self.age + (other.age - self.age) * alpha,
+            self.position + (other.position - self.position) * alpha,
+            self.forward + (other.forward - self.forward) * alpha,
+            self.up + (other.up - self.up) * alpha,
+            self.zoom * (other.zoom / self.zoom) ** alpha
+        )
+
+
+class CameraPath:
+    def __init__(self, keyframes: list[CameraKeyframe]) -> None:
+        if not keyframes:
+            raise RenderError("Camera path must have at least one keyframe")
+        self.keyframes = sorted(keyframes, key = lambda keyframe: keyframe.age)
+        self.ages = [keyframe.age for keyframe in self.keyframes]
+
+    @property
+    def start_age(self) -> float:
+        return self.ages[0]
+
+    @property
+    def end_age(self) -> float:
+        return self.ages[-1]
+
+    # Положение камеры в момент age, вне пути - положение в ближайшем ключевом кадре
+    def sample(self, age: float) -> CameraKeyframe:
+        index = bisect.bisect_right(self.ages, age)
+        if index == 0:
+            return self.keyframes[0]
+        if index == len(self.keyframes):
+            return self.keyframes[-1]
+
+        previous = self.keyframes[index - 1]
+        following = self.keyframes[index]
+        return previous.interpolate(following, (age - previous.age) / (following.age - previous.age))
+
+    # {"keyframes": [{"age": 0, "position": [x, y, z], "forward": [...], "up": [...], "zoom": 1}, ...]}
+    @classmethod
+    def load(cls, path: str | pathlib.Path) -> Self:
+        with open(path, encoding = "utf-8") as file:
+            data = json.load(file)
+        return cls([CameraKeyframe.from_dict(keyframe) for keyframe in data["keyframes"]])
+
+    def save(self, path: str | pathlib.Path) -> None:
+        with open(path, "w", encoding = "utf-8") as file:
+            json.dump({"keyframes": [keyframe.to_dict() for keyframe in self.keyframes]}, file, indent = 4)
+
+
+# Выполняется в потоке сжатия. Строки кадра в буфере идут снизу вверх, как их отдает glReadPixels
+def encode_frame(view: npt.NDArray, size: tuple[int, int], path: pathlib.Path, compression: int) -> None:
+    image = Image.frombuffer("RGB", size, view, "raw", "RGB", 0, -1)
+    image.save(path, compress_level = compression)
+
+
+# Внеэкранная отрисовка мира по пути камеры.
+# Кадр рисуется WorldProjection во внеэкранный буфер кадра размера RENDER_SIZE и копируется командой OpenGL
+# в постоянно отображенный буфер упаковки пикселей, ограждаемый fence. Пока видеокарта копирует,
+# а потоки сжимают предыдущие кадры в PNG, симуляция продолжается. Кадр удерживает свой буфер до конца сжатия,
+# поэтому если все буферы заняты, render() ждет освобождения одного из них: кадры не пропускаются
+class OfflineRenderer(ProjectMixin):
+    def __init__(
+            self,
+            projection: "WorldProjection",
+            path: CameraPath,
+            folder: str | pathlib.Path,
+            size: tuple[int, int] | None = None
+    ) -> None:
+        self.projection = projection
+        self.window = projection.window
+        self.path = path
+        self.folder = pathlib.Path(folder)
+        self.folder.mkdir(parents = True, exist_ok = True)
+        self.size = tuple(self.settings.RENDER_SIZE if size is None else size)
+
+        max_size = gl.GLint()
+        gl.glGetIntegerv(gl.GL_MAX_RENDERBUFFER_SIZE, ctypes.byref(max_size))
+        if max(self.size) > max_size.value:
+            raise RenderError(f"Render size {self.size} exceeds GL_MAX_RENDERBUFFER_SIZE ({max_size.value})")
+
+        self.framebuffer_id = gl.GLuint()
+        self.color_id = gl.GLuint()
+        self.init_framebuffer()
+
+        width, height = self.size
+        self.slots = [
+            ReadbackSlot(width * height * 3, np.uint8, (height, width, 3))
+            for _ in range(self.settings.RENDER_READBACK_DEPTH)
+        ]
+        # Мир создается до внеэкранной отрисовки, поэтому ее ресурсы дописываются в его план видеопамяти
+        memory_plan = self.projection.world.memory_plan
+        memory_plan.add("render", "frame", width * height * 4)
+        memory_plan.add("render", "frame readback", width * height * 3, len(self.slots))
+        self.logger.info(f"Video memory plan with offline rendering: {memory_plan.summary()}")
+        # Кадры, копируемые видеокартой, в порядке отправки
+        self.in_flight: list[tuple[ReadbackSlot, int]] = []
+        # Кадры, сжимаемые потоками, с буферами, которые они удерживают
+        self.encoding: list[tuple[Future, ReadbackSlot]] = []
+        self.encoder = ThreadPoolExecutor(self.settings.RENDER_ENCODER_COUNT, thread_name_prefix = "render")
+
+        self.frame = 0
+        self.encoded = 0
+        # Время ожидания свободного буфера, то есть того, насколько сжатие отстает от симуляции
+        self.stall_time = 0.0
+
+    def init_framebuffer(self) -> None:
+        gl.glCreateRenderbuffers(1, ctypes.byref(self.color_id))
+        gl.glNamedRenderbufferStorage(self.color_id, gl.GL_RGBA8, *self.size)
+        gl.glCreateFramebuffers(1, ctypes.byref(self.framebuffer_id))
+        gl.glNamedFramebufferRenderbuffer(
+            self.framebuffer_id,
+            gl.GL_COLOR_ATTACHMENT0,
+            gl.GL_RENDERBUFFER,
+            self.color_id
+        )
+        gl.glNamedFramebufferReadBuffer(self.framebuffer_id, gl.GL_COLOR_ATTACHMENT0)
+
+        status = gl.glCheckNamedFramebufferStatus(self.framebuffer_id, gl.GL_FRAMEBUFFER)
+        if status != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise RenderError(f"Render framebuffer is incomplete, status {status:#x}")
+
+    def get_frame_path(self, frame: int) -> pathlib.Path:
+        return self.folder / f"frame_{frame:06d}.png"
+
+    # Рисует кадр мира в его текущем состоянии с камерой пути в момент age
+    def render(self, age: float) -> None:
+        slot = self.acquire_slot()
+
+        previous_framebuffer = gl.GLint()
+        gl.glGetIntegerv(gl.GL_FRAMEBUFFER_BINDING, ctypes.byref(previous_framebuffer))
+        previous_viewport = (gl.GLint * 4)()
+        gl.glGetIntegerv(gl.GL_VIEWPORT, previous_viewport)
+
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.framebuffer_id)
+        gl.glViewport(0, 0, *self.size)
+        try:
+            self.projection.set_target_size(self.size)
+            self.projection.write_camera(self.path.sample(age))
+            self.projection.draw_scene()
+
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, slot.gl_id)
+            gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+            # При привязанном буфере упаковки указатель - смещение в нем
+            gl.glReadPixels(0, 0, *self.size, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, None)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        finally:
+            gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, previous_framebuffer.value)
+            gl.glViewport(*previous_viewport)
+            # Окно при следующей отрисовке запишет свою камеру и размер заново
+            self.projection.set_target_size(self.window.size)
+            self.window.projector.changed = True
+
+        slot.fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        slot.age = self.frame
+        slot.busy = True
+        self.in_flight.append((slot, self.frame))
+        self.frame += 1
+        gl.glFlush()
+
+    def acquire_slot(self) -> ReadbackSlot:
+        started = time.perf_counter()
+        while True:
+            self.poll()
+            slot = next((slot for slot in self.slots if not slot.busy), None)
+            if slot is not None:
+                self.stall_time += time.perf_counter() - started
+                return slot
+            self.wait()
+
+    # Блокируется, пока не завершится копирование старейшего кадра или сжатие одного из кадров
+    def wait(self) -> None:
+        if self.in_flight:
+            gl.glClientWaitSync(self.in_flight[0][0].fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT, 1_000_000_000)
+        elif self.encoding:
+            wait([future for future, _ in self.encoding], return_when = FIRST_COMPLETED)
+
+    # Отправляет скопированные кадры на сжатие и освобождает буферы сжатых кадров, не блокируясь
+    def poll(self) -> None:
+        while self.in_flight:
+            slot, frame = self.in_flight[0]
+            status = gl.glClientWaitSync(slot.fence, 0, 0)
+            if status == gl.GL_WAIT_FAILED:
+                raise RenderError(f"Waiting for frame {frame} readback failed")
+            if status == gl.GL_TIMEOUT_EXPIRED:
+                break
+
+            self.in_flight.pop(0)
+            gl.glDeleteSync(slot.fence)
+            slot.fence = None
+            future = self.encoder.submit(
+                encode_frame,
+                slot.view,
+                self.size,
+                self.get_frame_path(frame),
+                self.settings.RENDER_PNG_COMPRESSION
+            )
+            self.encoding.append((future, slot))
+
+        still_encoding = []
+        for future, slot in self.encoding:
+            if not future.done():
+                still_encoding.append((future, slot))
+                continue
+
+            slot.busy = False
+            if future.exception() is None:
+                self.encoded += 1
+            else:
+                self.logger.error(f"Frame {slot.age} is not encoded: {future.exception()}")
+        self.encoding = still_encoding
+
+    # Дожидается чтения и сжатия всех отрисованных кадров
+    def finish(self) -> None:
+        while self.in_flight or self.encoding:
+            self.wait()
+            self.poll()
+        self.logger.info(
+            f"Rendered {self.frame} frames to {self.folder}, encoded {self.encoded},"
+            f" waited for free readback buffers {self.stall_time:.2f} s"
+        )
+
+    def delete(self) -> None:
+        self.encoder.shutdown(wait = True)
+        for slot in self.slots:
+            slot.delete()
+        gl.glDeleteFramebuffers(1, ctypes.byref(self.framebuffer_id))
+        gl.glDeleteRenderbuffers(1, ctypes.byref(self.color_id))
@@ -0,0 +1,204 @@
+import ctypes
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+import pyglet
+from pyglet import gl
+
+from core.service.object import ProjectMixin
+from core.service.threads.ring import SPSCRing
+from simulator.pick import PickCallback, PickResult
+
+
+if TYPE_CHECKING:
+    from simulator.world import World
+
+
+class SimulationError(Exception):
+    pass
+
+
+# Точки привязки буферов одного типа: (тип, запрос буфера, запрос начала, запрос размера, запрос количества точек)
+BINDING_QUERIES = (
+    (
+        gl.GL_SHADER_STORAGE_BUFFER,
+        gl.GL_SHADER_STORAGE_BUFFER_BINDING,
+        gl.GL_SHADER_STORAGE_BUFFER_START,
+        gl.GL_SHADER_STORAGE_BUFFER_SIZE,
+        gl.GL_MAX_SHADER_STORAGE_BUFFER_BINDINGS
+    ),
+    (
+        gl.GL_UNIFORM_BUFFER,
+        gl.GL_UNIFORM_BUFFER_BINDING,
+        gl.GL_UNIFORM_BUFFER_START,
+        gl.GL_UNIFORM_BUFFER_SIZE,
+        gl.GL_MAX_UNIFORM_BUFFER_BINDINGS
+    )
+)
+# (тип, точка, буфер, начало, размер), размер 0 - привязка всего буфера
+BufferBinding = tuple[int, int, int, int, int]
+
+
+# Привязки буферов текущего контекста. Объекты разделяемых контекстов общие, а привязки - нет
+def get_buffer_bindings() -> list[BufferBinding]:
+    bindings = []
+    for target, binding_query, start_query, size_query, count_query in BINDING_QUERIES:
+        count = gl.GLint()
+        gl.glGetIntegerv(count_query, ctypes.byref(count))
+        for index in range(count.value):
+            buffer_id = gl.GLint()
+            gl.glGetIntegeri_v(binding_query, index, ctypes.byref(buffer_id))
+            if buffer_id.value == 0:
+                continue
+            start = gl.GLint64()
+            size = gl.GLint64()
+            gl.glGetInteger64i_v(start_query, index, ctypes.byref(start))
+            gl.glGetInteger64i_v(size_query, index, ctypes.byref(size))
+            bindings.append((target, index, buffer_id.value, start.value, size.value))
+    return bindings
+
+
+def set_buffer_bindings(bindings: list[BufferBinding]) -> None:
+    for target, index, buffer_id, start, size in bindings:
+        if size == 0:
+            gl.glBindBufferBase(target, index, buffer_id)
+        else:
+            gl.glBindBufferRange(target, index, buffer_id, start, size)
+
+
+# Поток симуляции мира со своим контекстом OpenGL, разделяющим объекты с контекстом окна.
+# Поток выполняет тики (World.on_update) с частотой не больше desired_tps окна, после тика записывает объем оптики
+# для отрисовки (OpticsVolume.publish) и выполняет выборы ячеек, потому что текстуры мира привязаны только здесь.
+# Между потоками нет общих блокировок на тик: выборы и их результаты, моменты тиков передаются очередями SPSCRing,
+# а объем оптики - через ограждения OpenGL.
+# Чтобы поток не уходил от видеокарты вперед без ограничения, тик ждет, пока не выполнятся все, кроме
+# SIMULATION_TICKS_IN_FLIGHT последних отправленных тиков.
+# Исключение потока сохраняется и пробрасывается в основной поток из poll()
+class SimulationThread(ProjectMixin):
+    RING_CAPACITY = 1024
+    PICK_CAPACITY = 8
+
+    def __init__(self, world: "World") -> None:
+        self.world = world
+        self.window = world.window
+
+        # Скрытое окно нужно только как поверхность для контекста, окно не участвует в цикле событий pyglet
+        context = self.window.config.create_context(self.window.context)
+        self.context_window = pyglet.window.Window(
+            1,
+            1,
+            visible = False,
+            config = self.window.config,
+            context = context
+        )
+        pyglet.app.windows.discard(self.context_window)
+        self.window.switch_to()
+        self.bindings: list[BufferBinding] = []
+
+        # Моменты завершения тиков для статистики tps окна
+        self.ticks = SPSCRing(self.RING_CAPACITY, "ticks")
+        self.pick_requests = SPSCRing(self.PICK_CAPACITY, "pick requests")
+        self.pick_results = SPSCRing(self.PICK_CAPACITY, "pick results")
+        # Ограждения отправленных тиков
+        self.tick_fences: deque[gl.GLsync] = deque()
+
+        self.started = threading.Event()
+        self.stopping = threading.Event()
+        self.error: BaseException | None = None
+        self.thread = threading.Thread(target = self.run, name = "simulation", daemon = True)
+
+    def start(self) -> None:
+        self.bindings = get_buffer_bindings()
+        self.thread.start()
+        # Текущий контекст pyglet (gl.current_context) - один на все потоки, и поток симуляции делает текущим свой.
+        # Основной поток дожидается этого и возвращает себе контекст окна через pyglet, чтобы объекты, которые
+        # он создает, принадлежали окну. Поток симуляции объектов pyglet не создает
+        self.started.wait()
+        self.window.switch_to()
+        self.poll_error()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.context_window.close()
+        self.window.switch_to()
+
+    def run(self) -> None:
+        try:
+            self.context_window.switch_to()
+            set_buffer_bindings(self.bindings)
+            # Дескрипторы текстур резидентны только в контексте окна, где созданы. В контексте окна они остаются
+            # резидентными: отрисовка читает объем оптики
+            self.world.handles.make_resident()
+        except BaseException as error:
+            self.error = error
+            return
+        finally:
+            self.started.set()
+
+        try:
+            next_tick = time.perf_counter()
+            while not self.stopping.is_set():
+                self.tick()
+                next_tick += 1 / self.window.desired_tps
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    self.stopping.wait(delay)
+                else:
+                    # Не догонять пропущенные тики
+                    next_tick = time.perf_counter()
+        except BaseException as error:
+            self.error = error
+        finally:
+            gl.glFinish()
+            for fence in self.tick_fences:
+                gl.glDeleteSync(fence)
+            self.tick_fences.clear()
+
+    def tick(self) -> None:
+        while len(self.tick_fences) >= self.settings.SIMULATION_TICKS_IN_FLIGHT:
+            fence = self.tick_fences.popleft()
+            status = gl.glClientWaitSync(fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT, 1_000_000_000)
+            gl.glDeleteSync(fence)
+            if status == gl.GL_WAIT_FAILED:
+                raise SimulationError(f"Waiting for tick at age {self.world.age} failed")
+
+        self.world.on_update()
+        self.world.projection.optics.publish()
+
+        picker = self.world.projection.picker
+        picker.poll()
+        for x, y, window_size, callback in self.pick_requests.drain():
+            picker.pick(x, y, window_size, self.get_pick_forwarder(callback))
+
+        self.tick_fences.append(gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0))
+        gl.glFlush()
+        self.ticks.push(time.time())
+
+    # Результат выбора передается в основной поток, callback вызывается там из poll()
+    def get_pick_forwarder(self, callback: PickCallback) -> PickCallback:
+        def forward(result: PickResult) -> None:
+            if not self.pick_results.push((callback, result)):
+                self.logger.warning(f"Pick result is dropped, the queue is full: {result}")
+
+        return forward
+
+    # Вызывается основным потоком, False - очередь выборов заполнена.
+    # Размер окна передается с выбором, программу выбора меняет только поток симуляции
+    def pick(self, x: int, y: int, window_size: tuple[int, int], callback: PickCallback) -> bool:
+        return self.pick_requests.push((x, y, window_size, callback))
+
+    def poll_error(self) -> None:
+        if self.error is not None:
+            raise SimulationError("Simulation thread failed") from self.error
+
+    # Вызывается основным потоком: пробрасывает исключение потока, отдает результаты выборов
+    # и возвращает моменты тиков, завершенных с прошлого вызова
+    def poll(self) -> list[float]:
+        self.poll_error()
+        for callback, result in self.pick_results.drain():
+            callback(result)
+        return list(self.ticks.drain())
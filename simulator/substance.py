@@ -1,15 +1,36 @@
+from pathlib import Path
 from typing import Self
 
 import numpy as np
 import numpy.typing as npt
 
+from core.service.buffer import StorageBuffer
 from core.service.functions import get_subclasses
+from core.service.object import ProjectMixin
+from core.service.settings import Settings
+from core.service.singleton import Singleton
+
+
+settings = Settings()
+
+SubstanceIds = npt.NDArray[np.uint16]
+
+# Формат строки таблицы веществ, хранимой на диске (.npy)
+SUBSTANCE_TABLE_DTYPE = np.dtype([
+    ("mass", np.uint32),
+    ("color", np.uint8, 3),
+    ("absorption", np.float32)
+])
 
 
 class SubstanceInitError(Exception):
     pass
 
 
+class SubstanceRegistryError(Exception):
+    pass
+
+
 # https://ru.wikipedia.org/wiki/%D0%9F%D0%B5%D1%80%D0%B8%D0%BE%D0%B4%D0%B8%D1%87%D0%B5%D1%81%D0%BA%D0%B0%D1%8F_%D1%81%D0%B8%D1%81%D1%82%D0%B5%D0%BC%D0%B0_%D1%85%D0%B8%D0%BC%D0%B8%D1%87%D0%B5%D1%81%D0%BA%D0%B8%D1%85_%D1%8D%D0%BB%D0%B5%D0%BC%D0%B5%D0%BD%D1%82%D0%BE%D0%B2
 # todo: Температуру реализовать как количество запасенного тепла?
 # todo: Добавить базовые элементы (Element), из которых будут создаваться вещества.
@@ -42,21 +63,25 @@ class Substance:
             assert all(0 <= component <= 255 for component in cls.color[:3]), \
                 f"Color components {cls.color} must be in [0; 255]"
 
+    # Регистрирует вещества, заданные классами, в реестре.
+    # Vacuum регистрируется первым, чтобы получить индекс 0
     @classmethod
     def calculate_arrays(cls) -> None:
-        cls.real_substances: tuple[Self, ...] = tuple(substance for substance in get_subclasses(cls) if substance.real)
+        subclasses = sorted(
+            (substance for substance in get_subclasses(cls) if substance.real),
+            key = lambda substance: substance is not Vacuum
+        )
+        cls.real_substances: tuple[Self, ...] = tuple(subclasses)
         for substance in cls.real_substances:
             substance.check()
 
         cls.real_count = len(cls.real_substances)
-        cls.indexes = np.arange(cls.real_count, dtype = np.uint8)
-
-        cls.physics_data: npt.NDArray[np.uint32] = np.zeros((cls.real_count, 1), dtype = np.uint32)
-        cls.physics_data[:, 0] = [substance.mass for substance in cls.real_substances]
-
-        cls.optics_data = np.zeros((cls.real_count, 4), dtype = np.float32)
-        cls.optics_data[:, :3] = np.array([s.color for s in cls.real_substances], dtype = np.float32) / 255
-        cls.optics_data[:, 3] = [np.float32(substance.absorption) for substance in cls.real_substances]
+        cls.indexes = SUBSTANCES.add_many(
+            np.array([substance.mass for substance in cls.real_substances], dtype = np.uint32),
+            np.array([substance.color for substance in cls.real_substances], dtype = np.uint8),
+            np.array([substance.absorption for substance in cls.real_substances], dtype = np.float32),
+            [substance.__name__ for substance in cls.real_substances]
+        )
 
 
 # Не должен использоваться в расчетах, должен лишь служить как маркер отсутствия вещества, коим и является
@@ -106,4 +131,228 @@ class Quintum(TestSubstance):
     color = (160, 80, 220)
 
 
+# Реестр веществ в виде структуры массивов (SoA).
+# Индекс вещества в реестре - это substance_id, записываемый в юнит (14 бит, см. unit.glsl).
+# Вещества могут добавляться и изменяться во время симуляции - на видеокарту догружается только измененный диапазон
+class SubstanceRegistry(Singleton, ProjectMixin):
+    # Точки привязки буферов, должны совпадать с substance.glsl и substance_optics.glsl
+    PHYSICS_BINDING = 10
+    OPTICS_BINDING = 20
+    # Размеры одной записи в буферах видеокарты (std430)
+    PHYSICS_STRIDE = 4
+    OPTICS_STRIDE = 16
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.count = 0
+        self.capacity = 0
+        self.max_count = self.settings.MAX_SUBSTANCE_COUNT
+
+        self.mass: npt.NDArray[np.uint32] = np.zeros(0, dtype = np.uint32)
+        # Нормализованный цвет [0; 1]
+        self.color: npt.NDArray[np.float32] = np.zeros((0, 3), dtype = np.float32)
+        self.absorption: npt.NDArray[np.float32] = np.zeros(0, dtype = np.float32)
+        self.names: list[str | None] = []
+
+        # Диапазон [start; stop) индексов, измененных с последней загрузки на видеокарту
+        self.dirty_start = 0
+        self.dirty_stop = 0
+
+        self.physics_buffer: StorageBuffer | None = None
+        self.optics_buffer: StorageBuffer | None = None
+
+        self.reserve(self.settings.SUBSTANCE_CAPACITY)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def reserve(self, capacity: int) -> None:
+        if capacity > self.max_count:
+            raise SubstanceRegistryError(f"Substance count ({capacity}) must not exceed {self.max_count}")
+        if capacity <= self.capacity:
+            return
+
+        new_capacity = min(max(capacity, self.capacity * 2), self.max_count)
+        for name in ("mass", "color", "absorption"):
+            old_array = getattr(self, name)
+            new_array = np.zeros((new_capacity, *old_array.shape[1:]), dtype = old_array.dtype)
+            new_array[:self.count] = old_array[:self.count]
+            setattr(self, name, new_array)
+        self.capacity = new_capacity
+
+    def mark_dirty(self, start: int, stop: int) -> None:
+        if self.dirty_start == self.dirty_stop:
+            self.dirty_start, self.dirty_stop = start, stop
+        else:
+            self.dirty_start = min(self.dirty_start, start)
+            self.dirty_stop = max(self.dirty_stop, stop)
+
+    def check(self, start: int, stop: int) -> None:
+        mass = self.mass[start:stop]
+        absorption = self.absorption[start:stop]
+        # Vacuum (индекс 0) - маркер отсутствия вещества и проверке не подлежит
+        if start == 0:
+            mass = mass[1:]
+            absorption = absorption[1:]
+
+        mass_limit = 1 << Substance.mass_bits
+        if np.any((mass == 0) | (mass >= mass_limit)):
+            raise SubstanceRegistryError(f"Mass must be in (0; {mass_limit})")
+        if np.any(absorption <= 0):
+            raise SubstanceRegistryError("Absorption must be greater then 0")
+
+    # color - компоненты [0; 255]
+    def add_many(
+            self,
+            mass: npt.ArrayLike,
+            color: npt.ArrayLike,
+            absorption: npt.ArrayLike,
+            names: list[str | None] | None = None
+    ) -> SubstanceIds:
+        mass = np.asarray(mass, dtype = np.uint32)
+        color = np.asarray(color)
+        absorption = np.asarray(absorption, dtype = np.float32)
+        amount = len(mass)
+        if not (len(color) == len(absorption) == amount):
+            raise SubstanceRegistryError("mass, color and absorption must have the same length")
+        if np.any((color < 0) | (color > 255)):
+            raise SubstanceRegistryError("Color components must be in [0; 255]")
+
+        start = self.count
+        stop = start + amount
+        self.reserve(stop)
+
+        self.mass[start:stop] = mass
+        # Деление на месте, без временного массива размером с добавляемые вещества
+        self.color[start:stop] = color
+        self.color[start:stop] /= 255
+        self.absorption[start:stop] = absorption
+        if names is None:
+            names = [None] * amount
+        self.names.extend(names)
+        self.count = stop
+
+        try:
+            self.check(start, stop)
+        except SubstanceRegistryError:
+            self.count = start
+            del self.names[start:]
+            raise
+
+        self.mark_dirty(start, stop)
+        return np.arange(start, stop, dtype = np.uint16)
+
+    def add(
+            self,
+            mass: int,
+            color: tuple[int, int, int],
+            absorption: float,
+            name: str | None = None
+    ) -> int:
+        return int(self.add_many([mass], [color], [absorption], [name])[0])
+
+    def modify(
+            self,
+            substance_id: int,
+            mass: int | None = None,
+            color: tuple[int, int, int] | None = None,
+            absorption: float | None = None
+    ) -> None:
+        if not 0 < substance_id < self.count:
+            raise SubstanceRegistryError(f"Substance {substance_id} does not exist or can not be modified")
+
+        old_values = (self.mass[substance_id], self.color[substance_id].copy(), self.absorption[substance_id])
+        if mass is not None:
+            self.mass[substance_id] = mass
+        if color is not None:
+            self.color[substance_id] = np.asarray(color, dtype = np.float32) / 255
+        if absorption is not None:
+            self.absorption[substance_id] = absorption
+
+        try:
+            self.check(substance_id, substance_id + 1)
+        except SubstanceRegistryError:
+            self.mass[substance_id], self.color[substance_id], self.absorption[substance_id] = old_values
+            raise
+
+        self.mark_dirty(substance_id, substance_id + 1)
+
+    # Процедурная генерация веществ, воспроизводимая по seed
+    def generate(self, amount: int, seed: int) -> SubstanceIds:
+        generator = np.random.default_rng(seed)
+        return self.add_many(
+            generator.integers(1, 1 << Substance.mass_bits, amount, dtype = np.uint32),
+            generator.integers(0, 256, (amount, 3), dtype = np.uint8),
+            generator.uniform(0.1, 1.0, amount).astype(np.float32)
+        )
+
+    # Таблица отображается в память, а не читается целиком, и переносится частями во временные массивы.
+    # В реестр они добавляются одним add_many, поэтому ошибка в любой части таблицы оставляет реестр без изменений
+    def load_table(self, path: str | Path) -> SubstanceIds:
+        table = np.load(path, mmap_mode = "r")
+        if table.dtype != SUBSTANCE_TABLE_DTYPE:
+            raise SubstanceRegistryError(f"Substance table {path} has dtype {table.dtype}, {SUBSTANCE_TABLE_DTYPE} expected")
+
+        # Столбцы отображенной таблицы - представления без копий, add_many переносит их сразу в массивы реестра
+        return self.add_many(table["mass"], table["color"], table["absorption"])
+
+    # Vacuum в таблицу не записывается, так как всегда регистрируется из класса
+    def save_table(self, path: str | Path) -> None:
+        table = np.zeros(self.count - 1, dtype = SUBSTANCE_TABLE_DTYPE)
+        table["mass"] = self.mass[1:self.count]
+        table["color"] = np.rint(self.color[1:self.count] * 255).astype(np.uint8)
+        table["absorption"] = self.absorption[1:self.count]
+        np.save(path, table)
+
+    def physics_data(self, start: int = 0, stop: int | None = None) -> npt.NDArray[np.uint32]:
+        if stop is None:
+            stop = self.count
+        data = np.zeros((stop - start, 1), dtype = np.uint32)
+        data[:, 0] = self.mass[start:stop]
+        return data
+
+    def optics_data(self, start: int = 0, stop: int | None = None) -> npt.NDArray[np.float32]:
+        if stop is None:
+            stop = self.count
+        data = np.zeros((stop - start, 4), dtype = np.float32)
+        data[:, :3] = self.color[start:stop]
+        data[:, 3] = self.absorption[start:stop]
+        return data
+
+    def init_buffers(self) -> None:
+        self.physics_buffer = StorageBuffer(
+            self.PHYSICS_BINDING,
+            self.capacity * self.PHYSICS_STRIDE,
+            self.physics_data()
+        )
+        self.optics_buffer = StorageBuffer(
+            self.OPTICS_BINDING,
+            self.capacity * self.OPTICS_STRIDE,
+            self.optics_data()
+        )
+        self.dirty_start = self.dirty_stop = 0
+
+    # Догружает на видеокарту только измененный диапазон веществ
+    def upload(self) -> None:
+        if self.dirty_start == self.dirty_stop:
+            return
+
+        if self.physics_buffer.size < self.capacity * self.PHYSICS_STRIDE:
+            self.physics_buffer.resize(self.capacity * self.PHYSICS_STRIDE)
+            self.optics_buffer.resize(self.capacity * self.OPTICS_STRIDE)
+
+        start, stop = self.dirty_start, self.dirty_stop
+        self.physics_buffer.write(start * self.PHYSICS_STRIDE, self.physics_data(start, stop))
+        self.optics_buffer.write(start * self.OPTICS_STRIDE, self.optics_data(start, stop))
+        self.dirty_start = self.dirty_stop = 0
+
+
+SUBSTANCES = SubstanceRegistry()
+
+
 Substance.calculate_arrays()
+if settings.SUBSTANCE_TABLE is not None:
+    SUBSTANCES.load_table(settings.SUBSTANCE_TABLE)
+if settings.SUBSTANCE_GENERATED_COUNT > 0:
+    SUBSTANCES.generate(settings.SUBSTANCE_GENERATED_COUNT, settings.WORLD_SEED)
@@ -1,3 +1,4 @@
+import pathlib
 import time
 
 import arcade
@@ -12,6 +13,8 @@ from pyglet.event import EVENT_HANDLE_STATE
 from core.gui.button import Button, DynamicTextButton
 from core.gui.projector import ProjectProjector
 from core.service.object import ProjectMixin
+from simulator.pick import PickResult
+from simulator.render import CameraKeyframe, CameraPath
 from simulator.world import World
 
 
@@ -22,11 +25,13 @@ class ProjectWindow(arcade.Window, ProjectMixin):
     tps_button: DynamicTextButton
     fps_button: DynamicTextButton
 
-    def __init__(self) -> None:
+    # visible = False - для внеэкранной отрисовки (render.py), окно нужно только ради контекста OpenGL
+    def __init__(self, visible: bool = True) -> None:
         super().__init__(
             self.settings.WINDOW_WIDTH,
             self.settings.WINDOW_HEIGHT,
             self.settings.WINDOWS_TITLE,
+            visible = visible,
             center_window = True
         )
 
@@ -53,6 +58,8 @@ class ProjectWindow(arcade.Window, ProjectMixin):
 
         self.pressed_keys = set()
         self.mouse_dragged = False
+        # Ключевые кадры пути камеры для render.py, записываются клавишей K и сохраняются при остановке
+        self.camera_keyframes: list[CameraKeyframe] = []
 
         arcade.set_background_color(self.settings.WINDOW_BACKGROUND_COLOR)
 
@@ -97,7 +104,10 @@ class ProjectWindow(arcade.Window, ProjectMixin):
 
         self.ui_manager.add(common_layout)
 
-    def start(self) -> None:
+    # simulation_thread - считать мир в отдельном потоке, None - по SIMULATION_THREAD
+    def start(self, simulation_thread: bool | None = None) -> None:
+        if simulation_thread is None:
+            simulation_thread = self.settings.SIMULATION_THREAD
         features_to_disable = (
             gl.GL_DEPTH_TEST,
             gl.GL_STENCIL_TEST,
@@ -111,17 +121,24 @@ class ProjectWindow(arcade.Window, ProjectMixin):
         self.ui_manager.enable()
         self.world = World(self)
 
-        self.world.start()
+        self.world.start(simulation_thread)
         self.world.projection.start()
 
         self.start_interface()
 
         # Для ожидания записи в буферы
         gl.glMemoryBarrier(gl.GL_SHADER_STORAGE_BARRIER_BIT)
+        if self.world.simulation is not None:
+            self.world.simulation.start()
 
     def stop(self) -> None:
         if self.world is not None:
             self.world.stop()
+        if self.camera_keyframes:
+            path = pathlib.Path(self.settings.RENDER_FOLDER) / "camera_path.json"
+            path.parent.mkdir(parents = True, exist_ok = True)
+            CameraPath(self.camera_keyframes).save(path)
+            self.logger.info(f"Camera path with {len(self.camera_keyframes)} keyframes is saved to {path}")
 
     def update_timing(self, timing: str, value: float | int) -> TimingArray:
         timing_array, index = self.timings[timing]
@@ -141,6 +158,10 @@ class ProjectWindow(arcade.Window, ProjectMixin):
         self.update_timing("fps", self.fps)
 
     def on_update(self, _: float) -> None:
+        if self.world.simulation is not None:
+            self.on_simulation_update()
+            return
+
         try:
             self.world.on_update()
         except Exception as error:
@@ -152,6 +173,19 @@ class ProjectWindow(arcade.Window, ProjectMixin):
                 self.tick_timestamp = time.time()
                 self.count_statistics_tps()
 
+    # Тики выполняет поток симуляции, окно только забирает их моменты и результаты выборов
+    def on_simulation_update(self) -> None:
+        try:
+            tick_timestamps = self.world.simulation.poll()
+        except Exception as error:
+            error.window = self
+            raise error
+        if self.tps_button.state == 0:
+            for tick_timestamp in tick_timestamps:
+                self.previous_tick_timestamp = self.tick_timestamp
+                self.tick_timestamp = tick_timestamp
+                self.count_statistics_tps()
+
     def on_draw(self) -> EVENT_HANDLE_STATE:
         try:
             self.clear()
@@ -171,8 +205,19 @@ class ProjectWindow(arcade.Window, ProjectMixin):
                 self.frame_timestamp = time.time()
                 self.count_statistics_fps()
 
+    def on_resize(self, width: int, height: int) -> EVENT_HANDLE_STATE:
+        super().on_resize(width, height)
+        if self.world is not None and self.world.projection is not None:
+            self.world.projection.on_resize((width, height))
+
     def on_key_press(self, symbol: int, modifiers: int) -> EVENT_HANDLE_STATE:
         self.pressed_keys.add(symbol)
+        if symbol == Keys.K.value:
+            self.camera_keyframes.append(CameraKeyframe.from_view(self.projector.view, self.world.age))
+        elif symbol == Keys.R.value:
+            self.world.projection.switch_renderer()
+        elif symbol == Keys.B.value:
+            self.world.projection.benchmark_requested = True
 
     def on_key_release(self, symbol: int, modifiers: int) -> EVENT_HANDLE_STATE:
         self.pressed_keys.remove(symbol)
@@ -180,10 +225,17 @@ class ProjectWindow(arcade.Window, ProjectMixin):
     def on_mouse_release(self, x: int, y: int, button: int, modifiers: int) -> EVENT_HANDLE_STATE:
         if not self.mouse_dragged:
             if button == MouseButtons.LEFT.value:
-                print(x, y)
+                self.world.projection.pick(x, y, self.on_pick)
 
         self.mouse_dragged = False
 
+    def on_pick(self, result: PickResult) -> None:
+        self.logger.info(str(result))
+        for unit in result.units:
+            self.logger.info(
+                f"substance {unit["substance_id"]}, quantity {unit["quantity"]}, momentum {tuple(unit["momentum"])}"
+            )
+
     def on_mouse_drag(self, x: int, y: int, dx: int, dy: int, buttons: int, modifiers: int) -> EVENT_HANDLE_STATE:
         # buttons - битовая маска.
         # Сравнивается ==, чтобы исключить действия при нажатии сразу нескольких кнопок
@@ -1,6 +1,5 @@
 import ctypes
 import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import TYPE_CHECKING
 
 import numpy as np
@@ -9,13 +8,30 @@ from pyglet import gl
 from pyglet.graphics.shader import ComputeShaderProgram, Shader, ShaderProgram
 from pyglet.math import Vec3
 
+from core.service.bitfield import BitfieldLayout, CELL_LAYOUT, PLAN_LAYOUT, UNIT_LAYOUT
+from core.service.buffer import StorageBuffer
 from core.service.colors import ProjectColors
 from core.service.glsl import load_shader, write_uniforms
+from core.service.handles import ResidentHandles
 from core.service.object import GLBuffer, PhysicalObject, ProjectionObject
-from simulator.substance import Substance
+from core.service.overflow import OverflowMonitor
+from core.service.readback import ReadbackService
+from core.service.threads.jobs import JobSystem
+from simulator.creature import CreatureEngine
+from simulator.fingerprint import StateFingerprint
+from simulator.gravity import GravityField
+from simulator.memory import MemoryPlan
+from simulator.optics import OpticsVolume
+from simulator.pick import CellPicker, PickCallback
+from simulator.raymarch import TileRaymarcher, WavefrontRaymarcher
+from simulator.reaction import REACTIONS
+from simulator.simulation import SimulationThread
+from simulator.substance import SUBSTANCES
 
 
 if TYPE_CHECKING:
+    from core.gui.projector import ProjectCameraData
+    from simulator.render import CameraKeyframe
     from simulator.window import ProjectWindow
 
 BufferIds = ctypes.Array[ctypes.c_uint]
@@ -40,16 +56,24 @@ class CameraBuffer(GLBuffer):
     ]
 
 
-class PhysicsBuffer(GLBuffer):
-    gl_id = gl.GLuint()
-    _fields_ = [
-        ("u_world_age", gl.GLuint),
-        ("u_padding_0", gl.GLint * 3)
+# WorldParameters из world.glsl (std430)
+WORLD_PARAMETERS_DTYPE = np.dtype(
+    [
+        ("gravity_vector", np.int32, 3),
+        ("seed", np.int32),
+        # При tps == 1000 int32 хватит примерно на 24.8 суток непрерывной симуляции
+        ("age", np.int32),
+        ("padding", np.int32, 3)
     ]
+)
 
 
 class WorldProjection(ProjectionObject):
-    def __init__(self, world: World) -> None:
+    # Порядок переключения клавишей R
+    RENDERERS = ("fragment", "tile", "wavefront")
+
+    # optics_generation_count - 2, если мир считается в потоке симуляции (OpticsVolume)
+    def __init__(self, world: World, optics_generation_count: int = 1) -> None:
         super().__init__()
 
         self.world = world
@@ -60,7 +84,6 @@ class WorldProjection(ProjectionObject):
             Shader(load_shader(f"{self.settings.PROJECTIONAL_SHADERS}/vertex.glsl"), "vertex"),
             Shader(load_shader(f"{self.settings.PROJECTIONAL_SHADERS}/fragment.glsl", ), "fragment")
         )
-        self.init_substance_buffer()
 
         uniforms = {
             "u_window_size": (self.window.size, True, True),
@@ -69,16 +92,24 @@ class WorldProjection(ProjectionObject):
             "u_far": (self.window.projector.projection.far, True, True),
 
             "u_background": (ProjectColors.to_opengl(self.settings.WINDOW_BACKGROUND_COLOR), True, True),
-            "u_optical_density_scale": (self.settings.OPTICAL_DENSITY_SCALE, False, False),
-
-            "u_test_color_cube_start": (self.settings.TEST_COLOR_CUBE_START, False, False),
-            "u_test_color_cube_end": (self.settings.TEST_COLOR_CUBE_END, False, False)
+            "u_optics_lod_bias": (self.settings.OPTICS_LOD_BIAS, True, True)
         }
         write_uniforms(self.program, uniforms)
 
+        self.optics = OpticsVolume(self.world, optics_generation_count)
+        # Отрисовка мира: "fragment" - полноэкранный проход fragment.glsl, "tile" - TileRaymarcher,
+        # "wavefront" - WavefrontRaymarcher
+        self.renderer = self.settings.PROJECTION_RENDERER
+        self.tile_raymarcher = TileRaymarcher(self)
+        self.wavefront_raymarcher = WavefrontRaymarcher(self)
+        self.target_size = tuple(self.window.size)
+        self.benchmark_requested = False
+
         self.uniform_buffer = CameraBuffer()
         self.init_uniform_buffer()
 
+        self.picker = CellPicker(self)
+
         self.scene_vertices = self.program.vertex_list(
             4,
             gl.GL_TRIANGLE_STRIP,
@@ -86,18 +117,6 @@ class WorldProjection(ProjectionObject):
         )
         self.need_update = True
 
-    @staticmethod
-    def init_substance_buffer() -> None:
-        buffer_id = gl.GLuint()
-        gl.glCreateBuffers(1, buffer_id)
-        gl.glNamedBufferStorage(
-            buffer_id,
-            Substance.optics_data.nbytes,
-            Substance.optics_data.ctypes.data,
-            0
-        )
-        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, 20, buffer_id)
-
     def init_uniform_buffer(self) -> None:
         gl.glCreateBuffers(1, self.uniform_buffer.gl_id)
         gl.glNamedBufferStorage(
@@ -112,28 +131,102 @@ class WorldProjection(ProjectionObject):
     def start(self) -> None:
         pass
 
+    def write_camera(self, view: "ProjectCameraData | CameraKeyframe") -> None:
+        self.uniform_buffer.u_view_position = view.position
+        self.uniform_buffer.u_view_forward = view.forward
+        self.uniform_buffer.u_view_right = view.right
+        self.uniform_buffer.u_view_up = view.up
+        self.uniform_buffer.u_zoom = view.zoom
+        gl.glNamedBufferSubData(
+            self.uniform_buffer.gl_id,
+            0,
+            ctypes.sizeof(self.uniform_buffer),
+            ctypes.byref(self.uniform_buffer)
+        )
+
+    # Размер изображения в пикселях, в которое рисуется мир (окно или внеэкранный буфер кадра)
+    def set_target_size(self, size: tuple[int, int]) -> None:
+        self.target_size = tuple(size)
+        write_uniforms(self.program, {"u_window_size": (self.target_size, True, True)})
+
+    # Размер окна для выбора ячеек передается с каждым выбором (pick)
+    def on_resize(self, size: tuple[int, int]) -> None:
+        self.set_target_size(size)
+
+    def switch_renderer(self) -> None:
+        renderers = self.RENDERERS
+        self.renderer = renderers[(renderers.index(self.renderer) + 1) % len(renderers)]
+        self.logger.info(f"Projection renderer: {self.renderer}")
+
+    def draw_scene(self) -> None:
+        # С потоком симуляции до первого завершенного тика рисовать нечего
+        if not self.optics.acquire():
+            return
+        try:
+            if self.renderer != "fragment":
+                raymarcher = self.tile_raymarcher if self.renderer == "tile" else self.wavefront_raymarcher
+                # Изображение пересоздается только при смене размера цели
+                raymarcher.resize(self.target_size)
+                raymarcher.draw()
+            else:
+                self.program.use()
+                self.scene_vertices.draw(gl.GL_TRIANGLE_STRIP)
+        finally:
+            self.optics.release()
+
+    # x, y - координаты пикселя в окне, с потоком симуляции выбор выполняется им после ближайшего тика
+    def pick(self, x: int, y: int, callback: PickCallback) -> bool:
+        window_size = tuple(self.window.size)
+        if self.world.simulation is not None:
+            return self.world.simulation.pick(x, y, window_size, callback)
+        return self.picker.pick(x, y, window_size, callback)
+
+    # Среднее время отрисовки кадра каждым способом по данным видеокарты, в миллисекундах.
+    # Объем оптики пересчитывается до замеров, поэтому замеряется только проход лучей
+    def benchmark(self, frame_count: int) -> dict[str, float]:
+        self.optics.acquire()
+        self.optics.release()
+        renderer = self.renderer
+        query_id = gl.GLuint()
+        gl.glCreateQueries(gl.GL_TIME_ELAPSED, 1, ctypes.byref(query_id))
+        timings = {}
+        try:
+            for self.renderer in self.RENDERERS:
+                gl.glBeginQuery(gl.GL_TIME_ELAPSED, query_id)
+                for _ in range(frame_count):
+                    self.draw_scene()
+                gl.glEndQuery(gl.GL_TIME_ELAPSED)
+                elapsed = ctypes.c_uint64()
+                gl.glGetQueryObjectui64v(query_id, gl.GL_QUERY_RESULT, ctypes.byref(elapsed))
+                timings[self.renderer] = elapsed.value / frame_count / 1e6
+        finally:
+            self.renderer = renderer
+            gl.glDeleteQueries(1, ctypes.byref(query_id))
+
+        self.logger.info(
+            f"Projection benchmark, {frame_count} frames of {self.target_size}: "
+            + ", ".join(f"{name} {timing:.3f} ms" for name, timing in timings.items())
+        )
+        return timings
+
     def on_draw(self, draw_voxels: bool) -> None:
+        if self.world.simulation is None:
+            self.picker.poll()
         if draw_voxels:
-            self.program.use()
-
             if self.window.projector.changed:
-                self.uniform_buffer.u_view_position = self.window.projector.view.position
-                self.uniform_buffer.u_view_forward = self.window.projector.view.forward
-                self.uniform_buffer.u_view_right = self.window.projector.view.right
-                self.uniform_buffer.u_view_up = self.window.projector.view.up
-                self.uniform_buffer.u_zoom = self.window.projector.view.zoom
-                gl.glNamedBufferSubData(
-                    self.uniform_buffer.gl_id,
-                    0,
-                    ctypes.sizeof(self.uniform_buffer),
-                    ctypes.byref(self.uniform_buffer)
-                )
+                self.write_camera(self.window.projector.view)
                 self.window.projector.changed = False
 
-            self.scene_vertices.draw(gl.GL_TRIANGLE_STRIP)
+            if self.benchmark_requested:
+                self.benchmark_requested = False
+                self.benchmark(self.settings.PROJECTION_BENCHMARK_FRAMES)
+            self.draw_scene()
 
 
 class World(PhysicalObject):
+    # Должна совпадать с world.glsl
+    WORLD_PARAMETERS_BINDING = 15
+
     def __init__(self, window: "ProjectWindow") -> None:
         super().__init__()
         self.seed = self.settings.WORLD_SEED
@@ -148,66 +241,114 @@ class World(PhysicalObject):
         self.center = self.shape // 2
         self.cell_count = self.settings.CELL_COUNT
         self.cell_size = self.settings.CELL_SIZE
+        # Миры пакета лежат друг за другом по оси z общих текстур
+        self.batch_size = self.settings.WORLD_BATCH_SIZE
+        self.texture_shape = Vec3(self.shape.x, self.shape.y, self.shape.z * self.batch_size)
+        self.group_shape = Vec3(
+            self.settings.WORLD_GROUP_SHAPE.x,
+            self.settings.WORLD_GROUP_SHAPE.y,
+            self.settings.WORLD_GROUP_SHAPE.z * self.batch_size
+        )
 
         self.creation_shader = ComputeShaderProgram(load_shader(f"{self.settings.PHYSICAL_SHADERS}/creation.glsl"))
         self.stage_0_shader = ComputeShaderProgram(load_shader(f"{self.settings.PHYSICAL_SHADERS}/stage_0.glsl"))
         self.stage_1_shader = ComputeShaderProgram(load_shader(f"{self.settings.PHYSICAL_SHADERS}/stage_1.glsl"))
-        self.uniform_buffer = PhysicsBuffer()
-        self.init_uniform_buffer()
 
+        # Проверка видеопамяти до создания ресурсов
+        self.memory_plan = MemoryPlan(self.shape)
+        self.memory_plan.validate()
+        available_memory = self.memory_plan.query_available_memory()
+        # Фактически занятая миром видеопамять по данным драйвера, None - если драйвер ее не сообщает
+        self.measured_memory: int | None = None
+
+        # Параметры миров пакета, по умолчанию отличаются только seed
+        self.world_parameters = np.zeros(self.batch_size, dtype = WORLD_PARAMETERS_DTYPE)
+        self.world_parameters["gravity_vector"] = tuple(self.settings.GRAVITY_VECTOR)
+        self.world_parameters["seed"] = (self.seed + np.arange(self.batch_size)) & 0x7FFFFFFF
+        self.world_parameters_buffer = StorageBuffer(
+            self.WORLD_PARAMETERS_BINDING,
+            self.world_parameters.nbytes,
+            self.world_parameters
+        )
+
+        # Дескрипторы текстур мира, поля тяготения и объема оптики, поток симуляции делает их резидентными у себя
+        self.handles = ResidentHandles()
+        # Текстуры юнитов, планов и ячеек каждого набора, по CHUNK_COUNT текстур каждого типа
+        self.texture_ids: list[BufferIds] = []
         self.texture_infos = (self.init_textures(), self.init_textures())
         self.texture_state = False
         self.swap_textures()
-        self.init_substance_buffer()
+        # Буферы веществ общие для физики и отображения (привязки 10 и 20)
+        SUBSTANCES.init_buffers()
+        REACTIONS.init_buffers()
+        # Поле тяготения из распределения вещества, иначе тяготение задается постоянным вектором мира
+        self.gravity: GravityField | None = None
+        if self.settings.GRAVITY_FIELD:
+            self.gravity = GravityField(self)
 
         uniforms = {
             "u_world_update_period": (self.settings.WORLD_UPDATE_PERIOD, True, True),
-
-            "u_gravity_vector": (self.settings.GRAVITY_VECTOR, True, True)
+            "u_pressure_stiffness": (self.settings.PRESSURE_STIFFNESS, True, True),
+            "u_creature_consumption": (self.settings.CREATURE_CONSUMPTION, True, True),
+            "u_creature_food_energy": (self.settings.CREATURE_FOOD_ENERGY, True, True),
+            "u_creature_max_energy": (self.settings.CREATURE_MAX_ENERGY, True, True)
         }
         write_uniforms(self.stage_0_shader, uniforms)
 
-        self.thread_executor = ThreadPoolExecutor(self.settings.CPU_COUNT)
+        self.creatures = CreatureEngine(self)
+
+        # Задачи мира на процессоре, отправленные за тик, завершаются в начале следующего тика
+        self.jobs = JobSystem()
+        # Чтение состояния мира с видеокарты без остановки конвейера, потоки чтения добавляются потребителями
+        self.readback = ReadbackService()
+        self.overflow: OverflowMonitor | None = None
+        if self.settings.SHADER_OVERFLOW_CHECKS:
+            self.overflow = OverflowMonitor(self.readback)
+        # Отпечатки состояния для поиска расхождений между запусками
+        self.fingerprint: StateFingerprint | None = None
+        if self.settings.FINGERPRINT_PERIOD > 0:
+            self.fingerprint = StateFingerprint(self)
         self.prepare()
+        if available_memory is not None:
+            self.measured_memory = available_memory - self.memory_plan.query_available_memory()
         self.projection: WorldProjection | None = None
-
-    def init_uniform_buffer(self) -> None:
-        gl.glCreateBuffers(1, self.uniform_buffer.gl_id)
-        gl.glNamedBufferStorage(
-            self.uniform_buffer.gl_id,
-            ctypes.sizeof(self.uniform_buffer),
-            ctypes.byref(self.uniform_buffer),
-            gl.GL_DYNAMIC_STORAGE_BIT
-        )
-
-        gl.glBindBufferBase(gl.GL_UNIFORM_BUFFER, 2, self.uniform_buffer.gl_id)
-
-    @staticmethod
-    def init_substance_buffer() -> None:
-        buffer_id = gl.GLuint()
-        gl.glCreateBuffers(1, buffer_id)
-        gl.glNamedBufferStorage(
-            buffer_id,
-            Substance.physics_data.nbytes,
-            Substance.physics_data.ctypes.data,
-            0
-        )
-        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, 10, buffer_id)
-
-    def init_texture(self, sampler_id: int, texture_ids: list[int], shape: Vec3) -> tuple[Handles, Handles]:
+        self.simulation: SimulationThread | None = None
+
+    # Меняет параметры одного мира пакета, None - оставить как есть
+    def set_world_parameters(
+            self,
+            index: int,
+            gravity_vector: Vec3 | None = None,
+            seed: int | None = None,
+            age: int | None = None
+    ) -> None:
+        if not 0 <= index < self.batch_size:
+            raise IndexError(f"World index ({index}) must be in [0; {self.batch_size - 1}]")
+        if gravity_vector is not None:
+            if self.gravity is not None:
+                raise ValueError("World gravity vector is not used when GRAVITY_FIELD is enabled")
+            self.world_parameters[index]["gravity_vector"] = tuple(gravity_vector)
+        if seed is not None:
+            self.world_parameters[index]["seed"] = seed & 0x7FFFFFFF
+        if age is not None:
+            self.world_parameters[index]["age"] = age
+
+    def init_texture(
+            self,
+            sampler_id: int,
+            texture_ids: list[int],
+            shape: Vec3,
+            layout: BitfieldLayout
+    ) -> tuple[Handles, Handles]:
         read_handles = np.zeros(self.settings.CHUNK_COUNT, dtype = np.uint64)
         write_handles = np.zeros(self.settings.CHUNK_COUNT, dtype = np.uint64)
 
         for index, texture_id in enumerate(texture_ids):
-            gl.glTextureStorage3D(texture_id, 1, gl.GL_RGBA32UI, *shape)
-
-            read_handle = gl.glGetTextureSamplerHandleARB(texture_id, sampler_id)
-            gl.glMakeTextureHandleResidentARB(read_handle)
-            read_handles[index] = read_handle
+            gl.glTextureStorage3D(texture_id, 1, layout.texel_format, *shape)
 
-            write_handle = gl.glGetImageHandleARB(texture_id, 0, gl.GL_TRUE, 0, gl.GL_RGBA32UI)
-            gl.glMakeImageHandleResidentARB(write_handle, gl.GL_WRITE_ONLY)
-            write_handles[index] = write_handle
+            read_handles[index] = self.handles.add_texture(gl.glGetTextureSamplerHandleARB(texture_id, sampler_id))
+            write_handle = gl.glGetImageHandleARB(texture_id, 0, gl.GL_TRUE, 0, layout.texel_format)
+            write_handles[index] = self.handles.add_image(write_handle, gl.GL_WRITE_ONLY)
 
         return read_handles, write_handles
 
@@ -227,18 +368,21 @@ class World(PhysicalObject):
 
         texture_ids = (gl.GLuint * texture_count)()
         gl.glCreateTextures(gl.GL_TEXTURE_3D, texture_count, texture_ids)
+        self.texture_ids.append(texture_ids)
 
         all_handles = []
+        # Формат тексела каждого типа текстур задается схемой упаковки (core/service/bitfield.py)
         shapes = (
-            self.shape * self.settings.CELL_SHAPE,
-            self.shape,
-            self.shape
+            (self.texture_shape * self.settings.CELL_SHAPE, UNIT_LAYOUT),
+            (self.texture_shape, PLAN_LAYOUT),
+            (self.texture_shape, CELL_LAYOUT)
         )
-        for offset, shape in enumerate(shapes):
+        for offset, (shape, layout) in enumerate(shapes):
             read_handles, write_handles = self.init_texture(
                 sampler_ids[offset],
                 texture_ids[offset * self.settings.CHUNK_COUNT: (offset + 1) * self.settings.CHUNK_COUNT],
-                shape
+                shape,
+                layout
             )
             all_handles.append(read_handles)
             all_handles.append(write_handles)
@@ -252,18 +396,40 @@ class World(PhysicalObject):
         return buffer_ids
 
     def prepare(self) -> None:
+        write_uniforms(self.creation_shader, {"u_substance_count": (len(SUBSTANCES), True, True)})
         self.creation_shader.use()
 
-        gl.glDispatchCompute(*self.settings.WORLD_GROUP_SHAPE)
+        gl.glDispatchCompute(*self.group_shape)
         gl.glMemoryBarrier(gl.GL_SHADER_IMAGE_ACCESS_BARRIER_BIT | gl.GL_TEXTURE_FETCH_BARRIER_BIT)
 
         self.swap_textures()
 
-    def start(self) -> None:
-        self.projection = WorldProjection(self)
+    # threaded - считать мир в потоке симуляции, поток запускается отдельно (SimulationThread.start),
+    # когда все буферы привязаны
+    def start(self, threaded: bool = False) -> None:
+        self.projection = WorldProjection(self, 2 if threaded else 1)
+        self.creatures.start()
+        if threaded:
+            self.simulation = SimulationThread(self)
 
     def stop(self) -> None:
-        self.thread_executor.shutdown()
+        # Поток симуляции использует ресурсы мира, поэтому останавливается первым
+        if self.simulation is not None:
+            self.simulation.stop()
+        self.jobs.shutdown()
+        if self.fingerprint is not None:
+            # Копии, уже отправленные видеокартой, попадают в журнал
+            gl.glFinish()
+            self.readback.poll()
+            self.fingerprint.delete()
+        self.readback.delete()
+        if self.gravity is not None:
+            self.gravity.delete()
+        if self.projection is not None:
+            self.projection.picker.delete()
+            self.projection.optics.delete()
+            self.projection.tile_raymarcher.delete()
+            self.projection.wavefront_raymarcher.delete()
 
     def swap_textures(self) -> None:
         read_unit_buffer_id = self.texture_infos[self.texture_state][0]
@@ -282,39 +448,47 @@ class World(PhysicalObject):
 
         self.texture_state = not self.texture_state
 
+    # Текстура последнего записанного состояния: 0 - юниты, 1 - планы, 2 - ячейки
+    def current_texture(self, texture_type: int, chunk: int = 0) -> int:
+        # После swap_textures последние записанные текстуры привязаны для чтения
+        return self.texture_ids[not self.texture_state][texture_type * self.settings.CHUNK_COUNT + chunk]
+
+    # Сенсоры и поглощение юнитов существами выполняются стадией stage_0 вместе с физикой
     def compute_creatures(self) -> None:
-        pass
+        self.creatures.on_update()
 
     def compute_physics(self) -> None:
         # todo: В текущем варианте, мне нужно каждый тик копировать все текстуры.
         #  Подумать, какое количество текстур сделать, чтобы копировать только необходимое, а не все, если можно сократить число копирований?
-        self.stage_0_shader.use()
-        gl.glDispatchCompute(*self.settings.WORLD_GROUP_SHAPE)
-        gl.glMemoryBarrier(gl.GL_SHADER_IMAGE_ACCESS_BARRIER_BIT | gl.GL_TEXTURE_FETCH_BARRIER_BIT)
-        self.swap_textures()
-
-        self.stage_1_shader.use()
-        gl.glDispatchCompute(*self.settings.WORLD_GROUP_SHAPE)
+        if self.gravity is not None:
+            self.gravity.update()
+        self.run_stage(self.stage_0_shader)
+        self.run_stage(self.stage_1_shader)
+
+    # Выполняет стадию над всеми ячейками мира и меняет местами текстуры для чтения и записи
+    def run_stage(self, shader: ComputeShaderProgram) -> None:
+        shader.use()
+        gl.glDispatchCompute(*self.group_shape)
         gl.glMemoryBarrier(gl.GL_SHADER_IMAGE_ACCESS_BARRIER_BIT | gl.GL_TEXTURE_FETCH_BARRIER_BIT)
         self.swap_textures()
 
     def on_update(self) -> None:
-        futures = []
-        for _ in []:
-            futures.extend()
-        for future in as_completed(futures):
-            # это нужно для проброса исключения из потока
-            future.result()
-
-        self.uniform_buffer.u_world_age = self.age
-        gl.glNamedBufferSubData(
-            self.uniform_buffer.gl_id,
-            0,
-            ctypes.sizeof(self.uniform_buffer),
-            ctypes.byref(self.uniform_buffer)
-        )
+        # это нужно для проброса исключения из задач
+        self.jobs.wait()
+        self.readback.poll()
+        if self.settings.JOB_TIMING_LOG_PERIOD > 0 and self.age % self.settings.JOB_TIMING_LOG_PERIOD == 0:
+            self.jobs.log_timings()
+
+        self.world_parameters_buffer.write(0, self.world_parameters)
+
+        SUBSTANCES.upload()
+        REACTIONS.upload()
 
         self.compute_creatures()
         self.compute_physics()
+        if self.fingerprint is not None:
+            self.fingerprint.update()
+        self.readback.request(self.age)
 
         self.age += self.settings.WORLD_UPDATE_PERIOD
+        self.world_parameters["age"] += self.settings.WORLD_UPDATE_PERIOD
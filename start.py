@@ -1,6 +1,7 @@
 import arcade
 
 from core.pyglet import patch_gl
+from simulator.memory import format_size
 from simulator.window import ProjectWindow
 
 
@@ -16,6 +17,9 @@ def simulate() -> None:
         window.stop()
         if window.world is not None:
             print(f"Симуляция окончена. Возраст мира: {window.world.age}")
+            print(f"Видеопамять по плану: {window.world.memory_plan.summary()}")
+            if window.world.measured_memory is not None:
+                print(f"Видеопамять по данным драйвера: {format_size(window.world.measured_memory)}")
 
 
 if __name__ == "__main__":